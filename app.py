@@ -2,135 +2,52 @@
 Run with: streamlit run app.py
 Requirements:
 pip install streamlit python-dotenv openai-agents "langsmith[openai-agents]"
+
+The UI is a thin client of `services.chat_service`; the same orchestration is
+served headless by `services/api.py`.
 """
 
 import asyncio
 import uuid
 import os
 import time
-from collections import deque
-from app_agents.menu_agent import menu_agent
-from app_agents.ordering_agent import ordering_agent
-from app_agents.status_agent import status_agent
-from app_agents.outlet_agent import outlet_agent
-from models import ConversationContext
 import streamlit as st
 
-try:
-    from dotenv import load_dotenv
-    load_dotenv()  # loads OPENAI_API_KEY, DB_*, LANGSMITH_* from .env
-except ImportError:
-    # python-dotenv not installed, using environment variables directly
-    pass
-
-from agents import Runner, SQLiteSession, set_trace_processors
-
-try:
-    from langsmith.wrappers import OpenAIAgentsTracingProcessor
-    LANGSMITH_AVAILABLE = True
-except ImportError:
-    LANGSMITH_AVAILABLE = False
-
-from app_agents.router_agent import router_agent
-from db.connection import get_connection
-
-# ---------------------------------------------------------------------
-# Boot
-# ---------------------------------------------------------------------
-
-# Optional: attach LangSmith tracing (comment out to disable)
-if LANGSMITH_AVAILABLE:
-    try:
-        set_trace_processors([OpenAIAgentsTracingProcessor()])
-    except Exception:
-        pass  # LangSmith not configured
-
-# Add strict fallback if no tool applies
-RULE = (
-    "\n\nCRITICAL RULE: Only if the user's request is clearly NOT about restaurant "
-    "outlets, opening hours, menu items, placing orders, or checking order status "
-    "(for example, questions about personal life, movies, programming help, etc.), "
-    "then reply EXACTLY with: "
-    "'I can only help with restaurant menu, orders, and order status. "
-    "How can I assist you with that?' "
-    "In all other cases, call the appropriate tools."
-)
-
-if RULE not in router_agent.instructions:
-    router_agent.instructions += RULE
+from services.chat_service import handle_user_message, open_session
+from services.model_policy import RequestWindow, use_window
+from services.response_cache import response_cache_stats
+from services.usage import session_usage
+from db.cache import active_outlets, outlet_menu, shared_cache_stats
 
 # ---------------------------------------------------------------------
 # Helper Functions
 # ---------------------------------------------------------------------
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes
+# Outlets and menus come from the shared cache tier (db/cache.py), which is
+# shared with the agent tools and other processes and follows catalog writes.
+
 def get_all_outlets():
     """Fetch all active outlets from the database."""
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT id, name, city, state
-            FROM outlets
-            WHERE is_active = TRUE
-            ORDER BY city, name
-        """)
-        outlets = cur.fetchall()
-        cur.close()
-        conn.close()
-        return outlets
+        return active_outlets()
     except Exception as e:
         st.error(f"Error fetching outlets: {str(e)}")
         return []
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes per outlet
 def get_outlet_menu_cached(outlet_id: int):
     """Fetch menu for a specific outlet with caching."""
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        
-        # Verify outlet exists
-        cur.execute("SELECT name FROM outlets WHERE id = %s AND is_active = TRUE", (outlet_id,))
-        outlet_row = cur.fetchone()
-        if not outlet_row:
-            cur.close()
-            conn.close()
-            return None
-        
-        outlet_name = outlet_row[0]
-        
-        query = """
-            SELECT 
-                mi.id,
-                mi.name,
-                mi.description,
-                mi.category,
-                mi.base_price,
-                mi.is_veg,
-                mi.is_spicy,
-                oma.is_available,
-                oma.available_from_time,
-                oma.available_to_time
-            FROM menu_items mi
-            INNER JOIN outlet_menu_availability oma ON oma.menu_item_id = mi.id
-            WHERE oma.outlet_id = %s
-              AND mi.is_active = TRUE
-            ORDER BY mi.category, mi.name
-        """
-        
-        cur.execute(query, (outlet_id,))
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
-        
-        return {
-            "outlet_name": outlet_name,
-            "outlet_id": outlet_id,
-            "items": rows
-        }
-    except Exception as e:
+        menu = outlet_menu(outlet_id)
+    except Exception:
+        return None
+    if menu is None:
         return None
+    outlet_name, rows = menu
+    return {
+        "outlet_name": outlet_name,
+        "outlet_id": outlet_id,
+        "items": rows
+    }
 
 # ---------------------------------------------------------------------
 # Rate Limiting
@@ -138,12 +55,10 @@ def get_outlet_menu_cached(outlet_id: int):
 
 def init_rate_limiter():
     """Initialize rate limiter in session state if not present."""
-    if "rate_limiter_calls" not in st.session_state:
-        st.session_state.rate_limiter_calls = deque()
-    if "rate_limiter_max_calls" not in st.session_state:
-        st.session_state.rate_limiter_max_calls = 100  # 100 calls per minute
-    if "rate_limiter_window" not in st.session_state:
-        st.session_state.rate_limiter_window = 60  # 60 seconds
+    if "rate_limiter" not in st.session_state:
+        # Every model request of the session's turns is charged here, retries
+        # and hedges included (services/model_policy.py)
+        st.session_state.rate_limiter = RequestWindow(limit=100, seconds=60)  # 100 calls per minute
 
 def enforce_rate_limit():
     """
@@ -152,36 +67,41 @@ def enforce_rate_limit():
     """
     init_rate_limiter()
     
-    now = time.time()
-    window_start = now - st.session_state.rate_limiter_window
-    
-    # Remove calls outside the time window
-    while (st.session_state.rate_limiter_calls and 
-           st.session_state.rate_limiter_calls[0] < window_start):
-        st.session_state.rate_limiter_calls.popleft()
-    
-    # Check if we're at the limit
-    current_calls = len(st.session_state.rate_limiter_calls)
-    
-    if current_calls >= st.session_state.rate_limiter_max_calls:
-        # Calculate how long to wait until the oldest call expires
-        oldest_call_time = st.session_state.rate_limiter_calls[0]
-        wait_time = (oldest_call_time + st.session_state.rate_limiter_window) - now + 0.1
-        
-        if wait_time > 0:
-            # Show a message to user (optional, can be removed for production)
-            with st.spinner(f"Rate limit reached. Waiting {wait_time:.1f}s..."):
-                time.sleep(wait_time)
-            
-            # Clean up expired calls again after waiting
-            now = time.time()
-            window_start = now - st.session_state.rate_limiter_window
-            while (st.session_state.rate_limiter_calls and 
-                   st.session_state.rate_limiter_calls[0] < window_start):
-                st.session_state.rate_limiter_calls.popleft()
-    
-    # Record this call
-    st.session_state.rate_limiter_calls.append(time.time())
+    wait_time = st.session_state.rate_limiter.wait_seconds()
+    if wait_time > 0:
+        # Show a message to user (optional, can be removed for production)
+        with st.spinner(f"Rate limit reached. Waiting {wait_time:.1f}s..."):
+            time.sleep(wait_time + 0.1)
+
+# ---------------------------------------------------------------------
+# Chat Transcript
+# ---------------------------------------------------------------------
+
+# Only the most recent messages are rendered; older ones are paged in on demand
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "30"))
+
+WELCOME_MESSAGE = {
+    "role": "assistant",
+    "content": (
+        "### 👋 Welcome to your Food Ordering Assistant\n\n"
+        "I can help you with:\n"
+        "- 🏪 **Outlets** – find restaurants in a city \n"
+        "- 📖 **Menus** – browse items, or filter by cuisine, veg/spicy, or price\n"
+        "- 🛒 **Orders** – place a new order for pickup or delivery\n"
+        "- 🔔 **Order status** – check the status of an existing order\n\n"
+        "**Try asking me:**\n"
+        "- \"Show me the outlets in Seattle\"\n"
+        "- \"What vegetarian options do you have at Downtown Diner?\"\n"
+        "- \"I want to order 2 Chicken Tikka Masala for delivery\"\n"
+        "- \"What is the status of order #number ?\"\n\n"
+        "What would you like to do today?"
+    ),
+}
+
+def reset_chat():
+    """Start the on-screen transcript over with the welcome message."""
+    st.session_state.messages = [dict(WELCOME_MESSAGE)]
+    st.session_state.chat_visible = CHAT_PAGE_SIZE
 
 # ---------------------------------------------------------------------
 # Streamlit UI
@@ -192,62 +112,42 @@ st.set_page_config(
     layout="wide"
 )
 
-# Sidebar for outlet selection and session controls
-with st.sidebar:
-    st.header("⚙️ Controls")
-    
-    # Session Controls
+# Create (or reuse) a persistent session id for conversation memory
+if "session_id" not in st.session_state:
+    st.session_state.session_id = f"web-{uuid.uuid4().hex[:8]}"
+
+# Persist chat transcript for on-screen history
+if "messages" not in st.session_state:
+    reset_chat()
+if "chat_visible" not in st.session_state:
+    st.session_state.chat_visible = CHAT_PAGE_SIZE
+
+init_rate_limiter()
+
+# Sidebar pieces are fragments: interacting with one reruns only that piece,
+# and a chat turn does not re-execute the sidebar at all.
+@st.fragment
+def session_controls():
     st.subheader("📋 Session")
     st.text(f"Session ID: {st.session_state.get('session_id', 'N/A')[:12]}...")
     
     if st.button("🔄 New Session", use_container_width=True):
         st.session_state.session_id = f"web-{uuid.uuid4().hex[:8]}"
-        st.session_state.messages = [
-            {
-                "role": "assistant",
-                "content": (
-                    "### 👋 Welcome to your Food Ordering Assistant\n\n"
-                    "I can help you with:\n"
-                    "- 🏪 **Outlets** – find restaurants in a city \n"
-                    "- 📖 **Menus** – browse items, or filter by cuisine, veg/spicy, or price\n"
-                    "- 🛒 **Orders** – place a new order for pickup or delivery\n"
-                    "- 🔔 **Order status** – check the status of an existing order\n\n"
-                    "**Try asking me:**\n"
-                    "- \"Show me the outlets in Seattle\"\n"
-                    "- \"What vegetarian options do you have at Downtown Diner?\"\n"
-                    "- \"I want to order 2 Chicken Tikka Masala for delivery\"\n"
-                    "- \"What is the status of order #number ?\"\n\n"
-                    "What would you like to do today?"
-                ),
-            }
-        ]
+        reset_chat()
         st.rerun()
     
     if st.button("🗑️ Clear Chat", use_container_width=True):
-        st.session_state.messages = [
-            {
-                "role": "assistant",
-                "content": (
-                    "### 👋 Welcome to your Food Ordering Assistant\n\n"
-                    "I can help you with:\n"
-                    "- 🏪 **Outlets** – find restaurants in a city \n"
-                    "- 📖 **Menus** – browse items, or filter by cuisine, veg/spicy, or price\n"
-                    "- 🛒 **Orders** – place a new order for pickup or delivery\n"
-                    "- 🔔 **Order status** – check the status of an existing order\n\n"
-                    "**Try asking me:**\n"
-                    "- \"Show me the outlets in Seattle\"\n"
-                    "- \"What vegetarian options do you have at Downtown Diner?\"\n"
-                    "- \"I want to order 2 Chicken Tikka Masala for delivery\"\n"
-                    "- \"What is the status of order #number ?\"\n\n"
-                    "What would you like to do today?"
-                ),
-            }
-        ]
+        reset_chat()
         st.rerun()
-    
-    st.divider()
-    
-    # Outlet Selection
+
+    st.toggle(
+        "🔬 Profile turns",
+        key="profile_turns",
+        help="Write a sampling profile and memory trace of each turn to the profiles/ directory",
+    )
+
+@st.fragment
+def outlet_selector():
     st.subheader("🏪 Select Outlet")
     outlets = get_all_outlets()
     
@@ -276,29 +176,58 @@ with st.sidebar:
             st.session_state.selected_outlet_id = None
     else:
         st.warning("No outlets available")
-    
-    st.divider()
-    
+
+@st.fragment(run_every=10)
+def usage_gauges():
     # Rate Limit Status
-    init_rate_limiter()
-    now = time.time()
-    window_start = now - st.session_state.rate_limiter_window
-    
-    # Clean up old calls for display
-    recent_calls = [t for t in st.session_state.rate_limiter_calls if t >= window_start]
-    current_calls = len(recent_calls)
-    max_calls = st.session_state.rate_limiter_max_calls
+    current_calls = st.session_state.rate_limiter.in_window()
+    max_calls = st.session_state.rate_limiter.limit
     
     st.subheader("⚡ Rate Limit")
     usage_pct = (current_calls / max_calls) * 100 if max_calls > 0 else 0
-    st.progress(usage_pct / 100)
+    st.progress(min(usage_pct, 100) / 100)
     st.caption(f"{current_calls}/{max_calls} calls in last minute")
     
-    if usage_pct >= 90:
-        st.warning("⚠️ Approaching rate limit")
-    elif usage_pct >= 100:
+    if usage_pct >= 100:
         st.error("🚫 Rate limit reached")
+    elif usage_pct >= 90:
+        st.warning("⚠️ Approaching rate limit")
     
+    # Token usage of this session (router + specialists) and of today overall
+    tokens = session_usage(st.session_state.session_id)
+    st.subheader("🪙 Tokens")
+    if tokens["session_budget"]:
+        st.progress(min(tokens["tokens"] / tokens["session_budget"], 1.0))
+        st.caption(f"{tokens['tokens']:,}/{tokens['session_budget']:,} tokens this session (${tokens['cost_usd']:.4f})")
+    else:
+        st.caption(f"{tokens['tokens']:,} tokens this session (${tokens['cost_usd']:.4f})")
+    if tokens["by_agent"]:
+        st.caption(" | ".join(f"{agent}: {row['tokens']:,}" for agent, row in tokens["by_agent"].items()))
+    daily_budget = f"/{tokens['daily_budget']:,}" if tokens["daily_budget"] else ""
+    st.caption(f"Today (all sessions): {tokens['day_tokens']:,}{daily_budget} tokens (${tokens['day_cost_usd']:.2f})")
+    
+    # Response cache (process-wide)
+    cache_stats = response_cache_stats()
+    st.subheader("🧠 Response Cache")
+    st.caption(
+        f"Hit rate: {cache_stats['hit_rate'] * 100:.0f}% "
+        f"({cache_stats['answer_hits']} answers, {cache_stats['decision_hits']} routes) | "
+        f"Saved: {cache_stats['saved_seconds']:.1f}s"
+    )
+    catalog_stats = shared_cache_stats()
+    hits = sum(c["hits"] + c["stale_hits"] for c in catalog_stats.values())
+    misses = sum(c["misses"] for c in catalog_stats.values())
+    refreshes = sum(c["refreshes"] for c in catalog_stats.values())
+    st.caption(f"Catalog cache: {hits} hits, {misses} misses, {refreshes} refreshes")
+
+# Sidebar for outlet selection and session controls
+with st.sidebar:
+    st.header("⚙️ Controls")
+    session_controls()
+    st.divider()
+    outlet_selector()
+    st.divider()
+    usage_gauges()
     st.divider()
     st.caption("💡 Tip: Select an outlet to quickly access its menu")
 
@@ -306,123 +235,63 @@ with st.sidebar:
 st.title("🍽️ Restaurant Multi-Agent Chatbot")
 st.caption("Ask about outlets, menu, place orders, or check order status—our specialists will help you.")
 
-# Create (or reuse) a persistent session id for conversation memory
-if "session_id" not in st.session_state:
-    st.session_state.session_id = f"web-{uuid.uuid4().hex[:8]}"
-
-# Persist chat transcript for on-screen history
-if "messages" not in st.session_state:
-    st.session_state.messages = [
-        {
-            "role": "assistant",
-            "content": (
-                "### 👋 Welcome to your Food Ordering Assistant\n\n"
-                "I can help you with:\n"
-                "- 🏪 **Outlets** – find restaurants in a city \n"
-                "- 📖 **Menus** – browse items, or filter by cuisine, veg/spicy, or price\n"
-                "- 🛒 **Orders** – place a new order for pickup or delivery\n"
-                "- 🔔 **Order status** – check the status of an existing order\n\n"
-                "**Try asking me:**\n"
-                "- \"Show me the outlets in Seattle\"\n"
-                "- \"What vegetarian options do you have at Downtown Diner?\"\n"
-                "- \"I want to order 2 Chicken Tikka Masala for delivery\"\n"
-                "- \"What is the status of order #number ?\"\n\n"
-                "What would you like to do today?"
-            ),
-        }
-    ]
-
-
-# Render chat history
-chat_container = st.container()
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-# Handle quick actions from sidebar or chat input
-prompt = None
-if "quick_action" in st.session_state:
-    prompt = st.session_state.quick_action
-    del st.session_state.quick_action
-else:
+@st.fragment
+def chat():
+    messages = st.session_state.messages
+    visible = st.session_state.chat_visible
+    hidden = max(0, len(messages) - visible)
+
+    # Render only the latest page of the transcript
+    if hidden:
+        if st.button(f"⬆️ Load earlier messages ({hidden} hidden)"):
+            st.session_state.chat_visible = visible + CHAT_PAGE_SIZE
+            st.rerun(scope="fragment")
+    for message in messages[hidden:]:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+    # Handle quick actions from sidebar or chat input
     prompt = st.chat_input("How can we help today?")
+    if "quick_action" in st.session_state:
+        prompt = st.session_state.pop("quick_action")
 
-AGENT_MAP = {
-    "menu_agent": menu_agent,
-    "ordering_agent": ordering_agent,
-    "status_agent": status_agent,
-    "outlet_agent": outlet_agent,
-}
+    if not prompt:
+        return
 
-async def handle_user_message(conversation_id: str, user_message: str, session):
-    ctx = ConversationContext(
-        conversation_id=conversation_id,
-        raw_user_message=user_message,
-    )
+    prompt = prompt.strip()
+    if not prompt:
+        st.warning("Please enter a question.")
+        return
 
-    # 1) Run router once
-    router_result = await Runner.run(router_agent, user_message, session=session)
-
-    # Expect the router to return structured fields in final_output (you can adjust this)
-    meta = getattr(router_result, "metadata", {}) or {}
-    ctx.intent = meta.get("intent")
-    ctx.outlet_id = meta.get("outlet_id")
-    ctx.candidate_menu_item_ids = meta.get("candidate_menu_item_ids", [])
-    ctx.order_id = meta.get("order_id")
-    target = meta.get("target_agent")  # "menu_agent", "ordering_agent", "status_agent", "outlet_agent", or "clarify"
-
-    # 2) Clarify / no-op
-    if target in (None, "clarify"):
-        return router_result.final_output or (
-            "Can you clarify whether you want to browse the menu, place an order, or track an order?"
-        )
+    # Display user message immediately
+    messages.append({"role": "user", "content": prompt})
+    with st.chat_message("user"):
+        st.markdown(prompt)
 
-    # 3) One handoff to specialist
-    specialist = AGENT_MAP.get(target)
-    if specialist is None:
-        return "Sorry, something went wrong while routing your request. Please try again."
-
-    specialist_result = await Runner.run(
-        specialist,
-        user_message,
-        session=session,
-        # If your Runner/agents support extra kwargs, pass context here; if not,
-        # you’ll instead embed ctx into the prompt in the specialist agents.
-    )
+    session = open_session(st.session_state.session_id)
 
-    return specialist_result.final_output or "Done."
+    # Enforce rate limiting before making LLM call
+    enforce_rate_limit()
 
+    async def _run():
+        use_window(st.session_state.rate_limiter)  # charge this turn's model requests to the session
+        return await handle_user_message(
+            st.session_state.session_id,
+            prompt,
+            session=session,
+            profile=st.session_state.get("profile_turns") or None,
+        )
 
-if prompt:
-    prompt = prompt.strip()
-    if not prompt:
-        st.warning("Please enter a question.")
-    else:
-        # Display user message immediately
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
-            st.markdown(prompt)
-
-        session = SQLiteSession(st.session_state.session_id, "conversations.db")
-
-        # Enforce rate limiting before making LLM call
-        enforce_rate_limit()
-
-        async def _run():
-            return await handle_user_message(
-                st.session_state.session_id,
-                prompt,
-                session=session,
-            )
-
-        # Stream assistant response in chat-style block
-        with st.chat_message("assistant"):
-            placeholder = st.empty()
-            placeholder.markdown("_Checking with our specialists..._")
-            try:
-                result = asyncio.run(_run())
-            except Exception as e:
-                result = f"I encountered an error: {str(e)}. Please try again."
-            placeholder.markdown(result)
-
-        st.session_state.messages.append({"role": "assistant", "content": result})
+    # Stream assistant response in chat-style block
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        placeholder.markdown("_Checking with our specialists..._")
+        try:
+            result = asyncio.run(_run())
+        except Exception as e:
+            result = f"I encountered an error: {str(e)}. Please try again."
+        placeholder.markdown(result)
+
+    messages.append({"role": "assistant", "content": result})
+
+chat()
@@ -1,14 +1,25 @@
 """
 App Agents package - Simplified structure matching reference.
+
+Agents are built on first access (PEP 562), so importing the package is cheap.
 """
-from app_agents.router_agent import router_agent
-from app_agents.menu_agent import menu_agent
-from app_agents.ordering_agent import ordering_agent
-from app_agents.status_agent import status_agent
-
-__all__ = [
-    "router_agent",
-    "menu_agent",
-    "ordering_agent",
-    "status_agent",
-]
+import importlib
+
+_EXPORTS = {
+    "router_agent": "app_agents.router_agent",
+    "menu_agent": "app_agents.menu_agent",
+    "ordering_agent": "app_agents.ordering_agent",
+    "status_agent": "app_agents.status_agent",
+    "outlet_agent": "app_agents.outlet_agent",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
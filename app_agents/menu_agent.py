@@ -7,19 +7,48 @@ from db.queries import (
     get_outlet_menu,
     filter_menu,
     is_outlet_open,
-)   
+    get_outlet_menus,
+    filter_menu_multi,
+    is_outlets_open,
+)
+from db.sales import top_items
+
+MENU_INSTRUCTIONS = (
+    "Help guests explore the restaurant menu. Answer questions about menu items, "
+    "availability, pricing, and details. Use `the get_outlet_menu`  or `filter_menu`, to look up information "
+    "rather than guessing. If they mention a location, help them find outlets first. "
+    "If they ask about menu items, show them the menu for the selected outlet. "
+    "For recommendations or 'what's popular', use `top_items` for that outlet "
+    "(pass category or is_veg when they state a preference). "
+    "When a question covers several outlets, make one call with all outlet IDs using "
+    "`get_outlet_menus`, `filter_menu_multi` or `is_outlets_open` instead of one call per outlet."
+)
+
+
+def menu_instructions(run_context, agent) -> str:
+    """Base instructions plus the outlet and items the router already resolved."""
+    ctx = run_context.context
+    notes = []
+    if ctx.outlet_id is not None:
+        notes.append(
+            f"The guest means outlet #{ctx.outlet_id}: call the menu tools with outlet_id={ctx.outlet_id} "
+            "right away, without asking for or looking up the outlet."
+        )
+    if ctx.candidate_menu_item_ids:
+        notes.append(f"They are asking about menu item IDs {ctx.candidate_menu_item_ids}.")
+    return MENU_INSTRUCTIONS + ("\n\n" + " ".join(notes) if notes else "")
+
 
 menu_agent = Agent(
     name="MenuAgent",
-    instructions=(
-        "Help guests explore the restaurant menu. Answer questions about menu items, "
-        "availability, pricing, and details. Use `the get_outlet_menu`  or `filter_menu`, to look up information "
-        "rather than guessing. If they mention a location, help them find outlets first. "
-        "If they ask about menu items, show them the menu for the selected outlet."
-    ),
+    instructions=menu_instructions,
     tools=[
         get_outlet_menu,
         filter_menu,
         is_outlet_open,
+        top_items,
+        get_outlet_menus,
+        filter_menu_multi,
+        is_outlets_open,
     ],
 )
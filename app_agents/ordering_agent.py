@@ -7,6 +7,8 @@ from db.queries import (
     get_outlet_menu,
     create_order,
 )
+from db.bulk_orders import create_orders_bulk
+from db.customer_history import get_orders_by_phone, reorder
 
 ordering_agent = Agent[Any](
     name="OrderingAgent",
@@ -20,18 +22,30 @@ CRITICAL RULES:
 - When you call the `create_order` tool:
   - If the result starts with "SUCCESS:", treat this as a confirmed order.
     * Show the returned text to the user along with the order_id as their final confirmation message.
+    * Include the "Estimated ready" time from the result; never make up your own.
     * DO NOT say there was a technical issue in this case.
   - If the result starts with "ERROR:", apologize briefly, show the error message,
     and ask the user for whatever information is missing or needs to be fixed.
+    If the outlet is at kitchen capacity, offer to try again shortly or to order from another outlet.
 
 - Never claim there was a technical issue unless the tool output actually
   starts with "ERROR:".
 - Do not re-ask for confirmation again and again if `create_order` already
   succeeded. One success = one clear confirmation to the user.
+- For "reorder what I got last time": find the order with `get_orders_by_phone`
+  (ask for the phone number if needed), call `reorder` with its order ID, show the
+  rebuilt cart, ask for the customer's name (and phone/address as the fulfillment
+  type needs) and after they confirm pass its payload with those details to `create_order`.
+- For catering or group orders (several orders at once, or carts of dozens of lines),
+  call `create_orders_bulk` once with all the orders instead of `create_order` per order,
+  and relay its summary (created count, order IDs, rejected orders and why).
 """
     ),
     tools=[
         get_outlet_menu,
         create_order,
+        create_orders_bulk,
+        get_orders_by_phone,
+        reorder,
     ],
 )
\ No newline at end of file
@@ -2,17 +2,33 @@
 Outlet Agent - Handles outlet browsing, searching, and filtering.
 """
 from agents import Agent
-from db.queries import get_outlets_by_city_or_zip, is_outlet_open
+from db.queries import get_outlets_by_city_or_zip, is_outlet_open, is_outlets_open
+
+OUTLET_INSTRUCTIONS = (
+    "Help guests explore the restaurant outlets. Answer questions about outlets, "
+    "operating hours, and details. Use the `get_outlets_by_city_or_zip` to look up information "
+    "rather than guessing. If they mention a location, help them find outlets first. "
+    "To check whether several outlets are open, call `is_outlets_open` once with all their IDs. "
+)
+
+
+def outlet_instructions(run_context, agent) -> str:
+    """Base instructions plus the outlet the router already resolved."""
+    outlet_id = run_context.context.outlet_id
+    if outlet_id is None:
+        return OUTLET_INSTRUCTIONS
+    return OUTLET_INSTRUCTIONS + (
+        f"\n\nThe guest means outlet #{outlet_id}; use outlet_id={outlet_id} directly "
+        "(e.g. with `is_outlet_open`) instead of searching for it."
+    )
+
 
 outlet_agent = Agent(
     name="OutletAgent",
-    instructions=(
-        "Help guests explore the restaurant outlets. Answer questions about outlets, "
-        "operating hours, and details. Use the `get_outlets_by_city_or_zip` to look up information "
-        "rather than guessing. If they mention a location, help them find outlets first. "
-    ),
+    instructions=outlet_instructions,
     tools=[
         get_outlets_by_city_or_zip,
         is_outlet_open,
+        is_outlets_open,
     ],
 )
@@ -1,15 +1,15 @@
 """
-Router Agent - Routes messages to appropriate specialized agents.
+Router Agent - Decides which specialist handles a message.
+
+It does not hand off: its output is a `RouterDecision` (target agent,
+intent and the entities it could read from the message), which
+chat_service copies into the ConversationContext before running the
+specialist.
 """
 from agents import Agent
 
-from db import is_outlet_open
-
-from .menu_agent import menu_agent
-from .ordering_agent import ordering_agent
-from .status_agent import status_agent
-from .outlet_agent import outlet_agent
 from db.queries import is_outlet_open
+from models import RouterDecision
 
 router_agent = Agent(
     name="RestaurantRouterAgent",
@@ -19,15 +19,20 @@ router_agent = Agent(
         "If the user is asking about outlet locations, hours, or cities, prefer outlet_agent; if they mention " 
         "'order', 'add to cart', or item plus quantity, prefer ordering_agent; if they mention 'status of my order', 'track', 'where is my order'," 
         "or an order ID, prefer status_agent; if they are asking about menu, searching menu items, filtering menu items "
-        "by preferences prefer 'menu_agent'"
-        "Then hand off to the best-fit specialist agent "
+        "by preferences prefer 'menu_agent'. "
+        "Return your decision instead of answering: set target_agent to the best-fit specialist and intent to one of "
+        "menu, filter_menu, outlet_search, open_check, ordering, order_status, order_history or other. "
+        "Fill outlet_id, order_id and candidate_menu_item_ids only with IDs the user gave in this message or "
+        "earlier in the conversation; never guess them. "
+        "Use target_agent 'clarify' with the text in reply when you answer yourself."
     ),
     
     tools=[is_outlet_open],
-    handoffs=[outlet_agent, menu_agent, ordering_agent, status_agent],
+    output_type=RouterDecision,
 )
 router_agent.instructions += (
-    "\n\nIf the user asks whether a specific outlet is open now or at a given time, "
-    "resolve an outlet to an outlet_id via outlet_agent and call is_outlet_open return the response back to user"
+    "\n\nIf the user asks whether a specific outlet is open now or at a given time and gives its outlet ID, "
+    "call is_outlet_open and return its response in reply with target_agent 'clarify'; "
+    "if they name the outlet by place, route to outlet_agent with intent open_check. "
     "Do NOT use the fallback domain message in that case."
 )
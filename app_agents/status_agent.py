@@ -4,13 +4,32 @@ Status Agent - Handles order status queries.
 from agents import Agent
 
 from db.queries import get_order_status
+from db.customer_history import get_orders_by_phone
+
+STATUS_INSTRUCTIONS = (
+    "Help customers check their order status. Use `get_order_status` to retrieve detailed "
+    "information about orders. If the customer doesn't provide an order ID, ask them for it. "
+    "Always use the tools to get accurate order information rather than guessing. "
+    "When asked how long an order will take, give the 'Estimated ready' line from "
+    "`get_order_status` and never invent a time. "
+    "If they ask about their open or past orders without an order ID, ask for their phone "
+    "number and use `get_orders_by_phone` (status='OPEN' for open orders)."
+)
+
+
+def status_instructions(run_context, agent) -> str:
+    """Base instructions plus the order ID the router already resolved."""
+    order_id = run_context.context.order_id
+    if order_id is None:
+        return STATUS_INSTRUCTIONS
+    return STATUS_INSTRUCTIONS + (
+        f"\n\nThe customer means order #{order_id}: call `get_order_status` with order_id={order_id} "
+        "right away, without asking for it."
+    )
+
 
 status_agent = Agent(
     name="StatusAgent",
-    instructions=(
-        "Help customers check their order status. Use `get_order_status` to retrieve detailed "
-        "information about orders. If the customer doesn't provide an order ID, ask them for it. "
-        "Always use the tools to get accurate order information rather than guessing."
-    ),
-    tools=[get_order_status],
+    instructions=status_instructions,
+    tools=[get_order_status, get_orders_by_phone],
 )
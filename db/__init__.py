@@ -1,26 +1,39 @@
 """
 Database package for restaurant chatbot services.
+
+Submodules are imported on first attribute access, so `import db` (or
+`from db.connection import get_connection`) does not pull in the agents SDK.
 """
+import importlib
+
+_EXPORTS = {
+    "get_connection": ".connection",
+    "replica_stats": ".connection",
+    "get_outlets_by_city_or_zip": ".queries",
+    "get_outlet_menu": ".queries",
+    "filter_menu": ".queries",
+    "is_outlet_open": ".queries",
+    "is_outlets_open": ".queries",
+    "get_outlet_menus": ".queries",
+    "filter_menu_multi": ".queries",
+    "create_order": ".queries",
+    "get_order_status": ".queries",
+    "update_order_status": ".queries",
+    "get_orders_by_phone": ".customer_history",
+    "reorder": ".customer_history",
+    "top_items": ".sales",
+    "single_flight_stats": ".single_flight",
+    "shared_cache_stats": ".cache",
+    "statement_stats": ".statements",
+}
 
-from .connection import get_connection
-from .queries import (
-    get_outlets_by_city_or_zip,
-    get_outlet_menu,
-    filter_menu,
-    is_outlet_open,
-    create_order,
-    get_order_status,
-    update_order_status,
-)
+__all__ = list(_EXPORTS)
 
-__all__ = [
-    "get_connection",
-    "get_outlets_by_city_or_zip",
-    "get_outlet_menu",
-    "filter_menu",
-    "is_outlet_open",
-    "create_order",
-    "get_order_status",
-    "update_order_status",
-]
 
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
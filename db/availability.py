@@ -0,0 +1,387 @@
+"""
+Availability engine for outlet_menu_availability time windows.
+
+Each item's `available_from_time` / `available_to_time` / `available_days` is
+compiled once into a week of bitmaps: one Python int per weekday with one bit
+per BUCKET_MINUTES slot, in the outlet's timezone. "Available at T" is then a
+shift-and-mask on the right weekday. Identical windows share one interned
+bitmap tuple, so large outlet x item counts cost a reference per item.
+
+Windows are aligned to bucket boundaries: a slot is on when its start minute
+falls inside [from, to), and a window too narrow to contain a slot start keeps
+the slot it falls in. Windows with to < from run past midnight into the next
+day; from == to means all day. Compiled schedules are cached per outlet and dropped when the
+catalog version changes.
+
+Run with: python -m db.availability --benchmark
+          (bitmaps vs the per-request time-window query at --outlets x --items;
+          the query runs on a temporary table in the configured database)
+"""
+import argparse
+import os
+import random
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .catalog import get_catalog_version
+from .connection import close_cursor, get_connection
+
+BUCKET_MINUTES = int(os.getenv("AVAILABILITY_BUCKET_MINUTES", "15"))
+BUCKETS_PER_DAY = (24 * 60) // BUCKET_MINUTES
+FULL_DAY = (1 << BUCKETS_PER_DAY) - 1
+
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+DAY_ALIASES = {
+    "all": range(7),
+    "daily": range(7),
+    "everyday": range(7),
+    "weekdays": range(5),
+    "weekends": range(5, 7),
+}
+
+WeekBitmap = Tuple[int, int, int, int, int, int, int]
+
+ALWAYS: WeekBitmap = (FULL_DAY,) * 7
+NEVER: WeekBitmap = (0,) * 7
+
+_interned: Dict[tuple, WeekBitmap] = {}
+_interned_lock = threading.Lock()
+
+
+def parse_days(spec: Optional[str]) -> set:
+    """
+    Parse 'All', 'Mon-Fri', 'Sat,Sun', 'Weekdays', 'Fri-Mon' ... into weekday numbers (Mon=0).
+    Empty or unknown specs mean every day, matching how the column has been used.
+    """
+    if not spec or not spec.strip():
+        return set(range(7))
+
+    days = set()
+    for part in spec.lower().replace(" ", "").split(","):
+        if part in DAY_ALIASES:
+            days.update(DAY_ALIASES[part])
+            continue
+        if "-" in part:
+            start, _, end = part.partition("-")
+            if start[:3] in DAY_NAMES and end[:3] in DAY_NAMES:
+                i, j = DAY_NAMES.index(start[:3]), DAY_NAMES.index(end[:3])
+                while True:
+                    days.add(i)
+                    if i == j:
+                        break
+                    i = (i + 1) % 7
+                continue
+        if part[:3] in DAY_NAMES:
+            days.add(DAY_NAMES.index(part[:3]))
+
+    return days or set(range(7))
+
+
+def _bucket(t) -> int:
+    """Bucket index of a time (start of slot)."""
+    return (t.hour * 60 + t.minute) // BUCKET_MINUTES
+
+
+def _span(start: int, end: int) -> int:
+    """Bits [start, end) within one day."""
+    return ((1 << end) - 1) & ~((1 << start) - 1)
+
+
+def compile_window(is_available: bool, from_time, to_time, days_spec: Optional[str]) -> WeekBitmap:
+    """Compile one availability row into an interned week bitmap."""
+    if not is_available:
+        return NEVER
+
+    days = parse_days(days_spec)
+    key = (from_time, to_time, frozenset(days))
+    with _interned_lock:
+        cached = _interned.get(key)
+    if cached is not None:
+        return cached
+
+    week = [0] * 7
+    if from_time is None or to_time is None:
+        for day in days:
+            week[day] = FULL_DAY
+    else:
+        from_minute = from_time.hour * 60 + from_time.minute
+        to_minute = to_time.hour * 60 + to_time.minute
+        start = -(-from_minute // BUCKET_MINUTES)  # first slot starting inside
+        end = -(-to_minute // BUCKET_MINUTES)
+        if start == end and from_minute < to_minute:
+            # Narrower than a bucket with no slot starting inside: keep the slot it falls in
+            start = from_minute // BUCKET_MINUTES
+            end = start + 1
+        for day in days:
+            if start < end:
+                week[day] |= _span(start, end)
+            elif start > end:
+                # Runs past midnight: tail of this day, head of the next
+                week[day] |= _span(start, BUCKETS_PER_DAY)
+                week[(day + 1) % 7] |= _span(0, end)
+            else:
+                # Same start and end time, or past midnight leaving less than a bucket out
+                week[day] = FULL_DAY
+
+    bitmap = tuple(week)
+    with _interned_lock:
+        return _interned.setdefault(key, bitmap)
+
+
+def describe_window(from_time, to_time, days_spec: Optional[str]) -> str:
+    """Human readable window, e.g. '06:00 - 11:00, Mon-Fri'."""
+    parts = []
+    if from_time and to_time:
+        parts.append(f"{from_time.strftime('%H:%M')} - {to_time.strftime('%H:%M')}")
+    if days_spec and days_spec.strip().lower() not in ("all", "daily", "everyday"):
+        parts.append(days_spec.strip())
+    return ", ".join(parts)
+
+
+class OutletSchedule:
+    """Compiled availability for one outlet."""
+
+    __slots__ = ("outlet_id", "timezone", "items", "catalog_version")
+
+    def __init__(self, outlet_id: int, timezone: Optional[str], items: Dict[int, WeekBitmap], catalog_version: int):
+        self.outlet_id = outlet_id
+        self.timezone = timezone
+        self.items = items
+        self.catalog_version = catalog_version
+
+    def local_time(self, at: Optional[datetime] = None) -> datetime:
+        """`at` (default now) converted to the outlet's timezone; naive values are taken as local."""
+        if at is not None and (at.tzinfo is None or getattr(at.tzinfo, "zone", None) == self.timezone):
+            return at  # already local: callers pass one local_time() to many is_available() checks
+
+        import pytz  # deferred like in queries.is_outlet_open
+
+        try:
+            tz = pytz.timezone(self.timezone) if self.timezone else None
+        except Exception:
+            tz = None
+
+        if at is None:
+            return datetime.now(tz) if tz else datetime.now()
+        if tz is None or at.tzinfo is None:
+            return at
+        return at.astimezone(tz)
+
+    def is_available(self, menu_item_id: int, at: Optional[datetime] = None) -> bool:
+        """O(1): is the item orderable at `at` (default now)? Unknown items are not."""
+        week = self.items.get(menu_item_id)
+        if week is None:
+            return False
+        local = self.local_time(at)
+        return bool((week[local.weekday()] >> _bucket(local)) & 1)
+
+
+_schedules: Dict[int, OutletSchedule] = {}
+_schedules_lock = threading.Lock()
+
+
+def _load_schedule(cur, outlet_id: int, catalog_version: int) -> OutletSchedule:
+    cur.execute(
+        """
+        SELECT
+            o.timezone,
+            oma.menu_item_id,
+            oma.is_available,
+            oma.available_from_time,
+            oma.available_to_time,
+            oma.available_days
+        FROM outlets o
+        LEFT JOIN outlet_menu_availability oma ON oma.outlet_id = o.id
+        WHERE o.id = %s
+        """,
+        (outlet_id,),
+    )
+    rows = cur.fetchall()
+    timezone = rows[0][0] if rows else None
+    items = {
+        menu_item_id: compile_window(is_available, from_time, to_time, days)
+        for _, menu_item_id, is_available, from_time, to_time, days in rows
+        if menu_item_id is not None
+    }
+    return OutletSchedule(outlet_id, timezone, items, catalog_version)
+
+
+def get_outlet_schedule(outlet_id: int, cur=None) -> OutletSchedule:
+    """
+    Compiled schedule for an outlet, rebuilt when the catalog version moves.
+    Pass `cur` to reuse the caller's connection on a cache miss.
+    """
+    catalog_version = get_catalog_version()
+    with _schedules_lock:
+        schedule = _schedules.get(outlet_id)
+    if schedule is not None and schedule.catalog_version == catalog_version:
+        return schedule
+
+    if cur is not None:
+        schedule = _load_schedule(cur, outlet_id, catalog_version)
+    else:
+        conn = get_connection()
+        own_cur = conn.cursor()
+        try:
+            schedule = _load_schedule(own_cur, outlet_id, catalog_version)
+        finally:
+            close_cursor(own_cur)
+
+    with _schedules_lock:
+        _schedules[outlet_id] = schedule
+    return schedule
+
+
+# ---------- Benchmark ----------
+
+# (from, to, days) windows the synthetic catalog draws from; None = all day
+BENCH_WINDOWS = [
+    (None, None, "All"),
+    ("06:00", "11:00", "All"),
+    ("11:00", "15:00", "Mon-Fri"),
+    ("17:00", "23:00", "All"),
+    ("22:00", "02:00", "Fri-Sat"),
+    ("09:00", "14:00", "Sat,Sun"),
+]
+
+# The time-window check as a query per request. SQL has no form of the day
+# spec, so it checks the time only: a lower bound on what it would cost.
+_WINDOW_SQL = """
+    is_available
+    AND (available_from_time IS NULL OR available_to_time IS NULL
+         OR (available_from_time <= available_to_time
+             AND %(at)s >= available_from_time AND %(at)s < available_to_time)
+         OR (available_from_time > available_to_time
+             AND (%(at)s >= available_from_time OR %(at)s < available_to_time)))
+"""
+WINDOW_CHECK_SQL = (
+    "SELECT " + _WINDOW_SQL + " FROM availability_bench WHERE outlet_id = %(outlet)s AND menu_item_id = %(item)s"
+)
+WINDOW_MENU_SQL = "SELECT menu_item_id FROM availability_bench WHERE outlet_id = %(outlet)s AND " + _WINDOW_SQL
+
+
+def _bench_rows(outlets: int, items: int) -> List[tuple]:
+    """(outlet_id, menu_item_id, is_available, from, to, days) for every outlet x item."""
+    rng = random.Random(7)
+    windows = [
+        (datetime.strptime(start, "%H:%M").time() if start else None,
+         datetime.strptime(end, "%H:%M").time() if end else None,
+         days)
+        for start, end, days in BENCH_WINDOWS
+    ]
+    return [
+        (outlet_id, item_id, rng.random() > 0.05, *rng.choice(windows))
+        for outlet_id in range(1, outlets + 1)
+        for item_id in range(1, items + 1)
+    ]
+
+
+def _per_call(fn, args: List[tuple]) -> float:
+    """Mean microseconds of fn(*a) over `args`."""
+    started = time.perf_counter()
+    for a in args:
+        fn(*a)
+    return (time.perf_counter() - started) / len(args) * 1e6
+
+
+def _benchmark(outlets: int, items: int, checks: int, queries: int) -> None:
+    """
+    Compile `outlets` x `items` synthetic availability rows into schedules
+    and compare single-item checks and whole-menu filters against the same
+    checks as queries on an indexed temporary table.
+    """
+    import pytz  # deferred like in OutletSchedule.local_time
+
+    timezone = "America/Los_Angeles"
+    rows = _bench_rows(outlets, items)
+    rng = random.Random(11)
+    start = datetime(2026, 1, 5, tzinfo=pytz.utc)  # a Monday
+    moments = [start + timedelta(minutes=rng.randrange(7 * 24 * 60)) for _ in range(max(checks, queries))]
+
+    def compile_all() -> Dict[int, OutletSchedule]:
+        compiled: Dict[int, Dict[int, WeekBitmap]] = {}
+        for outlet_id, item_id, is_available, from_time, to_time, days in rows:
+            compiled.setdefault(outlet_id, {})[item_id] = compile_window(is_available, from_time, to_time, days)
+        return {outlet_id: OutletSchedule(outlet_id, timezone, by_item, 0) for outlet_id, by_item in compiled.items()}
+
+    started = time.perf_counter()
+    compile_all()
+    compile_seconds = time.perf_counter() - started
+    tracemalloc.start()
+    schedules = compile_all()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(
+        f"{outlets:,} outlets x {items:,} items: compiled {len(rows):,} rows in {compile_seconds:.2f} s, "
+        f"{len(_interned)} distinct bitmaps, {memory / len(rows):.0f} bytes per item"
+    )
+
+    picks = [(rng.randint(1, outlets), rng.randint(1, items)) for _ in range(max(checks, queries))]
+    bitmap_check = _per_call(
+        lambda outlet_id, item_id, at: schedules[outlet_id].is_available(item_id, at),
+        [(o, i, at) for (o, i), at in zip(picks[:checks], moments)],
+    )
+
+    def available_menu(outlet_id: int, at: datetime) -> List[int]:
+        schedule = schedules[outlet_id]
+        local_now = schedule.local_time(at)  # once per menu, as get_outlet_menu does
+        return [item_id for item_id in schedule.items if schedule.is_available(item_id, local_now)]
+
+    bitmap_menu = _per_call(available_menu, [(o, at) for (o, _), at in zip(picks[:queries], moments)])
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            CREATE TEMP TABLE availability_bench (
+                outlet_id INTEGER NOT NULL,
+                menu_item_id INTEGER NOT NULL,
+                is_available BOOLEAN NOT NULL,
+                available_from_time TIME,
+                available_to_time TIME,
+                available_days VARCHAR(50),
+                PRIMARY KEY (outlet_id, menu_item_id)
+            )
+            """
+        )
+        cur.executemany("INSERT INTO availability_bench VALUES (%s, %s, %s, %s, %s, %s)", rows)
+        cur.execute("ANALYZE availability_bench")
+        conn.commit()
+
+        local = [schedules[o].local_time(at).time() for (o, _), at in zip(picks, moments)]
+        sql_check = _per_call(
+            lambda outlet_id, item_id, at: (
+                cur.execute(WINDOW_CHECK_SQL, {"outlet": outlet_id, "item": item_id, "at": at}),
+                cur.fetchone(),
+            ),
+            [(o, i, at) for (o, i), at in zip(picks[:queries], local)],
+        )
+        sql_menu = _per_call(
+            lambda outlet_id, at: (cur.execute(WINDOW_MENU_SQL, {"outlet": outlet_id, "at": at}), cur.fetchall()),
+            [(o, at) for (o, _), at in zip(picks[:queries], local)],
+        )
+        cur.execute("DROP TABLE availability_bench")
+        conn.commit()
+    finally:
+        close_cursor(cur)
+
+    print(f"is item available    bitmap {bitmap_check:9.2f} us   query {sql_check:9.2f} us   ({sql_check / bitmap_check:,.1f}x)")
+    print(f"available menu ({items} items) bitmap {bitmap_menu:9.2f} us   query {sql_menu:9.2f} us   ({sql_menu / bitmap_menu:,.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare availability bitmaps with the time-window query.")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--outlets", type=int, default=1_000)
+    parser.add_argument("--items", type=int, default=300)
+    parser.add_argument("--checks", type=int, default=100_000, help="single-item checks on the bitmaps")
+    parser.add_argument("--queries", type=int, default=2_000, help="checks and menus run as queries")
+    args = parser.parse_args()
+    if args.benchmark:
+        _benchmark(args.outlets, args.items, args.checks, args.queries)
+    else:
+        parser.print_help()
@@ -0,0 +1,630 @@
+"""
+Bulk orders - Catering carts and group orders in one call.
+
+`place_orders` takes up to BULK_MAX_ORDERS `CreateOrderPayload`s (many
+individual orders, or one cart with hundreds of lines) and does per shard
+what `create_order` does per order, set-based:
+
+- one query for every outlet in the batch, one for every (outlet, menu
+  item) pair, and the outlets' cached schedules. Each order is then
+  validated in memory with the same rules and messages as create_order.
+- idempotency keys looked up, claimed and completed in one statement each.
+  Orders without a client key get one derived from the session, the cart
+  and their position in the batch, so identical orders in one batch stay
+  distinct and resending the whole batch replays it. Without a session
+  they have no key and are not deduplicated.
+- one kitchen quote per outlet (`kitchen.quote_many`, in outlet id order),
+  each order queued behind the accepted ones before it. Quotes come before
+  the keys are claimed, so an order refused at kitchen capacity leaves no
+  key behind and can be sent again.
+- orders and order_items written with multi-row INSERTs of BULK_PAGE_ROWS
+  rows, in one transaction.
+
+By default invalid orders are rejected and the rest are created.
+With `all_or_nothing`, any rejection rolls back the whole batch. Batches
+spanning several shards commit once per shard, so all_or_nothing covers
+validation and quoting but not a failed commit on a later shard.
+
+`create_orders_bulk` is the agent tool; the HTTP API exposes the same
+path as POST /orders/bulk. Both answer with the compact `summarize` text.
+
+Run with: python -m db.bulk_orders --benchmark --orders 1000   (bulk call vs one create_order per order)
+"""
+import argparse
+import json
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents import RunContextWrapper, function_tool
+from pydantic import BaseModel, ConfigDict
+
+from . import idempotency, kitchen
+from .availability import get_outlet_schedule
+from .connection import close_cursor, execute_batch, execute_values, get_connection, note_write, shard_for_outlet
+from .queries import CreateOrderPayload, order_confirmation
+
+BULK_MAX_ORDERS = int(os.getenv("BULK_MAX_ORDERS", "1000"))
+BULK_MAX_LINES = int(os.getenv("BULK_MAX_LINES", "20000"))  # order lines over the whole batch
+BULK_PAGE_ROWS = 1000  # rows per multi-row INSERT (keeps SQLite under its bound-parameter limit)
+BULK_SUMMARY_PROBLEMS = 10  # rejections listed in the summary text
+
+
+class BulkOrderPayload(BaseModel):
+    orders: List[CreateOrderPayload]
+    all_or_nothing: bool = False
+
+    model_config = ConfigDict(extra="forbid")  # no unknown keys
+
+
+@dataclass
+class BulkResult:
+    created: List[dict] = field(default_factory=list)  # index, order_id, outlet_id, items, total, ready_eta
+    rejected: List[dict] = field(default_factory=list)  # index, error
+    duplicates: List[dict] = field(default_factory=list)  # index, response (placed by an earlier submission)
+    held_back: List[int] = field(default_factory=list)  # indexes of valid orders rolled back by all_or_nothing
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "summary": summarize(self),
+            "created": [
+                {**order, "ready_eta": order["ready_eta"].isoformat()} for order in self.created
+            ],
+            "rejected": self.rejected,
+            "duplicates": [{"index": dup["index"]} for dup in self.duplicates],
+            "held_back": self.held_back,
+        }
+
+
+@dataclass
+class _Entry:
+    """One order of the batch on its way through validation and writing."""
+
+    index: int
+    payload: CreateOrderPayload
+    key: Optional[str]
+    fulfillment_type: str = ""
+    customer_name: str = ""
+    customer_phone: Optional[str] = None
+    customer_address: Optional[str] = None
+    outlet_name: str = ""
+    lines: List[dict] = field(default_factory=list)
+    total: float = 0.0
+    prep_seconds: int = 0
+    ready_eta: Optional[datetime] = None
+
+
+def _bulk_key(payload: CreateOrderPayload, index: int, session_id: Optional[str]) -> Optional[str]:
+    if payload.idempotency_key and payload.idempotency_key.strip():
+        return payload.idempotency_key.strip()[:128]
+    if not session_id:
+        return None
+    return f"bulk:{idempotency.cart_hash(payload)[:32]}:{index}:{session_id}"[:128]
+
+
+def _check_fields(entry: _Entry) -> Optional[str]:
+    """create_order's checks that need no database; fills the normalized fields."""
+    payload = entry.payload
+    if not payload.outlet_id:
+        return "outlet_id is required."
+    entry.fulfillment_type = payload.fulfillment_type.upper()
+    entry.customer_name = (payload.customer_name or "").strip()
+    if not entry.customer_name:
+        return "customer_name is required."
+    entry.customer_phone = (payload.customer_phone or "").strip() or None
+    entry.customer_address = (payload.customer_address or "").strip() or None
+    if entry.fulfillment_type == "DELIVERY" and not entry.customer_address:
+        return "customer_address is required for DELIVERY orders."
+    if not payload.items:
+        return "At least one item is required in the order."
+    for item in payload.items:
+        if not item.menu_item_id or not item.quantity:
+            return "Each item must have menu_item_id and quantity."
+        if item.quantity <= 0:
+            return "Quantity must be greater than zero."
+    return None
+
+
+def _price(entry: _Entry, outlets: Dict[int, tuple], menu: Dict[Tuple[int, int], tuple], now_by_outlet) -> Optional[str]:
+    """Validate an order against the batch's outlet and menu rows; fills lines, total and prep time."""
+    outlet_id = entry.payload.outlet_id
+    outlet = outlets.get(outlet_id)
+    if outlet is None:
+        return f"Outlet #{outlet_id} not found."
+    outlet_name, is_active = outlet
+    if not is_active:
+        return f"Outlet #{outlet_id} ({outlet_name}) is not active."
+    entry.outlet_name = outlet_name
+
+    schedule, local_now = now_by_outlet[outlet_id]
+    for item in entry.payload.items:
+        row = menu.get((outlet_id, item.menu_item_id))
+        if row is None:
+            return f"Menu item #{item.menu_item_id} not found or not available at this outlet."
+        item_name, unit_price, is_available, category = row
+        if not is_available or not schedule.is_available(item.menu_item_id, local_now):
+            return f"Menu item #{item.menu_item_id} ({item_name}) is currently unavailable."
+        line_total = float(unit_price) * item.quantity
+        entry.total += line_total
+        entry.lines.append(
+            {
+                "menu_item_id": item.menu_item_id,
+                "quantity": item.quantity,
+                "unit_price": float(unit_price),
+                "line_total": line_total,
+                "category": category,
+            }
+        )
+    entry.prep_seconds = kitchen.estimate_prep_seconds((line["category"], line["quantity"]) for line in entry.lines)
+    return None
+
+
+def _pages(rows: List[tuple]):
+    for start in range(0, len(rows), BULK_PAGE_ROWS):
+        yield rows[start:start + BULK_PAGE_ROWS]
+
+
+# ---------------------------------------------------------------------
+# One shard: validate and quote, then write
+# ---------------------------------------------------------------------
+
+def _prepare(cur, entries: List[_Entry], result: BulkResult, now: datetime) -> List[_Entry]:
+    """
+    Inside the shard's transaction: drop replays, validate, quote the
+    kitchens and claim keys. Returns the orders to write.
+    """
+    keys = [entry.key for entry in entries if entry.key is not None]
+    cur.execute(
+        """
+        SELECT idempotency_key, response
+        FROM order_idempotency_keys
+        WHERE idempotency_key = ANY(%s)
+          AND response IS NOT NULL
+          AND created_at >= NOW() - make_interval(secs => %s)
+        """,
+        (keys, idempotency.IDEMPOTENCY_WINDOW_SECONDS),
+    )
+    stored = dict(cur.fetchall())
+    fresh = []
+    for entry in entries:
+        if entry.key in stored:
+            result.duplicates.append({"index": entry.index, "response": stored[entry.key]})
+            idempotency.remember(entry.key, stored[entry.key])
+        else:
+            fresh.append(entry)
+
+    # ---------- Set-based validation ----------
+    outlet_ids = sorted({entry.payload.outlet_id for entry in fresh})
+    item_ids = sorted({item.menu_item_id for entry in fresh for item in entry.payload.items})
+    cur.execute("SELECT id, name, is_active FROM outlets WHERE id = ANY(%s)", (outlet_ids,))
+    outlets = {row[0]: row[1:] for row in cur.fetchall()}
+    cur.execute(
+        """
+        SELECT oma.outlet_id, mi.id, mi.name, mi.base_price, oma.is_available, mi.category
+        FROM menu_items mi
+        INNER JOIN outlet_menu_availability oma ON oma.menu_item_id = mi.id
+        WHERE oma.outlet_id = ANY(%s)
+          AND mi.id = ANY(%s)
+          AND mi.is_active = TRUE
+        """,
+        (outlet_ids, item_ids),
+    )
+    menu = {(row[0], row[1]): row[2:] for row in cur.fetchall()}
+    now_by_outlet = {}
+    for outlet_id in outlets:
+        schedule = get_outlet_schedule(outlet_id, cur=cur)
+        now_by_outlet[outlet_id] = (schedule, schedule.local_time())
+
+    valid = []
+    for entry in fresh:
+        error = _price(entry, outlets, menu, now_by_outlet)
+        if error is None:
+            valid.append(entry)
+        else:
+            result.rejected.append({"index": entry.index, "error": error})
+    if not valid:
+        return []
+
+    # ---------- Quote kitchen waits before claiming, so refused orders leave no key ----------
+    valid = _quote(cur, valid, result, now)
+    if not valid:
+        return []
+
+    # ---------- Claim idempotency keys ----------
+    keys = [entry.key for entry in valid if entry.key is not None]
+    cur.execute(
+        """
+        DELETE FROM order_idempotency_keys
+        WHERE idempotency_key = ANY(%s)
+          AND created_at < NOW() - make_interval(secs => %s)
+        """,
+        (keys, idempotency.IDEMPOTENCY_WINDOW_SECONDS),
+    )
+    claimed = {None}  # orders without a key go through unclaimed
+    for page in _pages([(key, now) for key in keys]):
+        rows = execute_values(
+            cur,
+            """
+            INSERT INTO order_idempotency_keys (idempotency_key, created_at)
+            VALUES %s
+            ON CONFLICT (idempotency_key) DO NOTHING
+            RETURNING idempotency_key
+            """,
+            page,
+            fetch=True,
+        )
+        claimed.update(row[0] for row in rows)
+    for entry in valid:
+        if entry.key not in claimed:
+            result.rejected.append({"index": entry.index, "error": "An identical order is already being processed."})
+    accepted = [entry for entry in valid if entry.key in claimed]
+    if len(accepted) == len(valid):
+        return valid
+    # Quote again without the orders that are already being processed (waits only get shorter)
+    return _quote(cur, accepted, result, now)
+
+
+def _quote(cur, entries: List[_Entry], result: BulkResult, now: datetime) -> List[_Entry]:
+    """
+    Quote kitchen waits with one locked read per outlet, in outlet id order
+    so concurrent bulk calls lock the same rows in the same order. Rejects
+    throttled orders; returns the rest with their ready_eta set.
+    """
+    by_outlet: Dict[int, List[_Entry]] = {}
+    for entry in entries:
+        by_outlet.setdefault(entry.payload.outlet_id, []).append(entry)
+    accepted = []
+    for outlet_id in sorted(by_outlet):
+        outlet_entries = by_outlet[outlet_id]
+        quotes = kitchen.quote_many(cur, outlet_id, [entry.prep_seconds for entry in outlet_entries], now)
+        for entry, (ready_eta, wait_seconds) in zip(outlet_entries, quotes):
+            if kitchen.is_throttled(wait_seconds):
+                result.rejected.append({
+                    "index": entry.index,
+                    "error": (
+                        f"{entry.outlet_name} (Outlet #{outlet_id}) is at kitchen capacity "
+                        f"(about {int(wait_seconds // 60)} min wait)."
+                    ),
+                })
+                continue
+            entry.ready_eta = ready_eta
+            accepted.append(entry)
+    accepted.sort(key=lambda entry: entry.index)
+    return accepted
+
+
+def _write(cur, entries: List[_Entry], result: BulkResult, now: datetime) -> List[Tuple[str, str]]:
+    """Insert the prepared orders and their lines; returns (key, confirmation) pairs to complete."""
+    order_ids: List[int] = []
+    order_rows = [
+        (
+            entry.payload.outlet_id, "PENDING", entry.fulfillment_type, entry.customer_name,
+            entry.customer_phone, entry.customer_address, now, now, entry.total,
+            entry.prep_seconds, entry.ready_eta,
+        )
+        for entry in entries
+    ]
+    for page in _pages(order_rows):
+        # RETURNING follows the VALUES order for a plain multi-row INSERT
+        rows = execute_values(
+            cur,
+            """
+            INSERT INTO orders (
+                outlet_id, status, fulfillment_type, customer_name, customer_phone,
+                customer_address, created_at, updated_at, total_amount, prep_seconds, ready_eta
+            )
+            VALUES %s
+            RETURNING id
+            """,
+            page,
+            fetch=True,
+        )
+        order_ids.extend(row[0] for row in rows)
+
+    item_rows = [
+        (order_id, now, line["menu_item_id"], line["quantity"], line["unit_price"], line["line_total"])
+        for order_id, entry in zip(order_ids, entries)
+        for line in entry.lines
+    ]
+    for page in _pages(item_rows):
+        execute_values(
+            cur,
+            """
+            INSERT INTO order_items (order_id, order_created_at, menu_item_id, quantity, unit_price, line_total)
+            VALUES %s
+            """,
+            page,
+        )
+
+    load: Dict[int, List[int]] = {}
+    for entry in entries:
+        totals = load.setdefault(entry.payload.outlet_id, [0, 0])
+        totals[0] += 1
+        totals[1] += entry.prep_seconds
+    for outlet_id, (orders, prep_seconds) in load.items():
+        kitchen.commit_quote(cur, outlet_id, prep_seconds, orders=orders)
+
+    completed = []
+    for order_id, entry in zip(order_ids, entries):
+        confirmation = order_confirmation(
+            order_id, entry.outlet_name, entry.customer_name, entry.fulfillment_type,
+            entry.lines, entry.total, entry.ready_eta, now,
+        )
+        completed.append((entry.key, confirmation))
+        result.created.append({
+            "index": entry.index,
+            "order_id": order_id,
+            "outlet_id": entry.payload.outlet_id,
+            "items": sum(line["quantity"] for line in entry.lines),
+            "total": round(entry.total, 2),
+            "ready_eta": entry.ready_eta,
+        })
+    execute_batch(
+        cur,
+        "UPDATE order_idempotency_keys SET order_id = %s, response = %s WHERE idempotency_key = %s",
+        [
+            (order_id, confirmation, key)
+            for order_id, (key, confirmation) in zip(order_ids, completed)
+            if key is not None
+        ],
+    )
+    return [(key, confirmation) for key, confirmation in completed if key is not None]
+
+
+def place_orders(
+    payloads: List[CreateOrderPayload],
+    session_id: Optional[str] = None,
+    all_or_nothing: bool = False,
+) -> BulkResult:
+    """
+    Create many orders in one pass per shard. Raises ValueError when the
+    batch exceeds BULK_MAX_ORDERS or BULK_MAX_LINES.
+    """
+    if len(payloads) > BULK_MAX_ORDERS:
+        raise ValueError(f"At most {BULK_MAX_ORDERS} orders per bulk call (got {len(payloads)}).")
+    lines = sum(len(payload.items) for payload in payloads)
+    if lines > BULK_MAX_LINES:
+        raise ValueError(f"At most {BULK_MAX_LINES} order lines per bulk call (got {lines}).")
+
+    result = BulkResult()
+    by_shard: Dict[Optional[str], List[_Entry]] = {}
+    for index, payload in enumerate(payloads):
+        entry = _Entry(index, payload, _bulk_key(payload, index, session_id))
+        previous = idempotency.recall(entry.key) if entry.key is not None else None
+        if previous is not None:
+            result.duplicates.append({"index": index, "response": previous})
+            continue
+        error = _check_fields(entry)
+        if error is None:
+            try:
+                by_shard.setdefault(shard_for_outlet(payload.outlet_id), []).append(entry)
+                continue
+            except LookupError as e:
+                error = str(e)
+        result.rejected.append({"index": index, "error": error})
+
+    # Validate and quote on every shard first, so all_or_nothing can still back out
+    now = datetime.now(timezone.utc)
+    prepared = []  # [cursor, orders to write] per shard
+    try:
+        for shard, entries in by_shard.items():
+            cur = get_connection(shard=shard).cursor()
+            prepared.append([cur, []])
+            prepared[-1][1] = _prepare(cur, entries, result, now)
+        if all_or_nothing and result.rejected:
+            for cur, entries in prepared:
+                cur.connection.rollback()
+                result.held_back.extend(entry.index for entry in entries)
+            result.held_back.sort()
+            result.rejected.sort(key=lambda problem: problem["index"])
+            return result
+
+        for cur, entries in prepared:
+            if not entries:
+                cur.connection.rollback()
+                continue
+            completed = _write(cur, entries, result, now)
+            cur.connection.commit()
+            note_write(cur.connection)
+            for key, confirmation in completed:
+                idempotency.remember(key, confirmation)
+    except Exception:
+        for cur, _ in prepared:
+            cur.connection.rollback()
+        raise
+    finally:
+        for cur, _ in prepared:
+            close_cursor(cur)
+
+    result.created.sort(key=lambda order: order["index"])
+    result.rejected.sort(key=lambda problem: problem["index"])
+    return result
+
+
+# ---------------------------------------------------------------------
+# Summary and tool
+# ---------------------------------------------------------------------
+
+def _id_ranges(ids: List[int]) -> str:
+    """'101-150, 170, 172-180' for sorted ids (shard ids step by SHARD_SLOTS, so ranges may be short)."""
+    parts = []
+    ids = sorted(ids)
+    start = prev = ids[0]
+    for order_id in ids[1:] + [None]:
+        if order_id is not None and order_id == prev + 1:
+            prev = order_id
+            continue
+        parts.append(str(start) if start == prev else f"{start}-{prev}")
+        if order_id is not None:
+            start = prev = order_id
+    return ", ".join(parts)
+
+
+def summarize(result: BulkResult) -> str:
+    """Compact text for the agent or API client: counts, totals, id ranges and the first problems."""
+    submitted = len(result.created) + len(result.rejected) + len(result.duplicates) + len(result.held_back)
+    lines = []
+    if result.created:
+        items = sum(order["items"] for order in result.created)
+        total = sum(order["total"] for order in result.created)
+        latest = max(order["ready_eta"] for order in result.created)
+        minutes = max(1, kitchen.eta_minutes(latest, datetime.now(timezone.utc)))
+        lines.append(
+            f"SUCCESS: Created {len(result.created)} of {submitted} orders "
+            f"({items:,} items, total ${total:,.2f})."
+        )
+        lines.append(f"Order IDs: {_id_ranges([order['order_id'] for order in result.created])}")
+        lines.append(f"Estimated ready: all within about {minutes} min")
+    elif result.duplicates and not result.rejected:
+        lines.append(f"SUCCESS: All {submitted} orders were already placed; nothing new was created.")
+    elif result.held_back:
+        lines.append(
+            f"ERROR: No orders created out of {submitted}: all_or_nothing was set and "
+            f"{len(result.rejected)} were rejected."
+        )
+    else:
+        lines.append(f"ERROR: No orders created out of {submitted}.")
+    if result.duplicates and (result.created or result.rejected):
+        lines.append(f"Already placed earlier (not created again): {len(result.duplicates)}")
+    if result.rejected:
+        lines.append(f"Rejected {len(result.rejected)}:")
+        for problem in result.rejected[:BULK_SUMMARY_PROBLEMS]:
+            lines.append(f"- order {problem['index'] + 1}: {problem['error']}")
+        if len(result.rejected) > BULK_SUMMARY_PROBLEMS:
+            lines.append(f"- ... and {len(result.rejected) - BULK_SUMMARY_PROBLEMS} more")
+    return "\n".join(lines)
+
+
+@function_tool
+def create_orders_bulk(wrapper: RunContextWrapper[Any], payload: BulkOrderPayload) -> str:
+    """
+    Create many orders at once (catering, group orders, very large carts).
+    Each entry of `orders` is a full order like create_order's payload.
+    Invalid orders are listed and the rest are created, unless
+    all_or_nothing is set. Resubmitting the same batch does not create it again.
+    """
+    session_id = getattr(wrapper.context, "conversation_id", None)
+    try:
+        result = place_orders(payload.orders, session_id, payload.all_or_nothing)
+    except ValueError as e:
+        return f"ERROR: {e}"
+    except Exception as e:
+        return f"ERROR: Error creating orders: {str(e)}"
+    return summarize(result)
+
+
+# ---------- Benchmark ----------
+
+BENCH_CUSTOMER = "bulk-benchmark"
+
+
+def _bench_payloads(orders: int, items: int, rng: random.Random) -> List[CreateOrderPayload]:
+    """Random pickup orders over items available all day at active outlets."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT oma.outlet_id, oma.menu_item_id
+            FROM outlet_menu_availability oma
+            INNER JOIN outlets o ON o.id = oma.outlet_id
+            INNER JOIN menu_items mi ON mi.id = oma.menu_item_id
+            WHERE o.is_active = TRUE AND mi.is_active = TRUE AND oma.is_available = TRUE
+              AND oma.available_from_time IS NULL AND oma.available_to_time IS NULL
+            """
+        )
+        menu: Dict[int, List[int]] = {}
+        for outlet_id, item_id in cur.fetchall():
+            menu.setdefault(outlet_id, []).append(item_id)
+    finally:
+        close_cursor(cur)
+
+    run = uuid.uuid4().hex[:8]
+    outlet_ids = sorted(menu)
+    payloads = []
+    for n in range(orders):
+        outlet_id = rng.choice(outlet_ids)
+        chosen = rng.sample(menu[outlet_id], min(items, len(menu[outlet_id])))
+        payloads.append(CreateOrderPayload(
+            outlet_id=outlet_id,
+            fulfillment_type="PICKUP",
+            customer_name=BENCH_CUSTOMER,
+            items=[{"menu_item_id": item_id, "quantity": rng.randint(1, 3)} for item_id in chosen],
+            idempotency_key=f"{BENCH_CUSTOMER}:{run}:{n}",
+        ))
+    return payloads
+
+
+def _cleanup() -> None:
+    """Take the benchmark's orders out of the kitchen totals, then delete them and their keys."""
+    from .connection import shard_names
+
+    for shard in shard_names():
+        conn = get_connection(shard=shard)
+        cur = conn.cursor()
+        try:
+            cur.execute("UPDATE orders SET status = 'CANCELLED' WHERE customer_name = %s", (BENCH_CUSTOMER,))
+            cur.execute("DELETE FROM orders WHERE customer_name = %s", (BENCH_CUSTOMER,))
+            cur.execute("DELETE FROM order_idempotency_keys WHERE idempotency_key LIKE %s", (BENCH_CUSTOMER + ":%",))
+            conn.commit()
+        finally:
+            close_cursor(cur)
+
+
+def _benchmark(orders: int, items: int, single: int) -> None:
+    """
+    One bulk call of `orders` orders vs `single` create_order calls (one
+    transaction and one lookup per line each), extrapolated per order.
+    """
+    from agents.tool_context import ToolContext
+
+    from .queries import create_order
+
+    rng = random.Random(7)
+    try:
+        payloads = _bench_payloads(orders, items, rng)
+        started = time.perf_counter()
+        result = place_orders(payloads)
+        bulk_seconds = time.perf_counter() - started
+        print(summarize(result).splitlines()[0])
+        print(f"bulk:         {bulk_seconds * 1000:9.1f} ms for {orders} orders ({bulk_seconds / orders * 1e6:8.0f} us/order)")
+
+        started = time.perf_counter()
+        result = place_orders(payloads)
+        replay_seconds = time.perf_counter() - started
+        print(f"bulk replay:  {replay_seconds * 1000:9.1f} ms ({len(result.duplicates)} duplicates, {len(result.created)} created)")
+
+        async def one_by_one() -> None:
+            for n, payload in enumerate(_bench_payloads(single, items, rng)):
+                arguments = json.dumps({"payload": payload.model_dump()})
+                context = ToolContext(context=None, tool_name="create_order", tool_call_id=f"bench-{n}", tool_arguments=arguments)
+                answer = await create_order.on_invoke_tool(context, arguments)
+                if not answer.startswith("SUCCESS"):
+                    raise RuntimeError(answer)
+
+        import asyncio
+
+        started = time.perf_counter()
+        asyncio.run(one_by_one())
+        single_seconds = (time.perf_counter() - started) / single
+        print(f"create_order: {single_seconds * orders * 1000:9.1f} ms for {orders} orders ({single_seconds * 1e6:8.0f} us/order, from {single} calls)")
+        print(f"speedup: {single_seconds * orders / bulk_seconds:.1f}x")
+    finally:
+        _cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bulk order creation against create_order.")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=5, help="lines per order")
+    parser.add_argument("--single", type=int, default=200, help="create_order calls to time")
+    args = parser.parse_args()
+    if args.benchmark:
+        _benchmark(args.orders, args.items, args.single)
+    else:
+        parser.print_help()
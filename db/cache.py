@@ -0,0 +1,364 @@
+"""
+Shared cache tier for catalog reads (outlets and menus).
+
+One cache is shared by the Streamlit UI and the agent tools, and across
+processes on the host. The default backend is a SQLite file in WAL mode.
+Set SHARED_CACHE_URL to choose another backend:
+
+- "redis://host:6379/0": a Redis server shared across hosts (needs `redis`);
+- "memory": a per-process dict, useful for a single worker or local runs.
+
+Keys carry the catalog version (see catalog.py), so any write to outlets,
+menu_items or outlet_menu_availability moves readers to fresh keys. Entries
+are fresh for SHARED_CACHE_TTL seconds. For SHARED_CACHE_STALE_TTL seconds
+after that they are still served, while one background refresh per key
+reloads them (stale-while-revalidate).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .catalog import get_catalog_version
+from .connection import close_cursor, get_connection
+
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "")
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "shared_cache.sqlite")
+SHARED_CACHE_TTL = float(os.getenv("SHARED_CACHE_TTL", "300"))
+SHARED_CACHE_STALE_TTL = float(os.getenv("SHARED_CACHE_STALE_TTL", "600"))
+
+
+# ---------- Backends ----------
+
+class MemoryBackend:
+    """Per-process dict backend."""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[float, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[float, bytes]]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: str, stored_at: float, value: bytes, expire_seconds: float) -> None:
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+
+    def delete_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def purge(self, older_than: float) -> None:
+        with self._lock:
+            for key in [k for k, (stored_at, _) in self._entries.items() if stored_at < older_than]:
+                del self._entries[key]
+
+
+class SQLiteBackend:
+    """File-backed backend shared by every process on the host."""
+
+    def __init__(self, path: str = SHARED_CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                stored_at REAL NOT NULL,
+                value BLOB NOT NULL
+            )
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[float, bytes]]:
+        row = self._conn().execute("SELECT stored_at, value FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key: str, stored_at: float, value: bytes, expire_seconds: float) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache_entries (key, stored_at, value) VALUES (?, ?, ?)",
+            (key, stored_at, value),
+        )
+
+    def delete_prefix(self, prefix: str) -> None:
+        self._conn().execute("DELETE FROM cache_entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def purge(self, older_than: float) -> None:
+        self._conn().execute("DELETE FROM cache_entries WHERE stored_at < ?", (older_than,))
+
+
+class RedisBackend:
+    """Remote backend; entries expire server-side once past their stale window."""
+
+    def __init__(self, url: str):
+        import redis  # optional dependency, only needed for this backend
+
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Tuple[float, bytes]]:
+        raw = self._client.get(key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key: str, stored_at: float, value: bytes, expire_seconds: float) -> None:
+        self._client.set(key, pickle.dumps((stored_at, value)), ex=max(1, int(expire_seconds)))
+
+    def delete_prefix(self, prefix: str) -> None:
+        keys = list(self._client.scan_iter(match=prefix + "*"))
+        if keys:
+            self._client.delete(*keys)
+
+    def purge(self, older_than: float) -> None:
+        pass  # Redis expires keys itself
+
+
+def _make_backend(url: str = SHARED_CACHE_URL):
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBackend(url)
+    if url == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(url or SHARED_CACHE_PATH)
+
+
+# ---------- Cache ----------
+
+class SharedCache:
+    """
+    Versioned get-or-load over a backend, with stale-while-revalidate and
+    per-namespace hit/miss/refresh counters. Backend failures fall through
+    to the loader, so the cache never breaks a read.
+    """
+
+    def __init__(self, backend=None, ttl: float = SHARED_CACHE_TTL, stale_ttl: float = SHARED_CACHE_STALE_TTL):
+        self._backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._last_purge = 0.0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = _make_backend()
+        return self._backend
+
+    def _count(self, namespace: str, field: str, n: int = 1) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(
+                namespace,
+                {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0},
+            )
+            counters[field] += n
+
+    def _key(self, namespace: str, key: Iterable[Any]) -> str:
+        parts = ":".join(str(part) for part in key)
+        return f"{namespace}:v{get_catalog_version()}:{parts}"
+
+    def _read(self, namespace: str, full_key: str) -> Optional[Tuple[float, Any]]:
+        try:
+            entry = self.backend.get(full_key)
+            return (entry[0], pickle.loads(entry[1])) if entry is not None else None
+        except Exception:
+            self._count(namespace, "errors")
+            return None
+
+    def _write(self, namespace: str, full_key: str, value: Any) -> None:
+        now = time.time()
+        try:
+            self.backend.set(full_key, now, pickle.dumps(value), self.ttl + self.stale_ttl)
+            if now - self._last_purge > self.ttl + self.stale_ttl:
+                self._last_purge = now
+                self.backend.purge(now - self.ttl - self.stale_ttl)
+        except Exception:
+            self._count(namespace, "errors")
+
+    def _refresh_in_background(self, namespace: str, full_key: str, loader: Callable[[], Any]) -> None:
+        with self._lock:
+            if full_key in self._refreshing:
+                return
+            self._refreshing.add(full_key)
+
+        def refresh():
+            try:
+                self._write(namespace, full_key, loader())
+                self._count(namespace, "refreshes")
+            except Exception:
+                self._count(namespace, "errors")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(full_key)
+
+        threading.Thread(target=refresh, name=f"cache-refresh-{namespace}", daemon=True).start()
+
+    def _classify(self, namespace: str, full_key: str, entry, loader: Callable[[], Any]) -> bool:
+        """True if `entry` can be served; starts a refresh when it is stale."""
+        if entry is None:
+            return False
+        age = time.time() - entry[0]
+        if age < self.ttl:
+            self._count(namespace, "hits")
+            return True
+        if age < self.ttl + self.stale_ttl:
+            self._count(namespace, "stale_hits")
+            self._refresh_in_background(namespace, full_key, loader)
+            return True
+        return False
+
+    def get_or_load(self, namespace: str, key: Iterable[Any], loader: Callable[[], Any]) -> Any:
+        """Cached value for (namespace, key), calling `loader()` on a miss."""
+        full_key = self._key(namespace, key)
+        entry = self._read(namespace, full_key)
+        if self._classify(namespace, full_key, entry, loader):
+            return entry[1]
+
+        self._count(namespace, "misses")
+        value = loader()
+        self._write(namespace, full_key, value)
+        return value
+
+    def get_or_load_many(
+        self,
+        namespace: str,
+        ids: List[Any],
+        load_missing: Callable[[List[Any]], Dict[Any, Any]],
+    ) -> Dict[Any, Any]:
+        """
+        Batch form keyed by single ids: cached ids are served, the rest are
+        loaded with one `load_missing(ids)` call. Ids missing from its result
+        are cached as None.
+        """
+        found: Dict[Any, Any] = {}
+        missing = []
+        for id_ in ids:
+            full_key = self._key(namespace, (id_,))
+            entry = self._read(namespace, full_key)
+            loader = lambda id_=id_: load_missing([id_]).get(id_)
+            if self._classify(namespace, full_key, entry, loader):
+                found[id_] = entry[1]
+            else:
+                missing.append(id_)
+
+        if missing:
+            self._count(namespace, "misses", len(missing))
+            loaded = load_missing(missing)
+            for id_ in missing:
+                found[id_] = loaded.get(id_)
+                self._write(namespace, self._key(namespace, (id_,)), found[id_])
+        return found
+
+    def invalidate(self, namespace: Optional[str] = None) -> None:
+        """Drop every entry, or every entry of one namespace."""
+        try:
+            self.backend.delete_prefix(f"{namespace}:" if namespace else "")
+        except Exception:
+            self._count(namespace or "*", "errors")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            stats = {namespace: dict(counters) for namespace, counters in self._stats.items()}
+        for counters in stats.values():
+            lookups = counters["hits"] + counters["stale_hits"] + counters["misses"]
+            counters["hit_rate"] = (counters["hits"] + counters["stale_hits"]) / (lookups or 1)
+        return stats
+
+
+shared_cache = SharedCache()
+
+
+def shared_cache_stats() -> Dict[str, Dict[str, float]]:
+    return shared_cache.stats()
+
+
+# ---------- Catalog loaders ----------
+
+def _load_active_outlets() -> List[tuple]:
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT id, name, city, state
+            FROM outlets
+            WHERE is_active = TRUE
+            ORDER BY city, name
+        """)
+        return cur.fetchall()
+    finally:
+        close_cursor(cur)
+
+
+def _load_outlet_menus(outlet_ids: List[int]) -> Dict[int, Tuple[str, List[tuple]]]:
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT id, name FROM outlets WHERE id = ANY(%s) AND is_active = TRUE",
+            (list(outlet_ids),),
+        )
+        menus: Dict[int, Tuple[str, List[tuple]]] = {row[0]: (row[1], []) for row in cur.fetchall()}
+        if not menus:
+            return {}
+
+        cur.execute(
+            """
+            SELECT
+                oma.outlet_id,
+                mi.id,
+                mi.name,
+                mi.description,
+                mi.category,
+                mi.base_price,
+                mi.is_veg,
+                mi.is_spicy,
+                oma.is_available,
+                oma.available_from_time,
+                oma.available_to_time,
+                oma.available_days
+            FROM menu_items mi
+            INNER JOIN outlet_menu_availability oma ON oma.menu_item_id = mi.id
+            WHERE oma.outlet_id = ANY(%s)
+              AND mi.is_active = TRUE
+            ORDER BY oma.outlet_id, mi.category, mi.name
+            """,
+            (list(menus),),
+        )
+        for row in cur.fetchall():
+            menus[row[0]][1].append(row[1:])
+        return menus
+    finally:
+        close_cursor(cur)
+
+
+def active_outlets() -> List[tuple]:
+    """(id, name, city, state) of every active outlet, ordered by city and name."""
+    return shared_cache.get_or_load("outlets", ("active",), _load_active_outlets)
+
+
+def outlet_menus(outlet_ids: List[int]) -> Dict[int, Optional[Tuple[str, List[tuple]]]]:
+    """
+    outlet id -> (outlet name, menu rows) for each id, or None for unknown or
+    inactive outlets. Rows are in get_outlet_menu's column order, without
+    the outlet id.
+    """
+    return shared_cache.get_or_load_many("outlet_menu", list(outlet_ids), _load_outlet_menus)
+
+
+def outlet_menu(outlet_id: int) -> Optional[Tuple[str, List[tuple]]]:
+    """(outlet name, menu rows) for one outlet, or None if unknown or inactive."""
+    return outlet_menus([outlet_id])[outlet_id]
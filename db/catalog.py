@@ -0,0 +1,78 @@
+"""
+Catalog version tracking.
+
+Any write to outlets, menu_items or outlet_menu_availability bumps the single
+row in `catalog_version` (statement-level triggers, see schema). Caches tag
+their entries with this number so they are invalidated when catalog data
+changes, without each lookup paying a query: the value is re-read at most
+every CATALOG_VERSION_TTL seconds. `bump_catalog_version` also clears the
+shared cache tier (cache.py) right away.
+"""
+
+import os
+import threading
+import time
+
+from .connection import close_cursor, get_connection
+
+CATALOG_VERSION_TTL = float(os.getenv("CATALOG_VERSION_TTL", "5"))
+
+_lock = threading.Lock()
+_cached_version = None
+_checked_at = 0.0
+
+
+def get_catalog_version(max_age: float = CATALOG_VERSION_TTL) -> int:
+    """
+    Return the current catalog version, re-reading it when older than `max_age`.
+    Falls back to the last known value (or 0) if the database is unreachable.
+    """
+    global _cached_version, _checked_at
+    now = time.monotonic()
+    with _lock:
+        if _cached_version is not None and now - _checked_at < max_age:
+            return _cached_version
+
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT version FROM catalog_version WHERE id = 1")
+            row = cur.fetchone()
+            version = int(row[0]) if row else 0
+        finally:
+            close_cursor(cur)
+    except Exception:
+        return _cached_version or 0
+
+    with _lock:
+        _cached_version = version
+        _checked_at = now
+    return version
+
+
+def bump_catalog_version(cur=None) -> None:
+    """
+    Bump the version explicitly (e.g. after a bulk load with triggers disabled)
+    and drop the local copy so the next read sees it.
+    """
+    global _cached_version
+    sql = "UPDATE catalog_version SET version = version + 1, updated_at = NOW() WHERE id = 1"
+    if cur is not None:
+        cur.execute(sql)
+    else:
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(sql)
+            conn.commit()
+        finally:
+            close_cursor(cur)
+    with _lock:
+        _cached_version = None
+
+    # Other processes may hold the old version for up to CATALOG_VERSION_TTL;
+    # clearing the shared tier stops them serving old entries meanwhile.
+    from .cache import shared_cache
+
+    shared_cache.invalidate()
@@ -1,17 +1,448 @@
-import psycopg2
+"""
+Database connections with primary / replica roles.
+
+Writes and read-modify-write flows use the primary (the default role).
+Read-only tools ask for `role="replica"`. That picks a healthy replica from
+DB_REPLICA_HOSTS ("host:port,host:port", same database and credentials) in
+round-robin order, or the primary when none are configured or healthy.
+
+A background health check polls each replica's replay position every
+DB_REPLICA_CHECK_INTERVAL seconds. Replicas more than
+DB_REPLICA_MAX_LAG_SECONDS behind, or unreachable, are ejected until a later
+check passes.
+
+Read-your-writes is kept per session. After a commit, `note_write(conn)`
+records the primary's WAL position for the current session (set with
+`use_session`). That session's replica reads then go only to replicas that
+have replayed past that position, otherwise to the primary.
+
+Orders can be sharded by region. DB_SHARDS lists the shards
+("west=host:port,central=host:port,east=host:port"); each holds the full
+schema with the catalog tables (outlets, menu, availability) loaded on every
+shard. An outlet's orders, kitchen load and sales live on the shard named by
+`outlets.region` (DB_SHARD_OUTLETS overrides single outlets, "12=east").
+Order ids encode their shard: each shard's sequence hands out
+n * SHARD_SLOTS + shard number (see shards.py), so an order id alone routes
+a lookup. Work spanning all shards goes through `fan_out`.
+
+DB_BACKEND=sqlite swaps all of this for one embedded SQLite file (see
+sqlite_backend.py): same schema and tools, no replicas or shards.
+
+Connections are pooled per server. `conn.close()` rolls back any open
+transaction and returns the connection to its pool, so callers keep the
+usual connect / close pattern. Pooled connections carry a `prepared` set
+for the statement registry (statements.py). Set DB_POOL_SIZE=0 to disable
+pooling.
+"""
+import contextvars
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 import os
-from typing import Optional
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
 
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres").lower()  # postgres | sqlite
+DB_REPLICA_HOSTS = os.getenv("DB_REPLICA_HOSTS", "")
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "10"))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+DB_SESSION_PIN_SECONDS = float(os.getenv("DB_SESSION_PIN_SECONDS", "300"))  # forget pins after this long
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))  # idle connections kept per server
+DB_SHARDS = os.getenv("DB_SHARDS", "")
+DB_SHARD_OUTLETS = os.getenv("DB_SHARD_OUTLETS", "")
+SHARD_SLOTS = 16  # order ids: n * SHARD_SLOTS + shard number (1-based)
 
-def get_connection():
-    """
-    Get a database connection using environment variables or defaults.
-    """
-    return psycopg2.connect(
+# Session of the turn being served; tools run in worker threads that inherit it
+current_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("db_session", default=None)
+
+
+_pools: Dict[Tuple[str, str], "queue.LifoQueue"] = {}
+_pools_lock = threading.Lock()
+_pooled_connection_class = None
+
+
+def _pooled_class():
+    """psycopg2 connection subclass whose close() returns it to its pool (built on first use)."""
+    global _pooled_connection_class
+    if _pooled_connection_class is None:
+        import psycopg2.extensions as ext
+
+        class PooledConnection(ext.connection):
+            def close(self):
+                pool = getattr(self, "pool", None)
+                if pool is None or self.closed:
+                    return super().close()
+                try:
+                    if self.get_transaction_status() != ext.TRANSACTION_STATUS_IDLE:
+                        self.rollback()
+                    pool.put_nowait(self)
+                except Exception:  # broken connection or full pool
+                    super().close()
+
+        _pooled_connection_class = PooledConnection
+    return _pooled_connection_class
+
+
+def _connect(host: str, port: str):
+    import psycopg2  # deferred: keeps cold start free of the driver until first query
+
+    if DB_POOL_SIZE <= 0:
+        return psycopg2.connect(
+            dbname=os.getenv("DB_NAME", "restaurant_db"),
+            user=os.getenv("DB_USER", "postgres"),
+            password=os.getenv("DB_PASSWORD", "user@123"),
+            host=host,
+            port=port,
+        )
+
+    with _pools_lock:
+        pool = _pools.setdefault((host, port), queue.LifoQueue(maxsize=DB_POOL_SIZE))
+    while True:
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            break
+        if not conn.closed:
+            return conn
+
+    conn = psycopg2.connect(
         dbname=os.getenv("DB_NAME", "restaurant_db"),
         user=os.getenv("DB_USER", "postgres"),
         password=os.getenv("DB_PASSWORD", "user@123"),
-        host=os.getenv("DB_HOST", "localhost"),
-        port=os.getenv("DB_PORT", "5434"),
+        host=host,
+        port=port,
+        connection_factory=_pooled_class(),
     )
+    conn.pool = pool
+    conn.prepared = set()  # statement names PREPAREd on this session
+    return conn
+
+
+def _parse_lsn(lsn: Optional[str]) -> int:
+    """'16/B374D848' -> comparable int."""
+    if not lsn:
+        return 0
+    high, _, low = lsn.partition("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+class _Replica:
+    __slots__ = ("host", "port", "healthy", "replay_lsn", "lag_seconds", "checked_at", "error")
+
+    def __init__(self, host: str, port: str):
+        self.host = host
+        self.port = port
+        self.healthy = False  # admitted by the first health check
+        self.replay_lsn = 0
+        self.lag_seconds = 0.0
+        self.checked_at = 0.0
+        self.error: Optional[str] = None
+
+
+class ReplicaSet:
+    """Health-checked replicas plus per-session read-your-writes positions."""
+
+    def __init__(self, hosts: str = DB_REPLICA_HOSTS):
+        self.replicas: List[_Replica] = []
+        for entry in filter(None, (h.strip() for h in hosts.split(","))):
+            host, _, port = entry.partition(":")
+            self.replicas.append(_Replica(host, port or os.getenv("DB_PORT", "5434")))
+        self._cycle = itertools.count()
+        self._lock = threading.Lock()
+        self._session_lsn: Dict[str, Tuple[int, float]] = {}  # session -> (primary lsn, noted at)
+        self._checker: Optional[threading.Thread] = None
+        self._stats = {"primary_reads": 0, "replica_reads": 0, "pinned_reads": 0, "ejections": 0}
+
+    # ---------- Health ----------
+
+    def check(self, replica: _Replica) -> None:
+        """Refresh one replica's position and lag; eject or readmit it."""
+        try:
+            conn = _connect(replica.host, replica.port)
+            try:
+                cur = conn.cursor()
+                cur.execute(
+                    """
+                    SELECT
+                        pg_last_wal_replay_lsn()::text,
+                        CASE
+                            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                            ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+                        END
+                    """
+                )
+                lsn, lag = cur.fetchone()
+                cur.close()
+            finally:
+                conn.close()
+            replica.replay_lsn = _parse_lsn(lsn)
+            replica.lag_seconds = float(lag or 0)
+            replica.error = None
+            healthy = replica.lag_seconds <= DB_REPLICA_MAX_LAG_SECONDS
+        except Exception as e:
+            replica.error = str(e)
+            healthy = False
+        replica.checked_at = time.time()
+        self._set_health(replica, healthy)
+
+    def _set_health(self, replica: _Replica, healthy: bool) -> None:
+        with self._lock:
+            if replica.healthy and not healthy:
+                self._stats["ejections"] += 1
+            replica.healthy = healthy
+
+    def _check_loop(self) -> None:
+        while True:
+            for replica in self.replicas:
+                self.check(replica)
+            self._forget_old_pins()
+            time.sleep(DB_REPLICA_CHECK_INTERVAL)
+
+    def start(self) -> None:
+        """Start the background health check once (no-op without replicas)."""
+        if not self.replicas:
+            return
+        with self._lock:
+            if self._checker is not None:
+                return
+            self._checker = threading.Thread(target=self._check_loop, name="replica-health", daemon=True)
+            self._checker.start()
+
+    # ---------- Read-your-writes ----------
+
+    def note_write(self, session: Optional[str], lsn: int) -> None:
+        if session:
+            with self._lock:
+                self._session_lsn[session] = (lsn, time.time())
+
+    def _forget_old_pins(self) -> None:
+        cutoff = time.time() - DB_SESSION_PIN_SECONDS
+        with self._lock:
+            for session in [s for s, (_, at) in self._session_lsn.items() if at < cutoff]:
+                del self._session_lsn[session]
+
+    def required_lsn(self, session: Optional[str]) -> int:
+        """Primary position `session`'s reads must have caught up with (0 = not pinned)."""
+        if not session:
+            return 0
+        with self._lock:
+            return self._session_lsn.get(session, (0, 0.0))[0]
+
+    # ---------- Selection ----------
+
+    def pick(self, session: Optional[str]) -> Optional[_Replica]:
+        """A healthy replica that has caught up with `session`'s writes, or None for the primary."""
+        with self._lock:
+            required = self._session_lsn.get(session, (0, 0.0))[0] if session else 0
+            candidates = [r for r in self.replicas if r.healthy]
+            caught_up = [r for r in candidates if r.replay_lsn >= required]
+            if not caught_up:
+                self._stats["pinned_reads" if candidates else "primary_reads"] += 1
+                return None
+            self._stats["replica_reads"] += 1
+            return caught_up[next(self._cycle) % len(caught_up)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["replicas"] = [
+            {
+                "host": f"{r.host}:{r.port}",
+                "healthy": r.healthy,
+                "lag_seconds": r.lag_seconds,
+                "error": r.error,
+            }
+            for r in self.replicas
+        ]
+        return stats
+
+
+replicas = ReplicaSet()
+
+
+class ShardMap:
+    """Region shards, outlet -> shard routing and the shard encoded in order ids."""
+
+    def __init__(self, shards: str = DB_SHARDS, outlet_overrides: str = DB_SHARD_OUTLETS):
+        self.servers: Dict[str, Tuple[str, str]] = {}
+        for entry in filter(None, (s.strip() for s in shards.split(","))):
+            name, _, address = entry.partition("=")
+            host, _, port = address.partition(":")
+            self.servers[name.strip().lower()] = (host, port or os.getenv("DB_PORT", "5434"))
+        if len(self.servers) >= SHARD_SLOTS:
+            raise ValueError(f"At most {SHARD_SLOTS - 1} shards are supported")
+        self.names = list(self.servers)
+        self._outlets: Dict[int, str] = {}
+        for entry in filter(None, (o.strip() for o in outlet_overrides.split(","))):
+            outlet_id, _, name = entry.partition("=")
+            self._outlets[int(outlet_id)] = name.strip().lower()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.servers)
+
+    def number(self, shard: str) -> int:
+        """1-based shard number encoded in that shard's order ids."""
+        return self.names.index(shard) + 1
+
+    def for_order(self, order_id: int) -> Optional[str]:
+        if not self.enabled:
+            return None
+        number = int(order_id) % SHARD_SLOTS
+        if not 1 <= number <= len(self.names):
+            raise LookupError(f"Order #{order_id} does not belong to any configured shard")
+        return self.names[number - 1]
+
+    def for_region(self, region: Optional[str]) -> Optional[str]:
+        if not self.enabled:
+            return None
+        shard = (region or "").strip().lower()
+        if shard not in self.servers:
+            raise LookupError(f"No shard configured for region {region!r}")
+        return shard
+
+    def for_outlet(self, outlet_id: int) -> Optional[str]:
+        """Shard owning an outlet's orders: an override, else its region (looked up once)."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            shard = self._outlets.get(outlet_id)
+        if shard is not None:
+            return shard
+
+        conn = _connect(*self.servers[self.names[0]])  # the catalog is the same on every shard
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT region FROM outlets WHERE id = %s", (outlet_id,))
+            row = cur.fetchone()
+        finally:
+            cur.close()
+            conn.close()
+        if row is None:
+            return self.names[0]  # unknown outlet: the caller reports "not found" from there
+        shard = self.for_region(row[0])
+        with self._lock:
+            self._outlets[outlet_id] = shard
+        return shard
+
+
+shards = ShardMap()
+
+T = TypeVar("T")
+
+
+def get_connection(role: str = "primary", shard: Optional[str] = None):
+    """
+    Get a database connection using environment variables or defaults.
+    `role="replica"` is for read-only work and may return a replica connection.
+    `shard` (see `shard_for_outlet` / `shard_for_order`) picks that shard's
+    server; shards have no replicas, so both roles use it.
+    """
+    if DB_BACKEND == "sqlite":
+        from .sqlite_backend import connect
+
+        return connect(role)
+
+    if shard is not None:
+        return _connect(*shards.servers[shard])
+
+    if role == "replica" and replicas.replicas:
+        replicas.start()
+        replica = replicas.pick(current_session.get())
+        if replica is not None:
+            try:
+                return _connect(replica.host, replica.port)
+            except Exception:
+                replicas._set_health(replica, False)
+
+    return _connect(os.getenv("DB_HOST", "localhost"), os.getenv("DB_PORT", "5434"))
+
+
+def close_cursor(cur) -> None:
+    """Close cursor and connection."""
+    conn = cur.connection
+    cur.close()
+    conn.close()
+
+
+def execute_values(cur, sql: str, rows: List[tuple], fetch: bool = False):
+    """
+    Insert `rows` through the single `VALUES %s` of `sql` in one statement,
+    on either backend; with `fetch`, returns the RETURNING rows.
+    """
+    if hasattr(cur, "execute_values"):
+        return cur.execute_values(sql, rows, fetch=fetch)
+    from psycopg2.extras import execute_values as pg_execute_values
+
+    return pg_execute_values(cur, sql, rows, page_size=max(len(rows), 1), fetch=fetch)
+
+
+def execute_batch(cur, sql: str, rows: List[tuple]) -> None:
+    """Run `sql` once per row of `rows` in as few round trips as the backend allows."""
+    if hasattr(cur, "execute_values"):  # SQLite: executemany runs in-process
+        cur.executemany(sql, rows)
+        return
+    from psycopg2.extras import execute_batch as pg_execute_batch
+
+    pg_execute_batch(cur, sql, rows, page_size=max(len(rows), 1))
+
+
+def shard_for_outlet(outlet_id: int) -> Optional[str]:
+    """Shard holding an outlet's orders (None when sharding is off)."""
+    return shards.for_outlet(outlet_id)
+
+
+def shard_for_order(order_id: int) -> Optional[str]:
+    """Shard encoded in an order id (None when sharding is off)."""
+    return shards.for_order(order_id)
+
+
+def shard_names() -> List[Optional[str]]:
+    """Every shard, or [None] (the single database) when sharding is off."""
+    return list(shards.names) or [None]
+
+
+def fan_out(work: Callable[[Optional[str]], T]) -> List[T]:
+    """
+    Run `work(shard)` for every shard concurrently and return the results in
+    shard order. Each call runs in a copy of the caller's context.
+    """
+    names = shard_names()
+    if len(names) == 1:
+        return [work(names[0])]
+    with ThreadPoolExecutor(max_workers=len(names), thread_name_prefix="shard") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, work, name) for name in names]
+        return [future.result() for future in futures]
+
+
+def use_session(session_id: Optional[str]) -> None:
+    """Tag the current task (and the tool threads it starts) with a session for read-your-writes."""
+    current_session.set(session_id)
+
+
+def note_write(conn) -> None:
+    """
+    Call after committing on a primary connection: the current session reads
+    from the primary until replicas replay past this point.
+    """
+    # Sharded writes go to shards, which have no replicas to wait for
+    if not replicas.replicas or shards.enabled or current_session.get() is None:
+        return
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_current_wal_lsn()::text")
+        replicas.note_write(current_session.get(), _parse_lsn(cur.fetchone()[0]))
+    finally:
+        cur.close()
+
+
+def read_position() -> int:
+    """Position the current session's reads must see: 0 unless it was pinned by a recent write."""
+    return replicas.required_lsn(current_session.get())
+
 
+def replica_stats() -> dict:
+    """Read routing counters and per-replica health."""
+    return replicas.stats()
@@ -0,0 +1,364 @@
+"""
+Customer history tools: orders by phone number and reorder.
+
+Phones are matched on digits only. `orders.customer_phone_digits` is a stored
+generated column with the same normalization, indexed together with the
+order's (created_at, id) so history pages are keyset-paginated index range
+scans, newest first. Ids are allocated per shard, so only creation time
+orders a customer's history across shards; the page cursor is the last
+order's id and its created_at is looked up on that order's shard. A page's
+item summaries come from one more query over its order ids, so the same SQL
+runs on Postgres and SQLite.
+
+`reorder` returns the cart only: contact details are never read back out of
+a stored order, the customer gives them again when placing it.
+
+Run with: python -m db.customer_history --benchmark
+          (history pages and reorder on a synthetic order history in a scratch
+          schema; --orders 10000000 for the full run, Postgres only)
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from typing import List, Optional
+
+from agents import function_tool
+
+from .connection import DB_BACKEND, close_cursor, fan_out, get_connection, shard_for_order
+from .partitions import load_bench_history, recent_first, use_bench_schema
+from .single_flight import coalesced
+
+OPEN_STATUSES = ("PENDING", "CONFIRMED", "IN_KITCHEN", "READY")
+MAX_HISTORY_PAGE = 20
+
+
+def normalize_phone(phone: str) -> str:
+    """Digits only; must match the `customer_phone_digits` column expression."""
+    return re.sub(r"[^0-9]", "", phone or "")
+
+
+def _created_at(order_id: int):
+    """Creation time of `order_id` (the other half of the page cursor), or None if there is no such order."""
+    try:
+        shard = shard_for_order(order_id)
+    except LookupError:
+        return None
+
+    conn = get_connection(role="replica", shard=shard)
+    cur = conn.cursor()
+    try:
+        def fetch(created_after):
+            cur.execute(
+                "SELECT created_at FROM orders WHERE id = %s AND created_at >= %s",
+                (order_id, created_after),
+            )
+            row = cur.fetchone()
+            return row[0] if row else None
+
+        return recent_first(fetch)
+    finally:
+        close_cursor(cur)
+
+
+@function_tool
+@coalesced("get_orders_by_phone")
+def get_orders_by_phone(
+    phone: str,
+    limit: int = 5,
+    status: str = "",
+    before_order_id: Optional[int] = None,
+) -> str:
+    """
+    List a customer's orders by phone number, newest first.
+    status: "" for all, "OPEN" for orders not yet completed/cancelled, or an exact status.
+    To get the next page, pass the before_order_id given at the end of the previous page.
+    """
+    digits = normalize_phone(phone)
+    if not digits:
+        return "Please provide a phone number to look up orders."
+
+    limit = max(1, min(int(limit or 5), MAX_HISTORY_PAGE))
+
+    conditions = ["o.customer_phone_digits = %s"]
+    params = [digits]
+
+    status = (status or "").strip().upper()
+    if status == "OPEN":
+        conditions.append("o.status = ANY(%s)")
+        params.append(list(OPEN_STATUSES))
+    elif status:
+        conditions.append("o.status = %s")
+        params.append(status)
+
+    if before_order_id is not None:
+        before = _created_at(before_order_id)
+        if before is None:
+            return "No more orders found for this phone number."
+        conditions.append("(o.created_at, o.id) < (%s, %s)")
+        params += [before, before_order_id]
+
+    # Fetch one extra row to know whether another page exists
+    params.append(limit + 1)
+
+    sql = """
+        SELECT
+            o.id,
+            o.status,
+            o.fulfillment_type,
+            o.total_amount,
+            o.created_at,
+            out.name AS outlet_name
+        FROM orders o
+        INNER JOIN outlets out ON out.id = o.outlet_id
+        WHERE """ + " AND ".join(conditions) + """
+        ORDER BY o.created_at DESC, o.id DESC
+        LIMIT %s
+    """
+
+    def fetch_page(shard):
+        conn = get_connection(role="replica", shard=shard)
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            if not rows:
+                return []
+
+            # Item summaries for the whole page; created_at keeps the lookups in their partitions
+            cur.execute(
+                """
+                SELECT oi.order_id, oi.quantity, mi.name
+                FROM order_items oi
+                INNER JOIN menu_items mi ON mi.id = oi.menu_item_id
+                WHERE oi.order_id = ANY(%s)
+                  AND oi.order_created_at = ANY(%s)
+                ORDER BY oi.order_id, oi.id
+                """,
+                ([row[0] for row in rows], sorted({row[4] for row in rows})),
+            )
+            summaries: dict = {}
+            for order_id, quantity, item_name in cur.fetchall():
+                summaries.setdefault(order_id, []).append(f"{quantity}x {item_name}")
+            return [row + (", ".join(summaries.get(row[0], [])),) for row in rows]
+        finally:
+            close_cursor(cur)
+
+    # A customer can have orders in every region: each shard returns its own
+    # first page and the merged pages are cut back to one, in the same
+    # (created_at, id) order (ids are unique across shards, so the cursor stays exact)
+    rows = sorted(
+        (row for page in fan_out(fetch_page) for row in page), key=lambda row: (row[4], row[0]), reverse=True
+    )
+    rows = rows[: limit + 1]
+
+    if not rows:
+        if before_order_id is not None:
+            return "No more orders found for this phone number."
+        return "No orders found for this phone number."
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    lines = [f"Orders for phone ending {digits[-4:]}:"]
+    for order_id, order_status, fulfillment_type, total_amount, created_at, outlet_name, summary in rows:
+        lines.append(
+            f"- Order #{order_id} | {order_status} | {fulfillment_type} | {outlet_name} | "
+            f"{created_at.strftime('%Y-%m-%d %H:%M')} | ${total_amount:.2f} | {summary or 'No items'}"
+        )
+
+    if has_more:
+        lines.append(f"\nMore orders available: call again with before_order_id={rows[-1][0]}")
+
+    return "\n".join(lines)
+
+
+@function_tool
+def reorder(order_id: int) -> str:
+    """
+    Rebuild a cart from a previous order, priced and checked against the current menu.
+    Returns the items plus the create_order items to use; ask the customer for
+    their name and contact details again.
+    """
+    try:
+        shard = shard_for_order(order_id)
+    except LookupError:
+        return f"Order #{order_id} not found or has no items."
+
+    conn = get_connection(role="replica", shard=shard)
+    cur = conn.cursor()
+    try:
+        def fetch_rows(created_after):
+            cur.execute(
+                """
+                SELECT
+                    o.outlet_id,
+                    out.name,
+                    o.fulfillment_type,
+                    oi.menu_item_id,
+                    oi.quantity,
+                    mi.name,
+                    mi.base_price,
+                    (mi.is_active AND out.is_active AND COALESCE(oma.is_available, FALSE)) AS orderable
+                FROM orders o
+                INNER JOIN outlets out ON out.id = o.outlet_id
+                INNER JOIN order_items oi
+                    ON oi.order_id = o.id AND oi.order_created_at = o.created_at
+                INNER JOIN menu_items mi ON mi.id = oi.menu_item_id
+                LEFT JOIN outlet_menu_availability oma
+                    ON oma.outlet_id = o.outlet_id AND oma.menu_item_id = oi.menu_item_id
+                WHERE o.id = %s
+                  AND o.created_at >= %s
+                ORDER BY oi.id
+                """,
+                (order_id, created_after),
+            )
+            return cur.fetchall()
+
+        rows = recent_first(fetch_rows)
+        if not rows:
+            return f"Order #{order_id} not found or has no items."
+
+        outlet_id, outlet_name, fulfillment_type = rows[0][:3]
+
+        items = []
+        unavailable = []
+        total = 0.0
+        for *_, menu_item_id, quantity, item_name, base_price, orderable in rows:
+            if not orderable:
+                unavailable.append(f"{item_name} (#{menu_item_id})")
+                continue
+            line_total = float(base_price) * quantity
+            total += line_total
+            items.append({"menu_item_id": menu_item_id, "quantity": quantity, "name": item_name, "line_total": line_total})
+
+        lines = [f"Cart rebuilt from order #{order_id} at {outlet_name} (Outlet #{outlet_id}):"]
+        for item in items:
+            lines.append(f"  - {item['quantity']}x {item['name']} (#{item['menu_item_id']}) = ${item['line_total']:.2f}")
+        if unavailable:
+            lines.append(f"No longer available: {', '.join(unavailable)}")
+        if not items:
+            lines.append("None of the items from that order can be ordered right now.")
+            return "\n".join(lines)
+
+        lines.append(f"Estimated total at current prices: ${total:.2f}")
+
+        payload = {
+            "outlet_id": outlet_id,
+            "fulfillment_type": fulfillment_type,
+            "items": [{"menu_item_id": i["menu_item_id"], "quantity": i["quantity"]} for i in items],
+        }
+        lines.append(f"create_order payload (add the customer's details): {json.dumps(payload)}")
+        return "\n".join(lines)
+    finally:
+        close_cursor(cur)
+
+
+# ---------- Benchmark ----------
+
+BENCH_SCHEMA = "history_bench"
+HEAVY_PHONE = "555-9999999"  # a regular: one order in every `heavy_every`
+
+
+def _timed(fn, runs: int) -> float:
+    """Mean milliseconds per call of `fn()`."""
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - started) / runs * 1e3
+
+
+def _benchmark(orders: int, months: int, lookups: int, pages: int) -> None:
+    """
+    Time the history tools on `orders` synthetic orders in a scratch schema
+    (dropped afterwards) against the catalog in public: first pages, the
+    OPEN filter, deep keyset pages vs OFFSET, reorder of recent and old
+    orders, and the phone lookup without the digits index.
+    """
+    from agents.tool_context import ToolContext
+
+    from models import ConversationContext
+    from . import single_flight
+
+    use_bench_schema(BENCH_SCHEMA)
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    heavy_every = 1000
+    try:
+        load_bench_history(cur, BENCH_SCHEMA, orders, months, heavy_every, HEAVY_PHONE)
+        history = single_flight.read_only_tool("get_orders_by_phone")
+        customers = max(1, orders // 20)
+        phones = [f"555-{random.randrange(1, customers):07d}" for _ in range(lookups)]
+        phone = iter(phones * 2)
+
+        print(f"history page 1         {_timed(lambda: history(next(phone)), lookups):9.2f} ms")
+        print(f"history OPEN orders    {_timed(lambda: history(next(phone), status='OPEN'), lookups):9.2f} ms")
+
+        # A regular with orders // heavy_every orders: walk their pages back with the keyset cursor
+        before: Optional[int] = None
+        page_ms: List[float] = []
+        for _ in range(pages):
+            started = time.perf_counter()
+            page = history(HEAVY_PHONE, limit=5, before_order_id=before)
+            page_ms.append((time.perf_counter() - started) * 1e3)
+            cursor = re.search(r"before_order_id=(\d+)", page)
+            if cursor is None:
+                break
+            before = int(cursor.group(1))
+        offset_sql = (
+            "SELECT o.id FROM orders o WHERE o.customer_phone_digits = %s "
+            "ORDER BY o.created_at DESC, o.id DESC LIMIT 6 OFFSET %s"
+        )
+        offset_ms = _timed(lambda: cur.execute(offset_sql, (normalize_phone(HEAVY_PHONE), 5 * (len(page_ms) - 1))), 20)
+        print(
+            f"regular ({orders // heavy_every:,} orders): page 1 {page_ms[0]:.2f} ms, "
+            f"keyset page {len(page_ms)} {page_ms[-1]:.2f} ms, OFFSET page {len(page_ms)} {offset_ms:.2f} ms"
+        )
+
+        async def reorder_ms(order_ids: List[int]) -> float:
+            context = ToolContext(
+                context=ConversationContext(conversation_id="history-bench", raw_user_message=""),
+                tool_name="reorder",
+                tool_call_id="bench",
+                tool_arguments="{}",
+            )
+            started = time.perf_counter()
+            for order_id in order_ids:
+                await reorder.on_invoke_tool(context, json.dumps({"order_id": order_id}))
+            return (time.perf_counter() - started) / len(order_ids) * 1e3
+
+        recent = [random.randint(orders - orders // months // 2, orders) for _ in range(lookups)]
+        old = [random.randint(1, orders // months) for _ in range(max(1, lookups // 10))]
+        print(f"reorder recent order   {asyncio.run(reorder_ms(recent)):9.2f} ms")
+        print(f"reorder oldest month   {asyncio.run(reorder_ms(old)):9.2f} ms (searches every partition)")
+
+        scan = (
+            "SELECT o.id FROM orders o WHERE regexp_replace(o.customer_phone, '[^0-9]', '', 'g') = %s "
+            "ORDER BY o.created_at DESC, o.id DESC LIMIT 6"
+        )
+        print(f"no digits index (scan) {_timed(lambda: cur.execute(scan, (normalize_phone(phones[0]),)), 3):9.2f} ms")
+    finally:
+        cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        cur.close()
+        conn.autocommit = False  # pooled connections go back in their usual mode
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark customer history and reorder on a large order history.")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--orders", type=int, default=1_000_000, help="benchmark size (10000000 for the full run)")
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--lookups", type=int, default=1_000)
+    parser.add_argument("--pages", type=int, default=50, help="keyset pages to walk back for the regular")
+    args = parser.parse_args()
+
+    if DB_BACKEND == "sqlite":
+        parser.error("the history benchmark loads a partitioned scratch schema and needs Postgres")
+    if args.benchmark:
+        _benchmark(args.orders, args.months, args.lookups, args.pages)
+    else:
+        parser.print_help()
@@ -0,0 +1,139 @@
+"""
+Idempotency keys for order creation.
+
+Retried LLM runs can call `create_order` more than once for the same cart.
+A submission carries an idempotency key (client supplied, or derived from
+the session plus a hash of the cart). Without either there is no key and no
+deduplication: a cart hash alone would make two customers' identical orders
+one order. The key is claimed in the
+`order_idempotency_keys` table inside the order transaction, and recent
+results are also kept in a small in-process LRU so duplicates inside the
+window are answered without touching the write path.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+IDEMPOTENCY_WINDOW_SECONDS = int(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", "600"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "1024"))
+
+_recent: "OrderedDict[str, tuple]" = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+def cart_hash(payload) -> str:
+    """
+    Stable hash of everything that makes an order distinct.
+    Items are merged per menu item and sorted, so reordered lines hash the same.
+    """
+    quantities = {}
+    for item in payload.items:
+        quantities[item.menu_item_id] = quantities.get(item.menu_item_id, 0) + item.quantity
+
+    canonical = {
+        "outlet_id": payload.outlet_id,
+        "fulfillment_type": payload.fulfillment_type.upper(),
+        "customer_name": (payload.customer_name or "").strip().lower(),
+        "customer_phone": (payload.customer_phone or "").strip(),
+        "customer_address": (payload.customer_address or "").strip().lower(),
+        "items": sorted(quantities.items()),
+    }
+    blob = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def resolve_key(payload, session_id: Optional[str] = None) -> Optional[str]:
+    """
+    Return the client supplied key, or derive one from the session and cart.
+    None when there is neither: the submission is not deduplicated.
+    """
+    if payload.idempotency_key and payload.idempotency_key.strip():
+        return payload.idempotency_key.strip()[:128]
+    if not session_id:
+        return None
+    return f"auto:{session_id}:{cart_hash(payload)[:32]}"[:128]
+
+
+def recall(key: str) -> Optional[str]:
+    """Return the remembered response for `key` if it is still inside the window."""
+    with _recent_lock:
+        entry = _recent.get(key)
+        if entry is None:
+            return None
+        response, stored_at = entry
+        if time.monotonic() - stored_at > IDEMPOTENCY_WINDOW_SECONDS:
+            del _recent[key]
+            return None
+        _recent.move_to_end(key)
+        return response
+
+
+def remember(key: str, response: str) -> None:
+    """Store a SUCCESS response for `key`, evicting the least recently used entry."""
+    with _recent_lock:
+        _recent[key] = (response, time.monotonic())
+        _recent.move_to_end(key)
+        while len(_recent) > IDEMPOTENCY_CACHE_SIZE:
+            _recent.popitem(last=False)
+
+
+def fetch_stored_response(cur, key: str) -> Optional[str]:
+    """Look up a completed submission for `key` inside the window."""
+    cur.execute(
+        """
+        SELECT response
+        FROM order_idempotency_keys
+        WHERE idempotency_key = %s
+          AND response IS NOT NULL
+          AND created_at >= NOW() - make_interval(secs => %s)
+        """,
+        (key, IDEMPOTENCY_WINDOW_SECONDS),
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def claim(cur, key: str) -> bool:
+    """
+    Claim `key` inside the caller's transaction.
+
+    Returns False if another transaction already owns the key. A concurrent
+    claimer blocks on the unique index until the owner commits or rolls back,
+    so a rolled-back (failed) submission frees the key again.
+    """
+    cur.execute(
+        """
+        DELETE FROM order_idempotency_keys
+        WHERE idempotency_key = %s
+          AND created_at < NOW() - make_interval(secs => %s)
+        """,
+        (key, IDEMPOTENCY_WINDOW_SECONDS),
+    )
+    cur.execute(
+        """
+        INSERT INTO order_idempotency_keys (idempotency_key, created_at)
+        VALUES (%s, NOW())
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING idempotency_key
+        """,
+        (key,),
+    )
+    return cur.fetchone() is not None
+
+
+def complete(cur, key: str, order_id: int, response: str) -> None:
+    """Attach the created order and its response text to a claimed key."""
+    cur.execute(
+        """
+        UPDATE order_idempotency_keys
+        SET order_id = %s,
+            response = %s
+        WHERE idempotency_key = %s
+        """,
+        (order_id, response, key),
+    )
@@ -0,0 +1,257 @@
+"""
+Kitchen load and ready-time estimates.
+
+Each outlet's kitchen is modelled as KITCHEN_PARALLEL_ORDERS stations
+working FIFO. Per outlet we keep only two running totals for the orders
+still in the kitchen: `queued_orders` and `queued_prep_seconds`. Both are
+updated in O(1) per event:
+
+- order created (`quote` / `commit_quote`, called from create_order;
+  `quote_many` for bulk orders): the wait is zero while a station is free,
+  otherwise (queued_orders - stations + 1) * average prep / stations. The
+  order is quoted `ready_eta` = now + wait + its own prep, then added to
+  the totals.
+- order leaves the kitchen (READY, COMPLETED, CANCELLED): its prep is
+  subtracted by the `kitchen_dequeue` trigger in the schema. That covers
+  update_status.py and update_order_status alike.
+
+The totals are exact sums, so they never drift. An order's prep time is the
+slowest line's category time plus KITCHEN_EXTRA_UNIT_SECONDS for every
+further unit.
+
+Simulate a rush hour: python -m db.kitchen --simulate
+"""
+import argparse
+import heapq
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+KITCHEN_PARALLEL_ORDERS = int(os.getenv("KITCHEN_PARALLEL_ORDERS", "4"))
+KITCHEN_EXTRA_UNIT_SECONDS = int(os.getenv("KITCHEN_EXTRA_UNIT_SECONDS", "30"))
+# Refuse new orders when the quoted wait exceeds this many minutes (unset = never)
+KITCHEN_THROTTLE_MINUTES = float(os.getenv("KITCHEN_THROTTLE_MINUTES", "0")) or None
+
+PREP_SECONDS_BY_CATEGORY = {
+    "drink": 60,
+    "dessert": 180,
+    "side": 240,
+    "salad": 300,
+    "starter": 360,
+    "breakfast": 420,
+    "burger": 480,
+    "main": 720,
+}
+DEFAULT_PREP_SECONDS = 420
+
+QUEUED_STATUSES = ("PENDING", "CONFIRMED", "IN_KITCHEN")
+
+
+def category_prep_seconds(category: Optional[str]) -> int:
+    """Prep time for a category; 'indian_main' falls back to its 'main' suffix."""
+    category = (category or "").lower()
+    if category in PREP_SECONDS_BY_CATEGORY:
+        return PREP_SECONDS_BY_CATEGORY[category]
+    suffix = category.rsplit("_", 1)[-1]
+    return PREP_SECONDS_BY_CATEGORY.get(suffix, DEFAULT_PREP_SECONDS)
+
+
+def estimate_prep_seconds(lines: Iterable[Tuple[Optional[str], int]]) -> int:
+    """Prep time of an order from (category, quantity) lines."""
+    slowest = 0
+    units = 0
+    for category, quantity in lines:
+        slowest = max(slowest, category_prep_seconds(category))
+        units += quantity
+    return slowest + KITCHEN_EXTRA_UNIT_SECONDS * max(0, units - 1)
+
+
+def estimate_wait_seconds(queued_orders: int, queued_prep_seconds: float) -> float:
+    """Time until a station frees up for a new order, from the outlet's running totals."""
+    if queued_orders < KITCHEN_PARALLEL_ORDERS:
+        return 0.0
+    average_prep = queued_prep_seconds / queued_orders
+    return (queued_orders - KITCHEN_PARALLEL_ORDERS + 1) * average_prep / KITCHEN_PARALLEL_ORDERS
+
+
+class KitchenQueue:
+    """In-memory form of one outlet's totals (simulation; mirrors quote and the dequeue trigger)."""
+
+    __slots__ = ("queued_orders", "queued_prep_seconds")
+
+    def __init__(self):
+        self.queued_orders = 0
+        self.queued_prep_seconds = 0.0
+
+    def enqueue(self, now: float, prep_seconds: float) -> float:
+        """Add an order; returns its quoted ready time."""
+        eta = now + estimate_wait_seconds(self.queued_orders, self.queued_prep_seconds) + prep_seconds
+        self.queued_orders += 1
+        self.queued_prep_seconds += prep_seconds
+        return eta
+
+    def dequeue(self, prep_seconds: float) -> None:
+        self.queued_orders -= 1
+        self.queued_prep_seconds -= prep_seconds
+
+
+# ---------- Database ----------
+
+def quote(cur, outlet_id: int, prep_seconds: int, now: datetime) -> Tuple[datetime, float]:
+    """
+    Quote a new order inside the caller's transaction: returns (ready_eta,
+    wait_seconds). The outlet's load row stays locked until commit, so
+    concurrent orders for one outlet are quoted one after another.
+    """
+    return quote_many(cur, outlet_id, [prep_seconds], now)[0]
+
+
+def quote_many(cur, outlet_id: int, prep_seconds: List[int], now: datetime) -> List[Tuple[datetime, float]]:
+    """
+    Quote several new orders of one outlet (bulk orders), each queued behind
+    the ones before it, with one locked read of the outlet's totals. A
+    throttled order (see is_throttled) will be refused, so the orders after
+    it are not queued behind it.
+    """
+    cur.execute(
+        """
+        INSERT INTO outlet_kitchen_load (outlet_id)
+        VALUES (%s)
+        ON CONFLICT (outlet_id) DO NOTHING
+        """,
+        (outlet_id,),
+    )
+    cur.execute(
+        """
+        SELECT queued_orders, queued_prep_seconds
+        FROM outlet_kitchen_load
+        WHERE outlet_id = %s
+        FOR UPDATE
+        """,
+        (outlet_id,),
+    )
+    queued_orders, queued_prep_seconds = cur.fetchone()
+    quotes = []
+    for prep in prep_seconds:
+        wait_seconds = estimate_wait_seconds(queued_orders, queued_prep_seconds)
+        quotes.append((now + timedelta(seconds=wait_seconds + prep), wait_seconds))
+        if not is_throttled(wait_seconds):
+            queued_orders += 1
+            queued_prep_seconds += prep
+    return quotes
+
+
+def commit_quote(cur, outlet_id: int, prep_seconds: int, orders: int = 1) -> None:
+    """Add accepted orders (`prep_seconds` in total) to the outlet's totals (same transaction as `quote`)."""
+    cur.execute(
+        """
+        UPDATE outlet_kitchen_load
+        SET queued_orders = queued_orders + %s,
+            queued_prep_seconds = queued_prep_seconds + %s,
+            updated_at = NOW()
+        WHERE outlet_id = %s
+        """,
+        (orders, prep_seconds, outlet_id),
+    )
+
+
+def is_throttled(wait_seconds: float) -> bool:
+    return KITCHEN_THROTTLE_MINUTES is not None and wait_seconds > KITCHEN_THROTTLE_MINUTES * 60
+
+
+def eta_minutes(ready_eta: datetime, now: datetime) -> int:
+    """Whole minutes until `ready_eta`, rounded; what every ETA shown to a customer uses."""
+    return max(0, round((ready_eta - now).total_seconds() / 60))
+
+
+def describe_eta(
+    status: str,
+    ready_eta: Optional[datetime],
+    now: Optional[datetime] = None,
+    timezone_str: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Ready-time line for order status, or None once the order has left the
+    kitchen. The clock time is shown in the outlet's `timezone_str`.
+    """
+    if ready_eta is None or status not in QUEUED_STATUSES:
+        return None
+    now = now or datetime.now(timezone.utc)
+    minutes = eta_minutes(ready_eta, now)
+    if minutes <= 0:
+        return "Estimated ready: any minute now"
+    if timezone_str:
+        import pytz  # deferred like in queries.is_outlet_open
+
+        ready_eta = ready_eta.astimezone(pytz.timezone(timezone_str))
+    return f"Estimated ready: in about {minutes} min ({ready_eta.strftime('%H:%M %Z').strip()})"
+
+
+# ---------- Simulation ----------
+
+def simulate(orders_per_hour: int = 180, hours: float = 2.0, seed: int = 7) -> dict:
+    """
+    Rush-hour simulation of one outlet: Poisson arrivals, actual prep times
+    with +/-30% noise and FIFO service on KITCHEN_PARALLEL_ORDERS stations.
+    Compares each quoted ready time with the simulated one and times the
+    queue updates.
+    """
+    rng = random.Random(seed)
+    categories = list(PREP_SECONDS_BY_CATEGORY)
+    queue = KitchenQueue()
+    station_free = [0.0] * KITCHEN_PARALLEL_ORDERS
+
+    now = 0.0
+    errors = []
+    pending = []  # (actual ready time, prep) heap of orders still in the kitchen
+    update_seconds = 0.0
+    updates = 0
+    while now < hours * 3600:
+        now += rng.expovariate(orders_per_hour / 3600)
+
+        # Orders that became ready before this arrival leave the queue first
+        while pending and pending[0][0] <= now:
+            _, prep = heapq.heappop(pending)
+            started = time.perf_counter()
+            queue.dequeue(prep)
+            update_seconds += time.perf_counter() - started
+            updates += 1
+
+        lines = [(rng.choice(categories), rng.randint(1, 3)) for _ in range(rng.randint(1, 4))]
+        prep = estimate_prep_seconds(lines)
+
+        started = time.perf_counter()
+        eta = queue.enqueue(now, prep)
+        update_seconds += time.perf_counter() - started
+        updates += 1
+
+        # Actual kitchen: earliest free station, noisy prep time
+        station = min(range(len(station_free)), key=station_free.__getitem__)
+        actual_ready = max(station_free[station], now) + prep * rng.uniform(0.7, 1.3)
+        station_free[station] = actual_ready
+        heapq.heappush(pending, (actual_ready, prep))
+        errors.append(eta - actual_ready)
+
+    abs_minutes = sorted(abs(e) / 60 for e in errors)
+    return {
+        "orders": len(errors),
+        "mean_abs_error_min": sum(abs_minutes) / len(abs_minutes),
+        "p90_abs_error_min": abs_minutes[int(0.9 * (len(abs_minutes) - 1))],
+        "mean_bias_min": sum(errors) / len(errors) / 60,
+        "update_cost_us": update_seconds / updates * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate the kitchen ETA model under rush-hour load.")
+    parser.add_argument("--simulate", action="store_true")
+    parser.add_argument("--orders-per-hour", type=int, default=180)
+    parser.add_argument("--hours", type=float, default=2.0)
+    args = parser.parse_args()
+    if args.simulate:
+        for key, value in simulate(args.orders_per_hour, args.hours).items():
+            print(f"{key:>20}: {value:.2f}" if isinstance(value, float) else f"{key:>20}: {value}")
+    else:
+        parser.print_help()
@@ -0,0 +1,393 @@
+"""
+Monthly partitions of `orders` and `order_items`.
+
+Both tables are range-partitioned on the order's creation time
+(`orders.created_at`, `order_items.order_created_at`), one partition per
+UTC month, named orders_YYYY_MM / order_items_YYYY_MM. This module runs the
+lifecycle (schedule it daily next to update_status.py and db.sales):
+
+- `ensure_partitions` creates the next ORDER_PARTITIONS_AHEAD months.
+- `archive_partitions` detaches months older than ORDER_RETENTION_MONTHS
+  and moves them to the ORDER_ARCHIVE_SCHEMA schema. The data stays
+  queryable there and can be dumped or dropped on its own schedule. A month
+  is skipped while it still has open orders or order items the sales rollup
+  has not folded in yet.
+
+Lookups by order id have no partition key, so they go through `recent_first`.
+That searches the last ORDER_LOOKUP_MONTHS months first, then every attached
+partition only when nothing matched.
+
+Run with: python -m db.partitions                 (create upcoming partitions)
+          python -m db.partitions --archive       (also archive old months)
+          python -m db.partitions --benchmark     (partitioned vs plain tables)
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, TypeVar
+
+from .connection import DB_BACKEND, close_cursor, get_connection, shard_names
+
+ORDER_PARTITIONS_AHEAD = int(os.getenv("ORDER_PARTITIONS_AHEAD", "3"))
+ORDER_RETENTION_MONTHS = int(os.getenv("ORDER_RETENTION_MONTHS", "12"))
+ORDER_LOOKUP_MONTHS = int(os.getenv("ORDER_LOOKUP_MONTHS", "2"))
+ORDER_ARCHIVE_SCHEMA = os.getenv("ORDER_ARCHIVE_SCHEMA", "orders_archive")
+ARCHIVE_LOCK_TIMEOUT = os.getenv("ORDER_ARCHIVE_LOCK_TIMEOUT", "5s")
+
+# Lower bound that keeps every partition (fallback of `recent_first`)
+ALL_PARTITIONS = "-infinity"
+
+OPEN_STATUSES = ("PENDING", "CONFIRMED", "IN_KITCHEN", "READY")
+
+T = TypeVar("T")
+
+
+def month_start(now: Optional[datetime] = None, months_back: int = 0) -> datetime:
+    """First instant (UTC) of the month `months_back` months before `now`'s."""
+    now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    index = now.year * 12 + now.month - 1 - months_back
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def recent_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Lower created_at bound for lookups: the current month and ORDER_LOOKUP_MONTHS - 1 before it."""
+    return month_start(now, max(ORDER_LOOKUP_MONTHS - 1, 0))
+
+
+def recent_first(fetch: Callable[[object], Optional[T]]) -> Optional[T]:
+    """
+    Run `fetch(created_after)` against recent partitions, and once more
+    against all of them only if that found nothing (falsy result).
+    """
+    result = fetch(recent_cutoff())
+    if not result:
+        result = fetch(ALL_PARTITIONS)
+    return result
+
+
+# ---------- Lifecycle ----------
+
+def ensure_partitions(ahead: int = ORDER_PARTITIONS_AHEAD, shard: Optional[str] = None) -> int:
+    """Create this month's partitions and the next `ahead` months'; returns how many were new."""
+    conn = get_connection(shard=shard)
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT create_order_partitions(%s, %s)",
+            (month_start().date(), ahead + 1),
+        )
+        created = cur.fetchone()[0]
+        conn.commit()
+        return created
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_cursor(cur)
+
+
+def list_partitions(cur, parent: str = "orders") -> List[str]:
+    """Attached partitions of `parent`, oldest month first."""
+    cur.execute(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        INNER JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        ORDER BY c.relname
+        """,
+        (parent,),
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def _partition_month(name: str) -> Optional[datetime]:
+    """orders_2025_03 -> 2025-03-01 UTC (None for names outside the convention)."""
+    try:
+        year, month = name.rsplit("_", 2)[-2:]
+        return datetime(int(year), int(month), 1, tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def archive_partitions(
+    retention_months: int = ORDER_RETENTION_MONTHS,
+    dry_run: bool = False,
+    shard: Optional[str] = None,
+) -> List[str]:
+    """
+    Detach months that ended more than `retention_months` ago and move them
+    to the archive schema. Returns one line per partition: archived or why
+    it was skipped.
+    """
+    cutoff = month_start(months_back=retention_months)
+    conn = get_connection(shard=shard)
+    cur = conn.cursor()
+    report = []
+    try:
+        cur.execute(f"CREATE SCHEMA IF NOT EXISTS {ORDER_ARCHIVE_SCHEMA}")
+        conn.commit()
+
+        for name in list_partitions(cur):
+            month = _partition_month(name)
+            if month is None or month >= cutoff:
+                continue
+            items = "order_items_" + name[len("orders_"):]
+
+            cur.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {name} WHERE status IN %s)",
+                (OPEN_STATUSES,),
+            )
+            if cur.fetchone()[0]:
+                report.append(f"{name}: skipped, still has open orders")
+                continue
+
+            cur.execute(
+                f"""
+                SELECT EXISTS (
+                    SELECT 1 FROM {items}
+                    WHERE id > (SELECT last_order_item_id FROM sales_rollup_state WHERE id = 1)
+                )
+                """
+            )
+            if cur.fetchone()[0]:
+                report.append(f"{name}: skipped, not rolled up yet (run python -m db.sales)")
+                continue
+
+            if dry_run:
+                report.append(f"{name}: would archive")
+                conn.rollback()
+                continue
+
+            # Detaching locks the parents; give up rather than queue behind long queries
+            cur.execute(f"SET LOCAL lock_timeout = '{ARCHIVE_LOCK_TIMEOUT}'")
+            cur.execute(f"ALTER TABLE order_items DETACH PARTITION {items}")
+            cur.execute(f"ALTER TABLE orders DETACH PARTITION {name}")
+            cur.execute(f"ALTER TABLE {items} SET SCHEMA {ORDER_ARCHIVE_SCHEMA}")
+            cur.execute(f"ALTER TABLE {name} SET SCHEMA {ORDER_ARCHIVE_SCHEMA}")
+            conn.commit()
+            report.append(f"{name}: archived to {ORDER_ARCHIVE_SCHEMA}")
+        return report
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_cursor(cur)
+
+
+# ---------- Benchmark ----------
+
+def use_bench_schema(schema: str) -> None:
+    """
+    Resolve unqualified tables to `schema` first, for every connection this
+    process opens from now on (call before the first one), so the tools run
+    unchanged against a benchmark's scratch copies.
+    """
+    os.environ["PGOPTIONS"] = f"-c search_path={schema},public"
+
+
+def load_bench_history(
+    cur,
+    schema: str,
+    orders: int,
+    months: int,
+    heavy_every: int = 0,
+    heavy_phone: str = "",
+) -> None:
+    """
+    Create `schema` with month-partitioned copies of orders and order_items
+    and load `orders` synthetic orders (two items each, ids 1..orders) over
+    `months` months, oldest first, on the catalog in public. Customers
+    average 20 orders; with `heavy_every`, every such order belongs to
+    `heavy_phone` instead. The newest day's orders are left open.
+    """
+    cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    cur.execute(f"CREATE SCHEMA {schema}")
+    for table, key in (("orders", "created_at"), ("order_items", "order_created_at")):
+        cur.execute(
+            f"CREATE TABLE {schema}.{table} (LIKE public.{table} INCLUDING ALL) PARTITION BY RANGE ({key})"
+        )
+    newest = month_start()
+    for back in range(-1, months + 1):
+        lower, upper = month_start(newest, back), month_start(newest, back - 1)
+        suffix = lower.strftime("%Y_%m")
+        for table in ("orders", "order_items"):
+            cur.execute(
+                f"CREATE TABLE {schema}.{table}_{suffix} PARTITION OF {schema}.{table} "
+                "FOR VALUES FROM (%s) TO (%s)",
+                (lower, upper),
+            )
+
+    cur.execute("SELECT array_agg(id ORDER BY id) FROM public.outlets WHERE is_active")
+    outlets = cur.fetchone()[0]
+    cur.execute("SELECT array_agg(id ORDER BY id) FROM public.menu_items WHERE is_active")
+    items = cur.fetchone()[0]
+    params = {
+        "span": months * 30 * 86400,
+        "n": orders,
+        "customers": max(1, orders // 20),
+        "heavy": heavy_every or orders + 1,
+        "heavy_phone": heavy_phone,
+        "outlets": outlets,
+        "items": items,
+    }
+    batch = 200_000
+    started = time.perf_counter()
+    for lo in range(1, orders + 1, batch):
+        params.update(lo=lo, hi=min(lo + batch - 1, orders))
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.orders
+                (id, outlet_id, status, fulfillment_type, customer_name, customer_phone,
+                 created_at, updated_at, total_amount)
+            SELECT g,
+                   (%(outlets)s::int[])[1 + g %% cardinality(%(outlets)s::int[])],
+                   CASE WHEN created < NOW() - INTERVAL '1 day' THEN 'COMPLETED' ELSE 'PENDING' END,
+                   'PICKUP',
+                   'Customer',
+                   CASE WHEN g %% %(heavy)s = 0 THEN %(heavy_phone)s
+                        ELSE '555-' || lpad((g %% %(customers)s)::text, 7, '0') END,
+                   created, created, 20
+            FROM generate_series(%(lo)s::bigint, %(hi)s::bigint) g,
+                 LATERAL (SELECT NOW() - make_interval(secs => %(span)s * (1 - g::float8 / %(n)s)) AS created) t
+            """,
+            params,
+        )
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.order_items
+                (id, order_id, order_created_at, menu_item_id, quantity, unit_price, line_total)
+            SELECT o.id * 2 + k, o.id, o.created_at,
+                   (%(items)s::int[])[1 + (o.id * 7 + k) %% cardinality(%(items)s::int[])],
+                   1, 10, 10
+            FROM {schema}.orders o, generate_series(0, 1) k
+            WHERE o.id BETWEEN %(lo)s AND %(hi)s
+            """,
+            params,
+        )
+    cur.execute(f"ANALYZE {schema}.orders")
+    cur.execute(f"ANALYZE {schema}.order_items")
+    print(f"loaded {orders:,} orders ({orders * 2:,} items) in {time.perf_counter() - started:,.0f} s")
+
+
+def _benchmark(orders: int, months: int, lookups: int) -> None:
+    """
+    Load `orders` synthetic orders spread over `months` months into a plain
+    and a partitioned table (scratch schema, dropped afterwards), then time
+    inserts, status lookups of recent orders and a lifecycle sweep on each.
+    """
+    import random
+
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    batch = 100_000
+    span_seconds = months * 30 * 86400
+    try:
+        cur.execute("DROP SCHEMA IF EXISTS partition_bench CASCADE")
+        cur.execute("CREATE SCHEMA partition_bench")
+        columns = """
+            id BIGINT NOT NULL,
+            outlet_id INTEGER NOT NULL,
+            status VARCHAR(50) NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL,
+            total_amount NUMERIC(10, 2) NOT NULL,
+            PRIMARY KEY (id, created_at)
+        """
+        cur.execute(f"CREATE TABLE partition_bench.plain ({columns})")
+        cur.execute(f"CREATE TABLE partition_bench.parted ({columns}) PARTITION BY RANGE (created_at)")
+        newest = month_start()
+        for back in range(-1, months + 1):
+            lower, upper = month_start(newest, back), month_start(newest, back - 1)
+            cur.execute(
+                f"CREATE TABLE partition_bench.parted_{back + 1} PARTITION OF partition_bench.parted "
+                "FOR VALUES FROM (%s) TO (%s)",
+                (lower, upper),
+            )
+        for table in ("plain", "parted"):
+            cur.execute(
+                f"CREATE INDEX ON partition_bench.{table} (created_at) "
+                f"WHERE status IN ('PENDING', 'CONFIRMED', 'IN_KITCHEN', 'READY')"
+            )
+
+        # Oldest first, like production; the newest day's orders are left open
+        insert = """
+            INSERT INTO partition_bench.{table}
+            SELECT g,
+                   1 + g % 50,
+                   CASE WHEN created < NOW() - INTERVAL '1 day' THEN 'COMPLETED' ELSE 'PENDING' END,
+                   created, created, 20
+            FROM generate_series(%(lo)s::bigint, %(hi)s::bigint) g,
+                 LATERAL (SELECT NOW() - make_interval(secs => %(span)s * (1 - g::float8 / %(n)s)) AS created) t
+        """
+        for table in ("plain", "parted"):
+            started = time.perf_counter()
+            for lo in range(1, orders + 1, batch):
+                cur.execute(
+                    insert.format(table=table),
+                    {"lo": lo, "hi": min(lo + batch - 1, orders), "span": span_seconds, "n": orders},
+                )
+            elapsed = time.perf_counter() - started
+            cur.execute(f"ANALYZE partition_bench.{table}")
+            print(f"{table:<7} insert  {orders / elapsed:12,.0f} rows/s")
+
+        recent = max(1, orders - orders // months)
+        ids = [random.randint(recent, orders) for _ in range(lookups)]
+        cutoff = recent_cutoff()
+        for table, sql, params in (
+            ("plain", "SELECT status FROM partition_bench.plain WHERE id = %s", lambda i: (i,)),
+            (
+                "parted",
+                "SELECT status FROM partition_bench.parted WHERE id = %s AND created_at >= %s",
+                lambda i: (i, cutoff),
+            ),
+        ):
+            started = time.perf_counter()
+            for order_id in ids:
+                cur.execute(sql, params(order_id))
+                cur.fetchone()
+            print(f"{table:<7} lookup  {(time.perf_counter() - started) / lookups * 1e6:12,.0f} us")
+
+        for table, window in (
+            ("plain", ""),
+            ("parted", "AND created_at >= date_trunc('month', NOW() - INTERVAL '1 month')"),
+        ):
+            started = time.perf_counter()
+            cur.execute(
+                f"""
+                UPDATE partition_bench.{table}
+                SET status = 'CONFIRMED', updated_at = NOW()
+                WHERE status IN ('PENDING', 'CONFIRMED', 'IN_KITCHEN', 'READY') {window}
+                """
+            )
+            print(f"{table:<7} sweep   {(time.perf_counter() - started) * 1e3:12,.1f} ms ({cur.rowcount} rows)")
+    finally:
+        cur.execute("DROP SCHEMA IF EXISTS partition_bench CASCADE")
+        cur.close()
+        conn.autocommit = False  # pooled connections go back in their usual mode
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create, archive and benchmark monthly order partitions.")
+    parser.add_argument("--archive", action="store_true", help="also archive months past the retention")
+    parser.add_argument("--dry-run", action="store_true", help="report what --archive would do")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--orders", type=int, default=1_000_000, help="benchmark size (50000000 for the full run)")
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--lookups", type=int, default=2_000)
+    args = parser.parse_args()
+
+    if DB_BACKEND == "sqlite":
+        parser.error("order partitions are Postgres-only (DB_BACKEND=sqlite)")
+    if args.benchmark:
+        _benchmark(args.orders, args.months, args.lookups)
+    else:
+        for shard in shard_names():
+            prefix = f"[{shard}] " if shard else ""
+            print(f"{prefix}Created {ensure_partitions(shard=shard)} new monthly partition(s).")
+            if args.archive or args.dry_run:
+                for line in archive_partitions(dry_run=args.dry_run, shard=shard) or ["Nothing to archive."]:
+                    print(prefix + line)
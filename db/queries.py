@@ -1,22 +1,34 @@
+"""
+Agent tools over the catalog and orders: outlet search, menus and menu
+filters, opening hours, order creation, order status and status updates.
+
+Menus are read through the catalog cache (cache.py) and filtered by each
+outlet's compiled availability schedule (availability.py). Orders live on
+their outlet's shard; create_order is idempotent (idempotency.py) and quotes
+a ready time from the kitchen load (kitchen.py). The *_multi / plural tools
+answer a question about several outlets in one call.
+"""
+import argparse
+import asyncio
+import statistics
 from datetime import datetime, time, timezone
-from typing import Any, Dict, List, Optional
-import pytz
+from typing import Any, Dict, List, Optional, Tuple
 import sys
 import os
-from agents import function_tool
+from agents import RunContextWrapper, function_tool
 from typing import List, Literal
 from pydantic import BaseModel, ConfigDict
-from .connection import get_connection
-
-
-def _close_cursor(cur) -> None:
-    """Close cursor and connection."""
-    conn = cur.connection
-    cur.close()
-    conn.close()
+from .connection import close_cursor, get_connection, note_write, shard_for_order, shard_for_outlet
+from .partitions import recent_first
+from . import idempotency, kitchen
+from .availability import describe_window, get_outlet_schedule
+from .cache import outlet_menu, outlet_menus
+from .single_flight import coalesced
+from .statements import execute
 
 
 @function_tool
+@coalesced("get_outlets_by_city_or_zip")
 def get_outlets_by_city_or_zip(city: str = "", zip_code: str = "") -> str:
     """
     Search for outlets by city name or zip code.
@@ -25,38 +37,17 @@ def get_outlets_by_city_or_zip(city: str = "", zip_code: str = "") -> str:
     if not city.strip() and not zip_code.strip():
         return "Please provide either city or zip_code to search for outlets."
 
-    conn = get_connection()
+    conn = get_connection(role="replica")
     cur = conn.cursor()
     try:
-        conditions: List[str] = ["o.is_active = TRUE"]
-        params: List[Any] = []
-
-        if city.strip():
-            conditions.append("o.city ILIKE %s")
-            params.append(f"%{city.strip()}%")
-
-        if zip_code.strip():
-            conditions.append("o.zip_code ILIKE %s")
-            params.append(f"%{zip_code.strip()}%")
-
-        query = """
-            SELECT 
-                o.id,
-                o.name,
-                o.address,
-                o.city,
-                o.state,
-                o.zip_code,
-                o.supports_delivery,
-                o.supports_pickup,
-                o.open_time,
-                o.close_time
-            FROM outlets o
-            WHERE """ + " AND ".join(conditions) + """
-            ORDER BY o.city, o.name
-        """
-
-        cur.execute(query, params)
+        execute(
+            cur,
+            "outlets_search",
+            (
+                f"%{city.strip()}%" if city.strip() else None,
+                f"%{zip_code.strip()}%" if zip_code.strip() else None,
+            ),
+        )
         rows = cur.fetchall()
 
         if not rows:
@@ -94,92 +85,192 @@ def get_outlets_by_city_or_zip(city: str = "", zip_code: str = "") -> str:
 
         return "\n".join(lines)
     finally:
-        _close_cursor(cur)
+        close_cursor(cur)
+
+
+def _format_menu(outlet_id: int, outlet_name: str, rows, schedule) -> List[str]:
+    """Menu lines grouped by category, with availability against the outlet's schedule."""
+    local_now = schedule.local_time()
+    lines = [f"Menu for {outlet_name} (Outlet #{outlet_id}):"]
+    current_category = None
+
+    for (
+        id,
+        name,
+        description,
+        category,
+        price,
+        is_veg,
+        is_spicy,
+        is_available,
+        avail_from,
+        avail_to,
+        avail_days,
+    ) in rows:
+        # Group by category
+        if category != current_category:
+            current_category = category
+            lines.append(f"\n{category.upper().replace('_', ' ')}:")
+
+        # Build item description
+        tags = []
+        if is_veg:
+            tags.append("Vegetarian")
+        if is_spicy:
+            tags.append("Spicy")
+        tag_str = f" [{', '.join(tags)}]" if tags else ""
+
+        if not is_available:
+            availability = "Currently Unavailable"
+        elif schedule.is_available(id, local_now):
+            availability = "Available"
+        else:
+            availability = "Not Available Now"
+        window = describe_window(avail_from, avail_to, avail_days)
+        if window:
+            availability += f" ({window})"
+
+        desc_text = f" - {description}" if description else ""
+        lines.append(
+            f"  #{id} {name}{tag_str} - ${price:.2f} | {availability}{desc_text}"
+        )
 
-@function_tool
-def get_outlet_menu(outlet_id: int) -> str:
-    """
-    Get the complete menu for a specific outlet, including availability status.
-    """
-    conn = get_connection()
-    cur = conn.cursor()
+    return lines
+
+
+def _format_filtered_menu(outlet_id: int, outlet_name: str, rows) -> List[str]:
+    """Filtered menu lines grouped by category."""
+    lines = [f"Filtered menu for {outlet_name} (Outlet #{outlet_id}):"]
+    current_category = None
+
+    for (
+        id,
+        name,
+        description,
+        cat,
+        price,
+        veg,
+        spicy,
+    ) in rows:
+        if cat != current_category:
+            current_category = cat
+            lines.append(f"\n{cat.upper().replace('_', ' ')}:")
+
+        tags = []
+        if veg:
+            tags.append("Vegetarian")
+        if spicy:
+            tags.append("Spicy")
+        tag_str = f" [{', '.join(tags)}]" if tags else ""
+
+        desc_text = f" - {description}" if description else ""
+        lines.append(f"  #{id} {name}{tag_str} - ${price:.2f}{desc_text}")
+
+    return lines
+
+
+def _menu_filter_params(
+    category: str,
+    is_veg: Optional[bool],
+    is_spicy: Optional[bool],
+    max_price: Optional[float],
+    min_price: Optional[float],
+) -> tuple:
+    """Optional filter_menu predicates as the ($2..$6) parameters of the prepared shape; None = no filter."""
+    return (
+        f"%{category.strip()}%" if category.strip() else None,
+        is_veg,
+        is_spicy,
+        min_price,
+        max_price,
+    )
+
+
+def _open_status_report(
+    outlet_id: int,
+    outlet_name: str,
+    open_time,
+    close_time,
+    timezone_str: Optional[str],
+    current_time: Optional[str] = None,
+) -> str:
+    """Open/closed message for one outlet at `current_time` (default now, outlet local)."""
+    import pytz  # deferred: only the open-hours tools need timezone data
+
+    if not open_time or not close_time:
+        return f"Outlet #{outlet_id} ({outlet_name}) does not have operating hours set."
+
+    # Parse or compute current time in outlet's timezone
     try:
-        # Verify outlet exists
-        cur.execute("SELECT name FROM outlets WHERE id = %s AND is_active = TRUE", (outlet_id,))
-        outlet_row = cur.fetchone()
-        if not outlet_row:
-            return f"Outlet #{outlet_id} not found or is inactive."
+        tz = pytz.timezone(timezone_str) if timezone_str else None
+    except Exception:
+        tz = None
 
-        outlet_name = outlet_row[0]
+    if current_time:
+        try:
+            if "T" in current_time:
+                # ISO string, possibly with Z or offset
+                current_dt = datetime.fromisoformat(current_time.replace("Z", "+00:00"))
+            else:
+                # naive datetime string, assume outlet's local time if tz is known
+                naive_dt = datetime.strptime(current_time, "%Y-%m-%d %H:%M:%S")
+                if tz:
+                    current_dt = tz.localize(naive_dt)
+                else:
+                    current_dt = naive_dt
+        except ValueError:
+            return (
+                "Invalid current_time format. Use ISO format "
+                "(e.g., 2025-01-15T14:00:00) or YYYY-MM-DD HH:MM:SS."
+            )
+    else:
+        # No time provided: use "now" in outlet's local timezone if available,
+        # otherwise just system local time.
+        if tz:
+            current_dt = datetime.now(tz)
+        else:
+            current_dt = datetime.now()
 
-        query = """
-            SELECT 
-                mi.id,
-                mi.name,
-                mi.description,
-                mi.category,
-                mi.base_price,
-                mi.is_veg,
-                mi.is_spicy,
-                oma.is_available,
-                oma.available_from_time,
-                oma.available_to_time
-            FROM menu_items mi
-            INNER JOIN outlet_menu_availability oma ON oma.menu_item_id = mi.id
-            WHERE oma.outlet_id = %s
-              AND mi.is_active = TRUE
-            ORDER BY mi.category, mi.name
-        """
-
-        cur.execute(query, (outlet_id,))
-        rows = cur.fetchall()
+    # Handle cases where close_time might be after midnight (e.g., 23:59 -> 08:00)
+    if close_time < open_time:
+        # Operating hours span midnight
+        is_open = current_dt.time() >= open_time or current_dt.time() <= close_time
+    else:
+        # Normal operating hours
+        is_open = open_time <= current_dt.time() <= close_time
 
-        if not rows:
-            return f"No menu items found for outlet #{outlet_id} ({outlet_name})."
+    status = "OPEN" if is_open else "CLOSED"
+    time_str = current_dt.strftime("%Y-%m-%d %H:%M:%S")
+    if timezone_str:
+        time_str += f" ({timezone_str})"
 
-        lines = [f"Menu for {outlet_name} (Outlet #{outlet_id}):"]
-        current_category = None
+    return (
+        f"Outlet #{outlet_id} ({outlet_name}) is {status}.\n"
+        f"Operating hours: {open_time} - {close_time}\n"
+        f"Current time: {time_str}"
+    )
 
-        for (
-            id,
-            name,
-            description,
-            category,
-            price,
-            is_veg,
-            is_spicy,
-            is_available,
-            avail_from,
-            avail_to,
-        ) in rows:
-            # Group by category
-            if category != current_category:
-                current_category = category
-                lines.append(f"\n{category.upper().replace('_', ' ')}:")
-
-            # Build item description
-            tags = []
-            if is_veg:
-                tags.append("Vegetarian")
-            if is_spicy:
-                tags.append("Spicy")
-            tag_str = f" [{', '.join(tags)}]" if tags else ""
-
-            availability = "Available" if is_available else "Currently Unavailable"
-            if avail_from and avail_to:
-                availability += f" ({avail_from} - {avail_to})"
-
-            desc_text = f" - {description}" if description else ""
-            lines.append(
-                f"  #{id} {name}{tag_str} - ${price:.2f} | {availability}{desc_text}"
-            )
 
-        return "\n".join(lines)
-    finally:
-        _close_cursor(cur)
+@function_tool
+@coalesced("get_outlet_menu")
+def get_outlet_menu(outlet_id: int) -> str:
+    """
+    Get the complete menu for a specific outlet, including availability status.
+    """
+    menu = outlet_menu(outlet_id)
+    if menu is None:
+        return f"Outlet #{outlet_id} not found or is inactive."
+
+    outlet_name, rows = menu
+    if not rows:
+        return f"No menu items found for outlet #{outlet_id} ({outlet_name})."
+
+    schedule = get_outlet_schedule(outlet_id)
+    return "\n".join(_format_menu(outlet_id, outlet_name, rows, schedule))
 
 
 @function_tool
+@coalesced("filter_menu")
 def filter_menu(
     outlet_id: int,
     category: str = "",
@@ -187,178 +278,196 @@ def filter_menu(
     is_spicy: Optional[bool] = None,
     max_price: Optional[float] = None,
     min_price: Optional[float] = None,
+    only_available_now: bool = True,
 ) -> str:
     """
     Filter menu items for a specific outlet based on various criteria.
+    By default only items inside their serving window right now are listed;
+    pass only_available_now=False to include e.g. breakfast items in the evening.
     """
-    conn = get_connection()
+    conn = get_connection(role="replica")
     cur = conn.cursor()
     try:
         # Verify outlet exists
-        cur.execute("SELECT name FROM outlets WHERE id = %s AND is_active = TRUE", (outlet_id,))
+        execute(cur, "outlet_name", (outlet_id,))
         outlet_row = cur.fetchone()
         if not outlet_row:
             return f"Outlet #{outlet_id} not found or is inactive."
 
         outlet_name = outlet_row[0]
 
-        conditions: List[str] = [
-            "oma.outlet_id = %s",
-            "mi.is_active = TRUE",
-            "oma.is_available = TRUE",
-        ]
-        params: List[Any] = [outlet_id]
-
-        if category.strip():
-            conditions.append("mi.category ILIKE %s")
-            params.append(f"%{category.strip()}%")
-
-        if is_veg is not None:
-            conditions.append("mi.is_veg = %s")
-            params.append(is_veg)
-
-        if is_spicy is not None:
-            conditions.append("mi.is_spicy = %s")
-            params.append(is_spicy)
-
-        if min_price is not None:
-            conditions.append("mi.base_price >= %s")
-            params.append(min_price)
-
-        if max_price is not None:
-            conditions.append("mi.base_price <= %s")
-            params.append(max_price)
-
-        query = """
-            SELECT 
-                mi.id,
-                mi.name,
-                mi.description,
-                mi.category,
-                mi.base_price,
-                mi.is_veg,
-                mi.is_spicy
-            FROM menu_items mi
-            INNER JOIN outlet_menu_availability oma ON oma.menu_item_id = mi.id
-            WHERE """ + " AND ".join(conditions) + """
-            ORDER BY mi.category, mi.base_price, mi.name
-        """
-
-        cur.execute(query, params)
+        execute(
+            cur,
+            "filter_menu",
+            (outlet_id,) + _menu_filter_params(category, is_veg, is_spicy, max_price, min_price),
+        )
         rows = cur.fetchall()
 
+        if only_available_now and rows:
+            schedule = get_outlet_schedule(outlet_id, cur=cur)
+            local_now = schedule.local_time()
+            rows = [row for row in rows if schedule.is_available(row[0], local_now)]
+
         if not rows:
             return f"No menu items found for outlet #{outlet_id} matching the filters."
 
-        lines = [f"Filtered menu for {outlet_name} (Outlet #{outlet_id}):"]
-        current_category = None
-
-        for (
-            id,
-            name,
-            description,
-            cat,
-            price,
-            veg,
-            spicy,
-        ) in rows:
-            if cat != current_category:
-                current_category = cat
-                lines.append(f"\n{cat.upper().replace('_', ' ')}:")
-
-            tags = []
-            if veg:
-                tags.append("Vegetarian")
-            if spicy:
-                tags.append("Spicy")
-            tag_str = f" [{', '.join(tags)}]" if tags else ""
-
-            desc_text = f" - {description}" if description else ""
-            lines.append(f"  #{id} {name}{tag_str} - ${price:.2f}{desc_text}")
+        lines = _format_filtered_menu(outlet_id, outlet_name, rows)
 
         return "\n".join(lines)
     finally:
-        _close_cursor(cur)
+        close_cursor(cur)
 
 
 @function_tool
+@coalesced("is_outlet_open")
 def is_outlet_open(outlet_id: int, current_time: Optional[str] = None) -> str:
     """
     Check if an outlet is currently open based on its operating hours and timezone.
     If current_time is not provided, uses the current system time.
     """
-    conn = get_connection()
+    conn = get_connection(role="replica")
     cur = conn.cursor()
     try:
-        cur.execute(
-            """
-            SELECT name, open_time, close_time, timezone
-            FROM outlets
-            WHERE id = %s AND is_active = TRUE
-            """,
-            (outlet_id,),
-        )
+        execute(cur, "outlet_hours", (outlet_id,))
         row = cur.fetchone()
         if not row:
             return f"Outlet #{outlet_id} not found or is inactive."
 
         outlet_name, open_time, close_time, timezone_str = row
+        return _open_status_report(
+            outlet_id, outlet_name, open_time, close_time, timezone_str, current_time
+        )
+    finally:
+        close_cursor(cur)
 
-        if not open_time or not close_time:
-            return f"Outlet #{outlet_id} ({outlet_name}) does not have operating hours set."
 
-        # Parse or compute current time in outlet's timezone
-        try:
-            tz = pytz.timezone(timezone_str) if timezone_str else None
-        except Exception:
-            tz = None
-
-        if current_time:
-            try:
-                if "T" in current_time:
-                    # ISO string, possibly with Z or offset
-                    current_dt = datetime.fromisoformat(current_time.replace("Z", "+00:00"))
-                else:
-                    # naive datetime string, assume outlet's local time if tz is known
-                    naive_dt = datetime.strptime(current_time, "%Y-%m-%s %H:%M:%S")
-                    if tz:
-                        current_dt = tz.localize(naive_dt)
-                    else:
-                        current_dt = naive_dt
-            except ValueError:
-                return (
-                    "Invalid current_time format. Use ISO format "
-                    "(e.g., 2025-01-15T14:00:00) or YYYY-MM-DD HH:MM:SS."
-                )
-        else:
-            # No time provided: use "now" in outlet's local timezone if available,
-            # otherwise just system local time.
-            if tz:
-                current_dt = datetime.now(tz)
-            else:
-                current_dt = datetime.now()
+# ---------------------------------------------------------------------
+# Batch variants for multi-outlet questions: one set-based query each
+# ---------------------------------------------------------------------
 
+MAX_BATCH_OUTLETS = 20
 
-        # Handle cases where close_time might be after midnight (e.g., 23:59 -> 08:00)
-        if close_time < open_time:
-            # Operating hours span midnight
-            is_open = current_dt.time() >= open_time or current_dt.time() <= close_time
-        else:
-            # Normal operating hours
-            is_open = open_time <= current_dt.time() <= close_time
-
-        status = "OPEN" if is_open else "CLOSED"
-        time_str = current_dt.strftime("%Y-%m-%s %H:%M:%S")
-        if timezone_str:
-            time_str += f" ({timezone_str})"
-
-        return (
-            f"Outlet #{outlet_id} ({outlet_name}) is {status}.\n"
-            f"Operating hours: {open_time} - {close_time}\n"
-            f"Current time: {time_str}"
+
+def _batch_outlet_ids(outlet_ids: List[int]) -> List[int]:
+    """De-duplicated ids in the order given, capped at MAX_BATCH_OUTLETS."""
+    return list(dict.fromkeys(outlet_ids))[:MAX_BATCH_OUTLETS]
+
+
+def _fetch_active_outlets(cur, outlet_ids: List[int]) -> Dict[int, tuple]:
+    """id -> (name, open_time, close_time, timezone) for the active outlets among `outlet_ids`."""
+    execute(cur, "outlets_by_ids", (list(outlet_ids),))
+    return {row[0]: row[1:] for row in cur.fetchall()}
+
+
+@function_tool
+@coalesced("is_outlets_open")
+def is_outlets_open(outlet_ids: List[int], current_time: Optional[str] = None) -> str:
+    """
+    Check several outlets at once (up to 20). Same rules and current_time format as is_outlet_open.
+    Prefer this over calling is_outlet_open repeatedly.
+    """
+    outlet_ids = _batch_outlet_ids(outlet_ids)
+    if not outlet_ids:
+        return "Please provide at least one outlet_id."
+
+    conn = get_connection(role="replica")
+    cur = conn.cursor()
+    try:
+        outlets = _fetch_active_outlets(cur, outlet_ids)
+        reports = []
+        for outlet_id in outlet_ids:
+            if outlet_id not in outlets:
+                reports.append(f"Outlet #{outlet_id} not found or is inactive.")
+                continue
+            outlet_name, open_time, close_time, timezone_str = outlets[outlet_id]
+            reports.append(
+                _open_status_report(outlet_id, outlet_name, open_time, close_time, timezone_str, current_time)
+            )
+        return "\n\n".join(reports)
+    finally:
+        close_cursor(cur)
+
+
+@function_tool
+@coalesced("get_outlet_menus")
+def get_outlet_menus(outlet_ids: List[int]) -> str:
+    """
+    Get the complete menus of several outlets at once (up to 20), including availability status.
+    Prefer this over calling get_outlet_menu repeatedly.
+    """
+    outlet_ids = _batch_outlet_ids(outlet_ids)
+    if not outlet_ids:
+        return "Please provide at least one outlet_id."
+
+    menus = outlet_menus(outlet_ids)
+
+    sections = []
+    for outlet_id in outlet_ids:
+        if menus[outlet_id] is None:
+            sections.append(f"Outlet #{outlet_id} not found or is inactive.")
+            continue
+        outlet_name, rows = menus[outlet_id]
+        if not rows:
+            sections.append(f"No menu items found for outlet #{outlet_id} ({outlet_name}).")
+            continue
+        schedule = get_outlet_schedule(outlet_id)
+        sections.append("\n".join(_format_menu(outlet_id, outlet_name, rows, schedule)))
+
+    return "\n\n".join(sections)
+
+
+@function_tool
+@coalesced("filter_menu_multi")
+def filter_menu_multi(
+    outlet_ids: List[int],
+    category: str = "",
+    is_veg: Optional[bool] = None,
+    is_spicy: Optional[bool] = None,
+    max_price: Optional[float] = None,
+    min_price: Optional[float] = None,
+    only_available_now: bool = True,
+) -> str:
+    """
+    filter_menu across several outlets at once (up to 20), e.g. "which of these outlets have Mapo Tofu".
+    Prefer this over calling filter_menu repeatedly.
+    """
+    outlet_ids = _batch_outlet_ids(outlet_ids)
+    if not outlet_ids:
+        return "Please provide at least one outlet_id."
+
+    conn = get_connection(role="replica")
+    cur = conn.cursor()
+    try:
+        outlets = _fetch_active_outlets(cur, outlet_ids)
+
+        execute(
+            cur,
+            "filter_menu_multi",
+            (list(outlets),) + _menu_filter_params(category, is_veg, is_spicy, max_price, min_price),
         )
+        rows_by_outlet: Dict[int, list] = {}
+        for row in cur.fetchall():
+            rows_by_outlet.setdefault(row[0], []).append(row[1:])
+
+        sections = []
+        for outlet_id in outlet_ids:
+            if outlet_id not in outlets:
+                sections.append(f"Outlet #{outlet_id} not found or is inactive.")
+                continue
+            rows = rows_by_outlet.get(outlet_id, [])
+            if only_available_now and rows:
+                schedule = get_outlet_schedule(outlet_id, cur=cur)
+                local_now = schedule.local_time()
+                rows = [row for row in rows if schedule.is_available(row[0], local_now)]
+            if not rows:
+                sections.append(f"No menu items found for outlet #{outlet_id} matching the filters.")
+                continue
+            sections.append("\n".join(_format_filtered_menu(outlet_id, outlets[outlet_id][0], rows)))
+
+        return "\n\n".join(sections)
     finally:
-        _close_cursor(cur)
+        close_cursor(cur)
+
 
 class OrderItemInput(BaseModel):
     menu_item_id: int
@@ -373,18 +482,69 @@ class CreateOrderPayload(BaseModel):
     customer_phone: Optional[str] = None
     customer_address: Optional[str] = None
     items: List[OrderItemInput]
+    idempotency_key: Optional[str] = None  # derived from session + cart when omitted; no session, no dedup
 
     model_config = ConfigDict(extra="forbid")  # no unknown keys
 
 
+def order_confirmation(
+    order_id: int,
+    outlet_name: str,
+    customer_name: str,
+    fulfillment_type: str,
+    order_items: List[dict],
+    total_amount: float,
+    ready_eta: datetime,
+    now: datetime,
+) -> str:
+    """The SUCCESS text of a created order (also stored as its idempotent response)."""
+    items_summary = ", ".join(
+        f"{item['quantity']}x item #{item['menu_item_id']}"
+        for item in order_items
+    )
+    return (
+        "SUCCESS: "
+        f"Order #{order_id} created successfully for {outlet_name}.\n"
+        f"Customer: {customer_name}\n"
+        f"Type: {fulfillment_type}\n"
+        f"Items: {items_summary}\n"
+        f"Total: ${total_amount:.2f}\n"
+        f"Estimated ready: in about {max(1, kitchen.eta_minutes(ready_eta, now))} min"
+    )
+
+
 @function_tool
-def create_order(payload: CreateOrderPayload) -> str:
+def create_order(wrapper: RunContextWrapper[Any], payload: CreateOrderPayload) -> str:
     """
     Create a new order with items.
+    Submitting the same cart again within the idempotency window returns the
+    original confirmation instead of creating a second order.
     """
-    conn = get_connection()
+    session_id = getattr(wrapper.context, "conversation_id", None)
+    idempotency_key = idempotency.resolve_key(payload, session_id)
+
+    # Duplicate submission answered from memory, no DB round trip
+    if idempotency_key is not None:
+        previous = idempotency.recall(idempotency_key)
+        if previous is not None:
+            return previous
+
+    # The order, its idempotency key and the kitchen load live on the outlet's shard
+    try:
+        shard = shard_for_outlet(payload.outlet_id)
+    except LookupError as e:
+        return f"ERROR: {e}"
+
+    conn = get_connection(shard=shard)
     cur = conn.cursor()
     try:
+        if idempotency_key is not None:
+            previous = idempotency.fetch_stored_response(cur, idempotency_key)
+            if previous is not None:
+                conn.rollback()
+                idempotency.remember(idempotency_key, previous)
+                return previous
+
         # ---------- Basic validation ----------
         outlet_id = payload.outlet_id
         if not outlet_id:
@@ -431,6 +591,8 @@ def create_order(payload: CreateOrderPayload) -> str:
         # ---------- Validate items & compute total ----------
         order_items: List[dict] = []
         total_amount = 0.0
+        schedule = get_outlet_schedule(outlet_id, cur=cur)
+        local_now = schedule.local_time()
 
         for item in items:
             menu_item_id = item.menu_item_id
@@ -447,7 +609,7 @@ def create_order(payload: CreateOrderPayload) -> str:
             # Look up menu item & availability
             cur.execute(
                 """
-                SELECT mi.id, mi.name, mi.base_price, oma.is_available
+                SELECT mi.id, mi.name, mi.base_price, oma.is_available, mi.category
                 FROM menu_items mi
                 INNER JOIN outlet_menu_availability oma ON oma.menu_item_id = mi.id
                 WHERE mi.id = %s
@@ -464,8 +626,8 @@ def create_order(payload: CreateOrderPayload) -> str:
                     f"or not available at this outlet."
                 )
 
-            item_id, item_name, unit_price, is_available = menu_row
-            if not is_available:
+            item_id, item_name, unit_price, is_available, category = menu_row
+            if not is_available or not schedule.is_available(item_id, local_now):
                 conn.rollback()
                 return (
                     f"ERROR: Menu item #{menu_item_id} ({item_name}) "
@@ -481,11 +643,36 @@ def create_order(payload: CreateOrderPayload) -> str:
                     "quantity": quantity,
                     "unit_price": float(unit_price),
                     "line_total": line_total,
+                    "category": category,
                 }
             )
 
-        # ---------- Insert into orders ----------
+        # ---------- Claim idempotency key ----------
+        if idempotency_key is not None and not idempotency.claim(cur, idempotency_key):
+            # A concurrent duplicate committed first; return its result
+            conn.rollback()
+            previous = idempotency.fetch_stored_response(cur, idempotency_key)
+            conn.rollback()
+            if previous is None:
+                return "ERROR: An identical order is already being processed. Please wait."
+            idempotency.remember(idempotency_key, previous)
+            return previous
+
+        # ---------- Quote kitchen wait ----------
         now = datetime.now(timezone.utc)
+        prep_seconds = kitchen.estimate_prep_seconds(
+            (item["category"], item["quantity"]) for item in order_items
+        )
+        ready_eta, wait_seconds = kitchen.quote(cur, outlet_id, prep_seconds, now)
+        if kitchen.is_throttled(wait_seconds):
+            conn.rollback()
+            return (
+                f"ERROR: {outlet_name} (Outlet #{outlet_id}) is at kitchen capacity right now "
+                f"(about {int(wait_seconds // 60)} min wait). Please try again shortly or choose another outlet."
+            )
+        kitchen.commit_quote(cur, outlet_id, prep_seconds)
+
+        # ---------- Insert into orders ----------
         cur.execute(
             """
             INSERT INTO orders (
@@ -497,9 +684,11 @@ def create_order(payload: CreateOrderPayload) -> str:
                 customer_address,
                 created_at,
                 updated_at,
-                total_amount
+                total_amount,
+                prep_seconds,
+                ready_eta
             )
-            VALUES (%s, 'PENDING', %s, %s, %s, %s, %s, %s, %s)
+            VALUES (%s, 'PENDING', %s, %s, %s, %s, %s, %s, %s, %s, %s)
             RETURNING id
             """,
             (
@@ -511,6 +700,8 @@ def create_order(payload: CreateOrderPayload) -> str:
                 now,
                 now,
                 total_amount,
+                prep_seconds,
+                ready_eta,
             ),
         )
         order_id = cur.fetchone()[0]
@@ -521,15 +712,17 @@ def create_order(payload: CreateOrderPayload) -> str:
                 """
                 INSERT INTO order_items (
                     order_id,
+                    order_created_at,
                     menu_item_id,
                     quantity,
                     unit_price,
                     line_total
                 )
-                VALUES (%s, %s, %s, %s, %s)
+                VALUES (%s, %s, %s, %s, %s, %s)
                 """,
                 (
                     order_id,
+                    now,
                     item["menu_item_id"],
                     item["quantity"],
                     item["unit_price"],
@@ -537,22 +730,19 @@ def create_order(payload: CreateOrderPayload) -> str:
                 ),
             )
 
-        conn.commit()
-
         # ---------- Build confirmation message ----------
-        items_summary = ", ".join(
-            f"{item['quantity']}x item #{item['menu_item_id']}"
-            for item in order_items
+        confirmation = order_confirmation(
+            order_id, outlet_name, customer_name, fulfillment_type, order_items, total_amount, ready_eta, now
         )
 
-        return (
-            "SUCCESS: "
-            f"Order #{order_id} created successfully for {outlet_name}.\n"
-            f"Customer: {customer_name}\n"
-            f"Type: {fulfillment_type}\n"
-            f"Items: {items_summary}\n"
-            f"Total: ${total_amount:.2f}"
-        )
+        if idempotency_key is not None:
+            idempotency.complete(cur, idempotency_key, order_id, confirmation)
+        conn.commit()
+        note_write(conn)
+        if idempotency_key is not None:
+            idempotency.remember(idempotency_key, confirmation)
+
+        return confirmation
 
     except Exception as e:
         conn.rollback()
@@ -564,35 +754,25 @@ def create_order(payload: CreateOrderPayload) -> str:
 
 
 @function_tool
+@coalesced("get_order_status")
 def get_order_status(order_id: int) -> str:
     """
     Get detailed status and information for a specific order.
     """
-    conn = get_connection()
+    try:
+        shard = shard_for_order(order_id)
+    except LookupError:
+        return f"Order #{order_id} not found."
+
+    conn = get_connection(role="replica", shard=shard)
     cur = conn.cursor()
     try:
-        # Get order details
-        cur.execute(
-            """
-            SELECT 
-                o.id,
-                o.status,
-                o.fulfillment_type,
-                o.customer_name,
-                o.customer_phone,
-                o.customer_address,
-                o.total_amount,
-                o.created_at,
-                o.updated_at,
-                o.outlet_id,
-                out.name AS outlet_name
-            FROM orders o
-            INNER JOIN outlets out ON out.id = o.outlet_id
-            WHERE o.id = %s
-            """,
-            (order_id,),
-        )
-        order_row = cur.fetchone()
+        # Get order details, searching recent partitions first
+        def fetch_header(created_after):
+            execute(cur, "order_header", (order_id, created_after))
+            return cur.fetchone()
+
+        order_row = recent_first(fetch_header)
         if not order_row:
             return f"Order #{order_id} not found."
 
@@ -608,28 +788,19 @@ def get_order_status(order_id: int) -> str:
             updated_at,
             outlet_id,
             outlet_name,
+            ready_eta,
+            outlet_timezone,
         ) = order_row
 
         # Get order items
-        cur.execute(
-            """
-            SELECT 
-                oi.quantity,
-                oi.unit_price,
-                oi.line_total,
-                mi.name,
-                mi.category
-            FROM order_items oi
-            INNER JOIN menu_items mi ON mi.id = oi.menu_item_id
-            WHERE oi.order_id = %s
-            ORDER BY oi.id
-            """,
-            (order_id,),
-        )
+        execute(cur, "order_lines", (order_id, created_at))
         items = cur.fetchall()
 
-        lines = [
-            f"Order #{order_id} Status: {status}",
+        lines = [f"Order #{order_id} Status: {status}"]
+        eta_line = kitchen.describe_eta(status, ready_eta, timezone_str=outlet_timezone)
+        if eta_line:
+            lines.append(eta_line)
+        lines += [
             f"Outlet: {outlet_name} (Outlet #{outlet_id})",
             f"Customer: {customer_name}",
         ]
@@ -653,7 +824,7 @@ def get_order_status(order_id: int) -> str:
 
         return "\n".join(lines)
     finally:
-        _close_cursor(cur)
+        close_cursor(cur)
 
 
 OrderStatusLiteral = Literal[
@@ -677,19 +848,27 @@ def update_order_status(order_id: int, new_status: OrderStatusLiteral) -> str:
     - COMPLETED
     - CANCELLED
     """
-    conn = get_connection()
+    try:
+        shard = shard_for_order(order_id)
+    except LookupError:
+        return f"Order #{order_id} not found."
+
+    conn = get_connection(shard=shard)
     cur = conn.cursor()
     try:
         # 1) Check that the order exists and see its current status
-        cur.execute(
-            "SELECT status FROM orders WHERE id = %s",
-            (order_id,),
-        )
-        row = cur.fetchone()
+        def fetch_status(created_after):
+            cur.execute(
+                "SELECT status, created_at FROM orders WHERE id = %s AND created_at >= %s",
+                (order_id, created_after),
+            )
+            return cur.fetchone()
+
+        row = recent_first(fetch_status)
         if not row:
             return f"Order #{order_id} not found."
 
-        current_status = row[0]
+        current_status, created_at = row
 
         # 2) If it's already in that status, no need to update
         if current_status == new_status:
@@ -701,15 +880,83 @@ def update_order_status(order_id: int, new_status: OrderStatusLiteral) -> str:
             UPDATE orders
             SET status = %s,
                 updated_at = NOW()
-            WHERE id = %s
+            WHERE id = %s AND created_at = %s
             """,
-            (new_status, order_id),
+            (new_status, order_id, created_at),
         )
         conn.commit()
+        note_write(conn)
 
         return f"Order #{order_id} status updated from {current_status} to {new_status}."
     except Exception as e:
         conn.rollback()
         return f"Error updating order status: {str(e)}"
     finally:
-        _close_cursor(cur)
+        close_cursor(cur)
+
+
+# ---------- Benchmark ----------
+
+# Multi-outlet questions, one per batch tool; {ids} is "1, 2 and 3"
+BENCHMARK_QUESTIONS = [
+    ("is_outlets_open", "Are outlets {ids} open right now?"),
+    ("get_outlet_menus", "Show me the menu of outlets {ids}"),
+    ("filter_menu_multi", "Vegetarian items under $15 at outlets {ids}"),
+]
+
+
+def _benchmark(outlet_counts: List[int], repeats: int, latency_ms: float) -> None:
+    """
+    For each question and number of outlets, run full turns with the
+    specialist calling one tool per outlet (one response each, or all in
+    one response) and with the batch tool; report model requests and wall
+    clock per turn. The model is the stub from services/stub_model.py, the
+    tools run on the configured database.
+
+    Run with: python -m db.queries --benchmark [--outlets 2 4 8] [--latency-ms 400]
+    """
+    import time as clock
+
+    from services import chat_service, speculation, stub_model
+
+    settings = stub_model.install(latency_ms=latency_ms, jitter=0.0)
+    chat_service.RESPONSE_CACHE_ENABLED = False  # repeated questions must reach the model
+    speculation.SPECULATION_ENABLED = False  # router and specialist run one after the other
+
+    async def turn(message: str) -> Tuple[int, float]:
+        stub_model.reset_stats()
+        started = clock.perf_counter()
+        await chat_service.handle_user_message("batch-bench", message, None)
+        return stub_model.stub_stats()["requests"], clock.perf_counter() - started
+
+    async def run() -> None:
+        await turn(BENCHMARK_QUESTIONS[0][1].format(ids="1 and 2"))  # warm agents, tools and connections
+        print(f"model latency {latency_ms:.0f} ms; model requests per turn (router included) and p50 wall clock")
+        print(f"{'tool':<18} {'outlets':>7}  {'sequential':>18}  {'parallel':>18}  {'batch':>18}")
+        for tool, question in BENCHMARK_QUESTIONS:
+            for count in outlet_counts:
+                ids = [str(n) for n in range(1, count + 1)]
+                message = question.format(ids=", ".join(ids[:-1]) + " and " + ids[-1])
+                cells = []
+                for mode in ("sequential", "parallel", "batch"):
+                    settings.tool_mode = mode
+                    samples = [await turn(message) for _ in range(repeats)]
+                    requests = samples[-1][0]
+                    wall = statistics.median(seconds for _, seconds in samples)
+                    cells.append(f"{requests:>3} req {wall * 1e3:>7.0f} ms")
+                print(f"{tool:<18} {count:>7}  " + "  ".join(f"{cell:>18}" for cell in cells))
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure multi-outlet questions with and without the batch tools.")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--outlets", type=int, nargs="+", default=[2, 4, 8], help="outlets per question")
+    parser.add_argument("--repeats", type=int, default=5, help="turns per question, outlet count and mode")
+    parser.add_argument("--latency-ms", type=float, default=400, help="latency of one model request")
+    args = parser.parse_args()
+    if args.benchmark:
+        _benchmark(args.outlets, args.repeats, args.latency_ms)
+    else:
+        parser.print_help()
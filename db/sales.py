@@ -0,0 +1,446 @@
+"""
+Sales aggregates and popular-item recommendations.
+
+`outlet_item_daily_sales` keeps per outlet x item x day counts and revenue.
+It is maintained by a batched, watermark-based rollup (run it on a schedule
+next to update_status.py) instead of per-row triggers, so the order write
+path never contends on hot aggregate rows. Cancelling an order that was
+already rolled up subtracts it again via a trigger on `orders`.
+
+The watermark is an order_items id, and ids are taken from the sequence
+before their transaction commits. A batch therefore ends at the newest row
+whose order is ROLLUP_SAFETY_SECONDS old: every id below it belongs to a
+transaction that has finished, as long as no order transaction stays open
+for more than half of that. Batches also end on order boundaries, so an
+order is counted in order_count once.
+
+`top_items` reads only the aggregates.
+
+Run with: python -m db.sales          (roll up everything new)
+          python -m db.sales --lag    (report freshness only)
+          python -m db.sales --benchmark
+          (aggregates vs a raw scan of order_items for top_items, and the
+          rollup's lag under a steady order stream, on a synthetic history
+          in a scratch schema; Postgres only)
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from agents import function_tool
+
+from .connection import DB_BACKEND, close_cursor, get_connection, shard_for_outlet, shard_names
+from .single_flight import coalesced
+
+ROLLUP_BATCH_SIZE = 50_000
+# Rows are rolled up once their order is this old (see the module docstring)
+ROLLUP_SAFETY_SECONDS = float(os.getenv("ROLLUP_SAFETY_SECONDS", "300"))
+MAX_WINDOW_DAYS = 365
+
+
+def _order_boundary(cur, watermark: int, upper: int) -> int:
+    """
+    Move `upper` so that no order has items on both sides of it: down to
+    just below the first item of an order that continues past it, or, if
+    that empties the batch, up to the last item of every order in it.
+    """
+    straddling = """
+        SELECT MIN(oi.id)
+        FROM order_items oi
+        WHERE oi.id > %s AND oi.id <= %s
+          AND EXISTS (SELECT 1 FROM order_items later WHERE later.order_id = oi.order_id AND later.id > %s)
+    """
+    lowered = upper
+    while True:
+        cur.execute(straddling, (watermark, lowered, lowered))
+        first = cur.fetchone()[0]
+        if first is None:
+            return lowered
+        lowered = first - 1
+        if lowered <= watermark:
+            break
+
+    # One order spans the whole batch: take its orders in full instead
+    while True:
+        cur.execute(
+            """
+            SELECT MAX(oi.id)
+            FROM order_items oi
+            WHERE oi.order_id IN (SELECT order_id FROM order_items WHERE id > %s AND id <= %s)
+            """,
+            (watermark, upper),
+        )
+        extended = cur.fetchone()[0]
+        if extended == upper:
+            return upper
+        upper = extended
+
+
+def rollup_sales(
+    batch_size: int = ROLLUP_BATCH_SIZE,
+    shard: Optional[str] = None,
+    safety_seconds: Optional[float] = None,
+) -> int:
+    """
+    Fold order_items rows past the watermark into the daily aggregates (of
+    one shard: each keeps its own outlets' aggregates and watermark). Rows
+    of orders younger than `safety_seconds` (default ROLLUP_SAFETY_SECONDS)
+    wait for the next run. Each batch is its own transaction; returns the
+    number of rows rolled up.
+    """
+    if safety_seconds is None:
+        safety_seconds = ROLLUP_SAFETY_SECONDS
+    conn = get_connection(shard=shard)
+    cur = conn.cursor()
+    rolled = 0
+    try:
+        while True:
+            # Lock the watermark so concurrent rollups cannot double count
+            cur.execute("SELECT last_order_item_id FROM sales_rollup_state WHERE id = 1 FOR UPDATE")
+            watermark = cur.fetchone()[0]
+
+            cur.execute(
+                """
+                SELECT MAX(id) FROM (
+                    SELECT id FROM order_items
+                    WHERE id > %s
+                      AND order_created_at < NOW() - make_interval(secs => %s)
+                    ORDER BY id
+                    LIMIT %s
+                ) batch
+                """,
+                (watermark, safety_seconds, batch_size),
+            )
+            upper = cur.fetchone()[0]
+            if upper is None:
+                conn.commit()
+                return rolled
+            upper = _order_boundary(cur, watermark, upper)
+
+            cur.execute(
+                """
+                INSERT INTO outlet_item_daily_sales
+                    (outlet_id, menu_item_id, sales_date, order_count, quantity, revenue)
+                SELECT
+                    o.outlet_id,
+                    oi.menu_item_id,
+                    (o.created_at AT TIME ZONE COALESCE(out.timezone, 'UTC'))::date,
+                    COUNT(DISTINCT oi.order_id),
+                    SUM(oi.quantity),
+                    SUM(oi.line_total)
+                FROM order_items oi
+                INNER JOIN orders o ON o.id = oi.order_id AND o.created_at = oi.order_created_at
+                INNER JOIN outlets out ON out.id = o.outlet_id
+                WHERE oi.id > %s AND oi.id <= %s
+                  AND o.status <> 'CANCELLED'
+                GROUP BY 1, 2, 3
+                ON CONFLICT (outlet_id, sales_date, menu_item_id) DO UPDATE
+                SET order_count = outlet_item_daily_sales.order_count + EXCLUDED.order_count,
+                    quantity    = outlet_item_daily_sales.quantity + EXCLUDED.quantity,
+                    revenue     = outlet_item_daily_sales.revenue + EXCLUDED.revenue
+                """,
+                (watermark, upper),
+            )
+            cur.execute(
+                "SELECT COUNT(*) FROM order_items WHERE id > %s AND id <= %s",
+                (watermark, upper),
+            )
+            rolled += cur.fetchone()[0]
+
+            cur.execute(
+                """
+                UPDATE sales_rollup_state
+                SET last_order_item_id = %s,
+                    rolled_at = NOW()
+                WHERE id = 1
+                """,
+                (upper,),
+            )
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_cursor(cur)
+
+
+def rollup_lag(shard: Optional[str] = None) -> dict:
+    """Freshness of the aggregates: rows and seconds behind order_items."""
+    conn = get_connection(shard=shard)
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT
+                s.last_order_item_id,
+                (SELECT COUNT(*) FROM order_items oi WHERE oi.id > s.last_order_item_id),
+                EXTRACT(EPOCH FROM NOW() - s.rolled_at)
+            FROM sales_rollup_state s
+            WHERE s.id = 1
+            """
+        )
+        watermark, pending_rows, seconds_since_rollup = cur.fetchone()
+        return {
+            "watermark": watermark,
+            "pending_rows": pending_rows,
+            "seconds_since_rollup": float(seconds_since_rollup or 0),
+        }
+    finally:
+        close_cursor(cur)
+
+
+def _local_today(timezone: Optional[str]):
+    """Today's date at the outlet; sales_date is outlet-local too."""
+    import pytz  # deferred like in queries.is_outlet_open
+
+    try:
+        tz = pytz.timezone(timezone) if timezone else pytz.utc
+    except Exception:
+        tz = pytz.utc
+    return datetime.now(tz).date()
+
+
+@function_tool
+@coalesced("top_items")
+def top_items(
+    outlet_id: int,
+    window_days: int = 30,
+    category: str = "",
+    is_veg: Optional[bool] = None,
+    limit: int = 5,
+) -> str:
+    """
+    Most popular menu items at an outlet over the last `window_days` days,
+    optionally filtered by category and vegetarian. Use for recommendations.
+    """
+    window_days = max(1, min(int(window_days or 30), MAX_WINDOW_DAYS))
+    limit = max(1, min(int(limit or 5), 20))
+
+    conditions = [
+        "s.outlet_id = %s",
+        "s.sales_date >= %s",
+        "mi.is_active = TRUE",
+    ]
+    params = [outlet_id, None]  # first day of the window, in the outlet's timezone (below)
+
+    if category.strip():
+        conditions.append("mi.category ILIKE %s")
+        params.append(f"%{category.strip()}%")
+
+    if is_veg is not None:
+        conditions.append("mi.is_veg = %s")
+        params.append(is_veg)
+
+    params.append(limit)
+
+    try:
+        shard = shard_for_outlet(outlet_id)
+    except LookupError as e:
+        return f"ERROR: {e}"
+
+    conn = get_connection(role="replica", shard=shard)
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT name, timezone FROM outlets WHERE id = %s AND is_active = TRUE", (outlet_id,))
+        outlet_row = cur.fetchone()
+        if not outlet_row:
+            return f"Outlet #{outlet_id} not found or is inactive."
+
+        outlet_name, outlet_timezone = outlet_row
+        params[1] = _local_today(outlet_timezone) - timedelta(days=window_days)
+
+        cur.execute(
+            """
+            SELECT
+                mi.id,
+                mi.name,
+                mi.category,
+                mi.base_price,
+                mi.is_veg,
+                mi.is_spicy,
+                SUM(s.quantity) AS units,
+                SUM(s.order_count) AS orders
+            FROM outlet_item_daily_sales s
+            INNER JOIN menu_items mi ON mi.id = s.menu_item_id
+            WHERE """ + " AND ".join(conditions) + """
+            GROUP BY mi.id, mi.name, mi.category, mi.base_price, mi.is_veg, mi.is_spicy
+            ORDER BY units DESC, orders DESC, mi.name
+            LIMIT %s
+            """,
+            params,
+        )
+        rows = cur.fetchall()
+
+        if not rows:
+            return f"No sales data yet for outlet #{outlet_id} in the last {window_days} days matching the filters."
+
+        lines = [f"Most popular at {outlet_name} (Outlet #{outlet_id}), last {window_days} days:"]
+        for rank, (item_id, name, cat, price, veg, spicy, units, orders) in enumerate(rows, start=1):
+            tags = []
+            if veg:
+                tags.append("Vegetarian")
+            if spicy:
+                tags.append("Spicy")
+            tag_str = f" [{', '.join(tags)}]" if tags else ""
+            lines.append(
+                f"  {rank}. #{item_id} {name}{tag_str} ({cat}) - ${price:.2f} | "
+                f"{units} sold in {orders} orders"
+            )
+
+        return "\n".join(lines)
+    finally:
+        close_cursor(cur)
+
+
+# ---------- Benchmark ----------
+
+BENCH_SCHEMA = "sales_bench"
+
+# top_items without the aggregates: the same ranking straight from order_items
+RAW_TOP_ITEMS = """
+    SELECT
+        mi.id,
+        mi.name,
+        SUM(oi.quantity) AS units,
+        COUNT(DISTINCT oi.order_id) AS orders
+    FROM order_items oi
+    INNER JOIN orders o ON o.id = oi.order_id AND o.created_at = oi.order_created_at
+    INNER JOIN menu_items mi ON mi.id = oi.menu_item_id
+    WHERE o.outlet_id = %s
+      AND o.created_at >= NOW() - make_interval(days => %s)
+      AND o.status <> 'CANCELLED'
+      AND mi.is_active = TRUE
+    GROUP BY mi.id, mi.name
+    ORDER BY units DESC, orders DESC, mi.name
+    LIMIT 5
+"""
+
+
+def _ms(samples: List[float]) -> str:
+    ordered = sorted(samples)
+    return f"p50 {statistics.median(ordered):8.2f} ms  p99 {ordered[int(len(ordered) * 0.99)]:8.2f} ms"
+
+
+def _benchmark(orders: int, months: int, lookups: int, ticks: int, tick_orders: int, interval: float) -> None:
+    """
+    On `orders` synthetic orders in a scratch schema (dropped afterwards):
+    the initial rollup, top_items from the aggregates vs the same ranking
+    scanned from order_items, then `ticks` rounds of new orders followed by
+    an incremental rollup, reporting the lag it clears and what it costs.
+    """
+    from . import single_flight
+    from .partitions import load_bench_history, use_bench_schema
+
+    use_bench_schema(BENCH_SCHEMA)
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        load_bench_history(cur, BENCH_SCHEMA, orders, months)
+        for table in ("outlet_item_daily_sales", "sales_rollup_state"):
+            cur.execute(f"CREATE TABLE {BENCH_SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)")
+        cur.execute(f"INSERT INTO {BENCH_SCHEMA}.sales_rollup_state (id) VALUES (1)")
+
+        started = time.perf_counter()
+        rolled = rollup_sales(safety_seconds=0)  # the benchmark is the only writer
+        seconds = time.perf_counter() - started
+        cur.execute("SELECT COUNT(*) FROM outlet_item_daily_sales")
+        print(
+            f"initial rollup: {rolled:,} rows in {seconds:,.1f} s ({rolled / seconds:,.0f} rows/s) "
+            f"-> {cur.fetchone()[0]:,} aggregate rows"
+        )
+
+        cur.execute("SELECT id FROM outlets WHERE is_active ORDER BY id")
+        outlet_ids = [row[0] for row in cur.fetchall()]
+        tool = single_flight.read_only_tool("top_items")
+        single_flight.set_enabled("top_items", False)  # every call runs its query
+        for window in (7, 30, 365):
+            aggregates, raw = [], []
+            for _ in range(lookups):
+                outlet_id = random.choice(outlet_ids)
+                started = time.perf_counter()
+                tool(outlet_id, window_days=window)
+                aggregates.append((time.perf_counter() - started) * 1e3)
+            for _ in range(max(1, lookups // 20)):  # the raw scan is slow; fewer samples
+                started = time.perf_counter()
+                cur.execute(RAW_TOP_ITEMS, (random.choice(outlet_ids), window))
+                cur.fetchall()
+                raw.append((time.perf_counter() - started) * 1e3)
+            print(f"top_items {window:>3}d  aggregates {_ms(aggregates)}   raw scan {_ms(raw)}")
+
+        # Freshness: orders keep arriving; each tick rolls up what arrived since the last one
+        cur.execute("SELECT array_agg(id ORDER BY id) FROM menu_items WHERE is_active")
+        items = cur.fetchone()[0]
+        next_id = orders + 1
+        lags, rollup_ms = [], []
+        for _ in range(ticks):
+            cur.execute(
+                """
+                INSERT INTO orders
+                    (id, outlet_id, status, fulfillment_type, customer_name, customer_phone,
+                     created_at, updated_at, total_amount)
+                SELECT g, (%(outlets)s::int[])[1 + g %% cardinality(%(outlets)s::int[])],
+                       'PENDING', 'PICKUP', 'Customer', '555-0000000', NOW(), NOW(), 20
+                FROM generate_series(%(lo)s::bigint, %(hi)s::bigint) g
+                """,
+                {"outlets": outlet_ids, "lo": next_id, "hi": next_id + tick_orders - 1},
+            )
+            cur.execute(
+                """
+                INSERT INTO order_items
+                    (id, order_id, order_created_at, menu_item_id, quantity, unit_price, line_total)
+                SELECT o.id * 2 + k, o.id, o.created_at,
+                       (%(items)s::int[])[1 + (o.id * 7 + k) %% cardinality(%(items)s::int[])], 1, 10, 10
+                FROM orders o, generate_series(0, 1) k
+                WHERE o.id BETWEEN %(lo)s AND %(hi)s
+                """,
+                {"items": items, "lo": next_id, "hi": next_id + tick_orders - 1},
+            )
+            next_id += tick_orders
+            time.sleep(interval)
+            lag = rollup_lag()
+            lags.append(lag)
+            started = time.perf_counter()
+            rollup_sales(safety_seconds=0)
+            rollup_ms.append((time.perf_counter() - started) * 1e3)
+        pending = [lag["pending_rows"] for lag in lags]
+        behind = [lag["seconds_since_rollup"] for lag in lags]
+        print(
+            f"freshness over {ticks} ticks of {tick_orders} orders every {interval:g} s: "
+            f"up to {max(pending):,} rows / {max(behind):.1f} s behind before each rollup; "
+            f"incremental rollup {_ms(rollup_ms)}"
+        )
+    finally:
+        cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        cur.close()
+        conn.autocommit = False  # pooled connections go back in their usual mode
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Roll up order_items into outlet_item_daily_sales.")
+    parser.add_argument("--lag", action="store_true", help="only report rollup freshness")
+    parser.add_argument("--batch-size", type=int, default=ROLLUP_BATCH_SIZE)
+    parser.add_argument("--benchmark", action="store_true", help="aggregates vs raw scan, and rollup lag")
+    parser.add_argument("--orders", type=int, default=1_000_000, help="benchmark size")
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--lookups", type=int, default=200, help="top_items calls per window")
+    parser.add_argument("--ticks", type=int, default=20, help="order-stream rounds, each followed by a rollup")
+    parser.add_argument("--tick-orders", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between a round's orders and its rollup")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        if DB_BACKEND == "sqlite":
+            parser.error("the sales benchmark loads a partitioned scratch schema and needs Postgres")
+        _benchmark(args.orders, args.months, args.lookups, args.ticks, args.tick_orders, args.interval)
+    else:
+        for shard in shard_names():
+            prefix = f"[{shard}] " if shard else ""
+            if not args.lag:
+                print(f"{prefix}Rolled up {rollup_sales(args.batch_size, shard)} order item rows.")
+            print(f"{prefix}{rollup_lag(shard)}")
@@ -7,6 +7,7 @@ CREATE TABLE outlets (
   city              VARCHAR(100),
   state             VARCHAR(50),
   zip_code          VARCHAR(20),
+  region            VARCHAR(20),       -- west, central, east: shard owning its orders
   timezone          VARCHAR(100),
   is_active         BOOLEAN NOT NULL DEFAULT TRUE,
   supports_delivery BOOLEAN NOT NULL DEFAULT TRUE,
@@ -43,33 +44,197 @@ CREATE TABLE outlet_menu_availability (
   CONSTRAINT uq_outlet_menu UNIQUE (outlet_id, menu_item_id)
 );
 
--- Orders
+-- Orders, range-partitioned by month of created_at. Monthly partitions are
+-- created ahead and old ones archived by db/partitions.py.
 CREATE TABLE orders (
-  id               SERIAL PRIMARY KEY,
+  id               SERIAL,
   outlet_id        INTEGER NOT NULL,
   status           VARCHAR(50) NOT NULL,      -- PENDING, IN_KITCHEN, READY, COMPLETED, CANCELLED
   fulfillment_type VARCHAR(50) NOT NULL,      -- PICKUP, DELIVERY
   customer_name    VARCHAR(255),
   customer_phone   VARCHAR(50),
+  customer_phone_digits VARCHAR(50)           -- normalized phone for history lookups
+    GENERATED ALWAYS AS (regexp_replace(customer_phone, '[^0-9]', '', 'g')) STORED,
   customer_address TEXT,                      -- for delivery, NULL for pickup
   created_at       TIMESTAMPTZ NOT NULL,
   updated_at       TIMESTAMPTZ NOT NULL,
   total_amount     NUMERIC(10, 2) NOT NULL,
+  prep_seconds     INTEGER,                   -- kitchen estimate, see db/kitchen.py
+  ready_eta        TIMESTAMPTZ,               -- ready time quoted at creation
+  PRIMARY KEY (id, created_at),
   CONSTRAINT fk_orders_outlet
     FOREIGN KEY(outlet_id) REFERENCES outlets(id)
-);
+) PARTITION BY RANGE (created_at);
 
--- Order line items
+-- Order line items, partitioned like their order (order_created_at = orders.created_at)
 CREATE TABLE order_items (
-  id           SERIAL PRIMARY KEY,
-  order_id     INTEGER NOT NULL,
-  menu_item_id INTEGER NOT NULL,
-  quantity     INTEGER NOT NULL,
-  unit_price   NUMERIC(10, 2) NOT NULL,      -- price at time of order
-  line_total   NUMERIC(10, 2) NOT NULL,
+  id               SERIAL,
+  order_id         INTEGER NOT NULL,
+  order_created_at TIMESTAMPTZ NOT NULL,
+  menu_item_id     INTEGER NOT NULL,
+  quantity         INTEGER NOT NULL,
+  unit_price       NUMERIC(10, 2) NOT NULL,      -- price at time of order
+  line_total       NUMERIC(10, 2) NOT NULL,
+  PRIMARY KEY (id, order_created_at),
   CONSTRAINT fk_order_items_order
-    FOREIGN KEY(order_id) REFERENCES orders(id) ON DELETE CASCADE,
+    FOREIGN KEY(order_id, order_created_at) REFERENCES orders(id, created_at) ON DELETE CASCADE,
   CONSTRAINT fk_order_items_menu
     FOREIGN KEY(menu_item_id) REFERENCES menu_items(id),
   CONSTRAINT ck_order_items_quantity CHECK (quantity > 0)
+) PARTITION BY RANGE (order_created_at);
+
+-- Create the monthly partitions of orders and order_items for `months`
+-- months starting at `first_month` (UTC); existing ones are skipped
+CREATE OR REPLACE FUNCTION create_order_partitions(first_month DATE, months INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+  month_start TIMESTAMPTZ;
+  month_end   TIMESTAMPTZ;
+  suffix      TEXT;
+  created     INTEGER := 0;
+BEGIN
+  FOR i IN 0 .. months - 1 LOOP
+    month_start := (date_trunc('month', first_month::timestamp) + make_interval(months => i)) AT TIME ZONE 'UTC';
+    month_end   := (date_trunc('month', first_month::timestamp) + make_interval(months => i + 1)) AT TIME ZONE 'UTC';
+    suffix      := to_char(month_start AT TIME ZONE 'UTC', 'YYYY_MM');
+    IF to_regclass('orders_' || suffix) IS NULL THEN
+      EXECUTE format('CREATE TABLE %I PARTITION OF orders FOR VALUES FROM (%L) TO (%L)',
+                     'orders_' || suffix, month_start, month_end);
+      EXECUTE format('CREATE TABLE %I PARTITION OF order_items FOR VALUES FROM (%L) TO (%L)',
+                     'order_items_' || suffix, month_start, month_end);
+      created := created + 1;
+    END IF;
+  END LOOP;
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Last month through three months ahead
+SELECT create_order_partitions((CURRENT_DATE - INTERVAL '1 month')::date, 5);
+
+-- Customer history: keyset pages of a phone's orders, newest first
+CREATE INDEX idx_orders_phone_history ON orders (customer_phone_digits, created_at DESC, id DESC);
+
+-- Item lookups by order (order status, history summaries, reorder)
+CREATE INDEX idx_order_items_order ON order_items (order_id, order_created_at);
+
+-- Lifecycle sweep in update_status.py: only open orders are visited
+CREATE INDEX idx_orders_open ON orders (created_at)
+  WHERE status IN ('PENDING', 'CONFIRMED', 'IN_KITCHEN', 'READY');
+
+-- Idempotency keys for order creation (dedupes retried create_order calls)
+CREATE TABLE order_idempotency_keys (
+  idempotency_key VARCHAR(128) PRIMARY KEY,
+  order_id        INTEGER,                   -- NULL until the order is written; no FK,
+                                             -- order partitions get archived
+  response        TEXT,                      -- original SUCCESS text
+  created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Catalog version: bumped on any write to outlets / menu / availability,
+-- used to invalidate cached answers and menus
+CREATE TABLE catalog_version (
+  id         INTEGER PRIMARY KEY CHECK (id = 1),
+  version    BIGINT NOT NULL DEFAULT 1,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
+INSERT INTO catalog_version (id, version) VALUES (1, 1);
+
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE catalog_version SET version = version + 1, updated_at = NOW() WHERE id = 1;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_outlets_catalog_version
+  AFTER INSERT OR UPDATE OR DELETE ON outlets
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+CREATE TRIGGER trg_menu_items_catalog_version
+  AFTER INSERT OR UPDATE OR DELETE ON menu_items
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+CREATE TRIGGER trg_oma_catalog_version
+  AFTER INSERT OR UPDATE OR DELETE ON outlet_menu_availability
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+-- Sales aggregates per outlet x item x day (outlet-local date), maintained by
+-- the batched rollup in db/sales.py; read by the top_items tool
+CREATE TABLE outlet_item_daily_sales (
+  outlet_id    INTEGER NOT NULL,
+  menu_item_id INTEGER NOT NULL,
+  sales_date   DATE NOT NULL,
+  order_count  INTEGER NOT NULL DEFAULT 0,
+  quantity     INTEGER NOT NULL DEFAULT 0,
+  revenue      NUMERIC(12, 2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (outlet_id, sales_date, menu_item_id)
+);
+
+-- Rollup watermark: highest order_items.id folded into the aggregates
+CREATE TABLE sales_rollup_state (
+  id                 INTEGER PRIMARY KEY CHECK (id = 1),
+  last_order_item_id BIGINT NOT NULL DEFAULT 0,
+  rolled_at          TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+INSERT INTO sales_rollup_state (id) VALUES (1);
+
+-- Cancelling an already rolled-up order takes it back out of the aggregates
+CREATE OR REPLACE FUNCTION unroll_cancelled_order() RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE outlet_item_daily_sales s
+  SET order_count = s.order_count - 1,
+      quantity    = s.quantity - agg.quantity,
+      revenue     = s.revenue - agg.revenue
+  FROM (
+    SELECT oi.menu_item_id, SUM(oi.quantity) AS quantity, SUM(oi.line_total) AS revenue
+    FROM order_items oi
+    WHERE oi.order_id = NEW.id
+      AND oi.order_created_at = NEW.created_at
+      AND oi.id <= (SELECT last_order_item_id FROM sales_rollup_state WHERE id = 1 FOR SHARE)
+    GROUP BY oi.menu_item_id
+  ) agg
+  WHERE s.outlet_id = NEW.outlet_id
+    AND s.menu_item_id = agg.menu_item_id
+    AND s.sales_date = (NEW.created_at AT TIME ZONE COALESCE(
+          (SELECT timezone FROM outlets WHERE id = NEW.outlet_id), 'UTC'))::date;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_orders_unroll_cancelled
+  AFTER UPDATE OF status ON orders
+  FOR EACH ROW WHEN (NEW.status = 'CANCELLED' AND OLD.status <> 'CANCELLED')
+  EXECUTE FUNCTION unroll_cancelled_order();
+
+-- Kitchen load per outlet: running totals of orders still in the kitchen
+-- (PENDING, CONFIRMED, IN_KITCHEN); see db/kitchen.py
+CREATE TABLE outlet_kitchen_load (
+  outlet_id           INTEGER PRIMARY KEY,
+  queued_orders       INTEGER NOT NULL DEFAULT 0,
+  queued_prep_seconds BIGINT NOT NULL DEFAULT 0,
+  updated_at          TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  CONSTRAINT fk_kitchen_load_outlet
+    FOREIGN KEY(outlet_id) REFERENCES outlets(id) ON DELETE CASCADE
+);
+
+-- An order leaving the kitchen takes its prep time off the outlet's totals
+CREATE OR REPLACE FUNCTION kitchen_dequeue() RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE outlet_kitchen_load
+  SET queued_orders       = GREATEST(queued_orders - 1, 0),
+      queued_prep_seconds = GREATEST(queued_prep_seconds - NEW.prep_seconds, 0),
+      updated_at          = NOW()
+  WHERE outlet_id = NEW.outlet_id;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_orders_kitchen_dequeue
+  AFTER UPDATE OF status ON orders
+  FOR EACH ROW WHEN (
+    NEW.prep_seconds IS NOT NULL
+    AND OLD.status IN ('PENDING', 'CONFIRMED', 'IN_KITCHEN')
+    AND NEW.status NOT IN ('PENDING', 'CONFIRMED', 'IN_KITCHEN')
+  )
+  EXECUTE FUNCTION kitchen_dequeue();
@@ -0,0 +1,189 @@
+-- SQLite form of schema_postgress.sql for the embedded backend (db/sqlite_backend.py).
+-- Same tables, columns and triggers. Declared types (BOOLEAN, TIME,
+-- TIMESTAMPTZ, NUMERIC) drive the converters, so rows come back with the
+-- Python types psycopg2 returns. Timestamps are stored as UTC ISO text.
+-- No partitions: orders and order_items are plain tables here. local_date()
+-- is registered by the backend on every connection (sqlite_backend._open).
+
+-- Outlets (restaurants)
+CREATE TABLE outlets (
+  id                INTEGER PRIMARY KEY,
+  name              VARCHAR(255) NOT NULL,
+  address           TEXT,
+  city              VARCHAR(100),
+  state             VARCHAR(50),
+  zip_code          VARCHAR(20),
+  region            VARCHAR(20),       -- west, central, east: shard owning its orders
+  timezone          VARCHAR(100),
+  is_active         BOOLEAN NOT NULL DEFAULT TRUE,
+  supports_delivery BOOLEAN NOT NULL DEFAULT TRUE,
+  supports_pickup   BOOLEAN NOT NULL DEFAULT TRUE,
+  open_time         TIME,              -- e.g. '08:00'
+  close_time        TIME               -- e.g. '22:00'
+);
+
+-- Master menu items (outlet-agnostic)
+CREATE TABLE menu_items (
+  id          INTEGER PRIMARY KEY,
+  name        VARCHAR(255) NOT NULL,
+  description TEXT,
+  category    VARCHAR(50) NOT NULL,    -- burger, side, drink, salad, breakfast, dessert...
+  base_price  NUMERIC(10, 2) NOT NULL,
+  is_veg      BOOLEAN NOT NULL DEFAULT FALSE,
+  is_spicy    BOOLEAN NOT NULL DEFAULT FALSE,
+  is_active   BOOLEAN NOT NULL DEFAULT TRUE
+);
+
+-- Per-outlet availability & time windows
+CREATE TABLE outlet_menu_availability (
+  id                  INTEGER PRIMARY KEY,
+  outlet_id           INTEGER NOT NULL REFERENCES outlets(id) ON DELETE CASCADE,
+  menu_item_id        INTEGER NOT NULL REFERENCES menu_items(id) ON DELETE CASCADE,
+  is_available        BOOLEAN NOT NULL DEFAULT TRUE,
+  available_from_time TIME,             -- e.g. '06:00'
+  available_to_time   TIME,             -- e.g. '11:00'
+  available_days      VARCHAR(50),      -- 'Mon-Fri', 'All', etc.
+  CONSTRAINT uq_outlet_menu UNIQUE (outlet_id, menu_item_id)
+);
+
+-- Orders
+CREATE TABLE orders (
+  id               INTEGER PRIMARY KEY,
+  outlet_id        INTEGER NOT NULL REFERENCES outlets(id),
+  status           VARCHAR(50) NOT NULL,      -- PENDING, IN_KITCHEN, READY, COMPLETED, CANCELLED
+  fulfillment_type VARCHAR(50) NOT NULL,      -- PICKUP, DELIVERY
+  customer_name    VARCHAR(255),
+  customer_phone   VARCHAR(50),
+  customer_phone_digits VARCHAR(50)           -- normalized phone for history lookups
+    GENERATED ALWAYS AS (
+      replace(replace(replace(replace(replace(replace(
+        customer_phone, ' ', ''), '-', ''), '(', ''), ')', ''), '.', ''), '+', '')
+    ) STORED,
+  customer_address TEXT,                      -- for delivery, NULL for pickup
+  created_at       TIMESTAMPTZ NOT NULL,
+  updated_at       TIMESTAMPTZ NOT NULL,
+  total_amount     NUMERIC(10, 2) NOT NULL,
+  prep_seconds     INTEGER,                   -- kitchen estimate, see db/kitchen.py
+  ready_eta        TIMESTAMPTZ                -- ready time quoted at creation
+);
+
+-- Order line items (order_created_at = orders.created_at, as on Postgres)
+CREATE TABLE order_items (
+  id               INTEGER PRIMARY KEY,
+  order_id         INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+  order_created_at TIMESTAMPTZ NOT NULL,
+  menu_item_id     INTEGER NOT NULL REFERENCES menu_items(id),
+  quantity         INTEGER NOT NULL CHECK (quantity > 0),
+  unit_price       NUMERIC(10, 2) NOT NULL,      -- price at time of order
+  line_total       NUMERIC(10, 2) NOT NULL
+);
+
+CREATE INDEX idx_orders_phone_history ON orders (customer_phone_digits, created_at DESC, id DESC);
+CREATE INDEX idx_order_items_order ON order_items (order_id, order_created_at);
+CREATE INDEX idx_orders_open ON orders (created_at)
+  WHERE status IN ('PENDING', 'CONFIRMED', 'IN_KITCHEN', 'READY');
+CREATE INDEX idx_oma_menu_item ON outlet_menu_availability (menu_item_id);
+
+-- Idempotency keys for order creation (dedupes retried create_order calls)
+CREATE TABLE order_idempotency_keys (
+  idempotency_key VARCHAR(128) PRIMARY KEY,
+  order_id        INTEGER,
+  response        TEXT,
+  created_at      TIMESTAMPTZ NOT NULL
+);
+
+-- Catalog version: bumped on any write to outlets / menu / availability
+CREATE TABLE catalog_version (
+  id         INTEGER PRIMARY KEY CHECK (id = 1),
+  version    BIGINT NOT NULL DEFAULT 1,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f000+00:00', 'now'))
+);
+INSERT INTO catalog_version (id, version) VALUES (1, 1);
+
+-- SQLite has no statement-level triggers; a bump per row moves the version all the same
+CREATE TRIGGER trg_outlets_catalog_version_ins AFTER INSERT ON outlets
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER trg_outlets_catalog_version_upd AFTER UPDATE ON outlets
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER trg_outlets_catalog_version_del AFTER DELETE ON outlets
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+
+CREATE TRIGGER trg_menu_items_catalog_version_ins AFTER INSERT ON menu_items
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER trg_menu_items_catalog_version_upd AFTER UPDATE ON menu_items
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER trg_menu_items_catalog_version_del AFTER DELETE ON menu_items
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+
+CREATE TRIGGER trg_oma_catalog_version_ins AFTER INSERT ON outlet_menu_availability
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER trg_oma_catalog_version_upd AFTER UPDATE ON outlet_menu_availability
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER trg_oma_catalog_version_del AFTER DELETE ON outlet_menu_availability
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+
+-- Sales aggregates per outlet x item x day (outlet-local date), maintained by
+-- the batched rollup in db/sales.py; read by the top_items tool
+CREATE TABLE outlet_item_daily_sales (
+  outlet_id    INTEGER NOT NULL,
+  menu_item_id INTEGER NOT NULL,
+  sales_date   DATE NOT NULL,
+  order_count  INTEGER NOT NULL DEFAULT 0,
+  quantity     INTEGER NOT NULL DEFAULT 0,
+  revenue      NUMERIC(12, 2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (outlet_id, sales_date, menu_item_id)
+);
+
+-- Rollup watermark: highest order_items.id folded into the aggregates
+CREATE TABLE sales_rollup_state (
+  id                 INTEGER PRIMARY KEY CHECK (id = 1),
+  last_order_item_id BIGINT NOT NULL DEFAULT 0,
+  rolled_at          TIMESTAMPTZ NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f000+00:00', 'now'))
+);
+INSERT INTO sales_rollup_state (id) VALUES (1);
+
+-- Cancelling an already rolled-up order takes it back out of the aggregates
+CREATE TRIGGER trg_orders_unroll_cancelled
+  AFTER UPDATE OF status ON orders
+  FOR EACH ROW WHEN (NEW.status = 'CANCELLED' AND OLD.status <> 'CANCELLED')
+BEGIN
+  UPDATE outlet_item_daily_sales
+  SET order_count = outlet_item_daily_sales.order_count - 1,
+      quantity    = outlet_item_daily_sales.quantity - agg.quantity,
+      revenue     = outlet_item_daily_sales.revenue - agg.revenue
+  FROM (
+    SELECT oi.menu_item_id, SUM(oi.quantity) AS quantity, SUM(oi.line_total) AS revenue
+    FROM order_items oi
+    WHERE oi.order_id = NEW.id
+      AND oi.id <= (SELECT last_order_item_id FROM sales_rollup_state WHERE id = 1)
+    GROUP BY oi.menu_item_id
+  ) AS agg
+  WHERE outlet_item_daily_sales.outlet_id = NEW.outlet_id
+    AND outlet_item_daily_sales.menu_item_id = agg.menu_item_id
+    AND outlet_item_daily_sales.sales_date = local_date(
+          NEW.created_at, COALESCE((SELECT timezone FROM outlets WHERE id = NEW.outlet_id), 'UTC'));
+END;
+
+-- Kitchen load per outlet: running totals of orders still in the kitchen; see db/kitchen.py
+CREATE TABLE outlet_kitchen_load (
+  outlet_id           INTEGER PRIMARY KEY REFERENCES outlets(id) ON DELETE CASCADE,
+  queued_orders       INTEGER NOT NULL DEFAULT 0,
+  queued_prep_seconds BIGINT NOT NULL DEFAULT 0,
+  updated_at          TIMESTAMPTZ NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f000+00:00', 'now'))
+);
+
+-- An order leaving the kitchen takes its prep time off the outlet's totals
+CREATE TRIGGER trg_orders_kitchen_dequeue
+  AFTER UPDATE OF status ON orders
+  FOR EACH ROW WHEN (
+    NEW.prep_seconds IS NOT NULL
+    AND OLD.status IN ('PENDING', 'CONFIRMED', 'IN_KITCHEN')
+    AND NEW.status NOT IN ('PENDING', 'CONFIRMED', 'IN_KITCHEN')
+  )
+BEGIN
+  UPDATE outlet_kitchen_load
+  SET queued_orders       = MAX(queued_orders - 1, 0),
+      queued_prep_seconds = MAX(queued_prep_seconds - NEW.prep_seconds, 0),
+      updated_at          = strftime('%Y-%m-%d %H:%M:%f000+00:00', 'now')
+  WHERE outlet_id = NEW.outlet_id;
+END;
@@ -1,19 +1,19 @@
-import psycopg2
-from psycopg2.extras import execute_values
 from datetime import datetime, timedelta, timezone
 import random
 from decimal import Decimal
 
+from .connection import execute_values, get_connection, shard_names
 
-def get_connection():
+# Same sample orders on every run, so two seeded databases (e.g. Postgres and
+# SQLite, see `python -m db.sqlite_backend --check`) hold the same data
+RANDOM_SEED = 7
 
-    return psycopg2.connect(
-        dbname="restaurant_db",
-        user="postgres",
-        password="user@123",  
-        host="localhost",
-        port=5434,
-    )
+# Region (= order shard, see connection.py) of each seeded outlet
+REGION_BY_TIMEZONE = {
+    "America/Los_Angeles": "west",
+    "America/Chicago": "central",
+    "America/New_York": "east",
+}
 
 
 def insert_outlets(cur):
@@ -52,16 +52,17 @@ def insert_outlets(cur):
          "1600 Pennsylvania Ave NW", "America/New_York", "08:00", "21:00", True, True),
     ]
 
+    outlets = [outlet + (REGION_BY_TIMEZONE[outlet[5]],) for outlet in outlets]
+
     sql = """
     INSERT INTO outlets
     (name, city, state, zip_code, address, timezone,
-     open_time, close_time, supports_delivery, supports_pickup)
+     open_time, close_time, supports_delivery, supports_pickup, region)
     VALUES %s
     RETURNING id;
 """
 
-    execute_values(cur, sql, outlets)
-    outlet_ids = [row[0] for row in cur.fetchall()]
+    outlet_ids = [row[0] for row in execute_values(cur, sql, outlets, fetch=True)]
     return outlet_ids
 
 
@@ -157,8 +158,7 @@ def insert_menu_items(cur):
 """
 
 
-    execute_values(cur, sql, menu_items)
-    menu_item_ids = [row[0] for row in cur.fetchall()]
+    menu_item_ids = [row[0] for row in execute_values(cur, sql, menu_items, fetch=True)]
     return menu_item_ids
 
 
@@ -195,32 +195,31 @@ def insert_orders(cur, outlet_ids):
         fulfillment = random.choice(["PICKUP", "DELIVERY"])
         customer_name = f"Customer {i+1}"
         customer_phone = f"555-000{i+1}"
-        customer_notes = None
         total_amount = Decimal("0.00")  # we'll update after items
 
         orders.append(
             (
                 outlet_id,
                 created_at,
+                created_at,
                 status,
                 fulfillment,
                 customer_name,
                 customer_phone,
-                customer_notes,
                 total_amount,
             )
         )
 
     sql = """
         INSERT INTO orders
-        (outlet_id, created_at, status, fulfillment_type,
-         customer_name, customer_phone, customer_notes, total_amount)
+        (outlet_id, created_at, updated_at, status, fulfillment_type,
+         customer_name, customer_phone, total_amount)
         VALUES %s
-        RETURNING id;
+        RETURNING id, created_at;
     """
 
-    execute_values(cur, sql, orders)
-    order_ids = [row[0] for row in cur.fetchall()]
+    # (id, created_at): order_items rows carry the order's partition key
+    order_ids = [tuple(row) for row in execute_values(cur, sql, orders, fetch=True)]
     return order_ids
 
 def insert_order_items(cur, order_ids, menu_item_ids):
@@ -228,9 +227,9 @@ def insert_order_items(cur, order_ids, menu_item_ids):
     For each order, add 2–3 random items and update total_amount.
     """
     order_items_rows = []
-    order_totals = {order_id: Decimal("0.00") for order_id in order_ids}
+    order_totals = {order: Decimal("0.00") for order in order_ids}
 
-    for order_id in order_ids:
+    for order_id, created_at in order_ids:
         num_items = random.randint(2, 3)
         chosen_items = random.sample(menu_item_ids, num_items)
 
@@ -247,27 +246,32 @@ def insert_order_items(cur, order_ids, menu_item_ids):
             line_total = unit_price * quantity
 
             order_items_rows.append(
-                (order_id, menu_item_id, quantity, unit_price, line_total)
+                (order_id, created_at, menu_item_id, quantity, unit_price, line_total)
             )
-            order_totals[order_id] += line_total
+            order_totals[(order_id, created_at)] += line_total
 
     sql_items = """
         INSERT INTO order_items
-        (order_id, menu_item_id, quantity, unit_price, line_total)
+        (order_id, order_created_at, menu_item_id, quantity, unit_price, line_total)
         VALUES %s;
     """
     execute_values(cur, sql_items, order_items_rows)
 
     # update total_amount on orders
-    for order_id, total in order_totals.items():
+    for (order_id, created_at), total in order_totals.items():
         cur.execute(
-            "UPDATE orders SET total_amount = %s WHERE id = %s",
-            (total, order_id),
+            "UPDATE orders SET total_amount = %s WHERE id = %s AND created_at = %s",
+            (total, order_id, created_at),
         )
 
 
-def main():
-    conn = get_connection()
+def seed(shard=None):
+    """
+    Seed one database. With shards, every shard gets the same catalog and
+    sample orders only for the outlets of its own region.
+    """
+    random.seed(RANDOM_SEED)
+    conn = get_connection(shard=shard)
     try:
         with conn:
             with conn.cursor() as cur:
@@ -280,16 +284,27 @@ def main():
                 print("Inserting outlet menu availability...")
                 insert_outlet_menu_availability(cur, outlet_ids, menu_item_ids)
 
-                print("Inserting orders...")
-                order_ids = insert_orders(cur, outlet_ids)
+                if shard is not None:
+                    cur.execute("SELECT id FROM outlets WHERE region = %s", (shard,))
+                    outlet_ids = [row[0] for row in cur.fetchall()]
+                if outlet_ids:
+                    print("Inserting orders...")
+                    order_ids = insert_orders(cur, outlet_ids)
 
-                print("Inserting order items and updating totals...")
-                insert_order_items(cur, order_ids, menu_item_ids)
+                    print("Inserting order items and updating totals...")
+                    insert_order_items(cur, order_ids, menu_item_ids)
 
     finally:
         conn.close()
         print("Connection closed.")
 
 
+def main():
+    for shard in shard_names():
+        if shard is not None:
+            print(f"Seeding shard {shard}...")
+        seed(shard)
+
+
 if __name__ == "__main__":
     main()
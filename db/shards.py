@@ -0,0 +1,153 @@
+"""
+Setup and benchmark for region-sharded order storage.
+
+Routing lives in connection.py (DB_SHARDS, `shard_for_outlet`,
+`shard_for_order`, `fan_out`). Each shard is a Postgres with the full schema
+and the same catalog. `init_shard` makes the shard's order ids encode it:
+the orders sequence steps by SHARD_SLOTS from the shard's number, so shard 2
+of 3 hands out 18, 34, 50, ...
+
+Local setup with three servers (ports 5441-5443), schema loaded into each:
+
+    export DB_SHARDS="west=localhost:5441,central=localhost:5442,east=localhost:5443"
+    python -m db.shards --init      # per-shard order id sequences
+    python -m db.seed_data          # catalog everywhere, orders on their region's shard
+    python -m db.shards --benchmark --writers 16 --seconds 20
+"""
+import argparse
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .connection import SHARD_SLOTS, close_cursor, get_connection, shard_for_outlet, shard_names, shards
+
+
+def init_shard(shard: str) -> int:
+    """
+    Point the shard's orders sequence at ids congruent to its number modulo
+    SHARD_SLOTS, past any existing order. Returns the next id it will use.
+    """
+    number = shards.number(shard)
+    conn = get_connection(shard=shard)
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM orders")
+        highest = cur.fetchone()[0]
+        next_id = highest - highest % SHARD_SLOTS + number
+        if next_id <= highest:
+            next_id += SHARD_SLOTS
+        cur.execute(f"ALTER SEQUENCE orders_id_seq INCREMENT BY {SHARD_SLOTS} RESTART WITH {next_id}")
+        conn.commit()
+        return next_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_cursor(cur)
+
+
+# ---------- Benchmark ----------
+
+BENCH_CUSTOMER = "shard-benchmark"
+
+
+def _write_orders(
+    outlet_ids: List[int],
+    item_ids: List[int],
+    pinned: Optional[str],
+    deadline: float,
+    counts: List[int],
+    slot: int,
+) -> None:
+    """One writer: insert orders (header + two lines, one transaction each) until `deadline`."""
+    rng = random.Random(slot)
+    while time.perf_counter() < deadline:
+        outlet_id = rng.choice(outlet_ids)
+        conn = get_connection(shard=pinned or shard_for_outlet(outlet_id))
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                INSERT INTO orders (outlet_id, status, fulfillment_type, customer_name,
+                                    created_at, updated_at, total_amount)
+                VALUES (%s, 'COMPLETED', 'PICKUP', %s, NOW(), NOW(), 20)
+                RETURNING id, created_at
+                """,
+                (outlet_id, BENCH_CUSTOMER),
+            )
+            order_id, created_at = cur.fetchone()
+            cur.executemany(
+                """
+                INSERT INTO order_items (order_id, order_created_at, menu_item_id, quantity, unit_price, line_total)
+                VALUES (%s, %s, %s, 1, 10, 10)
+                """,
+                [(order_id, created_at, item_id) for item_id in rng.sample(item_ids, 2)],
+            )
+            conn.commit()
+            counts[slot] += 1
+        finally:
+            close_cursor(cur)
+
+
+def _benchmark(writers: int, seconds: float) -> None:
+    """
+    Order write throughput with every write on the first shard (one primary,
+    as before sharding) vs routed to each outlet's shard.
+    """
+    names = shard_names()
+    conn = get_connection(shard=names[0])
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id FROM outlets WHERE is_active = TRUE")
+        outlet_ids = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT id FROM menu_items WHERE is_active = TRUE ORDER BY id LIMIT 20")
+        item_ids = [row[0] for row in cur.fetchall()]
+    finally:
+        close_cursor(cur)
+
+    results: Dict[str, float] = {}
+    for label, pinned in (("single primary", names[0]), (f"{len(names)} shard(s)", None)):
+        counts = [0] * writers
+        deadline = time.perf_counter() + seconds
+        threads = [
+            threading.Thread(target=_write_orders, args=(outlet_ids, item_ids, pinned, deadline, counts, slot))
+            for slot in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results[label] = sum(counts) / seconds
+        print(f"{label:<16} {results[label]:10,.0f} orders/s ({writers} writers)")
+
+    for name in names:
+        conn = get_connection(shard=name)
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM orders WHERE customer_name = %s", (BENCH_CUSTOMER,))
+            conn.commit()
+        finally:
+            close_cursor(cur)
+
+    single, sharded = results.values()
+    print(f"scaling: {sharded / (single or 1):.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Initialise shards and benchmark sharded order writes.")
+    parser.add_argument("--init", action="store_true", help="set each shard's order id sequence")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if not shards.enabled:
+        parser.error("DB_SHARDS is not set")
+    if args.init:
+        for name in shards.names:
+            print(f"{name}: next order id {init_shard(name)}")
+    if args.benchmark:
+        _benchmark(args.writers, args.seconds)
+    if not (args.init or args.benchmark):
+        parser.print_help()
@@ -0,0 +1,245 @@
+"""
+Single-flight coalescing for read-only tools.
+
+Concurrent calls to the same tool with identical arguments share one in-flight
+execution: the first caller runs the query, the others wait for its result.
+The agents SDK runs sync tools in worker threads (`asyncio.to_thread`), so a
+thread-safe implementation covers async tasks as well; coroutine callers that
+invoke a wrapped function directly can use `SingleFlight.do_async`.
+
+Sessions that wrote recently are pinned to the primary or to caught-up
+replicas (read-your-writes, see db/connection.py). The key includes the
+position a caller's reads must see, so a pinned session never joins a read
+that may have gone to a lagging replica.
+
+Run with: python -m db.single_flight --benchmark
+          (burst of 200 concurrent identical calls per tool, coalesced vs not:
+          queries run and latency)
+"""
+
+import argparse
+import asyncio
+import functools
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from .connection import read_position
+
+# Per-tool enable flags. Disable with SINGLE_FLIGHT_DISABLED="filter_menu,get_order_status"
+SINGLE_FLIGHT_ENABLED: Dict[str, bool] = {
+    "get_outlets_by_city_or_zip": True,
+    "get_outlet_menu": True,
+    "filter_menu": True,
+    "is_outlet_open": True,
+    "get_order_status": True,
+    "get_orders_by_phone": True,
+    "top_items": True,
+    "is_outlets_open": True,
+    "get_outlet_menus": True,
+    "filter_menu_multi": True,
+}
+for _name in filter(None, (n.strip() for n in os.getenv("SINGLE_FLIGHT_DISABLED", "").split(","))):
+    SINGLE_FLIGHT_ENABLED[_name] = False
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Deduplicates concurrent executions by key and counts how many calls were coalesced."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, _Call] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, group: str, field: str) -> None:
+        counters = self._stats.setdefault(group, {"calls": 0, "executions": 0, "coalesced": 0})
+        counters[field] += 1
+
+    def do(self, group: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run `fn` once per concurrent `key`; followers get the leader's result or exception."""
+        with self._lock:
+            self._count(group, "calls")
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._in_flight[key] = call
+                self._count(group, "executions")
+            else:
+                self._count(group, "coalesced")
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+    async def do_async(self, group: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Async variant: waits in a worker thread so the event loop is never blocked."""
+        return await asyncio.to_thread(self.do, group, key, fn)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {group: dict(counters) for group, counters in self._stats.items()}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+_flight = SingleFlight()
+
+
+def _freeze(value):
+    """Make list arguments (batch tools) usable in a key."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+# tool name -> plain callable (the coalesced wrapper), for callers outside an agent run
+_read_only_tools: Dict[str, Callable[..., Any]] = {}
+
+
+def coalesced(tool_name: str):
+    """
+    Decorator for read-only tool functions. Place it under `@function_tool`;
+    `functools.wraps` keeps the signature and docstring the SDK reads.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not SINGLE_FLIGHT_ENABLED.get(tool_name, False):
+                return func(*args, **kwargs)
+            key = (
+                tool_name,
+                read_position(),
+                _freeze(args),
+                tuple(sorted((k, _freeze(v)) for k, v in kwargs.items())),
+            )
+            return _flight.do(tool_name, key, lambda: func(*args, **kwargs))
+        _read_only_tools[tool_name] = wrapper
+        return wrapper
+    return decorator
+
+
+def read_only_tool(tool_name: str) -> Callable[..., Any]:
+    """
+    Plain callable behind a coalesced tool (the module defining it must be
+    imported). Lets code outside an agent run, such as the degraded mode,
+    call the tool directly.
+    """
+    return _read_only_tools[tool_name]
+
+
+def set_enabled(tool_name: str, enabled: bool) -> None:
+    """Toggle coalescing for one tool at runtime."""
+    SINGLE_FLIGHT_ENABLED[tool_name] = enabled
+
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """Per-tool counters: calls, executions (queries actually run), coalesced."""
+    return _flight.stats()
+
+
+# ---------- Benchmark ----------
+
+BENCHMARK_CALLS: List[Tuple[str, tuple]] = [
+    ("get_outlets_by_city_or_zip", ("Seattle",)),
+    ("filter_menu", (1,)),
+    ("get_order_status", (1,)),
+]
+
+
+def _queries_run() -> int:
+    from .statements import statement_stats
+
+    return sum(c["prepares"] + c["hits"] + c["unprepared"] for c in statement_stats().values())
+
+
+def _quantile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _burst(module, tool_name: str, args: tuple, requests: int) -> Dict[str, float]:
+    """`requests` threads released together, all calling `tool_name(*args)`."""
+    tool = module.read_only_tool(tool_name)
+    barrier = threading.Barrier(requests)
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def one() -> None:
+        barrier.wait()
+        started = time.perf_counter()
+        tool(*args)
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    queries = _queries_run()
+    threads = [threading.Thread(target=one) for _ in range(requests)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        "wall": time.perf_counter() - started,
+        "queries": _queries_run() - queries,
+        "p50": _quantile(latencies, 0.50),
+        "p99": _quantile(latencies, 0.99),
+    }
+
+
+def _benchmark(requests: int, rounds: int) -> None:
+    from . import queries  # noqa: F401  registers the tools
+    from . import single_flight  # the module the tools use; this file runs as __main__
+
+    for tool_name, args in BENCHMARK_CALLS:
+        single_flight.read_only_tool(tool_name)(*args)  # warm the pool and the statement cache
+        for enabled in (False, True):
+            single_flight.set_enabled(tool_name, enabled)
+            single_flight._flight.reset_stats()
+            runs = [_burst(single_flight, tool_name, args, requests) for _ in range(rounds)]
+            executions = single_flight.single_flight_stats().get(tool_name, {}).get("executions", requests * rounds)
+            print(
+                f"{tool_name:<28} {'coalesced' if enabled else 'direct':<9} "
+                f"executions {executions / rounds:6.1f}  queries {sum(r['queries'] for r in runs) / rounds:6.1f}  "
+                f"p50 {_quantile([r['p50'] for r in runs], 0.5) * 1e3:7.1f} ms  "
+                f"p99 {_quantile([r['p99'] for r in runs], 0.5) * 1e3:7.1f} ms  "
+                f"burst {_quantile([r['wall'] for r in runs], 0.5) * 1e3:7.1f} ms"
+            )
+        single_flight.set_enabled(tool_name, True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Burst of identical concurrent tool calls, with and without coalescing.")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--requests", type=int, default=200, help="concurrent identical calls per burst")
+    parser.add_argument("--rounds", type=int, default=5, help="bursts per tool and mode (medians are shown)")
+    args = parser.parse_args()
+    if args.benchmark:
+        _benchmark(args.requests, args.rounds)
+    else:
+        parser.print_help()
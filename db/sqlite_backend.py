@@ -0,0 +1,535 @@
+"""
+Embedded SQLite backend (DB_BACKEND=sqlite).
+
+For single-box deployments and CI benchmarks that should not need a
+Postgres server. `get_connection` in connection.py hands out these
+connections instead of psycopg2 ones. The tools keep their SQL: each
+statement is rewritten once (and cached) from the Postgres dialect the
+query layer writes:
+
+- `%s` / `%(name)s` placeholders -> `?` / `:name`
+- `ILIKE` -> `LIKE` (case-insensitive for ASCII in SQLite)
+- `::type` casts dropped; `= ANY(list)` -> `IN (SELECT value FROM json_each(...))`
+- `NOW()` and `NOW() - make_interval(secs => n)` -> UTC text timestamps
+- `(ts AT TIME ZONE tz)::date` -> `local_date(ts, tz)`, a function every
+  connection registers; `EXTRACT(EPOCH FROM NOW() - ts)` -> seconds via julianday
+- `FOR UPDATE` / `FOR SHARE` dropped: a writing transaction holds the
+  database lock (primary connections BEGIN IMMEDIATE)
+
+Values convert both ways, so the tools format identical rows. Timestamps
+are stored as UTC ISO text, which sorts in time order. The declared
+column types in schema_sqlite.sql map TIME, TIMESTAMPTZ, NUMERIC and
+BOOLEAN back to time, aware datetime, Decimal and bool.
+
+The database runs in WAL mode with DB_SQLITE_MMAP_BYTES of memory-mapped
+I/O. Connections are pooled per role like the Postgres ones, and
+`conn.close()` returns them to their pool. Replicas, shards and order
+partitions stay Postgres-only; every agent tool runs on both backends
+(`--check` compares their output).
+
+Run with: python -m db.sqlite_backend --init          (create DB_SQLITE_PATH from schema_sqlite.sql)
+          DB_BACKEND=sqlite python -m db.seed_data  (same seed generator as Postgres)
+          python -m db.sqlite_backend --check       (every agent tool on Postgres vs SQLite)
+          python -m db.sqlite_backend --benchmark   (tools on Postgres vs SQLite)
+"""
+import argparse
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timezone
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from .connection import DB_POOL_SIZE
+
+DB_SQLITE_PATH = os.getenv("DB_SQLITE_PATH", "restaurant.db")
+DB_SQLITE_MMAP_BYTES = int(os.getenv("DB_SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+DB_SQLITE_BUSY_TIMEOUT = float(os.getenv("DB_SQLITE_BUSY_TIMEOUT", "5"))  # seconds a writer waits for the lock
+
+SCHEMA_PATH = Path(__file__).with_name("schema_sqlite.sql")
+
+# UTC text timestamp with microseconds, the format `_adapt` writes for datetimes
+_SQL_NOW = "strftime('%Y-%m-%d %H:%M:%f000+00:00', 'now')"
+
+
+# ---------- Dialect ----------
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+_CAST = re.compile(r"::\w+(?:\[\])?")
+_ILIKE = re.compile(r"\bILIKE\b", re.I)
+_ANY = re.compile(r"=\s*ANY\(\s*(\?|:\w+)\s*\)", re.I)
+_NOW_MINUS_SECS = re.compile(r"NOW\(\)\s*-\s*make_interval\(\s*secs\s*=>\s*(\?|:\w+)\s*\)", re.I)
+_NOW = re.compile(r"\bNOW\(\)", re.I)
+_LOCKING = re.compile(r"\bFOR\s+(?:UPDATE|SHARE)\b", re.I)
+_LOCAL_DATE = re.compile(
+    r"\(\s*([\w.]+)\s+AT\s+TIME\s+ZONE\s+(COALESCE\([^()]*\)|'[^']*'|[\w.]+)\s*\)::date", re.I
+)
+_EPOCH_SINCE = re.compile(r"EXTRACT\(\s*EPOCH\s+FROM\s+NOW\(\)\s*-\s*([\w.]+)\s*\)", re.I)
+
+
+@lru_cache(maxsize=512)
+def translate(sql: str) -> str:
+    """Postgres-dialect SQL as written in db/ -> the SQLite equivalent."""
+    sql = _PLACEHOLDER.sub(
+        lambda m: f":{m.group(1)}" if m.group(1) else ("?" if m.group(0) == "%s" else "%"),
+        sql,
+    )
+    sql = _LOCAL_DATE.sub(r"local_date(\1, \2)", sql)
+    sql = _EPOCH_SINCE.sub(r"((julianday('now') - julianday(\1)) * 86400.0)", sql)
+    sql = _CAST.sub("", sql)
+    sql = _ILIKE.sub("LIKE", sql)
+    sql = _ANY.sub(r"IN (SELECT value FROM json_each(\1))", sql)
+    sql = _NOW_MINUS_SECS.sub(lambda m: _SQL_NOW[:-1] + f", '-' || {m.group(1)} || ' seconds')", sql)
+    sql = _NOW.sub(_SQL_NOW, sql)
+    return _LOCKING.sub("", sql)
+
+
+def _adapt(value: Any) -> Any:
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.isoformat(sep=" ", timespec="microseconds")
+    if isinstance(value, (dt_time, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return json.dumps([_adapt(item) for item in value])
+    return value
+
+
+def _adapt_params(params: Any) -> Any:
+    if params is None:
+        return ()
+    if isinstance(params, dict):
+        return {key: _adapt(value) for key, value in params.items()}
+    return [_adapt(value) for value in params]
+
+
+def _to_datetime(raw: bytes) -> datetime:
+    value = datetime.fromisoformat(raw.decode())
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _local_date(raw: Optional[str], tz_name: Optional[str]) -> Optional[str]:
+    """SQL `local_date(ts, tz)`: the calendar date of a stored timestamp in timezone `tz_name`."""
+    if raw is None:
+        return None
+    import pytz  # deferred like in availability.OutletSchedule
+
+    value = _to_datetime(raw.encode())
+    return value.astimezone(pytz.timezone(tz_name or "UTC")).date().isoformat()
+
+
+sqlite3.register_converter("TIMESTAMPTZ", _to_datetime)
+sqlite3.register_converter("DATE", lambda raw: date.fromisoformat(raw.decode()))
+sqlite3.register_converter("TIME", lambda raw: dt_time.fromisoformat(raw.decode()))
+sqlite3.register_converter("NUMERIC", lambda raw: Decimal(raw.decode()))
+sqlite3.register_converter("BOOLEAN", lambda raw: raw not in (b"0", b""))
+
+
+# ---------- Connections ----------
+
+class SQLiteCursor(sqlite3.Cursor):
+    """Cursor that accepts the query layer's Postgres-dialect SQL and parameters."""
+
+    def execute(self, sql: str, params: Any = None):
+        return super().execute(translate(sql), _adapt_params(params))
+
+    def executemany(self, sql: str, seq_of_params):
+        return super().executemany(translate(sql), (_adapt_params(p) for p in seq_of_params))
+
+    def execute_values(self, sql: str, rows: Sequence[Sequence[Any]], fetch: bool = False) -> Optional[List[tuple]]:
+        """`psycopg2.extras.execute_values`: `VALUES %s` expanded to one multi-row statement."""
+        if not rows:
+            return [] if fetch else None
+        row = "(" + ", ".join(["%s"] * len(rows[0])) + ")"
+        self.execute(sql.replace("%s", ", ".join([row] * len(rows)), 1), [v for r in rows for v in r])
+        return self.fetchall() if fetch else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SQLiteConnection(sqlite3.Connection):
+    """Pooled connection; close() rolls back and returns it to its pool."""
+
+    pool: Optional["queue.LifoQueue"] = None
+
+    def cursor(self, factory=SQLiteCursor):
+        return super().cursor(factory)
+
+    def close(self):
+        pool = self.pool
+        if pool is None:
+            return super().close()
+        try:
+            if self.in_transaction:
+                self.rollback()
+            pool.put_nowait(self)
+        except Exception:  # broken connection or full pool
+            super().close()
+
+
+_pools: Dict[str, "queue.LifoQueue"] = {}
+_pools_lock = threading.Lock()
+
+
+def _open(path: str, role: str) -> SQLiteConnection:
+    conn = sqlite3.connect(
+        path,
+        factory=SQLiteConnection,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        check_same_thread=False,  # pooled connections move between tool threads
+        timeout=DB_SQLITE_BUSY_TIMEOUT,
+        # Writers take the lock up front instead of failing to upgrade a read later
+        isolation_level="DEFERRED" if role == "replica" else "IMMEDIATE",
+    )
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA mmap_size = {DB_SQLITE_MMAP_BYTES}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.create_function("local_date", 2, _local_date, deterministic=True)
+    return conn
+
+
+def connect(role: str = "primary", path: Optional[str] = None) -> SQLiteConnection:
+    """A connection to the SQLite database; `role="replica"` ones never write."""
+    path = path or DB_SQLITE_PATH
+    if DB_POOL_SIZE <= 0:
+        return _open(path, role)
+
+    key = f"{path}|{role}"
+    with _pools_lock:
+        pool = _pools.setdefault(key, queue.LifoQueue(maxsize=DB_POOL_SIZE))
+    try:
+        return pool.get_nowait()
+    except queue.Empty:
+        conn = _open(path, role)
+        conn.pool = pool
+        return conn
+
+
+def init_database(path: Optional[str] = None) -> None:
+    """Create the schema in a new database file."""
+    conn = _open(path or DB_SQLITE_PATH, "primary")
+    try:
+        conn.executescript(SCHEMA_PATH.read_text())
+    finally:
+        conn.close()
+
+
+# ---------- Parity check and benchmark ----------
+
+def _use_backend(backend: str) -> None:
+    """Point get_connection at `backend` and drop everything cached from the other one."""
+    from . import availability, catalog, connection
+    from .cache import shared_cache
+
+    connection.DB_BACKEND = backend
+    with catalog._lock:
+        catalog._cached_version = None  # both databases may be at the same version number
+    with availability._schedules_lock:
+        availability._schedules.clear()
+    shared_cache.invalidate()
+
+
+CHECK_CUSTOMER = "backend-check"
+CHECK_PHONE = "555-0199"
+
+# Every tool an agent can call; tool_outputs() runs each at least once
+CHECKED_TOOLS = (
+    "create_order",
+    "create_orders_bulk",
+    "get_outlets_by_city_or_zip",
+    "get_outlet_menu",
+    "filter_menu",
+    "is_outlet_open",
+    "is_outlets_open",
+    "get_outlet_menus",
+    "filter_menu_multi",
+    "top_items",
+    "get_order_status",
+    "get_orders_by_phone",
+    "reorder",
+)
+
+# Clock readings differ between two runs of the same call, so they are masked
+_CLOCK = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2})?"), "<timestamp>"),
+    (re.compile(r"\(\d{2}:\d{2}[^)]*\)"), "(<clock>)"),
+    (re.compile(r"about \d+ min"), "about <n> min"),
+]
+_ORDER_REF = re.compile(r"(?i)(order #|before_order_id=)(\d+)")
+_ORDER_IDS_LINE = re.compile(r"^(Order IDs: )(.*)$", re.M)
+
+
+def _tools() -> Dict[str, Any]:
+    from . import bulk_orders, customer_history, queries, sales
+
+    modules = (queries, customer_history, sales, bulk_orders)
+    return {name: next(getattr(m, name) for m in modules if hasattr(m, name)) for name in CHECKED_TOOLS}
+
+
+def _check_fixture() -> Dict[str, Any]:
+    """An active pickup outlet and two of its all-day items (same ids on identically seeded databases)."""
+    from .connection import get_connection
+
+    conn = get_connection(role="replica")
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT oma.outlet_id, oma.menu_item_id
+            FROM outlet_menu_availability oma
+            INNER JOIN outlets o ON o.id = oma.outlet_id
+            INNER JOIN menu_items mi ON mi.id = oma.menu_item_id
+            WHERE o.is_active = TRUE AND o.supports_pickup = TRUE AND mi.is_active = TRUE
+              AND oma.is_available = TRUE AND oma.available_from_time IS NULL
+            ORDER BY oma.outlet_id, oma.menu_item_id
+            """
+        )
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+    if not rows:
+        raise SystemExit("No orderable outlet found; seed the database first (python -m db.seed_data).")
+    outlet_id = rows[0][0]
+    items = [item for outlet, item in rows if outlet == outlet_id][:2]
+    return {"outlet_id": outlet_id, "menu_item_ids": items, "outlet_ids": sorted({row[0] for row in rows})[:3]}
+
+
+def _cleanup_check_orders() -> None:
+    """Take the check's orders out of the kitchen and sales totals, then delete them and their keys."""
+    from .connection import get_connection
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("UPDATE orders SET status = 'CANCELLED' WHERE customer_name = %s", (CHECK_CUSTOMER,))
+        cur.execute("DELETE FROM orders WHERE customer_name = %s", (CHECK_CUSTOMER,))
+        cur.execute("DELETE FROM order_idempotency_keys WHERE idempotency_key LIKE %s", (CHECK_CUSTOMER + ":%",))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def tool_outputs(backend: str) -> List[tuple]:
+    """
+    Run every agent tool on `backend` (seeded with db.seed_data) and return
+    [(call, output)]. Orders are placed first, then the sales rollup runs,
+    then the reads; the check's orders are removed again at the end. Order
+    ids and clock readings are masked so two backends can be compared.
+    """
+    import asyncio
+    import uuid
+
+    from agents.tool_context import ToolContext
+
+    from models import ConversationContext
+    from .sales import rollup_sales
+    from .single_flight import SINGLE_FLIGHT_ENABLED
+
+    _use_backend(backend)
+    tools = _tools()
+    fixture = _check_fixture()
+    outlet_id, outlet_ids = fixture["outlet_id"], fixture["outlet_ids"]
+    run = f"{CHECK_CUSTOMER}:{backend}:{uuid.uuid4().hex[:8]}"  # keys unique per backend: the idempotency LRU is per process
+
+    def order(n: int) -> dict:
+        return {
+            "outlet_id": outlet_id,
+            "fulfillment_type": "PICKUP",
+            "customer_name": CHECK_CUSTOMER,
+            "customer_phone": CHECK_PHONE,
+            "items": [{"menu_item_id": item, "quantity": n + 1} for item in fixture["menu_item_ids"]],
+            "idempotency_key": f"{run}:{n}",
+        }
+
+    async def call(name: str, arguments: dict) -> str:
+        raw = json.dumps(arguments)
+        context = ToolContext(
+            context=ConversationContext(conversation_id=CHECK_CUSTOMER, raw_user_message=""),
+            tool_name=name,
+            tool_call_id=f"{run}:{name}",
+            tool_arguments=raw,
+        )
+        return await tools[name].on_invoke_tool(context, raw)
+
+    async def run_all() -> List[tuple]:
+        calls = [
+            ("create_order", {"payload": order(0)}),
+            ("create_order", {"payload": order(0)}),  # replayed, not created again
+            ("create_orders_bulk", {"payload": {"orders": [order(1), order(2)]}}),
+            ("create_orders_bulk", {"payload": {"orders": [order(1), {**order(3), "outlet_id": -1}]}}),
+        ]
+        outputs = [(f"{name} {json.dumps(args)}", await call(name, args)) for name, args in calls]
+        order_id = int(_ORDER_REF.search(outputs[0][1]).group(2))
+        await asyncio.to_thread(rollup_sales, safety_seconds=0)  # include the orders just created
+
+        calls = [
+            ("get_outlets_by_city_or_zip", {"city": "San"}),
+            ("get_outlets_by_city_or_zip", {"zip_code": "100"}),
+            ("get_outlet_menu", {"outlet_id": outlet_id}),
+            ("filter_menu", {"outlet_id": outlet_id, "is_veg": True, "only_available_now": False}),
+            ("filter_menu", {"outlet_id": outlet_id, "category": "main", "max_price": 12}),
+            ("is_outlet_open", {"outlet_id": outlet_id, "current_time": "2025-01-15T14:00:00"}),
+            ("is_outlets_open", {"outlet_ids": outlet_ids, "current_time": "2025-01-15 23:30:00"}),
+            ("get_outlet_menus", {"outlet_ids": outlet_ids}),
+            ("filter_menu_multi", {"outlet_ids": outlet_ids, "is_spicy": True, "only_available_now": False}),
+            ("top_items", {"outlet_id": outlet_id}),
+            ("top_items", {"outlet_id": outlet_id, "window_days": 7, "category": "drink", "is_veg": True}),
+            ("get_order_status", {"order_id": order_id}),
+            ("get_orders_by_phone", {"phone": CHECK_PHONE, "limit": 2}),
+            ("reorder", {"order_id": order_id}),
+        ]
+        outputs += [(f"{name} {json.dumps(args)}", await call(name, args)) for name, args in calls]
+        # Second history page from the first page's cursor
+        first_page = next(output for label, output in outputs if label.startswith("get_orders_by_phone"))
+        cursor = re.search(r"before_order_id=(\d+)", first_page)
+        if cursor is not None:
+            args = {"phone": CHECK_PHONE, "limit": 2, "before_order_id": int(cursor.group(1))}
+            outputs.append(("get_orders_by_phone (next page)", await call("get_orders_by_phone", args)))
+        return outputs
+
+    coalescing = dict(SINGLE_FLIGHT_ENABLED)
+    SINGLE_FLIGHT_ENABLED.update(dict.fromkeys(coalescing, False))  # every call runs its own queries
+    try:
+        outputs = asyncio.run(run_all())
+        order_ids = _check_order_ids()
+    finally:
+        SINGLE_FLIGHT_ENABLED.update(coalescing)
+        _cleanup_check_orders()
+    return [(label, _mask(output, order_ids)) for label, output in outputs]
+
+
+def _check_order_ids() -> Dict[int, str]:
+    """The check's order ids on the current backend -> placeholders by creation order."""
+    from .connection import get_connection
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id FROM orders WHERE customer_name = %s ORDER BY id", (CHECK_CUSTOMER,))
+        return {row[0]: f"<order {n}>" for n, row in enumerate(cur.fetchall(), start=1)}
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _mask(text: str, order_ids: Dict[int, str]) -> str:
+    for pattern, replacement in _CLOCK:
+        text = pattern.sub(replacement, text)
+    text = _ORDER_REF.sub(lambda m: m.group(1) + order_ids.get(int(m.group(2)), m.group(2)), text)
+    return _ORDER_IDS_LINE.sub(
+        lambda m: m.group(1) + re.sub(r"\d+", lambda n: order_ids.get(int(n.group()), n.group()), m.group(2)),
+        text,
+    )
+
+
+def _check() -> int:
+    """Every agent tool on Postgres and on SQLite; prints differences, returns the number of mismatches."""
+    outputs = {backend: tool_outputs(backend) for backend in ("postgres", "sqlite")}
+    mismatches = 0
+    for (label, pg), (_, lite) in zip(outputs["postgres"], outputs["sqlite"]):
+        if pg != lite:
+            mismatches += 1
+            print(f"MISMATCH {label}:\n--- postgres\n{pg}\n--- sqlite\n{lite}\n")
+    print(f"identical output: {len(outputs['sqlite']) - mismatches}/{len(outputs['sqlite'])} calls "
+          f"covering {len(CHECKED_TOOLS)} tools")
+    return mismatches
+
+
+# (tool, args, kwargs): catalog reads whose output does not depend on the clock or on seeded orders
+BENCH_CALLS = [
+    ("get_outlets_by_city_or_zip", (), {"city": "San"}),
+    ("get_outlets_by_city_or_zip", (), {"zip_code": "100"}),
+    ("filter_menu", (1,), {"is_veg": True, "only_available_now": False}),
+    ("filter_menu", (2,), {"category": "main", "max_price": 12, "only_available_now": False}),
+    ("filter_menu_multi", ([1, 2, 3],), {"is_spicy": True, "only_available_now": False}),
+    ("is_outlet_open", (3,), {"current_time": "2025-01-15T14:00:00"}),
+    ("is_outlets_open", ([1, 4, 7],), {"current_time": "2025-01-15 23:30:00"}),
+]
+
+
+def _run_calls(tools: Dict[str, Any]) -> List[str]:
+    return [tools[name](*args, **kwargs) for name, args, kwargs in BENCH_CALLS]
+
+
+def _benchmark(runs: int, threads: int, seconds: float) -> None:
+    """
+    Same tool calls on Postgres and on SQLite: check the outputs match, then
+    time sequential latency and multi-threaded throughput on each.
+    """
+    from . import queries  # noqa: F401  (registers the tools)
+    from .single_flight import read_only_tool, set_enabled
+
+    tools = {name: read_only_tool(name) for name, _, _ in BENCH_CALLS}
+    for name in tools:
+        set_enabled(name, False)  # measure the database, not request coalescing
+
+    outputs: Dict[str, List[str]] = {}
+    for backend in ("postgres", "sqlite"):
+        _use_backend(backend)
+        outputs[backend] = _run_calls(tools)
+
+        started = time.perf_counter()
+        for _ in range(runs):
+            _run_calls(tools)
+        latency = (time.perf_counter() - started) / (runs * len(BENCH_CALLS))
+
+        counts = [0] * threads
+        deadline = time.perf_counter() + seconds
+
+        def worker(slot: int) -> None:
+            while time.perf_counter() < deadline:
+                _run_calls(tools)
+                counts[slot] += len(BENCH_CALLS)
+
+        workers = [threading.Thread(target=worker, args=(slot,)) for slot in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        print(
+            f"{backend:<9} {latency * 1e6:9,.0f} us/call  "
+            f"{sum(counts) / seconds:10,.0f} calls/s ({threads} threads)"
+        )
+
+    for (name, args, kwargs), pg, lite in zip(BENCH_CALLS, outputs["postgres"], outputs["sqlite"]):
+        if pg != lite:
+            print(f"MISMATCH {name}{args}{kwargs}:\n--- postgres\n{pg}\n--- sqlite\n{lite}")
+    matched = sum(pg == lite for pg, lite in zip(outputs["postgres"], outputs["sqlite"]))
+    print(f"identical output: {matched}/{len(BENCH_CALLS)} calls")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the SQLite database or compare it with Postgres.")
+    parser.add_argument("--init", action="store_true", help=f"create {DB_SQLITE_PATH} from schema_sqlite.sql")
+    parser.add_argument("--check", action="store_true", help="needs both databases seeded by db.seed_data")
+    parser.add_argument("--benchmark", action="store_true", help="needs both databases seeded")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.init:
+        init_database()
+        print(f"Created {DB_SQLITE_PATH}.")
+    if args.check and _check():
+        raise SystemExit(1)
+    if args.benchmark:
+        _benchmark(args.runs, args.threads, args.seconds)
+    if not (args.init or args.check or args.benchmark):
+        parser.print_help()
@@ -0,0 +1,218 @@
+"""
+Server-side prepared statements for the hot read queries.
+
+Each statement is written once with $n placeholders. On a pooled connection
+(see connection.py) it is PREPAREd the first time it is used, and every later
+call sends only `EXECUTE name(...)`, which skips parsing and planning. On
+plain connections the same SQL runs unprepared with named parameters.
+
+Optional filters are folded into one fixed shape per query
+(`$n::type IS NULL OR column = $n`). The variable WHERE clauses of
+filter_menu and get_outlets_by_city_or_zip therefore map onto a single
+statement each, instead of up to 32 distinct texts.
+
+Benchmark: python -m db.statements --runs 500
+"""
+import argparse
+import re
+import threading
+import time
+from typing import Any, Dict, Sequence
+
+STATEMENTS: Dict[str, str] = {
+    "outlet_name": """
+        SELECT name FROM outlets WHERE id = $1 AND is_active = TRUE
+    """,
+    "outlet_hours": """
+        SELECT name, open_time, close_time, timezone
+        FROM outlets
+        WHERE id = $1 AND is_active = TRUE
+    """,
+    "outlets_by_ids": """
+        SELECT id, name, open_time, close_time, timezone
+        FROM outlets
+        WHERE id = ANY($1::int[]) AND is_active = TRUE
+    """,
+    "outlets_search": """
+        SELECT
+            o.id,
+            o.name,
+            o.address,
+            o.city,
+            o.state,
+            o.zip_code,
+            o.supports_delivery,
+            o.supports_pickup,
+            o.open_time,
+            o.close_time
+        FROM outlets o
+        WHERE o.is_active = TRUE
+          AND ($1::text IS NULL OR o.city ILIKE $1)
+          AND ($2::text IS NULL OR o.zip_code ILIKE $2)
+        ORDER BY o.city, o.name
+    """,
+    "filter_menu": """
+        SELECT
+            mi.id,
+            mi.name,
+            mi.description,
+            mi.category,
+            mi.base_price,
+            mi.is_veg,
+            mi.is_spicy
+        FROM menu_items mi
+        INNER JOIN outlet_menu_availability oma ON oma.menu_item_id = mi.id
+        WHERE oma.outlet_id = $1
+          AND mi.is_active = TRUE
+          AND oma.is_available = TRUE
+          AND ($2::text IS NULL OR mi.category ILIKE $2)
+          AND ($3::boolean IS NULL OR mi.is_veg = $3)
+          AND ($4::boolean IS NULL OR mi.is_spicy = $4)
+          AND ($5::numeric IS NULL OR mi.base_price >= $5)
+          AND ($6::numeric IS NULL OR mi.base_price <= $6)
+        ORDER BY mi.category, mi.base_price, mi.name
+    """,
+    "filter_menu_multi": """
+        SELECT
+            oma.outlet_id,
+            mi.id,
+            mi.name,
+            mi.description,
+            mi.category,
+            mi.base_price,
+            mi.is_veg,
+            mi.is_spicy
+        FROM menu_items mi
+        INNER JOIN outlet_menu_availability oma ON oma.menu_item_id = mi.id
+        WHERE oma.outlet_id = ANY($1::int[])
+          AND mi.is_active = TRUE
+          AND oma.is_available = TRUE
+          AND ($2::text IS NULL OR mi.category ILIKE $2)
+          AND ($3::boolean IS NULL OR mi.is_veg = $3)
+          AND ($4::boolean IS NULL OR mi.is_spicy = $4)
+          AND ($5::numeric IS NULL OR mi.base_price >= $5)
+          AND ($6::numeric IS NULL OR mi.base_price <= $6)
+        ORDER BY oma.outlet_id, mi.category, mi.base_price, mi.name
+    """,
+    "order_header": """
+        SELECT
+            o.id,
+            o.status,
+            o.fulfillment_type,
+            o.customer_name,
+            o.customer_phone,
+            o.customer_address,
+            o.total_amount,
+            o.created_at,
+            o.updated_at,
+            o.outlet_id,
+            out.name AS outlet_name,
+            o.ready_eta,
+            out.timezone AS outlet_timezone
+        FROM orders o
+        INNER JOIN outlets out ON out.id = o.outlet_id
+        WHERE o.id = $1
+          AND o.created_at >= $2::timestamptz
+    """,
+    "order_lines": """
+        SELECT
+            oi.quantity,
+            oi.unit_price,
+            oi.line_total,
+            mi.name,
+            mi.category
+        FROM order_items oi
+        INNER JOIN menu_items mi ON mi.id = oi.menu_item_id
+        WHERE oi.order_id = $1
+          AND oi.order_created_at = $2
+        ORDER BY oi.id
+    """,
+}
+
+_PLACEHOLDER = re.compile(r"\$(\d+)")
+
+# Unprepared form: $1 -> %(p1)s so repeated parameters are passed once
+_UNPREPARED = {name: _PLACEHOLDER.sub(r"%(p\1)s", sql) for name, sql in STATEMENTS.items()}
+
+_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _count(name: str, field: str) -> None:
+    with _lock:
+        counters = _stats.setdefault(name, {"prepares": 0, "hits": 0, "unprepared": 0})
+        counters[field] += 1
+
+
+def execute(cur, name: str, params: Sequence[Any] = ()) -> None:
+    """Run registered statement `name` with positional `params` ($1, $2, ...)."""
+    prepared = getattr(cur.connection, "prepared", None)
+    if prepared is None:
+        _count(name, "unprepared")
+        cur.execute(_UNPREPARED[name], {f"p{i}": value for i, value in enumerate(params, start=1)})
+        return
+
+    if name in prepared:
+        _count(name, "hits")
+    else:
+        cur.execute(f"PREPARE {name} AS {STATEMENTS[name]}")
+        prepared.add(name)  # PREPARE is not undone by ROLLBACK
+        _count(name, "prepares")
+
+    placeholders = ", ".join(["%s"] * len(params))
+    cur.execute(f"EXECUTE {name}({placeholders})" if params else f"EXECUTE {name}", list(params))
+
+
+def statement_stats() -> Dict[str, Dict[str, float]]:
+    """Per statement: prepares, hits (ran already prepared), unprepared runs and hit rate."""
+    with _lock:
+        stats = {name: dict(counters) for name, counters in _stats.items()}
+    for counters in stats.values():
+        prepared_runs = counters["prepares"] + counters["hits"]
+        counters["hit_rate"] = counters["hits"] / (prepared_runs or 1)
+    return stats
+
+
+def _benchmark(runs: int) -> None:
+    """Mean time per call for each hot statement: plain text vs EXECUTE of a prepared statement."""
+    from .connection import get_connection
+
+    samples = {
+        "outlet_hours": (1,),
+        "outlets_search": ("%a%", None),
+        "filter_menu": (1, None, True, None, None, 20),
+        "order_header": (1, "-infinity"),
+    }
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        for name, params in samples.items():
+            named = {f"p{i}": value for i, value in enumerate(params, start=1)}
+            started = time.perf_counter()
+            for _ in range(runs):
+                cur.execute(_UNPREPARED[name], named)
+                cur.fetchall()
+            plain = (time.perf_counter() - started) / runs
+
+            execute(cur, name, params)  # prepare outside the timed loop
+            cur.fetchall()
+            started = time.perf_counter()
+            for _ in range(runs):
+                execute(cur, name, params)
+                cur.fetchall()
+            prepared = (time.perf_counter() - started) / runs
+
+            print(
+                f"{name:<16} plain {plain * 1e6:8.0f}us  prepared {prepared * 1e6:8.0f}us  "
+                f"saved {(plain - prepared) * 1e6:6.0f}us/call"
+            )
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare plain vs prepared execution of the hot statements.")
+    parser.add_argument("--runs", type=int, default=500)
+    args = parser.parse_args()
+    _benchmark(args.runs)
@@ -1,5 +1,5 @@
 # models.py
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 
 class ConversationContext(BaseModel):
@@ -9,3 +9,18 @@ class ConversationContext(BaseModel):
     candidate_menu_item_ids: List[int] = []
     order_id: Optional[int] = None
     raw_user_message: str
+
+    def has_entities(self) -> bool:
+        """Whether the router resolved anything a specialist can use directly."""
+        return self.outlet_id is not None or self.order_id is not None or bool(self.candidate_menu_item_ids)
+
+class RouterDecision(BaseModel):
+    """Structured output of the router agent, copied into ConversationContext."""
+    target_agent: Literal["menu_agent", "ordering_agent", "status_agent", "outlet_agent", "clarify"]
+    intent: Literal[
+        "menu", "filter_menu", "outlet_search", "open_check", "ordering", "order_status", "order_history", "other"
+    ]
+    outlet_id: Optional[int] = None
+    candidate_menu_item_ids: List[int] = []
+    order_id: Optional[int] = None
+    reply: Optional[str] = None           # the answer itself when target_agent is "clarify"
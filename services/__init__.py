@@ -0,0 +1,10 @@
+"""
+Services package - Chat orchestration shared by the Streamlit UI and the HTTP API.
+"""
+from services.chat_service import handle_user_message, open_session, stream_user_message
+
+__all__ = [
+    "handle_user_message",
+    "open_session",
+    "stream_user_message",
+]
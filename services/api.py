@@ -0,0 +1,224 @@
+"""
+Headless HTTP chat API.
+
+Run with: uvicorn services.api:app --workers 4
+Each worker is stateless apart from the rate limiter; conversation memory
+lives in the shared SQLite session store.
+
+Load test: python -m services.api --benchmark
+           (concurrent POST /chat against one in-process worker, model served
+           by services/stub_model.py; reports throughput and p50/p99)
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from db.bulk_orders import BulkOrderPayload, place_orders
+from db.cache import shared_cache_stats
+from db.connection import replica_stats
+from db.single_flight import single_flight_stats
+from db.statements import statement_stats
+from services.chat_service import open_session, routing_stats, stream_user_message, warmup
+from services.degraded import degraded_stats
+from services.model_policy import RequestWindow, model_policy_stats, use_window
+from services.response_cache import response_cache_stats
+from services.speculation import speculation_stats
+from services.usage import usage_stats
+
+RATE_LIMIT_MAX_CALLS = 100  # per session, per window
+RATE_LIMIT_WINDOW = 60  # seconds
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build agents off the event loop so /health answers immediately after boot
+    asyncio.get_running_loop().run_in_executor(None, warmup)
+    yield
+
+
+app = FastAPI(title="Restaurant Chatbot API", lifespan=lifespan)
+
+# Per session: every model request of its turns (retries and hedges included) and bulk calls
+_windows_by_session = defaultdict(lambda: RequestWindow(RATE_LIMIT_MAX_CALLS, RATE_LIMIT_WINDOW))
+
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+
+
+def _check_rate_limit(session_id: str) -> RequestWindow:
+    """Sliding-window limit per session; rejects instead of sleeping. Returns the session's window."""
+    window = _windows_by_session[session_id]
+    if window.wait_seconds() > 0:
+        raise HTTPException(status_code=429, detail="Rate limit reached. Please retry shortly.")
+    return window
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/stats")
+async def stats():
+    """Per-worker cache counters."""
+    return {
+        "response_cache": response_cache_stats(),
+        "single_flight": single_flight_stats(),
+        "shared_cache": shared_cache_stats(),
+        "replicas": replica_stats(),
+        "prepared_statements": statement_stats(),
+        "degraded_mode": degraded_stats(),
+        "token_usage": usage_stats(),
+        "routing": routing_stats(),
+        "speculation": speculation_stats(),
+        "model_policy": model_policy_stats(),
+    }
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    message = request.message.strip()
+    if not message:
+        raise HTTPException(status_code=400, detail="Please enter a question.")
+
+    session_id = request.session_id or f"api-{uuid.uuid4().hex[:8]}"
+    window = _check_rate_limit(session_id)
+    session = open_session(session_id)
+
+    async def _body():
+        use_window(window)  # the turn's model requests count against the session's limit
+        try:
+            async for delta in stream_user_message(session_id, message, session):
+                yield delta
+        except Exception as e:
+            yield f"I encountered an error: {str(e)}. Please try again."
+
+    return StreamingResponse(
+        _body(),
+        media_type="text/plain; charset=utf-8",
+        headers={"X-Session-Id": session_id},
+    )
+
+
+@app.post("/orders/bulk")
+async def bulk_orders(request: BulkOrderPayload, session_id: Optional[str] = None):
+    """Create many orders in one call (catering, group orders); see db/bulk_orders.py."""
+    if session_id:
+        _check_rate_limit(session_id).charge()
+    try:
+        result = await asyncio.to_thread(place_orders, request.orders, session_id, request.all_or_nothing)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return result.as_dict()
+
+
+# ---------------------------------------------------------------------
+# Load test
+# ---------------------------------------------------------------------
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def _load_test(args) -> None:
+    """`args.users` sessions send `args.requests` turns in total through a real HTTP server."""
+    import httpx2
+    import uvicorn
+
+    from services import chat_service, stub_model
+    from services.speculation import BENCHMARK_MESSAGES
+
+    stub_model.install(latency_ms=args.latency_ms)
+    chat_service.RESPONSE_CACHE_ENABLED = args.response_cache
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    rng = random.Random(7)
+    turns = [rng.choice(BENCHMARK_MESSAGES).format(n=rng.randint(1, 6)) for _ in range(args.requests)]
+    latencies: List[float] = []
+    first_bytes: List[float] = []
+    failures = 0
+
+    async def user(client, session_id: str, messages: List[str]) -> None:
+        nonlocal failures
+        for message in messages:
+            started = time.perf_counter()
+            first, body = None, []
+            async with client.stream("POST", "/chat", json={"message": message, "session_id": session_id}) as response:
+                async for chunk in response.aiter_text():
+                    if first is None and chunk:
+                        first = time.perf_counter() - started
+                    body.append(chunk)
+            # _body() reports errors inside a 200 stream
+            if response.status_code != 200 or "".join(body).startswith("I encountered an error"):
+                failures += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            first_bytes.append(first or latencies[-1])
+
+    limits = httpx2.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    try:
+        async with httpx2.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=120) as client:
+            # Warm agents, tools and connections outside the measurement
+            await asyncio.gather(*(user(client, f"load-warmup-{i}", turns[:1]) for i in range(min(args.users, 10))))
+            latencies.clear()
+            first_bytes.clear()
+            stub_model.reset_stats()
+
+            started = time.perf_counter()
+            await asyncio.gather(
+                *(user(client, f"load-{uuid.uuid4().hex[:8]}", turns[i::args.users]) for i in range(args.users))
+            )
+            elapsed = time.perf_counter() - started
+    finally:
+        server.should_exit = True
+        await serving
+
+    model = stub_model.stub_stats()
+    print(
+        f"{len(latencies)} turns from {args.users} concurrent sessions in {elapsed:.1f} s: "
+        f"{len(latencies) / elapsed:.1f} turns/s, {failures} failed"
+    )
+    if latencies:
+        print(
+            f"turn latency      p50 {statistics.median(latencies) * 1e3:7.0f} ms   "
+            f"p99 {_percentile(latencies, 0.99) * 1e3:7.0f} ms"
+        )
+        print(
+            f"first byte        p50 {statistics.median(first_bytes) * 1e3:7.0f} ms   "
+            f"p99 {_percentile(first_bytes, 0.99) * 1e3:7.0f} ms"
+        )
+    print(
+        f"model requests {model['requests']} ({model['requests'] / (len(latencies) or 1):.1f} per turn, "
+        f"~{args.latency_ms:.0f} ms each); the rest of each turn is the API, orchestration and tools"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test POST /chat with a stub model.")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50, help="concurrent sessions, each sending its turns in order")
+    parser.add_argument("--latency-ms", type=float, default=300, help="median latency of one model request")
+    parser.add_argument("--response-cache", action="store_true", help="let repeated questions hit the response cache")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    if args.benchmark:
+        asyncio.run(_load_test(args))
+    else:
+        parser.print_help()
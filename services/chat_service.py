@@ -0,0 +1,492 @@
+"""
+Chat Service - Orchestrates router and specialist agents for one user turn.
+
+This module holds everything `app.py` used to do per message, so the
+Streamlit UI and the HTTP API (`services/api.py`) share one implementation.
+
+Importing it is cheap: the agents SDK, the agents themselves and LangSmith
+tracing are loaded on the first turn (or by `warmup()`), not at import time.
+"""
+import asyncio
+import importlib
+import os
+import threading
+import time
+from typing import AsyncIterator, Optional
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()  # loads OPENAI_API_KEY, DB_*, LANGSMITH_* from .env
+except ImportError:
+    # python-dotenv not installed, using environment variables directly
+    pass
+
+from db.catalog import get_catalog_version
+from db.connection import use_session
+from models import ConversationContext, RouterDecision
+from services import model_policy, speculation
+from services.degraded import DEGRADED_MODE_ENABLED, ModelUnavailable, breaker, degraded_answer
+from services.response_cache import RESPONSE_CACHE_ENABLED, response_cache
+from services.session_store import maybe_run_maintenance
+from services.turn_profile import profile_turn
+from services.usage import BudgetExceeded, begin_turn, check_budget, finish_turn, usage_hooks
+
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "conversations.db")
+
+CLARIFY_MESSAGE = (
+    "Can you clarify whether you want to browse the menu, place an order, or track an order?"
+)
+ROUTING_ERROR_MESSAGE = "Sorry, something went wrong while routing your request. Please try again."
+
+# ---------------------------------------------------------------------
+# Boot (lazy)
+# ---------------------------------------------------------------------
+
+# Add strict fallback if no tool applies
+RULE = (
+    "\n\nCRITICAL RULE: Only if the user's request is clearly NOT about restaurant "
+    "outlets, opening hours, menu items, placing orders, or checking order status "
+    "(for example, questions about personal life, movies, programming help, etc.), "
+    "then use target_agent 'clarify' with reply set EXACTLY to: "
+    "'I can only help with restaurant menu, orders, and order status. "
+    "How can I assist you with that?' "
+    "In all other cases, route to the appropriate specialist."
+)
+
+# target name -> (module, attribute); agents are imported on first use
+AGENT_MAP = {
+    "menu_agent": ("app_agents.menu_agent", "menu_agent"),
+    "ordering_agent": ("app_agents.ordering_agent", "ordering_agent"),
+    "status_agent": ("app_agents.status_agent", "status_agent"),
+    "outlet_agent": ("app_agents.outlet_agent", "outlet_agent"),
+}
+
+_boot_lock = threading.Lock()
+_tracing_configured = False
+
+
+def _configure_tracing() -> None:
+    """Optional: attach LangSmith tracing once, on the first turn."""
+    global _tracing_configured
+    if _tracing_configured:
+        return
+    with _boot_lock:
+        if _tracing_configured:
+            return
+        _tracing_configured = True
+        if os.getenv("LANGSMITH_TRACING_DISABLED"):
+            return
+        try:
+            from agents import set_trace_processors
+            from langsmith.wrappers import OpenAIAgentsTracingProcessor
+            set_trace_processors([OpenAIAgentsTracingProcessor()])
+        except Exception:
+            pass  # LangSmith not installed or not configured
+
+
+def get_agent(name: str):
+    """Import and return a specialist agent by target name, or None if unknown."""
+    spec = AGENT_MAP.get(name)
+    if spec is None:
+        return None
+    module_name, attr = spec
+    return model_policy.apply(getattr(importlib.import_module(module_name), attr))
+
+
+def get_router_agent():
+    """Return the router agent with the domain fallback rule applied."""
+    from app_agents.router_agent import router_agent
+
+    if RULE not in router_agent.instructions:
+        with _boot_lock:
+            if RULE not in router_agent.instructions:
+                router_agent.instructions += RULE
+    return model_policy.apply(router_agent)
+
+
+def warmup() -> None:
+    """Build every agent and tool ahead of the first request (e.g. after a worker boots)."""
+    _configure_tracing()
+    get_router_agent()
+    for name in AGENT_MAP:
+        get_agent(name)
+
+
+def open_session(session_id: str):
+    """Open the persistent conversation memory for a session."""
+    from agents import SQLiteSession
+
+    maybe_run_maintenance(SESSION_DB_PATH)
+    return SQLiteSession(session_id, SESSION_DB_PATH)
+
+
+def _apply_decision(ctx: ConversationContext, decision: RouterDecision) -> str:
+    """Copy a router decision into the context and return the target agent name."""
+    ctx.intent = decision.intent
+    ctx.outlet_id = decision.outlet_id
+    ctx.candidate_menu_item_ids = decision.candidate_menu_item_ids
+    ctx.order_id = decision.order_id
+    return decision.target_agent  # "menu_agent", "ordering_agent", "status_agent", "outlet_agent", or "clarify"
+
+
+def _route(ctx: ConversationContext, router_result):
+    """
+    Copy the router's decision into the context and return the target agent name.
+    """
+    decision = router_result.final_output
+    if not isinstance(decision, RouterDecision):
+        return None
+    return _apply_decision(ctx, decision)
+
+
+def _decision_of(ctx: ConversationContext, target: Optional[str]) -> Optional[RouterDecision]:
+    """The decision that sent this turn to `target`, rebuilt from the context it filled."""
+    if target is None:
+        return None
+    return RouterDecision(
+        target_agent=target,
+        intent=ctx.intent or "other",
+        outlet_id=ctx.outlet_id,
+        candidate_menu_item_ids=ctx.candidate_menu_item_ids,
+        order_id=ctx.order_id,
+    )
+
+
+def _router_reply(router_result) -> str:
+    """The router's own answer, for turns it does not route to a specialist."""
+    decision = router_result.final_output
+    return getattr(decision, "reply", None) or CLARIFY_MESSAGE
+
+
+# target -> {"with_entities" | "without_entities": {"runs", "model_calls"}}
+_routing_lock = threading.Lock()
+_routing_stats: dict = {}
+
+
+def _record_specialist_run(target: str, result) -> None:
+    """Count a specialist run's model calls, by whether the router gave it entities."""
+    ctx = result.context_wrapper.context
+    group = "with_entities" if ctx.has_entities() else "without_entities"
+    with _routing_lock:
+        row = _routing_stats.setdefault(target, {}).setdefault(group, {"runs": 0, "model_calls": 0})
+        row["runs"] += 1
+        row["model_calls"] += len(result.raw_responses)
+
+
+def routing_stats() -> dict:
+    """
+    Tool round trips per specialist run (model calls beyond the first), split
+    by whether the router's decision pre-filled entities into the context.
+    """
+    with _routing_lock:
+        stats = {target: {group: dict(row) for group, row in groups.items()} for target, groups in _routing_stats.items()}
+    for groups in stats.values():
+        for row in groups.values():
+            row["tool_round_trips_per_run"] = (row["model_calls"] - row["runs"]) / (row["runs"] or 1)
+    return stats
+
+
+# ---------------------------------------------------------------------
+# Response cache helpers
+# ---------------------------------------------------------------------
+
+_full_turn_seconds = 0.0  # EWMA of turns that went through the router
+
+
+async def _cache_lookup(ctx: ConversationContext, user_message: str):
+    """
+    Return (answer, target, catalog_version) from the response cache. A cached
+    decision is copied into `ctx`, as the router's own would be.
+    """
+    if not RESPONSE_CACHE_ENABLED:
+        return None, None, None
+    catalog_version = await asyncio.to_thread(get_catalog_version)
+    answer, decision = response_cache.lookup(user_message, ctx.conversation_id, catalog_version)
+    target = _apply_decision(ctx, decision) if decision is not None else None
+    return answer, target, catalog_version
+
+
+def _cache_store(ctx: ConversationContext, user_message: str, catalog_version, target, answer, started: float, via_router: bool) -> None:
+    global _full_turn_seconds
+    if catalog_version is None:
+        return
+    elapsed = time.perf_counter() - started
+    if via_router:
+        _full_turn_seconds = elapsed if not _full_turn_seconds else 0.8 * _full_turn_seconds + 0.2 * elapsed
+    else:
+        response_cache.record_saved(_full_turn_seconds - elapsed)
+    response_cache.store(user_message, ctx.conversation_id, catalog_version, _decision_of(ctx, target), answer, elapsed)
+
+
+async def _remember_turn(session, user_message: str, answer: str) -> None:
+    """Write a turn answered without a session run (cache, router reply) so conversation memory stays complete."""
+    if session is not None:
+        await session.add_items([
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": answer},
+        ])
+
+
+async def _turn_input(session, user_message: str):
+    """(user item, session history + user item): input for runs made without the session."""
+    user_item = {"role": "user", "content": user_message}
+    return user_item, (list(await session.get_items()) if session is not None else []) + [user_item]
+
+
+async def _remember_run(session, user_item: dict, result) -> None:
+    """Write a run made without a session (see `_speculative_turn`) to the session."""
+    if session is not None:
+        await session.add_items([user_item] + [item.to_input_item() for item in result.new_items])
+
+
+# ---------------------------------------------------------------------
+# Orchestration
+# ---------------------------------------------------------------------
+
+async def _run_agent(agent, user_message: str, session, ctx):
+    """
+    One model run with token accounting, under the circuit breaker unless
+    degraded mode is disabled.
+    """
+    from agents import Runner
+
+    check_budget()
+    hooks = usage_hooks()
+    if not DEGRADED_MODE_ENABLED:
+        return await Runner.run(agent, user_message, session=session, context=ctx, hooks=hooks)
+    return await breaker.call(
+        lambda: Runner.run(agent, user_message, session=session, context=ctx, hooks=hooks)
+    )
+
+
+async def _degraded_turn(session, user_message: str) -> str:
+    """Answer from the database only and keep the turn in conversation memory."""
+    answer = await degraded_answer(user_message)
+    await _remember_turn(session, user_message, answer)
+    return answer
+
+
+async def handle_user_message(conversation_id: str, user_message: str, session, profile: Optional[bool] = None) -> str:
+    """One chat turn; `profile` writes a turn profile (None = PROFILE_TURNS, see services/turn_profile.py)."""
+    with profile_turn(conversation_id, profile):
+        return await _handle_turn(conversation_id, user_message, session)
+
+
+async def _handle_turn(conversation_id: str, user_message: str, session) -> str:
+    _configure_tracing()
+    use_session(conversation_id)  # read-your-writes routing for tools this turn
+    started = time.perf_counter()
+    ctx = ConversationContext(
+        conversation_id=conversation_id,
+        raw_user_message=user_message,
+    )
+
+    # 0) Near-identical message seen before: reuse the answer or the routing decision
+    cached_answer, cached_target, catalog_version = await _cache_lookup(ctx, user_message)
+    if cached_answer is not None:
+        await _remember_turn(session, user_message, cached_answer)
+        return cached_answer
+
+    try:
+        turn = await begin_turn(conversation_id)
+    except BudgetExceeded as e:
+        return e.message
+
+    try:
+        return await _agent_turn(ctx, user_message, session, catalog_version, cached_target, started)
+    except ModelUnavailable:
+        if not DEGRADED_MODE_ENABLED:
+            raise
+        return await _degraded_turn(session, user_message)
+    except BudgetExceeded as e:
+        return e.message  # the router used up what was left
+    finally:
+        await finish_turn(turn)
+
+
+async def _agent_turn(ctx, user_message: str, session, catalog_version, cached_target, started: float) -> str:
+    if cached_target is not None:
+        specialist_result = await _run_agent(get_agent(cached_target), user_message, session, ctx)
+        _record_specialist_run(cached_target, specialist_result)
+        answer = specialist_result.final_output or "Done."
+        _cache_store(ctx, user_message, catalog_version, cached_target, answer, started, via_router=False)
+        return answer
+
+    turn_plan = speculation.plan(user_message)
+    if turn_plan is None:
+        return await _routed_turn(ctx, user_message, session, catalog_version, started)
+    if turn_plan.control:
+        answer = await _routed_turn(ctx, user_message, session, catalog_version, started)
+    else:
+        answer = await _speculative_turn(ctx, user_message, session, turn_plan, catalog_version, started)
+    speculation.record_latency(turn_plan, time.perf_counter() - started)
+    return answer
+
+
+async def _routed_turn(ctx, user_message: str, session, catalog_version, started: float) -> str:
+    # 1) Run router once; its decision fills ctx, only the specialist's run goes to the session
+    _, items = await _turn_input(session, user_message)
+    router_result = await _run_agent(get_router_agent(), items, None, ctx)
+    target = _route(ctx, router_result)
+
+    # 2) Clarify / no-op
+    if target in (None, "clarify"):
+        return await _router_answered(ctx, router_result, user_message, session, catalog_version, started)
+
+    # 3) One run of the specialist, starting from the router's entities
+    return await _specialist_turn(ctx, target, user_message, session, catalog_version, started)
+
+
+async def _router_answered(ctx, router_result, user_message: str, session, catalog_version, started: float) -> str:
+    answer = _router_reply(router_result)
+    await _remember_turn(session, user_message, answer)
+    _cache_store(ctx, user_message, catalog_version, None, answer, started, via_router=True)
+    return answer
+
+
+async def _specialist_turn(ctx, target: str, user_message: str, session, catalog_version, started: float) -> str:
+    specialist = get_agent(target)
+    if specialist is None:
+        return ROUTING_ERROR_MESSAGE
+
+    # tools read conversation_id from ctx (e.g. create_order idempotency)
+    specialist_result = await _run_agent(specialist, user_message, session, ctx)
+    _record_specialist_run(target, specialist_result)
+
+    answer = specialist_result.final_output or "Done."
+    _cache_store(ctx, user_message, catalog_version, target, answer, started, via_router=True)
+    return answer
+
+
+async def _speculative_turn(ctx, user_message: str, session, turn_plan, catalog_version, started: float) -> str:
+    """
+    Router and predicted specialist side by side (see services/speculation.py).
+    Both run on the session history without the session itself. The
+    speculative run is written back only if the router picks its specialist,
+    so a wrong guess leaves no trace.
+    """
+    from agents import Runner
+
+    check_budget()
+    user_item, items = await _turn_input(session, user_message)
+
+    speculation.start_prefetch(turn_plan)
+    spec = None
+    if turn_plan.target is not None:
+        hooks = usage_hooks()
+        # Each model request of the run is bounded by the breaker's MODEL_CALL_TIMEOUT
+        run = Runner.run(get_agent(turn_plan.target), items, context=ctx.model_copy(), hooks=hooks)
+        spec = speculation.Speculation(turn_plan.target, run, hooks)
+
+    try:
+        router_result = await _run_agent(get_router_agent(), items, None, ctx)
+        target = _route(ctx, router_result)
+
+        if spec is not None and target == spec.target:
+            result = await spec.commit()
+            if result is not None:
+                _record_specialist_run(target, result)
+                await _remember_run(session, user_item, result)
+                answer = result.final_output or "Done."
+                _cache_store(ctx, user_message, catalog_version, target, answer, started, via_router=True)
+                return answer
+            # The speculative run failed: run the specialist for real below
+        elif spec is not None:
+            await spec.cancel()
+
+        if target in (None, "clarify"):
+            return await _router_answered(ctx, router_result, user_message, session, catalog_version, started)
+        return await _specialist_turn(ctx, target, user_message, session, catalog_version, started)
+    finally:
+        if spec is not None:
+            await spec.cancel()  # no-op once committed
+
+
+async def _stream_run(agent, user_message: str, session, ctx, outcome: dict) -> AsyncIterator[str]:
+    """
+    Stream text deltas from one agent run; the finished result is left in `outcome`.
+    """
+    from agents import Runner
+    from openai.types.responses import ResponseTextDeltaEvent
+
+    check_budget()
+    hooks = usage_hooks()
+
+    def start():
+        outcome["result"] = Runner.run_streamed(agent, user_message, session=session, context=ctx, hooks=hooks)
+        return outcome["result"].stream_events()
+
+    events = breaker.stream(start) if DEGRADED_MODE_ENABLED else start()
+    async for event in events:
+        if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+            outcome["streamed"] = True
+            yield event.data.delta
+
+
+async def stream_user_message(conversation_id: str, user_message: str, session) -> AsyncIterator[str]:
+    """
+    Same orchestration as `handle_user_message`, yielding the answer as it is generated.
+    """
+    _configure_tracing()
+    use_session(conversation_id)  # read-your-writes routing for tools this turn
+    started = time.perf_counter()
+    ctx = ConversationContext(
+        conversation_id=conversation_id,
+        raw_user_message=user_message,
+    )
+
+    cached_answer, cached_target, catalog_version = await _cache_lookup(ctx, user_message)
+    if cached_answer is not None:
+        await _remember_turn(session, user_message, cached_answer)
+        yield cached_answer
+        return
+
+    try:
+        turn = await begin_turn(conversation_id)
+    except BudgetExceeded as e:
+        yield e.message
+        return
+
+    streamed = False
+    try:
+        async for delta in _stream_agent_turn(ctx, user_message, session, catalog_version, cached_target, started):
+            streamed = True
+            yield delta
+    except ModelUnavailable:
+        if not DEGRADED_MODE_ENABLED:
+            raise
+        answer = await _degraded_turn(session, user_message)
+        yield ("\n\n" if streamed else "") + answer
+    except BudgetExceeded as e:
+        yield ("\n\n" if streamed else "") + e.message
+    finally:
+        await finish_turn(turn)
+
+
+async def _stream_agent_turn(ctx, user_message: str, session, catalog_version, cached_target, started: float) -> AsyncIterator[str]:
+    if cached_target is not None:
+        target = cached_target
+    else:
+        # The router's output is a decision, not text for the user: run it to completion
+        _, items = await _turn_input(session, user_message)
+        router_result = await _run_agent(get_router_agent(), items, None, ctx)
+        target = _route(ctx, router_result)
+
+        if target in (None, "clarify"):
+            yield await _router_answered(ctx, router_result, user_message, session, catalog_version, started)
+            return
+
+    specialist = get_agent(target)
+    if specialist is None:
+        yield ROUTING_ERROR_MESSAGE
+        return
+
+    specialist_outcome: dict = {"streamed": False}
+    async for delta in _stream_run(specialist, user_message, session, ctx, specialist_outcome):
+        yield delta
+    specialist_result = specialist_outcome["result"]
+    _record_specialist_run(target, specialist_result)
+    answer = specialist_result.final_output or "Done."
+    if not specialist_outcome["streamed"]:
+        yield answer
+    _cache_store(ctx, user_message, catalog_version, target, answer, started, via_router=cached_target is None)
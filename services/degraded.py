@@ -0,0 +1,385 @@
+"""
+Degraded Mode - Answers without the LLM when the model provider is slow or failing.
+
+Every model run goes through `breaker.call`, which refuses it while the
+breaker is open. Each model request inside the run (wrapped by
+services/model_policy.py) goes through `breaker.model_call`: it is bounded
+by MODEL_CALL_TIMEOUT, and provider errors (connection errors, API
+timeouts, 429s, 5xx), timeouts and requests slower than BREAKER_SLOW_SECONDS
+count as failures. Tool errors, invalid requests, MaxTurnsExceeded and
+output validation errors say nothing about the provider and are not
+counted. When the failure ratio over the last BREAKER_WINDOW requests
+reaches BREAKER_FAILURE_RATIO, the breaker opens. While it is open, turns
+skip the model entirely. After BREAKER_COOLDOWN seconds, one probe run is
+let through to test the provider.
+
+Turns that cannot use the model get a deterministic answer instead. A regex
+intent and slot extractor picks a read-only tool from db/, calls it directly,
+and wraps the result in a short template. Placing orders needs the model, so
+those turns get a retry-later message instead.
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+DEGRADED_MODE_ENABLED = os.getenv("DEGRADED_MODE_ENABLED", "1") != "0"
+MODEL_CALL_TIMEOUT = float(os.getenv("MODEL_CALL_TIMEOUT", "20"))
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATIO = float(os.getenv("BREAKER_FAILURE_RATIO", "0.5"))
+BREAKER_SLOW_SECONDS = float(os.getenv("BREAKER_SLOW_SECONDS", "12"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+
+LIMITED_MODE_NOTE = "_Our assistant is in limited mode right now, so here is the information directly._\n\n"
+ORDERING_UNAVAILABLE_MESSAGE = (
+    "Placing orders needs our assistant, which is unavailable at the moment. "
+    "Please try again in a minute. Meanwhile I can show menus, opening hours and order status."
+)
+FALLBACK_HELP_MESSAGE = (
+    "Our assistant is unavailable at the moment, but I can still help with:\n"
+    "- \"outlets in Seattle\" or \"outlets near 98101\"\n"
+    "- \"menu for outlet 2\" or \"vegetarian items under $10 at outlet 2\"\n"
+    "- \"is outlet 3 open?\"\n"
+    "- \"status of order 1234\"\n"
+    "- \"my orders for 555-123-4567\""
+)
+
+
+class ModelUnavailable(Exception):
+    """The model run failed, timed out, or was refused by an open breaker."""
+
+
+def is_provider_error(error: BaseException) -> bool:
+    """Whether `error` means the provider is down or overloaded (not a bad request or a tool failure)."""
+    import openai
+
+    if isinstance(error, (TimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True  # APITimeoutError is an APIConnectionError; asyncio.TimeoutError is TimeoutError
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+# ---------------------------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------------------------
+
+class CircuitBreaker:
+    """Rolling-window breaker over model requests: closed -> open -> half-open -> closed."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._outcomes: deque = deque(maxlen=BREAKER_WINDOW)  # True = healthy request
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._stats = {"calls": 0, "failures": 0, "timeouts": 0, "slow": 0, "rejected": 0, "opened": 0}
+
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < BREAKER_COOLDOWN:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """Whether a model run may start; in half-open state only one probe at a time."""
+        return self._admit() is not None
+
+    def _admit(self) -> Optional[str]:
+        """How a model run is let in: "closed", "probe", or None when it is refused."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return state
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return "probe"
+            self._stats["rejected"] += 1
+            return None
+
+    def _release(self, admitted: Optional[str]) -> None:
+        """A probe run that ended without a model request: let the next run probe instead."""
+        if admitted == "probe":
+            with self._lock:
+                self._probing = False
+
+    def record(self, healthy: bool) -> None:
+        with self._lock:
+            self._stats["calls"] += 1
+            if not healthy:
+                self._stats["failures"] += 1
+            if self._probing:
+                self._probing = False
+                self._opened_at = None if healthy else time.monotonic()
+                self._outcomes.clear()
+                return
+            self._outcomes.append(healthy)
+            failures = self._outcomes.count(False)
+            if (
+                self._opened_at is None
+                and len(self._outcomes) >= BREAKER_MIN_CALLS
+                and failures / len(self._outcomes) >= BREAKER_FAILURE_RATIO
+            ):
+                self._opened_at = time.monotonic()
+                self._stats["opened"] += 1
+
+    def _record_error(self, error: BaseException) -> None:
+        if isinstance(error, TimeoutError):
+            with self._lock:
+                self._stats["timeouts"] += 1
+        # Any other answer from the provider (a 400, a refusal) shows it is up
+        self.record(not is_provider_error(error))
+
+    def _record_latency(self, seconds: float) -> None:
+        slow = seconds > BREAKER_SLOW_SECONDS
+        if slow:
+            with self._lock:
+                self._stats["slow"] += 1
+        self.record(not slow)
+
+    async def call(self, make_call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run one model run (`Runner.run`) if the breaker allows it. Its model
+        requests are counted one by one in `model_call`; any failure of the
+        run raises ModelUnavailable so the turn can be answered without it.
+        """
+        admitted = self._admit()
+        if admitted is None:
+            raise ModelUnavailable("circuit open")
+        try:
+            return await make_call()
+        except Exception as e:
+            raise ModelUnavailable(str(e) or type(e).__name__) from e
+        finally:
+            self._release(admitted)
+
+    async def stream(self, start: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Streaming form of `call`: `start()` begins the run and returns its event iterator."""
+        admitted = self._admit()
+        if admitted is None:
+            raise ModelUnavailable("circuit open")
+        try:
+            async for event in start():
+                yield event
+        except Exception as e:
+            raise ModelUnavailable(str(e) or type(e).__name__) from e
+        finally:
+            self._release(admitted)
+
+    async def model_call(self, make_request: Callable[[], Awaitable[Any]]) -> Any:
+        """One model request, bounded by MODEL_CALL_TIMEOUT and counted by outcome and latency."""
+        if not DEGRADED_MODE_ENABLED:
+            return await make_request()
+        started = time.monotonic()
+        try:
+            response = await asyncio.wait_for(make_request(), MODEL_CALL_TIMEOUT)
+        except Exception as e:
+            self._record_error(e)
+            raise
+        self._record_latency(time.monotonic() - started)
+        return response
+
+    async def model_stream(self, start: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Streaming form of `model_call`: each event must arrive within MODEL_CALL_TIMEOUT."""
+        if not DEGRADED_MODE_ENABLED:
+            async for event in start():
+                yield event
+            return
+        started = time.monotonic()
+        events = start().__aiter__()
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.__anext__(), MODEL_CALL_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                yield event
+        except Exception as e:
+            self._record_error(e)
+            raise
+        self._record_latency(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["state"] = self._state()
+        return stats
+
+
+breaker = CircuitBreaker()
+
+
+# ---------------------------------------------------------------------
+# Intent and slot extraction
+# ---------------------------------------------------------------------
+
+@dataclass
+class Intent:
+    name: str  # order_status, order_history, open_check, filter_menu, menu, outlet_search, ordering, unknown
+    slots: Dict[str, Any] = field(default_factory=dict)
+
+
+_ORDER_ID = re.compile(r"\border\s*(?:#|no\.?|number|id)?\s*#?\s*(\d+)", re.I)
+_OUTLET_IDS = re.compile(r"\b(?:outlet|store|restaurant|location)s?\s*#?\s*(\d+(?:\s*(?:,|and|&)\s*#?\s*\d+)*)", re.I)
+_PHONE = re.compile(r"(\+?\d[\d\s().-]{8,}\d)")
+_ZIP = re.compile(r"\b(\d{5})\b")
+_CITY = re.compile(r"\b(?:in|near|around)\s+([A-Za-z][A-Za-z .'-]*[A-Za-z])", re.I)
+_MAX_PRICE = re.compile(r"\b(?:under|below|less than|cheaper than|max(?:imum)?|up to)\s*\$?\s*(\d+(?:\.\d+)?)", re.I)
+_MIN_PRICE = re.compile(r"\b(?:over|above|more than|at least|min(?:imum)?)\s*\$?\s*(\d+(?:\.\d+)?)", re.I)
+_NON_VEG = re.compile(r"\bnon[- ]?veg(?:etarian)?\b", re.I)
+_VEG = re.compile(r"\bveg(?:etarian|gie|an)?\b", re.I)
+_MILD = re.compile(r"\b(?:not spicy|non[- ]?spicy|mild)\b", re.I)
+_SPICY = re.compile(r"\bspicy\b", re.I)
+_ORDERING = re.compile(r"\b(?:i want to order|i'd like to order|place an order|add to (?:my )?cart|buy|checkout)\b", re.I)
+_CITY_STOPWORDS = {"outlet", "outlets", "the", "my", "your", "stock", "store", "restaurant"}
+
+
+def _outlet_ids(message: str) -> List[int]:
+    ids: List[int] = []
+    for match in _OUTLET_IDS.finditer(message):
+        ids += [int(n) for n in re.findall(r"\d+", match.group(1))]
+    return list(dict.fromkeys(ids))
+
+
+def extract_intent(message: str) -> Intent:
+    """Best-effort intent and slots for the read-only questions the tools can answer."""
+    text = message.strip()
+    lower = text.lower()
+
+    if _ORDERING.search(text):
+        return Intent("ordering")
+
+    order = _ORDER_ID.search(text)
+    if order and ("outlet" not in lower or re.search(r"\b(?:status|track|where|when|ready|eta)\b", lower)):
+        return Intent("order_status", {"order_id": int(order.group(1))})
+
+    phone = _PHONE.search(text)
+    if phone and re.search(r"\b(?:orders?|history|past|previous|my)\b", lower):
+        digits = re.sub(r"\D", "", phone.group(1))
+        if len(digits) >= 7:
+            return Intent("order_history", {"phone": phone.group(1)})
+
+    outlet_ids = _outlet_ids(text)
+    if outlet_ids and re.search(r"\b(?:open|opened|closed|close|hours)\b", lower):
+        return Intent("open_check", {"outlet_ids": outlet_ids})
+
+    if outlet_ids:
+        filters: Dict[str, Any] = {}
+        if _NON_VEG.search(text):
+            filters["is_veg"] = False
+        elif _VEG.search(text):
+            filters["is_veg"] = True
+        if _MILD.search(text):
+            filters["is_spicy"] = False
+        elif _SPICY.search(text):
+            filters["is_spicy"] = True
+        max_price = _MAX_PRICE.search(text)
+        if max_price:
+            filters["max_price"] = float(max_price.group(1))
+        min_price = _MIN_PRICE.search(text)
+        if min_price:
+            filters["min_price"] = float(min_price.group(1))
+        if filters:
+            return Intent("filter_menu", {"outlet_ids": outlet_ids, **filters})
+        if re.search(r"\b(?:menu|items|dishes|food|serve|eat)\b", lower):
+            return Intent("menu", {"outlet_ids": outlet_ids})
+
+    if re.search(r"\b(?:outlets?|restaurants?|stores?|locations?|branch(?:es)?)\b", lower):
+        zip_code = _ZIP.search(text)
+        if zip_code:
+            return Intent("outlet_search", {"zip_code": zip_code.group(1)})
+        city = _CITY.search(text)
+        if city:
+            words = [w for w in city.group(1).split() if w.lower() not in _CITY_STOPWORDS]
+            if words:
+                return Intent("outlet_search", {"city": " ".join(words)})
+
+    return Intent("unknown")
+
+
+# ---------------------------------------------------------------------
+# Templated answers
+# ---------------------------------------------------------------------
+
+def _tool(name: str) -> Callable[..., str]:
+    # Tool modules register their plain callables on import
+    import db.customer_history  # noqa: F401
+    import db.queries  # noqa: F401
+    from db.single_flight import read_only_tool
+
+    return read_only_tool(name)
+
+
+def _answer(intent: Intent) -> str:
+    slots = intent.slots
+    if intent.name == "ordering":
+        return ORDERING_UNAVAILABLE_MESSAGE
+    if intent.name == "order_status":
+        return LIMITED_MODE_NOTE + _tool("get_order_status")(slots["order_id"])
+    if intent.name == "order_history":
+        return LIMITED_MODE_NOTE + _tool("get_orders_by_phone")(slots["phone"])
+    if intent.name == "open_check":
+        ids = slots["outlet_ids"]
+        if len(ids) == 1:
+            return LIMITED_MODE_NOTE + _tool("is_outlet_open")(ids[0])
+        return LIMITED_MODE_NOTE + _tool("is_outlets_open")(ids)
+    if intent.name == "menu":
+        ids = slots["outlet_ids"]
+        if len(ids) == 1:
+            return LIMITED_MODE_NOTE + _tool("get_outlet_menu")(ids[0])
+        return LIMITED_MODE_NOTE + _tool("get_outlet_menus")(ids)
+    if intent.name == "filter_menu":
+        filters = {k: v for k, v in slots.items() if k != "outlet_ids"}
+        ids = slots["outlet_ids"]
+        if len(ids) == 1:
+            return LIMITED_MODE_NOTE + _tool("filter_menu")(ids[0], **filters)
+        return LIMITED_MODE_NOTE + _tool("filter_menu_multi")(ids, **filters)
+    if intent.name == "outlet_search":
+        return LIMITED_MODE_NOTE + _tool("get_outlets_by_city_or_zip")(**slots)
+    return FALLBACK_HELP_MESSAGE
+
+
+_stats_lock = threading.Lock()
+_fallback_stats: Dict[str, Any] = {"answers": 0, "errors": 0, "by_intent": {}}
+_fallback_latencies: deque = deque(maxlen=1000)
+
+
+async def degraded_answer(user_message: str) -> str:
+    """Deterministic answer for `user_message`, computed from the database only."""
+    started = time.perf_counter()
+    intent = extract_intent(user_message)
+    try:
+        answer = await asyncio.to_thread(_answer, intent)
+    except Exception:
+        answer = FALLBACK_HELP_MESSAGE
+        with _stats_lock:
+            _fallback_stats["errors"] += 1
+    with _stats_lock:
+        _fallback_stats["answers"] += 1
+        by_intent = _fallback_stats["by_intent"]
+        by_intent[intent.name] = by_intent.get(intent.name, 0) + 1
+        _fallback_latencies.append(time.perf_counter() - started)
+    return answer
+
+
+def degraded_stats() -> Dict[str, Any]:
+    """Breaker state and counters, plus how often and how fast fallback answers were served."""
+    with _stats_lock:
+        stats = {
+            "answers": _fallback_stats["answers"],
+            "errors": _fallback_stats["errors"],
+            "by_intent": dict(_fallback_stats["by_intent"]),
+        }
+        latencies = sorted(_fallback_latencies)
+    if latencies:
+        for name, q in (("p50_seconds", 0.50), ("p99_seconds", 0.99)):
+            stats[name] = latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+    stats["breaker"] = breaker.stats()
+    return stats
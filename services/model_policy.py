@@ -0,0 +1,574 @@
+"""
+Model Policy - Deadlines, retries and hedged requests for every model call.
+
+Each agent's model is wrapped in a `PolicyModel` (`apply`, called when
+chat_service loads the agents). The wrapper works on single model requests,
+below `Runner.run`. Tool calls are never repeated, only the request that
+asks the model what to do next, which has no side effects. Per request:
+
+- deadline: MODEL_DEADLINE_SECONDS, or the agent's entry in
+  MODEL_DEADLINES ({"RouterAgent": 8}), covers all attempts. Past it the
+  request fails with ModelDeadlineExceeded, which the degraded-mode breaker
+  counts like any other provider timeout.
+- retries: up to MODEL_RETRIES on connection errors, timeouts, 429s and
+  5xx, after a full-jitter exponential backoff (MODEL_RETRY_BACKOFF,
+  capped at MODEL_RETRY_MAX_BACKOFF), while the deadline allows.
+- hedging: when a request is still running after the agent's recent p95
+  latency, one duplicate is sent. The first to finish wins and the other is
+  cancelled. Until MODEL_HEDGE_MIN_SAMPLES latencies are known,
+  MODEL_HEDGE_INITIAL_DELAY is used.
+
+Every attempt is charged to the caller's rate limit: the RequestWindow a
+turn runs under (`use_window`; the Streamlit session's limiter in app.py,
+the session's in services/api.py). First attempts always go out. Retries
+and hedges are only sent while that window has room, and never while the
+breaker is not closed, so they cannot amplify an overload or an outage.
+Streaming responses get the deadline and retries up to their first event,
+but no hedging.
+
+The OpenAI client's own retries are turned off so this layer decides; set a
+custom client with `set_openai_client`. Each attempt also goes through the
+breaker's `model_call`, which times it and counts provider errors. With
+MODEL_POLICY_ENABLED=0 models are still wrapped for that, with one plain
+attempt per request.
+
+Run with: python -m services.model_policy --benchmark
+          (local stub model server with injected latency and faults; p99 with vs without the policy)
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar, Token
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from services.degraded import DEGRADED_MODE_ENABLED, breaker, is_provider_error
+
+MODEL_POLICY_ENABLED = os.getenv("MODEL_POLICY_ENABLED", "1") != "0"
+MODEL_DEADLINE_SECONDS = float(os.getenv("MODEL_DEADLINE_SECONDS", "15"))
+MODEL_DEADLINES: Dict[str, float] = json.loads(os.getenv("MODEL_DEADLINES", "{}"))
+MODEL_RETRIES = int(os.getenv("MODEL_RETRIES", "2"))
+MODEL_RETRY_BACKOFF = float(os.getenv("MODEL_RETRY_BACKOFF", "0.25"))
+MODEL_RETRY_MAX_BACKOFF = float(os.getenv("MODEL_RETRY_MAX_BACKOFF", "2"))
+MODEL_HEDGE_ENABLED = os.getenv("MODEL_HEDGE_ENABLED", "1") != "0"
+MODEL_HEDGE_QUANTILE = float(os.getenv("MODEL_HEDGE_QUANTILE", "0.95"))
+MODEL_HEDGE_MIN_SAMPLES = int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", "20"))
+MODEL_HEDGE_INITIAL_DELAY = float(os.getenv("MODEL_HEDGE_INITIAL_DELAY", "4"))
+
+LATENCY_WINDOW = 200  # recent successful attempts per agent, for the hedge delay
+
+
+class ModelDeadlineExceeded(TimeoutError):
+    """No attempt of a model request finished within the agent's deadline."""
+
+
+# ---------------------------------------------------------------------
+# Rate limiter and stats
+# ---------------------------------------------------------------------
+
+class RequestWindow:
+    """Sliding window rate limit: at most `limit` model requests per `seconds`."""
+
+    def __init__(self, limit: int, seconds: float = 60):
+        self.limit = limit
+        self.seconds = seconds
+        self._sent: deque = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float) -> None:
+        while self._sent and self._sent[0] < now - self.seconds:
+            self._sent.popleft()
+
+    def charge(self) -> None:
+        """Record a request that goes out regardless (a first attempt)."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._sent.append(now)
+
+    def try_charge(self) -> bool:
+        """Record an optional request (retry, hedge) if the window has room."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if len(self._sent) >= self.limit:
+                return False
+            self._sent.append(now)
+            return True
+
+    def in_window(self) -> int:
+        with self._lock:
+            self._trim(time.monotonic())
+            return len(self._sent)
+
+    def wait_seconds(self) -> float:
+        """Seconds until the window has room for another request (0 if it has now)."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if len(self._sent) < self.limit:
+                return 0.0
+            return self._sent[0] + self.seconds - now
+
+
+_window: ContextVar[Optional[RequestWindow]] = ContextVar("model_request_window", default=None)
+
+
+def use_window(window: Optional[RequestWindow]) -> Token:
+    """Charge the model requests of this context (a turn and its tasks) to `window`."""
+    return _window.set(window)
+
+
+def _charge() -> None:
+    window = _window.get()
+    if window is not None:
+        window.charge()
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {
+    "requests": 0,
+    "attempts": 0,
+    "retries": 0,
+    "hedges": 0,
+    "hedge_wins": 0,
+    "limited": 0,  # retries or hedges not sent because the window was full
+    "deadline_exceeded": 0,
+    "failures": 0,
+}
+
+
+def _count(field: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[field] += n
+
+
+# ---------------------------------------------------------------------
+# Per-agent policy
+# ---------------------------------------------------------------------
+
+class AgentPolicy:
+    """Deadline and latency history of one agent."""
+
+    def __init__(self, agent_name: str):
+        self.agent_name = agent_name
+        self.deadline = float(MODEL_DEADLINES.get(agent_name, MODEL_DEADLINE_SECONDS))
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging: recent MODEL_HEDGE_QUANTILE latency (None = no hedging)."""
+        if not MODEL_HEDGE_ENABLED:
+            return None
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < MODEL_HEDGE_MIN_SAMPLES:
+            return MODEL_HEDGE_INITIAL_DELAY
+        return latencies[min(len(latencies) - 1, int(MODEL_HEDGE_QUANTILE * len(latencies)))]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = len(self._latencies)
+        return {"deadline_seconds": self.deadline, "hedge_delay_seconds": self.hedge_delay(), "samples": samples}
+
+
+_policies: Dict[str, AgentPolicy] = {}
+
+
+def _extra_allowed() -> bool:
+    """Whether a retry or hedge may be sent now (breaker closed, the caller's window has room)."""
+    if breaker.state() != "closed":
+        return False
+    window = _window.get()
+    if window is not None and not window.try_charge():
+        _count("limited")
+        return False
+    return True
+
+
+def _backoff(retry: int) -> float:
+    """Full jitter: uniform over [0, min(cap, base * 2^(retry - 1))]."""
+    return random.uniform(0, min(MODEL_RETRY_MAX_BACKOFF, MODEL_RETRY_BACKOFF * 2 ** (retry - 1)))
+
+
+# ---------------------------------------------------------------------
+# Model wrapper
+# ---------------------------------------------------------------------
+
+_policy_model_class = None
+_openai_client = None
+_openai_provider = None
+
+
+def _provider():
+    """
+    OpenAI model provider on the client from `set_openai_client` (or one
+    built from the OPENAI_* variables), with the client's retries turned off
+    so this module decides (built on first use).
+    """
+    global _openai_provider
+    if _openai_provider is None:
+        from agents import OpenAIProvider
+        from openai import AsyncOpenAI
+
+        client = _openai_client or AsyncOpenAI()
+        _openai_provider = OpenAIProvider(openai_client=client.with_options(max_retries=0))
+    return _openai_provider
+
+
+def set_openai_client(client) -> None:
+    """Use `client` for every model request, and as the agents SDK's default client."""
+    global _openai_client, _openai_provider
+    from agents import set_default_openai_client
+
+    set_default_openai_client(client)
+    _openai_client = client
+    _openai_provider = None
+
+
+def use_provider(provider) -> None:
+    """Serve wrapped models from `provider` instead (services/stub_model.py); call before the first turn."""
+    global _openai_provider
+    _openai_provider = provider
+
+
+def _model_class():
+    """agents.Model subclass applying the policy around an inner model (built on first use)."""
+    global _policy_model_class
+    if _policy_model_class is None:
+        from agents.models.interface import Model
+
+        class PolicyModel(Model):
+            def __init__(self, policy: AgentPolicy, model_name: Optional[str] = None, inner=None):
+                from agents.models import get_default_model
+
+                self.policy = policy
+                self.model_name = model_name or get_default_model()
+                self._inner = inner
+
+            @property
+            def inner(self):
+                if self._inner is None:
+                    self._inner = _provider().get_model(self.model_name)
+                return self._inner
+
+            async def _attempt(self, args, kwargs):
+                _count("attempts")
+                started = time.monotonic()
+                response = await breaker.model_call(lambda: self.inner.get_response(*args, **kwargs))
+                self.policy.observe(time.monotonic() - started)
+                return response
+
+            async def _hedged(self, deadline: float, args, kwargs):
+                """One attempt, plus a duplicate if it outlives the hedge delay; first success wins."""
+                loop = asyncio.get_running_loop()
+                started = loop.time()  # the hedge delay counts from this attempt, not the first one
+                tasks = {asyncio.ensure_future(self._attempt(args, kwargs))}
+                hedge = None
+                hedge_delay = self.policy.hedge_delay()
+                error: Optional[BaseException] = None
+                try:
+                    while tasks:
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            _count("deadline_exceeded")
+                            raise ModelDeadlineExceeded(
+                                f"{self.policy.agent_name}: no model response within {self.policy.deadline:.0f}s"
+                            )
+                        wait = remaining
+                        if hedge is None and hedge_delay is not None:
+                            wait = min(wait, max(hedge_delay - (loop.time() - started), 0))
+                        done, tasks = await asyncio.wait(tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            if task.exception() is None:
+                                if task is hedge:
+                                    _count("hedge_wins")
+                                return task.result()
+                            error = task.exception()
+                        if not done and hedge is None and hedge_delay is not None:
+                            if _extra_allowed():
+                                _count("hedges")
+                                hedge = asyncio.ensure_future(self._attempt(args, kwargs))
+                                tasks.add(hedge)
+                            else:
+                                hedge_delay = None  # no room: just wait for the first attempt
+                    raise error
+                finally:
+                    for task in tasks:
+                        task.cancel()
+
+            async def get_response(self, *args, **kwargs):
+                _charge()
+                if not MODEL_POLICY_ENABLED:
+                    return await breaker.model_call(lambda: self.inner.get_response(*args, **kwargs))
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + self.policy.deadline
+                _count("requests")
+                retry = 0
+                while True:
+                    try:
+                        return await self._hedged(deadline, args, kwargs)
+                    except ModelDeadlineExceeded:
+                        _count("failures")
+                        raise
+                    except Exception as e:
+                        retry += 1
+                        delay = _backoff(retry)
+                        if (
+                            not is_provider_error(e)
+                            or retry > MODEL_RETRIES
+                            or loop.time() + delay >= deadline
+                            or not _extra_allowed()
+                        ):
+                            _count("failures")
+                            raise
+                        _count("retries")
+                        await asyncio.sleep(delay)
+
+            async def stream_response(self, *args, **kwargs) -> AsyncIterator[Any]:
+                _charge()
+                if not MODEL_POLICY_ENABLED:
+                    async for event in breaker.model_stream(lambda: self.inner.stream_response(*args, **kwargs)):
+                        yield event
+                    return
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + self.policy.deadline
+                _count("requests")
+                retry = 0
+                while True:
+                    _count("attempts")
+                    events = breaker.model_stream(lambda: self.inner.stream_response(*args, **kwargs)).__aiter__()
+                    try:
+                        first = await asyncio.wait_for(events.__anext__(), max(deadline - loop.time(), 0))
+                        break
+                    except StopAsyncIteration:
+                        return
+                    except asyncio.TimeoutError as e:
+                        await events.aclose()
+                        _count("deadline_exceeded")
+                        _count("failures")
+                        raise ModelDeadlineExceeded(
+                            f"{self.policy.agent_name}: no model response within {self.policy.deadline:.0f}s"
+                        ) from e
+                    except Exception as e:
+                        await events.aclose()
+                        retry += 1
+                        delay = _backoff(retry)
+                        if (
+                            not is_provider_error(e)
+                            or retry > MODEL_RETRIES
+                            or loop.time() + delay >= deadline
+                            or not _extra_allowed()
+                        ):
+                            _count("failures")
+                            raise
+                        _count("retries")
+                        await asyncio.sleep(delay)
+                yield first
+                async for event in events:
+                    yield event
+
+            def get_retry_advice(self, request):
+                return self.inner.get_retry_advice(request)
+
+            async def close(self) -> None:
+                if self._inner is not None:
+                    await self._inner.close()
+
+        _policy_model_class = PolicyModel
+    return _policy_model_class
+
+
+def policy_for(agent_name: str) -> AgentPolicy:
+    policy = _policies.get(agent_name)
+    if policy is None:
+        policy = _policies.setdefault(agent_name, AgentPolicy(agent_name))
+    return policy
+
+
+def apply(agent):
+    """
+    Wrap `agent`'s model (and those of the agents it hands off to) in a
+    PolicyModel, once. The agent keeps the model settings it was built with:
+    assigning `.model` does not reset them.
+    """
+    if not (MODEL_POLICY_ENABLED or DEGRADED_MODE_ENABLED):
+        return agent
+    model_class = _model_class()
+    pending = [agent]
+    while pending:
+        current = pending.pop()
+        if isinstance(current.model, model_class) or not hasattr(current, "handoffs"):
+            continue
+        if current.model is None or isinstance(current.model, str):
+            current.model = model_class(policy_for(current.name), current.model)
+        pending.extend(h for h in current.handoffs if hasattr(h, "model"))
+    return agent
+
+
+def model_policy_stats() -> Dict[str, Any]:
+    """Attempts, retries, hedges (and how often the hedge won), deadline misses, per-agent hedge delays."""
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(_stats)
+    stats["agents"] = {name: policy.stats() for name, policy in list(_policies.items())}
+    return stats
+
+
+# ---------------------------------------------------------------------
+# Stub model server and benchmark
+# ---------------------------------------------------------------------
+
+def _stub_app(latency_ms: float, tail_ratio: float, tail_ms: float, fault_ratio: float):
+    """
+    Minimal Responses API: each call sleeps a lognormal latency around
+    `latency_ms`; `tail_ratio` of calls take `tail_ms` instead and
+    `fault_ratio` fail with a 500 or 429.
+    """
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+    counter = {"calls": 0}
+
+    @app.post("/v1/responses")
+    async def responses():
+        counter["calls"] += 1
+        roll = random.random()
+        if roll < tail_ratio:
+            delay = tail_ms * random.uniform(0.8, 1.2)
+        else:
+            delay = random.lognormvariate(0, 0.25) * latency_ms
+        await asyncio.sleep(delay / 1000)
+        if random.random() < fault_ratio:
+            status = random.choice((429, 500))
+            return JSONResponse({"error": {"message": "injected fault", "type": "server_error"}}, status_code=status)
+        return {
+            "id": f"resp_{counter['calls']}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": "stub",
+            "status": "completed",
+            "parallel_tool_calls": False,
+            "tool_choice": "auto",
+            "tools": [],
+            "output": [{
+                "type": "message",
+                "id": f"msg_{counter['calls']}",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": "ok", "annotations": []}],
+            }],
+            "usage": {
+                "input_tokens": 20,
+                "output_tokens": 2,
+                "total_tokens": 22,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens_details": {"reasoning_tokens": 0},
+            },
+        }
+
+    app.state.counter = counter
+    return app
+
+
+def _quantile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _measure(model, requests: int, concurrency: int) -> Dict[str, Any]:
+    from agents import ModelSettings
+    from agents.models.interface import ModelTracing
+
+    latencies: List[float] = []
+    errors = 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with gate:
+            started = time.perf_counter()
+            try:
+                await model.get_response(
+                    "You are a stub.", "hi", ModelSettings(), [], None, [], ModelTracing.DISABLED,
+                    previous_response_id=None, conversation_id=None, prompt=None,
+                )
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    result: Dict[str, Any] = {"ok": len(latencies), "errors": errors}
+    for name, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+        result[name] = _quantile(latencies, q) if latencies else float("nan")
+    return result
+
+
+def _benchmark(args) -> None:
+    import logging
+
+    import uvicorn
+    from agents.models.openai_responses import OpenAIResponsesModel
+    from openai import AsyncOpenAI
+
+    logging.getLogger("openai.agents").setLevel(logging.CRITICAL)  # injected faults are expected
+    app = _stub_app(args.latency_ms, args.tail_ratio, args.tail_ms, args.fault_ratio)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    async def run() -> None:
+        client = AsyncOpenAI(base_url=f"http://127.0.0.1:{args.port}/v1", api_key="stub", max_retries=0)
+        bare = OpenAIResponsesModel("stub", client)
+        policy = policy_for("benchmark")
+        wrapped = _model_class()(policy, "stub", inner=bare)
+
+        # Warm the latency history so the hedge delay is the measured p95
+        await _measure(wrapped, MODEL_HEDGE_MIN_SAMPLES * 2, args.concurrency)
+        with _stats_lock:
+            for key in _stats:
+                _stats[key] = 0
+
+        counter = app.state.counter
+        for label, model in (("no policy", bare), ("policy", wrapped)):
+            before = counter["calls"]
+            result = await _measure(model, args.requests, args.concurrency)
+            sent = counter["calls"] - before
+            print(
+                f"{label:<10} p50 {result['p50'] * 1e3:7.0f} ms  p95 {result['p95'] * 1e3:7.0f} ms  "
+                f"p99 {result['p99'] * 1e3:7.0f} ms  errors {result['errors']:4d}/{args.requests}  "
+                f"server calls {sent} (+{(sent / args.requests - 1) * 100:.0f}%)"
+            )
+        stats = model_policy_stats()
+        print(
+            f"policy: {stats['retries']} retries, {stats['hedges']} hedges "
+            f"({stats['hedge_wins']} won), hedge delay {policy.hedge_delay() * 1e3:.0f} ms"
+        )
+
+    asyncio.run(run())
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the model-call policy against a stub model server.")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--tail-ratio", type=float, default=0.03, help="share of very slow responses")
+    parser.add_argument("--tail-ms", type=float, default=5000)
+    parser.add_argument("--fault-ratio", type=float, default=0.02, help="share of 500/429 responses")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    if args.benchmark:
+        _benchmark(args)
+    else:
+        parser.print_help()
@@ -0,0 +1,103 @@
+"""
+Rerun timings of the Streamlit UI (app.py) by transcript length.
+
+Run with: python -m services.rerun_profile [--sizes 10 100 500]
+
+Drives app.py headless with streamlit.testing.AppTest. For each transcript
+size it times a plain rerun with the latest CHAT_PAGE_SIZE messages rendered
+(the default) and with the whole transcript rendered, and one chat turn with
+the model served instantly by services/stub_model.py, so the turn time is
+the UI, orchestration and tools only. Reports median milliseconds and the
+chat elements each rerun rendered.
+"""
+import argparse
+import logging
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "30"))  # as app.py reads it; it cannot be imported outside Streamlit
+
+# One exchange of a realistic size: a question and a menu-length markdown answer
+_QUESTION = "What vegetarian options do you have at outlet 1?"
+_ANSWER = "Menu for Downtown Diner (Outlet #1):\n\n" + "\n".join(
+    f"- **Item {n}** [Vegetarian] (Mains) - $12.50 | Available (11:00 - 15:00, Mon-Fri)" for n in range(20)
+)
+
+
+def _transcript(size: int) -> List[Dict[str, str]]:
+    return [
+        {"role": "user", "content": _QUESTION} if n % 2 == 0 else {"role": "assistant", "content": _ANSWER}
+        for n in range(size)
+    ]
+
+
+def _timed_runs(at, runs: int) -> float:
+    """Median milliseconds of `runs` full reruns."""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        at.run()
+        samples.append((time.perf_counter() - started) * 1e3)
+    return statistics.median(samples)
+
+
+def profile(sizes: List[int], runs: int) -> None:
+    from streamlit.testing.v1 import AppTest
+
+    from services import chat_service, stub_model
+
+    stub_model.install(latency_ms=0, jitter=0.0)
+    # Session state is seeded from outside a script run, which Streamlit warns about
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(
+        lambda record: "missing ScriptRunContext" not in record.getMessage()
+    )
+    chat_service.RESPONSE_CACHE_ENABLED = False  # every turn runs the orchestration
+
+    print(f"{'messages':>8}  {'paged rerun':>18}  {'full rerun':>18}  {'chat turn':>18}")
+    for size in sizes:
+        at = AppTest.from_file(str(APP_PATH), default_timeout=60)
+        at.session_state["messages"] = _transcript(size)
+        at.run()  # first run imports the app and builds the sidebar
+
+        paged = _timed_runs(at, runs)
+        paged_elements = len(at.chat_message)
+
+        at.session_state["chat_visible"] = size
+        full = _timed_runs(at, runs)
+        full_elements = len(at.chat_message)
+        at.session_state["chat_visible"] = CHAT_PAGE_SIZE
+
+        turns = []
+        for _ in range(runs):
+            at.session_state["messages"] = _transcript(size)
+            started = time.perf_counter()
+            at.chat_input[0].set_value(_QUESTION).run()
+            turns.append((time.perf_counter() - started) * 1e3)
+        turn_elements = len(at.chat_message)
+        if at.exception:
+            raise RuntimeError(f"app.py raised: {at.exception[0].message}")
+        answer = at.session_state["messages"][-1]["content"]
+        if answer.startswith("I encountered an error"):
+            raise RuntimeError(answer)
+
+        print(
+            f"{size:>8}  {paged:>8.0f} ms ({paged_elements:>3})  {full:>8.0f} ms ({full_elements:>3})  "
+            f"{statistics.median(turns):>8.0f} ms ({turn_elements:>3})"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time Streamlit reruns of app.py by transcript length.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500], help="messages in the transcript")
+    parser.add_argument("--runs", type=int, default=5, help="reruns per measurement")
+    args = parser.parse_args()
+    profile(args.sizes, args.runs)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,201 @@
+"""
+Response Cache - Reuses routing decisions and read-only answers for near-identical messages.
+
+Messages are normalized (case, punctuation, whitespace, numbers pulled out as
+slots), so "Show me the menu for outlet #2!" and "show me the menu for outlet 2"
+share a key. Two kinds of entries are kept in one LRU:
+
+- decisions: (template, slots) -> the router's decision (specialist and
+  entities), so the router run can be skipped next time and the specialist
+  still starts with the outlet / order it needs;
+- answers: (template, slots, catalog version, time slot) -> full reply, only
+  for read-only specialists. Menus depend on the clock through serving
+  windows, so answers are also keyed by a wall-clock slot aligned with the
+  availability engine's buckets. "Is it open now?" answers are not kept at
+  all: opening and closing times fall anywhere inside a slot, so only their
+  routing decision is cached.
+
+Only self-contained messages are cached: no words pointing back into the
+conversation, and more than a bare reply ("yes", "2", "confirm"), whose
+meaning is whatever the previous turn asked. Entries are scoped to the
+session they came from unless the message itself carries every entity the
+router resolved (the outlet and order numbers are among its slots). "show
+me the menu for outlet 2" is shared by all sessions; "show me the menu",
+routed with the outlet picked earlier in one session, stays in that session.
+
+Entries are bounded by count and by approximate size in bytes.
+"""
+import os
+import re
+import string
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from models import RouterDecision
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") != "0"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+RESPONSE_CACHE_ANSWER_SLOT_SECONDS = int(os.getenv("RESPONSE_CACHE_ANSWER_SLOT_SECONDS", "900"))
+
+# Specialists whose answers depend only on catalog data
+READ_ONLY_TARGETS = {"menu_agent", "outlet_agent"}
+# Intents answered from the current time (is_outlet_open); their answers are never cached
+CLOCK_INTENTS = {"open_check"}
+
+# Words that point back into the conversation; such messages are not self-contained
+_ANAPHORA = {"it", "that", "this", "those", "these", "them", "same", "again", "there", "one"}
+_FILLER = {"please", "pls", "plz"}
+# Bare replies: they answer the previous turn and mean nothing on their own
+_REPLIES = {
+    "yes", "yeah", "yep", "yup", "sure", "ok", "okay", "no", "nope", "nah", "confirm", "confirmed",
+    "correct", "right", "cancel", "done", "go", "ahead", "do", "proceed", "thanks", "thank", "you",
+}
+_SHARED = "*"  # scope of entries any session may use
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_PUNCTUATION = str.maketrans({ch: " " for ch in string.punctuation if ch not in "$#"})
+
+
+def normalize(message: str) -> Tuple[str, Tuple[str, ...]]:
+    """Return (template, slots): lowercased words with numbers replaced by `<n>`."""
+    text = message.lower().translate(_PUNCTUATION).replace("#", " ")
+    slots = tuple(_NUMBER.findall(text))
+    text = _NUMBER.sub(" <n> ", text)
+    words = [w for w in text.split() if w not in _FILLER]
+    return " ".join(words), slots
+
+
+def _time_slot() -> int:
+    return int(time.time() // RESPONSE_CACHE_ANSWER_SLOT_SECONDS)
+
+
+def is_self_contained(template: str) -> bool:
+    """True when the message does not refer back to earlier turns."""
+    words = set(template.split())
+    return not (_ANAPHORA & words) and bool(words - _REPLIES - {"<n>"})
+
+
+def _carries_entities(decision: RouterDecision, slots: Tuple[str, ...]) -> bool:
+    """True when the outlet and order the router resolved are written in the message itself."""
+    return all(entity is None or str(entity) in slots for entity in (decision.outlet_id, decision.order_id))
+
+
+class ResponseCache:
+    """Thread-safe LRU for routing decisions and answers, with hit-rate and latency-saved stats."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (value, cost_seconds, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "lookups": 0,
+            "answer_hits": 0,
+            "decision_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "saved_seconds": 0.0,
+        }
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key, value, cost: float) -> None:
+        size = sys.getsizeof(value) + sys.getsizeof(key)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[key] = (value, cost, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._stats["evictions"] += 1
+
+    def lookup(
+        self, message: str, session_id: str, catalog_version: int
+    ) -> Tuple[Optional[str], Optional[RouterDecision]]:
+        """
+        Return (answer, decision). `answer` is set for a full hit; otherwise
+        `decision` may hold the router's earlier decision, to run its
+        specialist directly.
+        """
+        template, slots = normalize(message)
+        with self._lock:
+            self._stats["lookups"] += 1
+            if is_self_contained(template):
+                for scope in (session_id, _SHARED):
+                    answer = self._get(("answer", scope, template, slots, catalog_version, _time_slot()))
+                    if answer is not None:
+                        self._stats["answer_hits"] += 1
+                        self._stats["saved_seconds"] += answer[1]
+                        return answer[0], None
+                for scope in (session_id, _SHARED):
+                    decision = self._get(("decision", scope, template, slots))
+                    if decision is not None:
+                        self._stats["decision_hits"] += 1
+                        return None, decision[0]
+            self._stats["misses"] += 1
+            return None, None
+
+    def store(
+        self,
+        message: str,
+        session_id: str,
+        catalog_version: int,
+        decision: Optional[RouterDecision],
+        answer: Optional[str],
+        cost: float,
+    ) -> None:
+        """
+        Remember the router's decision for `message` and, for read-only
+        specialists, its answer unless it is about the current time.
+        """
+        if decision is None or decision.target_agent == "clarify":
+            return
+        template, slots = normalize(message)
+        if not is_self_contained(template):
+            return
+        scope = _SHARED if _carries_entities(decision, slots) else session_id
+        with self._lock:
+            self._put(("decision", scope, template, slots), decision, cost)
+            if answer and decision.target_agent in READ_ONLY_TARGETS and decision.intent not in CLOCK_INTENTS:
+                self._put(("answer", scope, template, slots, catalog_version, _time_slot()), answer, cost)
+
+    def record_saved(self, seconds: float) -> None:
+        """Credit latency saved by a decision hit (router run skipped)."""
+        if seconds > 0:
+            with self._lock:
+                self._stats["saved_seconds"] += seconds
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["lookups"] or 1
+        stats["answer_hit_rate"] = stats["answer_hits"] / lookups
+        stats["hit_rate"] = (stats["answer_hits"] + stats["decision_hits"]) / lookups
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+def response_cache_stats() -> Dict[str, float]:
+    return response_cache.stats()
@@ -0,0 +1,351 @@
+"""
+Session Store - Maintenance for the SQLite conversation memory (conversations.db).
+
+`SQLiteSession` only ever appends. This module keeps the store bounded:
+- WAL journaling and incremental auto-vacuum (both persist in the file);
+- TTL eviction of idle sessions, archived first as gzip JSON lines;
+- a per-session item cap, trimmed at a user-turn boundary so tool calls and
+  their outputs are never split;
+- incremental VACUUM and a WAL checkpoint to hand freed pages back.
+
+`maybe_run_maintenance()` is called when sessions are opened and runs at most
+once per SESSION_MAINTENANCE_INTERVAL across processes, in a background thread.
+
+Run with: python -m services.session_store            (maintain now + report)
+          python -m services.session_store --report   (sizes and latency only)
+"""
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict
+
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "conversations.db")
+SESSION_TTL_DAYS = float(os.getenv("SESSION_TTL_DAYS", "30"))
+SESSION_MAX_ITEMS = int(os.getenv("SESSION_MAX_ITEMS", "200"))
+SESSION_ARCHIVE_DIR = os.getenv("SESSION_ARCHIVE_DIR", "session_archive")
+SESSION_MAINTENANCE_INTERVAL = float(os.getenv("SESSION_MAINTENANCE_INTERVAL", "3600"))
+VACUUM_PAGES_PER_RUN = 2000
+
+SESSIONS_TABLE = "agent_sessions"
+MESSAGES_TABLE = "agent_messages"
+
+_MAINTENANCE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS session_maintenance (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_run REAL NOT NULL
+    )
+"""
+
+_last_check = 0.0
+_maintenance_lock = threading.Lock()
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def _tables_exist(conn: sqlite3.Connection) -> bool:
+    row = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?)",
+        (SESSIONS_TABLE, MESSAGES_TABLE),
+    ).fetchone()
+    return row[0] == 2
+
+
+def configure_store(db_path: str = SESSION_DB_PATH) -> None:
+    """
+    Apply persistent settings: WAL, incremental auto-vacuum (needs one full
+    VACUUM on an existing file) and an index for TTL scans.
+    """
+    conn = _connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        conn.execute(_MAINTENANCE_TABLE_SQL)
+        if _tables_exist(conn):
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{SESSIONS_TABLE}_updated_at ON {SESSIONS_TABLE} (updated_at)"
+            )
+    finally:
+        conn.close()
+
+
+def archive_idle_sessions(conn: sqlite3.Connection, ttl_days: float = SESSION_TTL_DAYS,
+                          archive_dir: str = SESSION_ARCHIVE_DIR, batch_size: int = 500) -> int:
+    """Move sessions idle for longer than `ttl_days` into a gzip archive; returns how many."""
+    cutoff = f"-{ttl_days} days"
+    archived = 0
+    archive = None
+    try:
+        while True:
+            rows = conn.execute(
+                f"""
+                SELECT session_id, created_at, updated_at
+                FROM {SESSIONS_TABLE}
+                WHERE updated_at < datetime('now', ?)
+                ORDER BY updated_at
+                LIMIT ?
+                """,
+                (cutoff, batch_size),
+            ).fetchall()
+            if not rows:
+                return archived
+
+            if archive is None:
+                os.makedirs(archive_dir, exist_ok=True)
+                stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+                archive = gzip.open(os.path.join(archive_dir, f"sessions-{stamp}.jsonl.gz"), "at", encoding="utf-8")
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for session_id, created_at, updated_at in rows:
+                    items = [
+                        json.loads(data)
+                        for (data,) in conn.execute(
+                            f"SELECT message_data FROM {MESSAGES_TABLE} WHERE session_id = ? ORDER BY id",
+                            (session_id,),
+                        )
+                    ]
+                    archive.write(json.dumps({
+                        "session_id": session_id,
+                        "created_at": created_at,
+                        "updated_at": updated_at,
+                        "items": items,
+                    }) + "\n")
+                    conn.execute(f"DELETE FROM {MESSAGES_TABLE} WHERE session_id = ?", (session_id,))
+                    conn.execute(f"DELETE FROM {SESSIONS_TABLE} WHERE session_id = ?", (session_id,))
+                archive.flush()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            archived += len(rows)
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+def trim_long_sessions(conn: sqlite3.Connection, max_items: int = SESSION_MAX_ITEMS) -> int:
+    """
+    Keep at most ~`max_items` per session. The cut is moved forward to the next
+    user message so a turn's tool calls and outputs stay together.
+    """
+    trimmed = 0
+    over = conn.execute(
+        f"""
+        SELECT session_id
+        FROM {MESSAGES_TABLE}
+        GROUP BY session_id
+        HAVING COUNT(*) > ?
+        """,
+        (max_items,),
+    ).fetchall()
+
+    for (session_id,) in over:
+        keep_from = conn.execute(
+            f"""
+            SELECT id FROM {MESSAGES_TABLE}
+            WHERE session_id = ?
+            ORDER BY id DESC
+            LIMIT 1 OFFSET ?
+            """,
+            (session_id, max_items - 1),
+        ).fetchone()[0]
+        boundary = conn.execute(
+            f"""
+            SELECT MIN(id) FROM {MESSAGES_TABLE}
+            WHERE session_id = ? AND id >= ?
+              AND json_extract(message_data, '$.role') = 'user'
+            """,
+            (session_id, keep_from),
+        ).fetchone()[0]
+        if boundary is None:
+            continue
+        cur = conn.execute(
+            f"DELETE FROM {MESSAGES_TABLE} WHERE session_id = ? AND id < ?",
+            (session_id, boundary),
+        )
+        trimmed += cur.rowcount
+    return trimmed
+
+
+def vacuum_incrementally(conn: sqlite3.Connection, pages: int = VACUUM_PAGES_PER_RUN) -> None:
+    """Release up to `pages` free pages and truncate the WAL."""
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+
+def run_maintenance(db_path: str = SESSION_DB_PATH) -> Dict[str, int]:
+    """One full maintenance pass."""
+    configure_store(db_path)
+    conn = _connect(db_path)
+    try:
+        if not _tables_exist(conn):
+            return {"archived": 0, "trimmed": 0}
+        archived = archive_idle_sessions(conn)
+        trimmed = trim_long_sessions(conn)
+        vacuum_incrementally(conn)
+        conn.execute(
+            "INSERT INTO session_maintenance (id, last_run) VALUES (1, ?) "
+            "ON CONFLICT(id) DO UPDATE SET last_run = excluded.last_run",
+            (time.time(),),
+        )
+        return {"archived": archived, "trimmed": trimmed}
+    finally:
+        conn.close()
+
+
+def _claim_maintenance_slot(db_path: str) -> bool:
+    """True if no process has run maintenance within the interval; claims it if so."""
+    conn = _connect(db_path)
+    try:
+        conn.execute(_MAINTENANCE_TABLE_SQL)
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT last_run FROM session_maintenance WHERE id = 1").fetchone()
+        now = time.time()
+        if row and now - row[0] < SESSION_MAINTENANCE_INTERVAL:
+            conn.execute("ROLLBACK")
+            return False
+        conn.execute(
+            "INSERT INTO session_maintenance (id, last_run) VALUES (1, ?) "
+            "ON CONFLICT(id) DO UPDATE SET last_run = excluded.last_run",
+            (now,),
+        )
+        conn.execute("COMMIT")
+        return True
+    finally:
+        conn.close()
+
+
+def maybe_run_maintenance(db_path: str = SESSION_DB_PATH) -> None:
+    """Cheap check on the request path; the actual pass runs in a daemon thread."""
+    global _last_check
+    now = time.monotonic()
+    if now - _last_check < SESSION_MAINTENANCE_INTERVAL:
+        return
+    if not _maintenance_lock.acquire(blocking=False):
+        return
+    try:
+        _last_check = now
+        if not _claim_maintenance_slot(db_path):
+            return
+    except sqlite3.Error:
+        return
+    finally:
+        _maintenance_lock.release()
+
+    def _run():
+        try:
+            run_maintenance(db_path)
+        except sqlite3.Error:
+            pass  # retried on the next interval
+
+    threading.Thread(target=_run, name="session-maintenance", daemon=True).start()
+
+
+def report(db_path: str = SESSION_DB_PATH, probes: int = 200) -> Dict[str, float]:
+    """DB size, row counts and median read/write latency of single-session operations."""
+    sizes = {
+        suffix or "db": os.path.getsize(db_path + suffix) if os.path.exists(db_path + suffix) else 0
+        for suffix in ("", "-wal")
+    }
+    conn = _connect(db_path)
+    try:
+        if not _tables_exist(conn):
+            return {"db_bytes": sizes["db"], "wal_bytes": sizes["-wal"], "sessions": 0, "messages": 0}
+        sessions = conn.execute(f"SELECT COUNT(*) FROM {SESSIONS_TABLE}").fetchone()[0]
+        messages = conn.execute(f"SELECT COUNT(*) FROM {MESSAGES_TABLE}").fetchone()[0]
+        sample = [row[0] for row in conn.execute(
+            f"SELECT session_id FROM {SESSIONS_TABLE} ORDER BY RANDOM() LIMIT ?", (probes,)
+        )]
+
+        read_ms, write_ms = [], []
+        probe_id = "__latency_probe__"
+        for session_id in sample:
+            t0 = time.perf_counter()
+            conn.execute(
+                f"SELECT message_data FROM {MESSAGES_TABLE} WHERE session_id = ? ORDER BY id DESC LIMIT 50",
+                (session_id,),
+            ).fetchall()
+            read_ms.append((time.perf_counter() - t0) * 1000)
+
+        conn.execute(f"INSERT OR IGNORE INTO {SESSIONS_TABLE} (session_id) VALUES (?)", (probe_id,))
+        for _ in range(min(probes, 50)):
+            t0 = time.perf_counter()
+            conn.execute(
+                f"INSERT INTO {MESSAGES_TABLE} (session_id, message_data) VALUES (?, ?)",
+                (probe_id, json.dumps({"role": "user", "content": "probe"})),
+            )
+            write_ms.append((time.perf_counter() - t0) * 1000)
+        conn.execute(f"DELETE FROM {MESSAGES_TABLE} WHERE session_id = ?", (probe_id,))
+        conn.execute(f"DELETE FROM {SESSIONS_TABLE} WHERE session_id = ?", (probe_id,))
+
+        def _median(values):
+            return sorted(values)[len(values) // 2] if values else 0.0
+
+        return {
+            "db_bytes": sizes["db"],
+            "wal_bytes": sizes["-wal"],
+            "sessions": sessions,
+            "messages": messages,
+            "read_ms_p50": _median(read_ms),
+            "write_ms_p50": _median(write_ms),
+        }
+    finally:
+        conn.close()
+
+
+def populate(db_path: str, sessions: int, items_per_session: int = 20, idle_fraction: float = 0.5) -> None:
+    """Fill a store with synthetic sessions (a share of them idle past the TTL) for measurements."""
+    from agents import SQLiteSession
+
+    SQLiteSession("__schema__", db_path).close()  # let the SDK create its schema
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN")
+        for i in range(sessions):
+            session_id = f"synthetic-{i}"
+            age_days = SESSION_TTL_DAYS * 2 if i < sessions * idle_fraction else 0
+            stamp = f"-{age_days} days"
+            conn.execute(
+                f"INSERT OR IGNORE INTO {SESSIONS_TABLE} (session_id, created_at, updated_at) "
+                "VALUES (?, datetime('now', ?), datetime('now', ?))",
+                (session_id, stamp, stamp),
+            )
+            conn.executemany(
+                f"INSERT INTO {MESSAGES_TABLE} (session_id, message_data) VALUES (?, ?)",
+                [
+                    (session_id, json.dumps({"role": "user" if n % 2 == 0 else "assistant", "content": f"message {n}"}))
+                    for n in range(items_per_session)
+                ],
+            )
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the conversation session store.")
+    parser.add_argument("--db", default=SESSION_DB_PATH)
+    parser.add_argument("--report", action="store_true", help="only report size and latency")
+    parser.add_argument("--populate", type=int, metavar="N", help="first add N synthetic sessions")
+    args = parser.parse_args()
+
+    if args.populate:
+        populate(args.db, args.populate)
+    before = report(args.db)
+    print("before:", before)
+    if not args.report:
+        print("maintenance:", run_maintenance(args.db))
+        print("after: ", report(args.db))
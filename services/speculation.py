@@ -0,0 +1,282 @@
+"""
+Speculation - Starts the likely specialist while the router is still deciding.
+
+Before the router runs, `plan` guesses the intent with the degraded-mode
+extractor (`services.degraded.extract_intent`). Two things can then start
+alongside the router:
+
+- a prefetch of the catalog data the specialist will read (menus of the
+  outlets mentioned, their opening schedules, the outlet list) into the
+  shared caches. It has no side effects, so it runs for every turn it applies to.
+- for read-only intents (menus, outlet search, order status and history),
+  the specialist run itself, on a copy of the conversation history and
+  without a session.
+
+If the router's decision names the predicted specialist, the speculative
+run is committed: its items are written to the session and its answer is
+returned. Otherwise it is cancelled and nothing of it reaches the session.
+The speculative run starts before the router has resolved any entities, so
+it works from the message alone. The ordering agent is never speculated
+because its tools place orders.
+
+Only SPECULATION_RATE of eligible turns speculate. The rest run
+sequentially as the control group for `speculation_stats`, which compares
+p50 turn latency of both groups with the tokens spent on cancelled runs.
+
+Run with: python -m services.speculation --benchmark
+          (offline: stub model from services/stub_model.py, tools on the configured database)
+"""
+import argparse
+import asyncio
+import os
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.degraded import breaker, extract_intent
+
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "1") != "0"
+# Share of eligible turns that speculate; the others are the latency baseline
+SPECULATION_RATE = float(os.getenv("SPECULATION_RATE", "0.9"))
+
+# intent -> specialist that answers it; only agents whose tools are read-only
+SPECULATIVE_TARGETS = {
+    "menu": "menu_agent",
+    "filter_menu": "menu_agent",
+    "outlet_search": "outlet_agent",
+    "order_status": "status_agent",
+    "order_history": "status_agent",
+}
+
+
+@dataclass
+class Plan:
+    intent: str
+    target: Optional[str]  # specialist to start now, None = prefetch only
+    prefetch: Optional[Callable[[], Any]]
+    control: bool = False  # eligible, but held back to measure the sequential path
+
+
+def _prefetch_for(intent) -> Optional[Callable[[], Any]]:
+    ids = intent.slots.get("outlet_ids")
+    if intent.name in ("menu", "filter_menu") and ids:
+        from db.cache import outlet_menus
+        return lambda: outlet_menus(ids)
+    if intent.name == "open_check" and ids:
+        from db.availability import get_outlet_schedule
+        return lambda: [get_outlet_schedule(outlet_id) for outlet_id in ids]
+    if intent.name == "outlet_search":
+        from db.cache import active_outlets
+        return active_outlets
+    return None
+
+
+def plan(user_message: str) -> Optional[Plan]:
+    """What to start next to the router for this message, or None to run the turn sequentially."""
+    if not SPECULATION_ENABLED or breaker.state() != "closed":
+        return None
+    intent = extract_intent(user_message)
+    target = SPECULATIVE_TARGETS.get(intent.name)
+    prefetch = _prefetch_for(intent)
+    if target is None and prefetch is None:
+        return None
+    control = random.random() >= SPECULATION_RATE
+    with _lock:
+        _stats["control" if control else "planned"] += 1
+    return Plan(intent.name, target, prefetch, control)
+
+
+# ---------------------------------------------------------------------
+# Running and resolving
+# ---------------------------------------------------------------------
+
+def _run_prefetch(fetch: Callable[[], Any]) -> None:
+    try:
+        fetch()
+        outcome = "prefetches"
+    except Exception:
+        outcome = "prefetch_errors"  # the specialist will query (and report) it itself
+    with _lock:
+        _stats[outcome] += 1
+
+
+_prefetching: set = set()  # running prefetch tasks (the loop keeps only weak references)
+
+
+def start_prefetch(turn_plan: Plan) -> None:
+    """Warm the caches in a worker thread; never awaited, never raises."""
+    if turn_plan.prefetch is not None:
+        task = asyncio.ensure_future(asyncio.to_thread(_run_prefetch, turn_plan.prefetch))
+        _prefetching.add(task)
+        task.add_done_callback(_prefetching.discard)
+
+
+class Speculation:
+    """A specialist run started before the router decided; commit it or cancel it."""
+
+    def __init__(self, target: str, run: Awaitable[Any], hooks):
+        self.target = target
+        self.hooks = hooks  # UsageHooks of this run only, for wasted tokens
+        self.task = asyncio.ensure_future(run)
+        self._resolved = False
+        with _lock:
+            _stats["speculated"] += 1
+
+    async def commit(self) -> Optional[Any]:
+        """The speculative run's result, or None if it failed or was cancelled (the caller runs the specialist again)."""
+        if self._resolved:
+            return None
+        self._resolved = True
+        try:
+            result = await self.task
+        except Exception:
+            with _lock:
+                _stats["failed"] += 1
+            return None
+        with _lock:
+            _stats["committed"] += 1
+        return result
+
+    async def cancel(self) -> None:
+        """Stop the run (no-op once committed or cancelled) and count its tokens as wasted."""
+        if self._resolved:
+            return
+        self._resolved = True
+        self.task.cancel()
+        try:
+            await self.task
+        except (asyncio.CancelledError, Exception):
+            pass
+        # Calls still in flight when cancelled report no usage, so this is a lower bound
+        wasted = sum(call.total_tokens for call in self.hooks.calls) if self.hooks is not None else 0
+        with _lock:
+            _stats["cancelled"] += 1
+            _stats["wasted_tokens"] += wasted
+
+
+# ---------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------
+
+_lock = threading.Lock()
+_stats: Dict[str, int] = {
+    "planned": 0,
+    "control": 0,
+    "speculated": 0,
+    "committed": 0,
+    "cancelled": 0,
+    "failed": 0,
+    "wasted_tokens": 0,
+    "prefetches": 0,
+    "prefetch_errors": 0,
+}
+_latencies: Dict[str, deque] = {"speculative": deque(maxlen=1000), "control": deque(maxlen=1000)}
+
+
+def record_latency(turn_plan: Plan, seconds: float) -> None:
+    """Turn latency of a planned turn, into its group (speculative or control)."""
+    with _lock:
+        _latencies["control" if turn_plan.control else "speculative"].append(seconds)
+
+
+def _p50(samples) -> Optional[float]:
+    ordered = sorted(samples)
+    return ordered[len(ordered) // 2] if ordered else None
+
+
+def speculation_stats() -> Dict[str, Any]:
+    """Counters, hit rate, p50 latency of speculative vs control turns and tokens wasted per commit."""
+    with _lock:
+        stats: Dict[str, Any] = dict(_stats)
+        speculative = _p50(_latencies["speculative"])
+        control = _p50(_latencies["control"])
+    stats["hit_rate"] = stats["committed"] / (stats["speculated"] or 1)
+    stats["p50_speculative_seconds"] = speculative
+    stats["p50_control_seconds"] = control
+    if speculative is not None and control is not None:
+        stats["p50_saved_seconds"] = control - speculative
+    stats["wasted_tokens_per_commit"] = stats["wasted_tokens"] / (stats["committed"] or 1)
+    return stats
+
+
+# ---------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------
+
+BENCHMARK_MESSAGES = [
+    "menu for outlet {n}",
+    "vegetarian items under $15 at outlet {n}",
+    "is outlet {n} open?",
+    "outlets in Seattle",
+    "status of order {n}",
+    "my orders for 555-000{n}",
+]
+
+
+def _benchmark(args) -> None:
+    """Speculative vs control turns through the real orchestration, with a stub model."""
+    from services import chat_service, stub_model
+    from services import speculation  # the module chat_service uses; this file runs as __main__
+
+    stub_model.install(latency_ms=args.latency_ms, misroute_ratio=args.misroute_ratio)
+    chat_service.RESPONSE_CACHE_ENABLED = False  # repeated messages must reach the model
+    speculation.SPECULATION_RATE = args.rate
+    rng = random.Random(7)
+
+    async def run() -> None:
+        messages = [rng.choice(BENCHMARK_MESSAGES).format(n=rng.randint(1, 6)) for _ in range(args.turns)]
+        for i, message in enumerate(messages[:10]):  # warm imports, agents and connections
+            await chat_service.handle_user_message(f"spec-warmup-{i}", message, None)
+        with speculation._lock:
+            for key in speculation._stats:
+                speculation._stats[key] = 0
+            for samples in speculation._latencies.values():
+                samples.clear()
+        stub_model.reset_stats()
+
+        gate = asyncio.Semaphore(args.concurrency)
+
+        async def turn(i: int, message: str) -> None:
+            async with gate:
+                await chat_service.handle_user_message(f"spec-bench-{i}", message, None)
+
+        await asyncio.gather(*(turn(i, message) for i, message in enumerate(messages)))
+
+    asyncio.run(run())
+    stats = speculation.speculation_stats()
+    tokens = stub_model.stub_stats()
+    spent = tokens["input_tokens"] + tokens["output_tokens"]
+    print(
+        f"{args.turns} turns, model latency ~{args.latency_ms:.0f} ms, router disagrees on "
+        f"{args.misroute_ratio:.0%}, speculation rate {args.rate:.0%}"
+    )
+    print(
+        f"speculated {stats['speculated']}  committed {stats['committed']}  cancelled {stats['cancelled']}  "
+        f"failed {stats['failed']}  hit rate {stats['hit_rate']:.0%}  prefetches {stats['prefetches']}"
+    )
+    if stats.get("p50_saved_seconds") is not None:
+        print(
+            f"p50 turn: control {stats['p50_control_seconds'] * 1e3:.0f} ms, speculative "
+            f"{stats['p50_speculative_seconds'] * 1e3:.0f} ms (saved {stats['p50_saved_seconds'] * 1e3:.0f} ms)"
+        )
+    print(
+        f"wasted tokens {stats['wasted_tokens']} ({stats['wasted_tokens'] / (spent or 1):.1%} of {spent}), "
+        f"{stats['wasted_tokens_per_commit']:.0f} per committed run"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure speculative specialist runs against a stub model.")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=400, help="median latency of one model request")
+    parser.add_argument("--misroute-ratio", type=float, default=0.15, help="share of turns the router sends elsewhere")
+    parser.add_argument("--rate", type=float, default=0.5, help="share of eligible turns that speculate")
+    args = parser.parse_args()
+    if args.benchmark:
+        _benchmark(args)
+    else:
+        parser.print_help()
@@ -0,0 +1,124 @@
+"""
+Cold-start profiler for the chat service.
+
+Run with: python -m services.startup_profile [--baseline startup_baseline.json]
+
+Every measurement runs in a fresh interpreter so nothing is already imported:
+- per-module import time (`python -X importtime`), slowest first
+- time to import the service, to build all agents, and until the HTTP API
+  answers its first request
+
+Exits with status 1 when a phase exceeds its budget or regresses past the
+baseline by more than the tolerance, so it can guard CI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Phase budgets in milliseconds (cold, single process)
+DEFAULT_BUDGETS_MS = {
+    "import_service": 500.0,
+    "warmup_agents": 4000.0,
+    "first_request": 5000.0,
+}
+
+_PHASES_SCRIPT = r"""
+import json, time
+t0 = time.perf_counter()
+import services.chat_service as chat_service
+t1 = time.perf_counter()
+chat_service.warmup()
+t2 = time.perf_counter()
+from fastapi.testclient import TestClient
+from services.api import app
+TestClient(app).get("/health").raise_for_status()
+t3 = time.perf_counter()
+print(json.dumps({
+    "import_service": (t1 - t0) * 1000,
+    "warmup_agents": (t2 - t1) * 1000,
+    "first_request": (t3 - t0) * 1000,
+}))
+"""
+
+
+def import_times(module: str, top: int = 15):
+    """Return [(cumulative_ms, self_ms, module_name)] for the slowest imports of `module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative_us) / 1000, int(self_us) / 1000, name))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def measure_phases():
+    """Time the cold-start phases in a fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, "-c", _PHASES_SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "LANGSMITH_TRACING_DISABLED": "1"},
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="services.chat_service", help="module to break down by import time")
+    parser.add_argument("--runs", type=int, default=3, help="cold starts to take the median of")
+    parser.add_argument("--baseline", help="JSON file with phase timings to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression vs baseline (0.25 = 25%%)")
+    parser.add_argument("--write-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    print(f"Slowest imports for `import {args.module}`:")
+    for cumulative_ms, self_ms, name in import_times(args.module):
+        print(f"  {cumulative_ms:9.1f} ms cumulative  {self_ms:8.1f} ms self  {name}")
+
+    runs = [measure_phases() for _ in range(max(1, args.runs))]
+    phases = {
+        phase: sorted(run[phase] for run in runs)[len(runs) // 2]
+        for phase in DEFAULT_BUDGETS_MS
+    }
+
+    baseline = {}
+    if args.baseline and not args.write_baseline:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(f"Baseline {args.baseline} not found; checking budgets only.")
+
+    failures = []
+    print(f"\nCold-start phases (median of {len(runs)}):")
+    for phase, value in phases.items():
+        budget = DEFAULT_BUDGETS_MS[phase]
+        limit = budget
+        if phase in baseline:
+            limit = min(budget, baseline[phase] * (1 + args.tolerance))
+        status = "ok" if value <= limit else "REGRESSION"
+        if value > limit:
+            failures.append(phase)
+        print(f"  {phase:15s} {value:9.1f} ms  (limit {limit:.1f} ms)  {status}")
+
+    if args.baseline and args.write_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(phases, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
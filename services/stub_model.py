@@ -0,0 +1,290 @@
+"""
+Stub Model - Scripted stand-in for the OpenAI model, for offline benchmarks.
+
+`install()` serves every agent's model (through services/model_policy.py)
+from a StubModel: no network, no API key, same orchestration, tools and
+database. Each model request sleeps a lognormal latency around
+`latency_ms` and reports tokens in proportion to its input and output.
+
+The stub answers the way the agents are meant to:
+
+- the router returns a RouterDecision built from the degraded-mode intent
+  extractor (`services.degraded.extract_intent`), sent to another
+  specialist for `misroute_ratio` of turns;
+- a specialist calls the tools that intent needs, then answers with their
+  output. For several outlets, `tool_mode` picks how: "batch" (one call to
+  is_outlets_open / get_outlet_menus / filter_menu_multi), "parallel" (one
+  single-outlet call per outlet, all in one response) or "sequential" (one
+  call per response, a model round trip per outlet).
+
+Used by the benchmarks in services/api.py, services/speculation.py and
+db/queries.py.
+"""
+import asyncio
+import itertools
+import json
+import random
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from models import RouterDecision
+from services.degraded import extract_intent
+
+# intent -> specialist, as the router is instructed to route
+INTENT_TARGETS = {
+    "menu": "menu_agent",
+    "filter_menu": "menu_agent",
+    "open_check": "menu_agent",
+    "outlet_search": "outlet_agent",
+    "order_status": "status_agent",
+    "order_history": "status_agent",
+    "ordering": "ordering_agent",
+}
+
+# intent -> (single-outlet tool, batch tool)
+_OUTLET_TOOLS = {
+    "open_check": ("is_outlet_open", "is_outlets_open"),
+    "menu": ("get_outlet_menu", "get_outlet_menus"),
+    "filter_menu": ("filter_menu", "filter_menu_multi"),
+}
+
+_ids = itertools.count(1)
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {"requests": 0, "tool_calls": 0, "input_tokens": 0, "output_tokens": 0}
+
+
+def _count(**fields: int) -> None:
+    with _stats_lock:
+        for field, n in fields.items():
+            _stats[field] += n
+
+
+def stub_stats() -> Dict[str, int]:
+    """Model requests served, tool calls requested and tokens reported since the last reset."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        for field in _stats:
+            _stats[field] = 0
+
+
+# ---------------------------------------------------------------------
+# What to answer
+# ---------------------------------------------------------------------
+
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") for part in content or [] if isinstance(part, dict))
+
+
+def _turn(input: Any) -> Tuple[str, List[str]]:
+    """(latest user message, outputs of the tool calls made since it)."""
+    if isinstance(input, str):
+        return input, []
+    message, outputs = "", []
+    for item in input:
+        item = item if isinstance(item, dict) else item.model_dump()
+        if item.get("role") == "user":
+            message, outputs = _text(item.get("content")), []
+        elif item.get("type") == "function_call_output":
+            outputs.append(str(item.get("output", "")))
+    return message, outputs
+
+
+def _decision(message: str, misroute_ratio: float = 0.0) -> RouterDecision:
+    intent = extract_intent(message)
+    target = INTENT_TARGETS.get(intent.name)
+    if target is not None and random.random() < misroute_ratio:
+        target = random.choice([t for t in ("menu_agent", "outlet_agent", "status_agent") if t != target])
+    if target is None:
+        return RouterDecision(
+            target_agent="clarify",
+            intent="other",
+            reply="Can you clarify whether you want to browse the menu, place an order, or track an order?",
+        )
+    ids = intent.slots.get("outlet_ids") or []
+    return RouterDecision(
+        target_agent=target,
+        intent=intent.name,
+        outlet_id=ids[0] if len(ids) == 1 else None,
+        order_id=intent.slots.get("order_id"),
+    )
+
+
+def tool_rounds(message: str, tool_names: List[str], tool_mode: str = "batch") -> List[List[Tuple[str, Dict[str, Any]]]]:
+    """Tool calls a specialist with `tool_names` makes for `message`, grouped by model response."""
+    intent = extract_intent(message)
+    slots = dict(intent.slots)
+    if intent.name == "order_status":
+        calls = [("get_order_status", {"order_id": slots["order_id"]})]
+    elif intent.name == "order_history":
+        calls = [("get_orders_by_phone", {"phone": slots["phone"]})]
+    elif intent.name == "outlet_search":
+        calls = [("get_outlets_by_city_or_zip", slots)]
+    elif intent.name in _OUTLET_TOOLS:
+        single, batch = _OUTLET_TOOLS[intent.name]
+        ids = slots.pop("outlet_ids")
+        if tool_mode == "batch" and len(ids) > 1 and batch in tool_names:
+            return [[(batch, {"outlet_ids": ids, **slots})]]
+        calls = [(single, {"outlet_id": outlet_id, **slots}) for outlet_id in ids]
+        if tool_mode == "parallel":
+            return [[call for call in calls if call[0] in tool_names]] if single in tool_names else []
+    else:
+        return []
+    return [[call] for call in calls if call[0] in tool_names]
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# ---------------------------------------------------------------------
+# Model
+# ---------------------------------------------------------------------
+
+class StubSettings:
+    """Latency and tool behaviour of every StubModel; change them between runs."""
+
+    def __init__(self, latency_ms: float = 300, jitter: float = 0.25, tool_mode: str = "batch", misroute_ratio: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.tool_mode = tool_mode
+        self.misroute_ratio = misroute_ratio
+
+
+def _model_class():
+    from agents.models.interface import Model
+
+    class StubModel(Model):
+        def __init__(self, model_name: str, settings: StubSettings):
+            self.model_name = model_name
+            self.settings = settings
+
+        def _output(self, system_instructions, input, tools, output_schema) -> Tuple[list, str]:
+            """(output items, their text) for one request."""
+            from openai.types.responses import ResponseFunctionToolCall, ResponseOutputMessage, ResponseOutputText
+
+            message, outputs = _turn(input)
+            text = None
+            if output_schema is not None:
+                text = _decision(message, self.settings.misroute_ratio).model_dump_json()
+            else:
+                rounds = tool_rounds(message, [getattr(t, "name", "") for t in tools], self.settings.tool_mode)
+                done = 0
+                for calls in rounds:
+                    if done == len(outputs):
+                        _count(tool_calls=len(calls))
+                        items = [
+                            ResponseFunctionToolCall(
+                                type="function_call",
+                                id=f"fc_{next(_ids)}",
+                                call_id=f"call_{next(_ids)}",
+                                name=name,
+                                arguments=json.dumps(args),
+                                status="completed",
+                            )
+                            for name, args in calls
+                        ]
+                        return items, " ".join(item.arguments for item in items)
+                    done += len(calls)
+                text = "\n\n".join(outputs)[:2000] or "How can I help you with our menu, orders or outlets?"
+            item = ResponseOutputMessage(
+                type="message",
+                id=f"msg_{next(_ids)}",
+                role="assistant",
+                status="completed",
+                content=[ResponseOutputText(type="output_text", text=text, annotations=[])],
+            )
+            return [item], text
+
+        def _usage(self, system_instructions, input, output_text: str):
+            from agents.usage import Usage
+
+            input_tokens = _tokens((system_instructions or "") + json.dumps(input, default=str))
+            output_tokens = _tokens(output_text)
+            _count(requests=1, input_tokens=input_tokens, output_tokens=output_tokens)
+            return Usage(
+                requests=1,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                total_tokens=input_tokens + output_tokens,
+            )
+
+        async def _wait(self) -> None:
+            delay = random.lognormvariate(0, self.settings.jitter) * self.settings.latency_ms
+            await asyncio.sleep(delay / 1000)
+
+        async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+            from agents.items import ModelResponse
+
+            await self._wait()
+            output, text = self._output(system_instructions, input, tools, output_schema)
+            return ModelResponse(output=output, usage=self._usage(system_instructions, input, text), response_id=None)
+
+        async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs) -> AsyncIterator[Any]:
+            from openai.types.responses import Response, ResponseCompletedEvent, ResponseTextDeltaEvent
+
+            await self._wait()
+            output, text = self._output(system_instructions, input, tools, output_schema)
+            usage = self._usage(system_instructions, input, text)
+            sequence = itertools.count()
+            if output[0].type == "message":
+                for start in range(0, len(text), 64):
+                    yield ResponseTextDeltaEvent(
+                        type="response.output_text.delta",
+                        item_id=output[0].id,
+                        output_index=0,
+                        content_index=0,
+                        delta=text[start:start + 64],
+                        logprobs=[],
+                        sequence_number=next(sequence),
+                    )
+            response = Response(
+                id=f"resp_{next(_ids)}",
+                object="response",
+                created_at=0,
+                model=self.model_name,
+                status="completed",
+                output=output,
+                parallel_tool_calls=True,
+                tool_choice="auto",
+                tools=[],
+                usage={
+                    "input_tokens": usage.input_tokens,
+                    "output_tokens": usage.output_tokens,
+                    "total_tokens": usage.total_tokens,
+                    "input_tokens_details": {"cached_tokens": 0, "cache_write_tokens": 0},
+                    "output_tokens_details": {"reasoning_tokens": 0},
+                },
+            )
+            yield ResponseCompletedEvent(type="response.completed", response=response, sequence_number=next(sequence))
+
+        async def close(self) -> None:
+            pass
+
+    return StubModel
+
+
+def install(latency_ms: float = 300, jitter: float = 0.25, tool_mode: str = "batch", misroute_ratio: float = 0.0) -> StubSettings:
+    """
+    Serve every agent's model from a StubModel and return their shared
+    settings. Call before the first turn: PolicyModel binds its inner model
+    on first use.
+    """
+    from agents.models.interface import ModelProvider
+
+    from services import model_policy
+
+    settings = StubSettings(latency_ms, jitter, tool_mode, misroute_ratio)
+    stub_class = _model_class()
+
+    class StubProvider(ModelProvider):
+        def get_model(self, model_name: Optional[str]):
+            return stub_class(model_name or "stub", settings)
+
+    model_policy.use_provider(StubProvider())
+    return settings
@@ -0,0 +1,208 @@
+"""
+Turn profiler - Opt-in sampling profile and memory trace of one chat turn.
+
+Enabled for every turn with PROFILE_TURNS=1, or per session with the
+sidebar toggle (`handle_user_message(..., profile=True)`). When it is off,
+`profile_turn` returns a shared no-op context manager: no thread, no
+tracing.
+
+A profiled turn writes these files to PROFILE_DIR:
+
+- `<stamp>-<session>.folded`: stacks sampled every PROFILE_INTERVAL_MS, in
+  the folded format flamegraph.pl, speedscope and inferno read. Samples are
+  taken from the event-loop thread (time in `select` is time spent waiting
+  on the model, the network or session I/O) and from worker threads while
+  they run a tool or a database call.
+- `<stamp>-<session>.tracemalloc`: the traced allocations at the end of the
+  turn (`tracemalloc.Snapshot.load`).
+- `<stamp>-<session>.alloc.txt`: wall time, peak traced memory and the
+  lines holding the most memory the turn allocated and did not free.
+
+Memory tracing slows allocation-heavy code down several times, which
+skews the samples. PROFILE_MEMORY=0 samples stacks only and writes just
+the .folded file.
+
+The event loop is shared, so turns of other sessions running at the same
+time show up in the samples and the allocations too. Profile on a quiet
+process for clean numbers.
+
+Run with: python -m services.turn_profile profiles/<file>.folded   (top frames by self time)
+"""
+import argparse
+import contextlib
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+PROFILE_TURNS = os.getenv("PROFILE_TURNS", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MEMORY = os.getenv("PROFILE_MEMORY", "1") != "0"
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "10"))
+PROFILE_TOP_ALLOCATIONS = 30
+
+_NO_PROFILE = contextlib.nullcontext()
+# The profiler's own snapshots are not the turn's allocations
+_OWN_ALLOCATIONS = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+
+_tracing_lock = threading.Lock()
+_tracing_turns = 0  # profiled turns in progress; tracemalloc stops with the last one
+_started_tracing = False  # whether tracemalloc was started here (else leave it running)
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    for prefix in sys.path:
+        if prefix and filename.startswith(prefix):
+            filename = filename[len(prefix):].lstrip(os.sep)
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _is_running_work(frame) -> bool:
+    """Whether an executor thread is running a submitted call (not waiting for one)."""
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "run" and code.co_filename.endswith(os.path.join("concurrent", "futures", "thread.py")):
+            return True
+        frame = frame.f_back
+    return False
+
+
+class _Sampler(threading.Thread):
+    """Samples the stacks of the loop thread and busy worker threads into folded counts."""
+
+    def __init__(self, loop_thread_id: int, interval: float):
+        super().__init__(name="turn-profiler", daemon=True)
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._halt = threading.Event()
+
+    def run(self) -> None:
+        names = {}
+        while not self._halt.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                if thread_id != self.loop_thread_id and not _is_running_work(frame):
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                root = "event-loop" if thread_id == self.loop_thread_id else names.get(thread_id, "thread")
+                stack.append(re.sub(r"_\d+$", "", root))  # one root for all pool workers
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._halt.set()
+        self.join()
+
+
+class TurnProfile:
+    """Context manager around one turn; `paths` lists the files written."""
+
+    def __init__(self, conversation_id: str, directory: str = PROFILE_DIR):
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        session = re.sub(r"[^\w-]", "_", conversation_id)[:40]
+        self.base = os.path.join(directory, f"{stamp}-{session}")
+        self.paths: List[str] = []
+
+    def __enter__(self):
+        global _tracing_turns, _started_tracing
+        if PROFILE_MEMORY:
+            with _tracing_lock:
+                if _tracing_turns == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+                    _started_tracing = True
+                _tracing_turns += 1
+            tracemalloc.reset_peak()
+            self._before = tracemalloc.take_snapshot().filter_traces(_OWN_ALLOCATIONS)
+        self._sampler = _Sampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+        self._started = time.perf_counter()
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        global _tracing_turns, _started_tracing
+        self._sampler.stop()
+        wall = time.perf_counter() - self._started
+        after = None
+        if PROFILE_MEMORY:
+            after = tracemalloc.take_snapshot().filter_traces(_OWN_ALLOCATIONS)
+            self._memory = tracemalloc.get_traced_memory()
+            with _tracing_lock:
+                _tracing_turns -= 1
+                if _tracing_turns == 0 and _started_tracing:
+                    tracemalloc.stop()
+                    _started_tracing = False
+        try:
+            self._write(wall, after)
+        except OSError as e:
+            print(f"turn profile not written: {e}", file=sys.stderr)
+        return False
+
+    def _write(self, wall: float, after) -> None:
+        os.makedirs(os.path.dirname(self.base) or ".", exist_ok=True)
+        with open(self.base + ".folded", "w") as f:
+            for stack, count in self._sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.paths = [self.base + ".folded"]
+        if after is None:
+            return
+
+        after.dump(self.base + ".tracemalloc")
+        current, peak = self._memory
+        growth = after.compare_to(self._before, "lineno")
+        with open(self.base + ".alloc.txt", "w") as f:
+            f.write(f"wall {wall * 1000:.1f} ms, {self._sampler.samples} samples every {PROFILE_INTERVAL_MS:g} ms\n")
+            f.write(f"traced memory: {current / 1024:.1f} KiB now, {peak / 1024:.1f} KiB peak during the turn\n\n")
+            f.write(f"Top {PROFILE_TOP_ALLOCATIONS} lines by memory allocated during the turn and still held:\n")
+            for stat in growth[:PROFILE_TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+        self.paths += [self.base + ".tracemalloc", self.base + ".alloc.txt"]
+
+
+def profile_turn(conversation_id: str, enabled: Optional[bool] = None):
+    """Profile the enclosed turn if `enabled` (None = PROFILE_TURNS), else do nothing."""
+    if not (PROFILE_TURNS if enabled is None else enabled):
+        return _NO_PROFILE
+    return TurnProfile(conversation_id)
+
+
+# ---------------------------------------------------------------------
+# Reading a profile
+# ---------------------------------------------------------------------
+
+def self_times(folded_path: str) -> Dict[str, int]:
+    """Samples per leaf frame of a .folded file."""
+    leaves: Counter = Counter()
+    with open(folded_path) as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            leaves[stack.rsplit(";", 1)[-1]] += int(count)
+    return dict(leaves)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a turn profile written to PROFILE_DIR.")
+    parser.add_argument("folded", help="a .folded file")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    leaves = self_times(args.folded)
+    total = sum(leaves.values()) or 1
+    print(f"{total} samples; top frames by self time:")
+    for frame, count in sorted(leaves.items(), key=lambda item: item[1], reverse=True)[: args.top]:
+        print(f"  {count / total * 100:5.1f}%  {frame}")
@@ -0,0 +1,473 @@
+"""
+Token Usage - Per-turn, per-agent token and cost accounting with budgets.
+
+Every model run of a turn (router, then specialist) gets a `UsageHooks`
+instance. On each model call it records the provider-reported input,
+cached and output tokens. It also splits the input into what filled the
+context:
+- the agent's instructions (system);
+- earlier conversation items (history);
+- tool outputs, per tool;
+- the new user message.
+The split is estimated from text length and scaled to the reported input
+tokens, so the parts always add up to the billed total.
+
+Calls are written to a local SQLite store (USAGE_DB_PATH) at the end of the
+turn, tagged with the session and UTC day. Before each model run the turn is
+checked against USAGE_SESSION_TOKEN_BUDGET (per session) and
+USAGE_DAILY_TOKEN_BUDGET (all sessions, per UTC day); 0 disables a budget.
+
+Prices are USD per 1M tokens (input, cached input, output). The defaults
+come from USAGE_PRICE_*; USAGE_PRICES overrides them per model as JSON, e.g.
+{"gpt-4.1-mini": [0.4, 0.1, 1.6]}.
+
+Run with: python -m services.usage --days 7    (which agents and tools use the most context)
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+USAGE_DB_PATH = os.getenv("USAGE_DB_PATH", "usage.db")
+USAGE_SESSION_TOKEN_BUDGET = int(os.getenv("USAGE_SESSION_TOKEN_BUDGET", "0"))
+USAGE_DAILY_TOKEN_BUDGET = int(os.getenv("USAGE_DAILY_TOKEN_BUDGET", "0"))
+USAGE_PRICE_INPUT = float(os.getenv("USAGE_PRICE_INPUT", "2.00"))
+USAGE_PRICE_CACHED_INPUT = float(os.getenv("USAGE_PRICE_CACHED_INPUT", "0.50"))
+USAGE_PRICE_OUTPUT = float(os.getenv("USAGE_PRICE_OUTPUT", "8.00"))
+USAGE_PRICES: Dict[str, List[float]] = json.loads(os.getenv("USAGE_PRICES", "{}"))
+
+CHARS_PER_TOKEN = 4  # rough English/JSON ratio, only used to split the reported total
+
+SESSION_BUDGET_MESSAGE = (
+    "This conversation has reached its usage limit. Please start a new session to continue."
+)
+DAILY_BUDGET_MESSAGE = (
+    "Our assistant has reached today's usage limit. Please try again tomorrow."
+)
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS usage_calls (
+        id                 INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at         REAL NOT NULL,
+        day                TEXT NOT NULL,
+        session_id         TEXT NOT NULL,
+        agent              TEXT NOT NULL,
+        model              TEXT,
+        input_tokens       INTEGER NOT NULL,
+        cached_tokens      INTEGER NOT NULL,
+        output_tokens      INTEGER NOT NULL,
+        system_tokens      INTEGER NOT NULL,
+        history_tokens     INTEGER NOT NULL,
+        tool_output_tokens INTEGER NOT NULL,
+        user_tokens        INTEGER NOT NULL,
+        cost_usd           REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_usage_calls_session ON usage_calls (session_id);
+    CREATE INDEX IF NOT EXISTS idx_usage_calls_day ON usage_calls (day);
+    CREATE TABLE IF NOT EXISTS usage_tool_context (
+        call_id INTEGER NOT NULL REFERENCES usage_calls(id) ON DELETE CASCADE,
+        tool    TEXT NOT NULL,
+        tokens  INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_usage_tool_context_call ON usage_tool_context (call_id);
+"""
+
+
+class BudgetExceeded(Exception):
+    """A token budget is used up; `message` is the reply to show instead of a model answer."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+@dataclass
+class CallUsage:
+    """One model call: reported tokens plus the estimated make-up of its input."""
+    agent: str
+    model: Optional[str]
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    system_tokens: int = 0
+    history_tokens: int = 0
+    tool_output_tokens: int = 0
+    user_tokens: int = 0
+    tool_tokens: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    @property
+    def cost_usd(self) -> float:
+        price_in, price_cached, price_out = USAGE_PRICES.get(
+            self.model or "", (USAGE_PRICE_INPUT, USAGE_PRICE_CACHED_INPUT, USAGE_PRICE_OUTPUT)
+        )
+        uncached = self.input_tokens - self.cached_tokens
+        return (uncached * price_in + self.cached_tokens * price_cached + self.output_tokens * price_out) / 1e6
+
+
+@dataclass
+class TurnUsage:
+    """Usage of one turn, with the session's and today's totals before it."""
+    session_id: str
+    session_tokens_before: int = 0
+    day_tokens_before: int = 0
+    calls: List[CallUsage] = field(default_factory=list)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(call.total_tokens for call in self.calls)
+
+    def check_budget(self) -> None:
+        """Raise BudgetExceeded when this turn has pushed either total past its budget."""
+        spent = self.total_tokens
+        if USAGE_SESSION_TOKEN_BUDGET and self.session_tokens_before + spent >= USAGE_SESSION_TOKEN_BUDGET:
+            raise BudgetExceeded(SESSION_BUDGET_MESSAGE)
+        if USAGE_DAILY_TOKEN_BUDGET and self.day_tokens_before + spent >= USAGE_DAILY_TOKEN_BUDGET:
+            raise BudgetExceeded(DAILY_BUDGET_MESSAGE)
+
+
+# Turn being served; `usage_hooks()` attaches to it
+current_turn: contextvars.ContextVar[Optional[TurnUsage]] = contextvars.ContextVar("usage_turn", default=None)
+
+_stats_lock = threading.Lock()
+_stats = {"turns": 0, "calls": 0, "tokens": 0, "cost_usd": 0.0, "budget_rejections": 0}
+
+
+# ---------- Context estimates ----------
+
+def _estimate_tokens(value: Any) -> int:
+    if value is None:
+        return 0
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_context(system_prompt: Optional[str], input_items: List[Any]) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    Split a model call's input into system / history / tool_output / user
+    (estimated tokens), plus tool output tokens per tool name.
+    """
+    parts = {"system": _estimate_tokens(system_prompt), "history": 0, "tool_output": 0, "user": 0}
+    tools: Dict[str, int] = {}
+    items = [item if isinstance(item, dict) else getattr(item, "__dict__", {}) for item in input_items]
+
+    tool_names = {item.get("call_id"): item.get("name") for item in items if item.get("type") == "function_call"}
+    last_user = max((i for i, item in enumerate(items) if item.get("role") == "user"), default=None)
+
+    for index, item in enumerate(items):
+        if item.get("type") == "function_call_output":
+            tokens = _estimate_tokens(item.get("output"))
+            name = tool_names.get(item.get("call_id")) or "unknown"
+            tools[name] = tools.get(name, 0) + tokens
+            parts["tool_output"] += tokens
+        elif index == last_user:
+            parts["user"] += _estimate_tokens(item.get("content"))
+        else:
+            parts["history"] += _estimate_tokens(item)
+    return parts, tools
+
+
+def _scale(parts: Dict[str, int], tools: Dict[str, int], total: int) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Scale estimated parts (and the per-tool share of tool_output) so the parts sum to `total`."""
+    factor = total / (sum(parts.values()) or 1)
+    return (
+        {key: round(value * factor) for key, value in parts.items()},
+        {key: round(value * factor) for key, value in tools.items()},
+    )
+
+
+_usage_hooks_class = None
+
+
+def _hooks_class():
+    """RunHooks subclass that records model calls into a turn (built on first use)."""
+    global _usage_hooks_class
+    if _usage_hooks_class is None:
+        from agents import RunHooks  # deferred with the rest of the SDK (see chat_service)
+
+        class UsageHooks(RunHooks):
+            def __init__(self, turn: TurnUsage):
+                self.turn = turn
+                self.calls: List[CallUsage] = []  # this run's calls only (turn.calls spans every run)
+                self._pending: Dict[str, Tuple[Dict[str, int], Dict[str, int]]] = {}
+
+            async def on_llm_start(self, context, agent, system_prompt, input_items) -> None:
+                self._pending[agent.name] = estimate_context(system_prompt, list(input_items))
+
+            async def on_llm_end(self, context, agent, response) -> None:
+                parts, tools = self._pending.pop(agent.name, ({}, {}))
+                usage = response.usage
+                input_tokens = usage.input_tokens or 0
+                details = getattr(usage, "input_tokens_details", None)
+                parts, tools = _scale(parts, tools, input_tokens)
+                call = CallUsage(
+                    agent=agent.name,
+                    model=agent.model if isinstance(agent.model, str) else getattr(agent.model, "model_name", None),
+                    input_tokens=input_tokens,
+                    cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+                    output_tokens=usage.output_tokens or 0,
+                    system_tokens=parts.get("system", 0),
+                    history_tokens=parts.get("history", 0),
+                    tool_output_tokens=parts.get("tool_output", 0),
+                    user_tokens=parts.get("user", 0),
+                    tool_tokens=tools,
+                )
+                self.calls.append(call)
+                self.turn.calls.append(call)
+
+        _usage_hooks_class = UsageHooks
+    return _usage_hooks_class
+
+
+def usage_hooks():
+    """RunHooks recording into the current turn, or None outside a turn."""
+    turn = current_turn.get()
+    return _hooks_class()(turn) if turn is not None else None
+
+
+# ---------- Store ----------
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def _open(db_path: str = USAGE_DB_PATH) -> sqlite3.Connection:
+    conn = _connect(db_path)
+    if db_path not in _schema_ready:
+        with _schema_lock:
+            conn.executescript(_SCHEMA)
+            _schema_ready.add(db_path)
+    return conn
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _totals(session_id: str, db_path: str = USAGE_DB_PATH) -> Tuple[int, int]:
+    """(session tokens, today's tokens across sessions)."""
+    conn = _open(db_path)
+    try:
+        session_tokens = conn.execute(
+            "SELECT COALESCE(SUM(input_tokens + output_tokens), 0) FROM usage_calls WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()[0]
+        day_tokens = conn.execute(
+            "SELECT COALESCE(SUM(input_tokens + output_tokens), 0) FROM usage_calls WHERE day = ?",
+            (_today(),),
+        ).fetchone()[0]
+        return session_tokens, day_tokens
+    finally:
+        conn.close()
+
+
+def _record(turn: TurnUsage, db_path: str = USAGE_DB_PATH) -> None:
+    now, day = time.time(), _today()
+    conn = _open(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for call in turn.calls:
+            cursor = conn.execute(
+                """
+                INSERT INTO usage_calls (
+                    created_at, day, session_id, agent, model,
+                    input_tokens, cached_tokens, output_tokens,
+                    system_tokens, history_tokens, tool_output_tokens, user_tokens, cost_usd
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    now, day, turn.session_id, call.agent, call.model,
+                    call.input_tokens, call.cached_tokens, call.output_tokens,
+                    call.system_tokens, call.history_tokens, call.tool_output_tokens, call.user_tokens,
+                    call.cost_usd,
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO usage_tool_context (call_id, tool, tokens) VALUES (?, ?, ?)",
+                [(cursor.lastrowid, tool, tokens) for tool, tokens in call.tool_tokens.items()],
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+# ---------- Turn lifecycle (chat_service) ----------
+
+async def begin_turn(session_id: str) -> TurnUsage:
+    """
+    Start accounting for a turn and make it current. Raises BudgetExceeded
+    if the session or the day is already over budget.
+    """
+    session_tokens, day_tokens = 0, 0
+    if USAGE_SESSION_TOKEN_BUDGET or USAGE_DAILY_TOKEN_BUDGET:
+        session_tokens, day_tokens = await asyncio.to_thread(_totals, session_id)
+    turn = TurnUsage(session_id, session_tokens, day_tokens)
+    try:
+        turn.check_budget()
+    except BudgetExceeded:
+        with _stats_lock:
+            _stats["budget_rejections"] += 1
+        raise
+    current_turn.set(turn)
+    return turn
+
+
+def check_budget() -> None:
+    """Between model runs: stop the turn if it has used up a budget."""
+    turn = current_turn.get()
+    if turn is None:
+        return
+    try:
+        turn.check_budget()
+    except BudgetExceeded:
+        with _stats_lock:
+            _stats["budget_rejections"] += 1
+        raise
+
+
+async def finish_turn(turn: TurnUsage) -> None:
+    """Persist the turn's calls (best effort: accounting never fails a reply)."""
+    if current_turn.get() is turn:
+        current_turn.set(None)
+    if not turn.calls:
+        return
+    with _stats_lock:
+        _stats["turns"] += 1
+        _stats["calls"] += len(turn.calls)
+        _stats["tokens"] += turn.total_tokens
+        _stats["cost_usd"] += sum(call.cost_usd for call in turn.calls)
+    try:
+        await asyncio.to_thread(_record, turn)
+    except Exception:
+        pass
+
+
+# ---------- Reads ----------
+
+def session_usage(session_id: str, db_path: str = USAGE_DB_PATH) -> dict:
+    """Tokens, cost and per-agent tokens of one session, with today's global total and the budgets."""
+    conn = _open(db_path)
+    try:
+        by_agent = {
+            agent: {"tokens": tokens, "cost_usd": cost}
+            for agent, tokens, cost in conn.execute(
+                """
+                SELECT agent, SUM(input_tokens + output_tokens), SUM(cost_usd)
+                FROM usage_calls
+                WHERE session_id = ?
+                GROUP BY agent
+                ORDER BY 2 DESC
+                """,
+                (session_id,),
+            )
+        }
+        day_tokens, day_cost = conn.execute(
+            "SELECT COALESCE(SUM(input_tokens + output_tokens), 0), COALESCE(SUM(cost_usd), 0) "
+            "FROM usage_calls WHERE day = ?",
+            (_today(),),
+        ).fetchone()
+    finally:
+        conn.close()
+    return {
+        "tokens": sum(a["tokens"] for a in by_agent.values()),
+        "cost_usd": sum(a["cost_usd"] for a in by_agent.values()),
+        "by_agent": by_agent,
+        "session_budget": USAGE_SESSION_TOKEN_BUDGET,
+        "day_tokens": day_tokens,
+        "day_cost_usd": day_cost,
+        "daily_budget": USAGE_DAILY_TOKEN_BUDGET,
+    }
+
+
+def usage_stats() -> dict:
+    """Process-wide counters since start."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def report(days: int = 7, db_path: str = USAGE_DB_PATH) -> str:
+    """Rank agents and tools by the context they consumed over the last `days` days."""
+    since = time.time() - days * 86400
+    conn = _open(db_path)
+    try:
+        agents = conn.execute(
+            """
+            SELECT agent, COUNT(*), SUM(input_tokens), SUM(output_tokens),
+                   SUM(system_tokens), SUM(history_tokens), SUM(tool_output_tokens), SUM(user_tokens),
+                   SUM(cost_usd)
+            FROM usage_calls
+            WHERE created_at >= ?
+            GROUP BY agent
+            ORDER BY SUM(input_tokens) DESC
+            """,
+            (since,),
+        ).fetchall()
+        tools = conn.execute(
+            """
+            SELECT t.tool, COUNT(*), SUM(t.tokens)
+            FROM usage_tool_context t
+            INNER JOIN usage_calls c ON c.id = t.call_id
+            WHERE c.created_at >= ?
+            GROUP BY t.tool
+            ORDER BY SUM(t.tokens) DESC
+            """,
+            (since,),
+        ).fetchall()
+        days_rows = conn.execute(
+            """
+            SELECT day, COUNT(DISTINCT session_id), SUM(input_tokens + output_tokens), SUM(cost_usd)
+            FROM usage_calls
+            WHERE created_at >= ?
+            GROUP BY day
+            ORDER BY day
+            """,
+            (since,),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    lines = [f"Agents by input tokens (last {days} days):"]
+    for agent, calls, tokens_in, tokens_out, system, history, tool_output, user, cost in agents:
+        lines.append(
+            f"  {agent:<16} {calls:6} calls  in {tokens_in:>10,}  out {tokens_out:>9,}  ${cost:8.2f}  "
+            f"[system {system / (tokens_in or 1):4.0%}  history {history / (tokens_in or 1):4.0%}  "
+            f"tools {tool_output / (tokens_in or 1):4.0%}  user {user / (tokens_in or 1):4.0%}]"
+        )
+    lines.append("\nTools by context tokens (outputs re-sent on every later call included):")
+    for tool, calls, tokens in tools:
+        lines.append(f"  {tool:<24} {tokens:>10,} tokens over {calls} calls")
+    lines.append("\nPer day:")
+    for day, sessions, tokens, cost in days_rows:
+        lines.append(f"  {day}  {sessions:5} sessions  {tokens:>10,} tokens  ${cost:8.2f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report which agents and tools consume the most tokens.")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--db", default=USAGE_DB_PATH)
+    args = parser.parse_args()
+    print(report(args.days, args.db))
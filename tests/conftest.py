@@ -0,0 +1,31 @@
+"""
+Shared fixtures. Tests run against a fresh embedded SQLite database
+(db/sqlite_backend.py) in a temporary directory, so no Postgres server is needed.
+"""
+import os
+
+os.environ.setdefault("SHARED_CACHE_URL", "memory")  # before db.cache builds its backend
+os.environ.setdefault("LANGSMITH_TRACING_DISABLED", "1")
+os.environ.setdefault("OPENAI_AGENTS_DISABLE_TRACING", "1")
+
+import pytest
+
+from db import availability, catalog, connection, idempotency, sqlite_backend
+from db.cache import shared_cache
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """Path of an empty SQLite database with the schema, used by every connection."""
+    path = str(tmp_path / "restaurant.db")
+    sqlite_backend.init_database(path)
+    monkeypatch.setattr(connection, "DB_BACKEND", "sqlite")
+    monkeypatch.setattr(sqlite_backend, "DB_SQLITE_PATH", path)
+
+    # Fresh databases restart the catalog version, so drop everything tagged with it
+    monkeypatch.setattr(catalog, "_cached_version", None)
+    availability._schedules.clear()
+    shared_cache.invalidate()
+    idempotency._recent.clear()
+    yield path
+    idempotency._recent.clear()
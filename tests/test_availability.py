@@ -0,0 +1,31 @@
+"""
+Availability windows compiled to bucket bitmaps (db/availability.py).
+"""
+from datetime import datetime, time
+
+from db import availability
+from db.availability import BUCKET_MINUTES, FULL_DAY, OutletSchedule, compile_window
+
+
+def _available(week, hour: int, minute: int) -> bool:
+    schedule = OutletSchedule(1, None, {1: week}, catalog_version=0)
+    return schedule.is_available(1, datetime(2026, 7, 1, hour, minute))  # a Wednesday
+
+
+def test_window_inside_one_bucket_is_not_all_day():
+    week = compile_window(True, time(10, 5), time(10, 10), "All")
+    assert week[2] != FULL_DAY
+    assert _available(week, 10, 7)
+    assert not _available(week, 9, 0)
+    assert not _available(week, 11, 0)
+
+
+def test_same_start_and_end_is_all_day():
+    week = compile_window(True, time(10, 0), time(10, 0), "All")
+    assert week == availability.ALWAYS
+
+
+def test_window_past_midnight_continues_next_day():
+    week = compile_window(True, time(22, 0), time(2, 0), "Wed")
+    assert week[2] == availability._span(22 * 60 // BUCKET_MINUTES, availability.BUCKETS_PER_DAY)
+    assert week[3] == availability._span(0, 2 * 60 // BUCKET_MINUTES)
@@ -0,0 +1,78 @@
+"""
+Idempotency keys of bulk orders (db/bulk_orders.py): refused orders leave no
+key behind, and orders without a key or session are not deduplicated.
+"""
+from typing import Optional
+
+import pytest
+
+from db import kitchen
+from db.bulk_orders import place_orders
+from db.connection import get_connection
+from db.queries import CreateOrderPayload
+
+STATIONS = 2
+
+
+@pytest.fixture
+def outlet(sqlite_db, monkeypatch):
+    """One outlet with one item available all day; returns (outlet_id, menu_item_id)."""
+    monkeypatch.setattr(kitchen, "KITCHEN_PARALLEL_ORDERS", STATIONS)
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            INSERT INTO outlets (name, city, timezone, open_time, close_time, region)
+            VALUES ('Test Kitchen', 'Seattle', 'America/Los_Angeles', '00:00', '23:59', 'west')
+            RETURNING id
+            """
+        )
+        outlet_id = cur.fetchone()[0]
+        cur.execute("INSERT INTO menu_items (name, category, base_price) VALUES ('Burger', 'burger', 9.50) RETURNING id")
+        menu_item_id = cur.fetchone()[0]
+        cur.execute(
+            "INSERT INTO outlet_menu_availability (outlet_id, menu_item_id) VALUES (%s, %s)",
+            (outlet_id, menu_item_id),
+        )
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+    return outlet_id, menu_item_id
+
+
+def _order(outlet_id: int, menu_item_id: int, key: Optional[str], quantity: int = 1) -> CreateOrderPayload:
+    return CreateOrderPayload(
+        outlet_id=outlet_id,
+        fulfillment_type="PICKUP",
+        customer_name="Bulk Test",
+        items=[{"menu_item_id": menu_item_id, "quantity": quantity}],
+        idempotency_key=key,
+    )
+
+
+def test_throttled_order_can_be_sent_again(outlet, monkeypatch):
+    outlet_id, menu_item_id = outlet
+    monkeypatch.setattr(kitchen, "KITCHEN_THROTTLE_MINUTES", 0.01)  # any wait at all is refused
+    orders = [_order(outlet_id, menu_item_id, f"bulk-test-{n}") for n in range(STATIONS + 1)]
+
+    first = place_orders(orders)
+    assert [problem["index"] for problem in first.rejected] == [STATIONS]
+    assert "kitchen capacity" in first.rejected[0]["error"]
+
+    monkeypatch.setattr(kitchen, "KITCHEN_THROTTLE_MINUTES", None)
+    again = place_orders([orders[STATIONS]])
+    assert not again.rejected
+    assert len(again.created) == 1
+
+
+
+def test_orders_without_key_or_session_are_not_deduplicated(outlet):
+    outlet_id, menu_item_id = outlet
+    orders = [_order(outlet_id, menu_item_id, key=None)]
+
+    assert len(place_orders(orders).created) == 1
+    assert len(place_orders(orders).created) == 1
+    assert len(place_orders(orders, session_id="session-1").created) == 1
+    assert place_orders(orders, session_id="session-1").duplicates
@@ -0,0 +1,84 @@
+"""
+The degraded-mode breaker counts model requests, not runs: only provider
+errors and slow requests are failures.
+"""
+import asyncio
+
+import httpx2
+import openai
+import pytest
+from agents import Agent, Runner
+from agents.models.interface import Model
+
+from services import degraded, model_policy
+from services.degraded import BREAKER_MIN_CALLS, CircuitBreaker, ModelUnavailable
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    fresh = CircuitBreaker()
+    monkeypatch.setattr(degraded, "breaker", fresh)
+    monkeypatch.setattr(model_policy, "breaker", fresh)
+    return fresh
+
+
+class Unreachable(Model):
+    """A provider that cannot be reached."""
+
+    async def get_response(self, *args, **kwargs):
+        raise openai.APIConnectionError(request=httpx2.Request("POST", "http://stub/v1/responses"))
+
+    def stream_response(self, *args, **kwargs):
+        raise NotImplementedError
+
+
+def test_failed_runs_are_not_outages(breaker):
+    async def failing_run():
+        raise ValueError("tool or output validation failure")
+
+    async def main():
+        for _ in range(BREAKER_MIN_CALLS * 2):
+            with pytest.raises(ModelUnavailable):
+                await breaker.call(failing_run)
+
+    asyncio.run(main())
+    assert breaker.state() == "closed"
+    assert breaker.stats()["failures"] == 0
+
+
+def test_provider_errors_open_the_breaker(breaker, monkeypatch):
+    monkeypatch.setattr(model_policy, "MODEL_RETRIES", 0)
+    model = model_policy._model_class()(model_policy.policy_for("BreakerTest"), "stub", inner=Unreachable())
+    agent = Agent(name="BreakerTest", model=model)
+
+    async def main():
+        for _ in range(BREAKER_MIN_CALLS):
+            with pytest.raises(ModelUnavailable) as raised:
+                await breaker.call(lambda: Runner.run(agent, "hi"))
+            assert isinstance(raised.value.__cause__, openai.APIConnectionError)
+        with pytest.raises(ModelUnavailable, match="circuit open"):
+            await breaker.call(lambda: Runner.run(agent, "hi"))
+
+    asyncio.run(main())
+    assert breaker.state() == "open"
+
+
+def test_slowness_is_measured_per_request(breaker, monkeypatch):
+    monkeypatch.setattr(degraded, "BREAKER_SLOW_SECONDS", 0.05)
+
+    async def request(seconds):
+        await asyncio.sleep(seconds)
+        return "ok"
+
+    async def multi_step_run():
+        for _ in range(4):  # 0.12s in total, each request fast
+            await breaker.model_call(lambda: request(0.03))
+
+    async def main():
+        await breaker.call(multi_step_run)
+        await breaker.call(lambda: breaker.model_call(lambda: request(0.08)))
+
+    asyncio.run(main())
+    stats = breaker.stats()
+    assert stats["calls"] == 5
+    assert stats["slow"] == 1
@@ -0,0 +1,121 @@
+"""
+create_order under simultaneous duplicate submissions: one order, one answer.
+"""
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from agents.tool_context import ToolContext
+
+from db.connection import get_connection
+from db.queries import create_order
+from models import ConversationContext
+
+DUPLICATES = 8
+
+
+@pytest.fixture
+def outlet(sqlite_db):
+    """One active outlet with one item available all day; returns (outlet_id, menu_item_id)."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            INSERT INTO outlets (name, city, timezone, open_time, close_time, region)
+            VALUES ('Test Kitchen', 'Seattle', 'America/Los_Angeles', '00:00', '23:59', 'west')
+            RETURNING id
+            """
+        )
+        outlet_id = cur.fetchone()[0]
+        cur.execute(
+            "INSERT INTO menu_items (name, category, base_price) VALUES ('Burger', 'burger', 9.50) RETURNING id"
+        )
+        menu_item_id = cur.fetchone()[0]
+        cur.execute(
+            "INSERT INTO outlet_menu_availability (outlet_id, menu_item_id) VALUES (%s, %s)",
+            (outlet_id, menu_item_id),
+        )
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+    return outlet_id, menu_item_id
+
+
+def _submit(arguments: str, session_id: str, barrier: threading.Barrier) -> str:
+    """One create_order tool call as the agents SDK makes it, released together with the others."""
+    context = ToolContext(
+        context=ConversationContext(conversation_id=session_id, raw_user_message="order"),
+        tool_name="create_order",
+        tool_call_id=f"call-{threading.get_ident()}",
+        tool_arguments=arguments,
+    )
+    barrier.wait()
+    return asyncio.run(create_order.on_invoke_tool(context, arguments))
+
+
+def _count(sql: str, params=()) -> int:
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _payload(outlet_id: int, menu_item_id: int, **extra) -> str:
+    payload = {
+        "outlet_id": outlet_id,
+        "fulfillment_type": "PICKUP",
+        "customer_name": "Ada",
+        "customer_phone": "555-0100",
+        "items": [{"menu_item_id": menu_item_id, "quantity": 2}],
+        **extra,
+    }
+    return json.dumps({"payload": payload})
+
+
+@pytest.mark.parametrize("client_key", [None, "client-key-1"])
+def test_simultaneous_duplicates_create_one_order(outlet, client_key):
+    outlet_id, menu_item_id = outlet
+    extra = {"idempotency_key": client_key} if client_key else {}
+    arguments = _payload(outlet_id, menu_item_id, **extra)
+    barrier = threading.Barrier(DUPLICATES)
+
+    with ThreadPoolExecutor(max_workers=DUPLICATES) as pool:
+        answers = list(pool.map(lambda _: _submit(arguments, "session-1", barrier), range(DUPLICATES)))
+
+    assert answers[0].startswith("SUCCESS"), answers[0]
+    assert len(set(answers)) == 1
+    assert _count("SELECT COUNT(*) FROM orders") == 1
+    assert _count("SELECT COUNT(*) FROM order_items") == 1
+    assert _count("SELECT queued_orders FROM outlet_kitchen_load WHERE outlet_id = %s", (outlet_id,)) == 1
+
+
+def test_same_cart_in_other_sessions_is_not_a_duplicate(outlet):
+    outlet_id, menu_item_id = outlet
+    arguments = _payload(outlet_id, menu_item_id)
+    barrier = threading.Barrier(2)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        answers = list(pool.map(lambda n: _submit(arguments, f"session-{n}", barrier), range(2)))
+
+    assert all(answer.startswith("SUCCESS") for answer in answers), answers
+    assert answers[0] != answers[1]
+    assert _count("SELECT COUNT(*) FROM orders") == 2
+
+
+def test_no_session_means_no_shared_key(outlet):
+    outlet_id, menu_item_id = outlet
+    arguments = _payload(outlet_id, menu_item_id)
+
+    answers = [_submit(arguments, "", threading.Barrier(1)) for _ in range(2)]
+
+    assert all(answer.startswith("SUCCESS") for answer in answers), answers
+    assert _count("SELECT COUNT(*) FROM orders") == 2
+    assert _count("SELECT COUNT(*) FROM order_idempotency_keys") == 0
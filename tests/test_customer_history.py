@@ -0,0 +1,100 @@
+"""
+Customer history (db/customer_history.py): page order and what reorder gives back.
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from agents.tool_context import ToolContext
+
+import db.customer_history  # noqa: F401  (registers the tools)
+from db.connection import get_connection
+from db.customer_history import reorder
+from db.single_flight import read_only_tool
+from models import ConversationContext
+
+PHONE = "555-0100"
+
+
+def _execute(sql: str, params=()):
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        rows = cur.fetchall() if cur.description else None
+        conn.commit()
+        return rows
+    finally:
+        cur.close()
+        conn.close()
+
+
+@pytest.fixture
+def outlet(sqlite_db):
+    """An outlet with one item available all day; returns (outlet_id, menu_item_id)."""
+    outlet_id = _execute(
+        """
+        INSERT INTO outlets (name, city, timezone, open_time, close_time, region)
+        VALUES ('Test Kitchen', 'Seattle', 'UTC', '00:00', '23:59', 'west')
+        RETURNING id
+        """
+    )[0][0]
+    menu_item_id = _execute("INSERT INTO menu_items (name, category, base_price) VALUES ('Burger', 'burger', 9) RETURNING id")[0][0]
+    _execute("INSERT INTO outlet_menu_availability (outlet_id, menu_item_id) VALUES (%s, %s)", (outlet_id, menu_item_id))
+    return outlet_id, menu_item_id
+
+
+def _order(outlet_id: int, menu_item_id: int, order_id: int, created_at: datetime) -> None:
+    _execute(
+        """
+        INSERT INTO orders (id, outlet_id, status, fulfillment_type, customer_name, customer_phone,
+                            customer_address, created_at, updated_at, total_amount)
+        VALUES (%s, %s, 'COMPLETED', 'DELIVERY', 'Ada', %s, '1 Main St', %s, %s, 9)
+        """,
+        (order_id, outlet_id, PHONE, created_at, created_at),
+    )
+    _execute(
+        """
+        INSERT INTO order_items (order_id, order_created_at, menu_item_id, quantity, unit_price, line_total)
+        VALUES (%s, %s, %s, 1, 9, 9)
+        """,
+        (order_id, created_at, menu_item_id),
+    )
+
+
+def test_history_pages_are_newest_first_by_creation_time(outlet):
+    now = datetime.now(timezone.utc)
+    # A higher id is no newer: ids are allocated per shard
+    _order(*outlet, order_id=7, created_at=now - timedelta(hours=2))
+    _order(*outlet, order_id=3, created_at=now - timedelta(hours=1))
+    _order(*outlet, order_id=5, created_at=now - timedelta(hours=3))
+    history = read_only_tool("get_orders_by_phone")
+
+    pages, before = [], None
+    while True:
+        page = history(PHONE, limit=1, before_order_id=before)
+        pages.append(int(page.split("Order #")[1].split(" ")[0]))
+        if "before_order_id=" not in page:
+            break
+        before = int(page.rsplit("before_order_id=", 1)[1])
+
+    assert pages == [3, 7, 5]
+
+
+def test_reorder_leaves_out_the_customers_details(outlet):
+    _order(*outlet, order_id=1, created_at=datetime.now(timezone.utc) - timedelta(hours=1))
+    arguments = json.dumps({"order_id": 1})
+    context = ToolContext(
+        context=ConversationContext(conversation_id="history-test", raw_user_message=""),
+        tool_name="reorder",
+        tool_call_id="call-1",
+        tool_arguments=arguments,
+    )
+
+    answer = asyncio.run(reorder.on_invoke_tool(context, arguments))
+
+    payload = json.loads(answer.split("): ", 1)[1])
+    assert payload == {"outlet_id": outlet[0], "fulfillment_type": "DELIVERY", "items": [{"menu_item_id": outlet[1], "quantity": 1}]}
+    for detail in ("Ada", PHONE, "Main St"):
+        assert detail not in answer
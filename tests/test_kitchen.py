@@ -0,0 +1,27 @@
+"""
+Ready-time estimates shown by get_order_status and order confirmations (db/kitchen.py).
+"""
+from datetime import datetime, timedelta, timezone
+
+from db import kitchen
+from db.queries import order_confirmation
+
+
+def test_eta_is_shown_in_the_outlet_timezone():
+    now = datetime(2026, 7, 1, 18, 0, tzinfo=timezone.utc)
+    line = kitchen.describe_eta("IN_KITCHEN", now + timedelta(minutes=25), now, timezone_str="America/Los_Angeles")
+    assert line == "Estimated ready: in about 25 min (11:25 PDT)"
+
+
+def test_no_eta_once_the_order_left_the_kitchen():
+    now = datetime(2026, 7, 1, 18, 0, tzinfo=timezone.utc)
+    assert kitchen.describe_eta("COMPLETED", now + timedelta(minutes=5), now, timezone_str="UTC") is None
+
+
+def test_status_and_confirmation_quote_the_same_minutes():
+    now = datetime(2026, 7, 1, 18, 0, tzinfo=timezone.utc)
+    ready_eta = now + timedelta(minutes=24, seconds=40)
+    confirmation = order_confirmation(1, "Test Kitchen", "Ada", "PICKUP", [], 0.0, ready_eta, now)
+    status = kitchen.describe_eta("PENDING", ready_eta, now, timezone_str="UTC")
+    assert confirmation.endswith("in about 25 min")
+    assert status.startswith("Estimated ready: in about 25 min")
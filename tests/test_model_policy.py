@@ -0,0 +1,75 @@
+"""
+Retries and hedging of single model requests (services/model_policy.py).
+"""
+import asyncio
+
+import agents
+import httpx2
+import openai
+import pytest
+from agents.models.interface import Model
+
+from services import degraded, model_policy
+from services.degraded import CircuitBreaker
+
+
+class FlakyModel(Model):
+    """Fails its first request after `fail_after` seconds, then answers after `latency`."""
+
+    def __init__(self, fail_after: float, latency: float):
+        self.fail_after = fail_after
+        self.latency = latency
+        self.calls = 0
+
+    async def get_response(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            await asyncio.sleep(self.fail_after)
+            raise openai.APIConnectionError(request=httpx2.Request("POST", "http://stub/v1/responses"))
+        await asyncio.sleep(self.latency)
+        return "ok"
+
+    def stream_response(self, *args, **kwargs):
+        raise NotImplementedError
+
+
+@pytest.fixture
+def policy(monkeypatch):
+    fresh = CircuitBreaker()
+    monkeypatch.setattr(degraded, "breaker", fresh)
+    monkeypatch.setattr(model_policy, "breaker", fresh)
+    monkeypatch.setattr(model_policy, "MODEL_HEDGE_INITIAL_DELAY", 0.4)
+    monkeypatch.setattr(model_policy, "_backoff", lambda retry: 0)
+    return model_policy.AgentPolicy("HedgeTest")
+
+
+def test_hedge_delay_restarts_with_each_retry(policy):
+    inner = FlakyModel(fail_after=0.3, latency=0.2)
+    model = model_policy._model_class()(policy, "stub", inner=inner)
+
+    assert asyncio.run(model.get_response()) == "ok"
+    assert inner.calls == 2  # the retry answered within the hedge delay, so no hedge was sent
+
+
+def test_provider_uses_the_configured_client(monkeypatch):
+    monkeypatch.setattr(model_policy, "_openai_client", None)
+    monkeypatch.setattr(model_policy, "_openai_provider", None)
+    monkeypatch.setattr(agents, "set_default_openai_client", lambda client: None)  # keep the SDK default
+    model_policy.set_openai_client(openai.AsyncOpenAI(api_key="stub", base_url="http://configured/v1"))
+
+    client = model_policy._provider()._get_client()
+    assert str(client.base_url) == "http://configured/v1/"
+    assert client.max_retries == 0
+
+
+def test_retries_are_charged_to_the_callers_window(policy):
+    window = model_policy.RequestWindow(limit=1)
+    model = model_policy._model_class()(policy, "stub", inner=FlakyModel(fail_after=0, latency=0))
+
+    async def turn():
+        model_policy.use_window(window)
+        return await model.get_response()
+
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(turn())  # the first attempt fills the window, so the retry is not sent
+    assert window.in_window() == 1
@@ -0,0 +1,29 @@
+"""
+Response cache (services/response_cache.py): which answers are reused.
+"""
+from models import RouterDecision
+from services.response_cache import ResponseCache
+
+
+def _decision(intent: str) -> RouterDecision:
+    return RouterDecision(target_agent="outlet_agent", intent=intent, outlet_id=2)
+
+
+def test_menu_answers_are_reused():
+    cache = ResponseCache()
+    cache.store("Show me the menu for outlet 2", "session-1", 1, _decision("menu"), "Menu for outlet 2", 1.0)
+
+    answer, decision = cache.lookup("show me the menu for outlet #2!", "session-2", 1)
+
+    assert answer == "Menu for outlet 2"
+    assert decision is None
+
+
+def test_open_check_answers_keep_only_the_routing_decision():
+    cache = ResponseCache()
+    cache.store("Is outlet 2 open?", "session-1", 1, _decision("open_check"), "Outlet 2 is open until 22:00", 1.0)
+
+    answer, decision = cache.lookup("is outlet 2 open", "session-1", 1)
+
+    assert answer is None
+    assert decision == _decision("open_check")
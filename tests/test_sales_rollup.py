@@ -0,0 +1,87 @@
+"""
+Batched sales rollup (db/sales.py): batch boundaries and the safety cutoff.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from db import sales
+from db.connection import get_connection
+
+
+def _execute(sql: str, params=()):
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        rows = cur.fetchall() if cur.description else None
+        conn.commit()
+        return rows
+    finally:
+        cur.close()
+        conn.close()
+
+
+@pytest.fixture
+def outlet(sqlite_db):
+    """An outlet and two menu items; returns (outlet_id, burger_id, fries_id)."""
+    outlet_id = _execute(
+        """
+        INSERT INTO outlets (name, city, timezone, open_time, close_time, region)
+        VALUES ('Test Kitchen', 'Seattle', 'UTC', '00:00', '23:59', 'west')
+        RETURNING id
+        """
+    )[0][0]
+    burger = _execute("INSERT INTO menu_items (name, category, base_price) VALUES ('Burger', 'burger', 9) RETURNING id")
+    fries = _execute("INSERT INTO menu_items (name, category, base_price) VALUES ('Fries', 'sides', 3) RETURNING id")
+    return outlet_id, burger[0][0], fries[0][0]
+
+
+def _order(outlet_id: int, order_id: int, created_at: datetime, lines) -> None:
+    """An order with `lines` as (order_items id, menu_item_id)."""
+    _execute(
+        """
+        INSERT INTO orders (id, outlet_id, status, fulfillment_type, created_at, updated_at, total_amount)
+        VALUES (%s, %s, 'COMPLETED', 'PICKUP', %s, %s, 0)
+        """,
+        (order_id, outlet_id, created_at, created_at),
+    )
+    for item_id, menu_item_id in lines:
+        _execute(
+            """
+            INSERT INTO order_items (id, order_id, order_created_at, menu_item_id, quantity, unit_price, line_total)
+            VALUES (%s, %s, %s, %s, 1, 5, 5)
+            """,
+            (item_id, order_id, created_at, menu_item_id),
+        )
+
+
+def _daily(menu_item_id: int):
+    return _execute(
+        "SELECT order_count, quantity FROM outlet_item_daily_sales WHERE menu_item_id = %s", (menu_item_id,)
+    )
+
+
+def test_an_order_split_across_batches_is_counted_once(outlet):
+    outlet_id, burger, fries = outlet
+    old = datetime.now(timezone.utc) - timedelta(hours=1)
+    # Two burger lines interleaved with another order's line: batches of one row would split order 1
+    _order(outlet_id, 1, old, [(1, burger), (3, burger)])
+    _order(outlet_id, 2, old, [(2, fries)])
+
+    assert sales.rollup_sales(batch_size=1) == 3
+    assert _daily(burger) == [(1, 2)]
+    assert _daily(fries) == [(1, 1)]
+
+
+def test_recent_orders_wait_for_the_safety_cutoff(outlet, monkeypatch):
+    outlet_id, burger, _ = outlet
+    monkeypatch.setattr(sales, "ROLLUP_SAFETY_SECONDS", 300)
+    now = datetime.now(timezone.utc)
+    _order(outlet_id, 1, now - timedelta(hours=1), [(1, burger)])
+    _order(outlet_id, 2, now - timedelta(seconds=1), [(2, burger)])
+
+    assert sales.rollup_sales() == 1
+    assert _execute("SELECT last_order_item_id FROM sales_rollup_state")[0][0] == 1
+    assert sales.rollup_sales(safety_seconds=0) == 1
+    assert _daily(burger) == [(2, 2)]
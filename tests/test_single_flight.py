@@ -0,0 +1,55 @@
+"""
+Single-flight coalescing must not hand a session pinned to the primary a
+read made for another session.
+"""
+import contextvars
+import threading
+import time
+
+import pytest
+
+from db import connection, single_flight
+
+
+@pytest.fixture
+def slow_read(monkeypatch):
+    monkeypatch.setitem(single_flight.SINGLE_FLIGHT_ENABLED, "test_read", True)
+    monkeypatch.setattr(connection.replicas, "_session_lsn", {})
+    executions = []
+
+    @single_flight.coalesced("test_read")
+    def read(order_id):
+        executions.append(connection.current_session.get())
+        time.sleep(0.2)
+        return order_id
+
+    return read, executions
+
+
+def _in_session(session, fn, *args):
+    def run():
+        connection.use_session(session)
+        fn(*args)
+    thread = threading.Thread(target=contextvars.Context().run, args=(run,))
+    thread.start()
+    return thread
+
+
+def test_unpinned_sessions_share_a_read(slow_read):
+    read, executions = slow_read
+    threads = [_in_session(f"session-{n}", read, 1) for n in range(4)]
+    for thread in threads:
+        thread.join()
+    assert len(executions) == 1
+
+
+def test_pinned_session_does_not_join_another_sessions_read(slow_read):
+    read, executions = slow_read
+    connection.replicas.note_write("writer", 42)
+
+    reader = _in_session("reader", read, 1)
+    time.sleep(0.05)  # the unpinned read is in flight
+    writer = _in_session("writer", read, 1)
+    reader.join()
+    writer.join()
+    assert sorted(executions) == ["reader", "writer"]
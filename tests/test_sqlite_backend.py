@@ -0,0 +1,56 @@
+"""
+Every agent tool on the embedded SQLite backend, through the same parity
+check `python -m db.sqlite_backend --check` runs against Postgres.
+"""
+import importlib
+
+from db import seed_data, sqlite_backend
+
+AGENT_MODULES = ["menu_agent", "ordering_agent", "outlet_agent", "router_agent", "status_agent"]
+
+
+def _seed(path, monkeypatch, create: bool = False):
+    if create:
+        sqlite_backend.init_database(path)
+    monkeypatch.setattr(sqlite_backend, "DB_SQLITE_PATH", path)
+    seed_data.main()
+
+
+def test_check_covers_every_agent_tool():
+    tools = set()
+    for name in AGENT_MODULES:
+        agent = getattr(importlib.import_module(f"app_agents.{name}"), name)
+        tools.update(tool.name for tool in agent.tools)
+    assert tools <= set(sqlite_backend.CHECKED_TOOLS), tools - set(sqlite_backend.CHECKED_TOOLS)
+
+
+def test_every_tool_runs_on_sqlite(sqlite_db, monkeypatch):
+    _seed(sqlite_db, monkeypatch)
+    outputs = sqlite_backend.tool_outputs("sqlite")
+
+    called = {label.split(" ", 1)[0] for label, _ in outputs}
+    assert called == set(sqlite_backend.CHECKED_TOOLS)
+    for label, output in outputs:
+        assert "error occurred" not in output.lower(), (label, output)  # the SDK's text for a raised exception
+        assert "ERROR: Error" not in output, (label, output)  # tools' own exception handlers
+
+    created, replayed, bulk = (output for _, output in outputs[:3])
+    assert created.startswith("SUCCESS: Order #<order 1> created") and replayed == created
+    assert bulk.startswith("SUCCESS: Created 2 of 2 orders")
+
+    last = {label.split(" ", 1)[0]: output for label, output in outputs}
+    assert last["get_order_status"].startswith("Order #<order 1> Status: PENDING")
+    assert last["reorder"].startswith("Cart rebuilt from order #<order 1>")
+    assert "Order #<order 1> | PENDING" in last["get_orders_by_phone"]
+    assert any(label.startswith("top_items") and output.startswith("Most popular at") for label, output in outputs)
+
+
+def test_check_output_is_stable_across_databases(sqlite_db, tmp_path, monkeypatch):
+    """Two identically seeded databases compare equal, so a mismatch means the backends differ."""
+    _seed(sqlite_db, monkeypatch)
+    first = sqlite_backend.tool_outputs("sqlite")
+
+    _seed(str(tmp_path / "second.db"), monkeypatch, create=True)
+    second = sqlite_backend.tool_outputs("sqlite")
+
+    assert [output for _, output in first] == [output for _, output in second]
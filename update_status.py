@@ -1,16 +1,12 @@
-import psycopg2
-
-def get_connection():
-    return psycopg2.connect(
-        dbname="restaurant_db",
-        user="postgres",
-        password="user@123",
-        host="localhost",
-        port=5434,
-    )
+from db.connection import get_connection, shard_names
 
 def advance_orders():
-    conn = get_connection()
+    # Every shard keeps its own orders
+    for shard in shard_names():
+        advance_shard(shard)
+
+def advance_shard(shard=None):
+    conn = get_connection(shard=shard)
     cur = conn.cursor()
     try:
         cur.execute("""
@@ -23,6 +19,8 @@ def advance_orders():
                 ELSE status
             END,
             updated_at = NOW()
+            -- every month: an old open order still holds kitchen load until it moves;
+            -- the partial open-status index keeps each partition's scan small
             WHERE status IN ('PENDING', 'CONFIRMED', 'IN_KITCHEN', 'READY');
         """)
         conn.commit()